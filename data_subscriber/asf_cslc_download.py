@@ -1,3 +1,4 @@
+import concurrent.futures
 import copy
 import logging
 import os
@@ -5,7 +6,6 @@ import urllib.parse
 from datetime import datetime, timezone
 from os.path import basename
 from pathlib import PurePath, Path
-import boto3
 import hashlib
 import backoff
 import elasticsearch
@@ -17,7 +17,7 @@ from data_subscriber.cslc.cslc_catalog import CSLCStaticProductCatalog, KCSLCPro
 from data_subscriber.cslc.cslc_static_query import CslcStaticCmrQuery
 from data_subscriber.download import SessionWithHeaderRedirection
 from data_subscriber.url import cslc_unique_id
-from util.aws_util import concurrent_s3_client_try_upload_file
+from util.aws_util import concurrent_s3_client_try_upload_file, get_s3_client
 from util.conf_util import SettingsConf
 from util.job_submitter import try_submit_mozart_job
 
@@ -31,6 +31,8 @@ from data_subscriber.cslc.cslc_blackout import DispS1BlackoutDates, localize_dis
 _C_CSLC_ES_INDEX_PATTERNS = "grq_1_l2_cslc_s1_compressed*"
 
 class AsfDaacCslcDownload(AsfDaacRtcDownload):
+    MAX_CONCURRENT_TRANSFERS = 16
+    """The maximum number of S3 existence checks or ionosphere file downloads in flight at once"""
 
     def __init__(self, provider):
         super().__init__(provider)
@@ -41,7 +43,15 @@ class AsfDaacCslcDownload(AsfDaacRtcDownload):
         self.dataset_type = "L2_CSLC_S1"
 
     def run_download(self, args, token, es_conn, netloc, username, password, cmr, job_id, rm_downloads_dir=True):
-
+        """
+        Gathers the input files of every batch, then submits a DISP-S1 SCIFLO job for them.
+
+        The download runs in three phases. The CSLC files of all batches are collected first. For the https transfer
+        protocol each batch's files are removed from the local filesystem as soon as they are uploaded, and for the s3
+        transfer protocol their existence is then checked concurrently. Finally, the ancillaries shared by the batches
+        (CSLC static layers and ionosphere files) are deduplicated and fetched once for all batches, rather than per
+        batch.
+        """
         settings = SettingsConf().cfg
         product_id = "_".join([batch_id for batch_id in args.batch_ids])
         self.logger.info(f"{product_id=}")
@@ -50,8 +60,8 @@ class AsfDaacCslcDownload(AsfDaacRtcDownload):
         cslc_static_s3paths = []
         ionosphere_s3paths = []
         to_mark_downloaded = []
-        latest_acq_cycle_index = 0
         burst_id_set = set()
+        downloaded_filepaths = []
 
         # All batches should have the same frame_id so we pick the first one
         frame_id, _ = split_download_batch_id(args.batch_ids[0])
@@ -67,15 +77,18 @@ class AsfDaacCslcDownload(AsfDaacRtcDownload):
         # Sort the batch_ids by acq_cycle_index
         batch_ids = sorted(args.batch_ids, key=lambda batch_id: split_download_batch_id(batch_id)[1], reverse=True)
 
-        for index, batch_id in enumerate(batch_ids):
-            self.logger.info(f"Downloading CSLC files for batch {batch_id}")
+        # Determine the highest acquisition cycle index here for later use in retrieving m compressed CSLCs
+        latest_acq_cycle_index = max(split_download_batch_id(batch_id)[1] for batch_id in batch_ids)
 
-            # Determine the highest acquisition cycle index here for later use in retrieving m compressed CSLCs
-            _, acq_cycle_index = split_download_batch_id(batch_id)
-            latest_acq_cycle_index = max(latest_acq_cycle_index, int(acq_cycle_index))
+        # Phase one: collect the CSLC files of every batch   -------------->
+        batch_id_to_cslc_files: dict[str, list[Path]] = {}
+        batch_id_to_cslc_s3paths: dict[str, list[str]] = {}
+        batch_id_to_granule_sizes: dict[str, list[tuple[str, int]]] = {}
+
+        for index, batch_id in enumerate(batch_ids):
+            self.logger.info(f"Collecting CSLC files for batch {batch_id}")
 
             new_args.batch_ids = [batch_id]
-            granule_sizes = []
 
             # Download the files from ASF only if the transfer protocol is HTTPS
             if args.transfer_protocol == "https":
@@ -89,10 +102,17 @@ class AsfDaacCslcDownload(AsfDaacRtcDownload):
                                                                          key_prefix=f"tmp/disp_s1/{batch_id}",
                                                                          files=cslc_files_to_upload))
 
-                for granule_id, fp_set in cslc_products_to_filepaths.items():
-                    filepath = list(fp_set)[0]
-                    file_size = os.path.getsize(filepath)
-                    granule_sizes.append((granule_id, file_size))
+                batch_id_to_granule_sizes[batch_id] = [
+                    (granule_id, os.path.getsize(list(fp_set)[0]))
+                    for granule_id, fp_set in cslc_products_to_filepaths.items()
+                ]
+
+                # Delete the batch's files once uploaded, so at most one batch is held on the local filesystem.
+                # Only their names are needed from here on.
+                if rm_downloads_dir:
+                    self.logger.info(f"Removing downloaded CSLC files of batch {batch_id} from local filesystem")
+                    for fp in cslc_files_to_upload:
+                        os.remove(fp)
 
             # For s3 we can use the files directly so simply copy over the paths
             else: # s3 or auto
@@ -111,31 +131,23 @@ class AsfDaacCslcDownload(AsfDaacRtcDownload):
                 cslc_s3paths.extend(batch_cslc_s3paths)
                 if len(batch_cslc_s3paths) == 0:
                     raise Exception(f"No s3_path found for {batch_id}. You probably should specify https transfer protocol.")
+                batch_id_to_cslc_s3paths[batch_id] = batch_cslc_s3paths
 
-                for p in batch_cslc_s3paths:
-                    # Split the following into bucket name and key
-                    # 's3://asf-cumulus-prod-opera-products/OPERA_L2_CSLC-S1/OPERA_L2_CSLC-S1_T122-260026-IW3_20231214T011435Z_20231215T075814Z_S1A_VV_v1.0/OPERA_L2_CSLC-S1_T122-260026-IW3_20231214T011435Z_20231215T075814Z_S1A_VV_v1.0.h5'
-                    parsed_url = urllib.parse.urlparse(p)
-                    bucket = parsed_url.netloc
-                    key = parsed_url.path[1:]
-                    granule_id = p.split("/")[-1]
-
-                    try:
-                        head_object = boto3.client("s3").head_object(Bucket=bucket, Key=key)
-                        self.logger.info(f"Adding CSLC file: {p}")
-                    except Exception as e:
-                        self.logger.error("Failed when accessing the S3 object:" + p)
-                        raise e
-                    file_size = int(head_object["ContentLength"])
+                cslc_files_to_upload = [Path(p) for p in batch_cslc_s3paths] # Need this for querying static CSLCs
 
-                    granule_sizes.append((granule_id, file_size))
+            batch_id_to_cslc_files[batch_id] = cslc_files_to_upload
 
-                cslc_files_to_upload = [Path(p) for p in batch_cslc_s3paths] # Need this for querying static CSLCs
+        # Phase two: check the existence of the CSLC files in S3, all at once   -------------->
+        if batch_id_to_cslc_s3paths:
+            s3path_to_file_size = self.get_s3_file_sizes(cslc_s3paths)
 
-                cslc_products_to_filepaths = {} # Dummy when trying to delete files later in this function
+            for batch_id, batch_cslc_s3paths in batch_id_to_cslc_s3paths.items():
+                batch_id_to_granule_sizes[batch_id] = [(p.split("/")[-1], s3path_to_file_size[p])
+                                                      for p in batch_cslc_s3paths]
 
-            # Create list of CSLC files marked as downloaded, this will be used as the very last step in this function
-            # While at it also build up burst_id set for compressed CSLC query
+        # Create list of CSLC files marked as downloaded, this will be used as the very last step in this function
+        # While at it also build up burst_id set for compressed CSLC query
+        for batch_id, granule_sizes in batch_id_to_granule_sizes.items():
             for granule_id, file_size in granule_sizes:
                 native_id = granule_id.split(".h5")[0] # remove file extension and revision id
                 burst_id, _, _, _ = parse_cslc_native_id(native_id, self.burst_to_frames, self.disp_burst_map)
@@ -143,64 +155,44 @@ class AsfDaacCslcDownload(AsfDaacRtcDownload):
                 to_mark_downloaded.append((unique_id, file_size))
                 burst_id_set.add(burst_id)
 
-            self.logger.info(f"Querying CSLC-S1 Static Layer products for {batch_id}")
-            cslc_static_granules = self.query_cslc_static_files_for_cslc_batch(
-                cslc_files_to_upload, new_args, token, job_id, settings
+        # Phase three: fetch the ancillaries shared by the batches once   -------------->
+        cslc_files = [cslc_file for cslc_files in batch_id_to_cslc_files.values() for cslc_file in cslc_files]
+
+        # Static layers only depend on the burst, so query for each burst once
+        burst_id_to_cslc_file = {}
+        for cslc_file in cslc_files:
+            burst_id_to_cslc_file.setdefault(parse_cslc_burst_id(cslc_file.stem), cslc_file)
+
+        self.logger.info(f"Querying CSLC-S1 Static Layer products for {len(burst_id_to_cslc_file)} bursts")
+        cslc_static_granules = self.query_cslc_static_files_for_cslc_batch(
+            list(burst_id_to_cslc_file.values()), new_args, token, job_id, settings
+        )
+
+        # Download the files from ASF only if the transfer protocol is HTTPS
+        if args.transfer_protocol == "https":
+            self.logger.info(f"Downloading CSLC Static Layer products")
+            cslc_static_products_to_filepaths: dict[str, set[Path]] = self.download_cslc_static_files_for_cslc_batch(
+                cslc_static_granules, new_args, token, netloc,
+                username, password, job_id
             )
 
-            # Download the files from ASF only if the transfer protocol is HTTPS
-            if args.transfer_protocol == "https":
-                self.logger.info(f"Downloading CSLC Static Layer products for {batch_id}")
-                cslc_static_products_to_filepaths: dict[str, set[Path]] = self.download_cslc_static_files_for_cslc_batch(
-                    cslc_static_granules, new_args, token, netloc,
-                    username, password, job_id
-                )
-
-                self.logger.info("Uploading CSLC Static input files to S3")
-                cslc_static_files_to_upload = [fp for fp_set in cslc_static_products_to_filepaths.values() for fp in fp_set]
-                cslc_static_s3paths.extend(concurrent_s3_client_try_upload_file(bucket=settings["DATASET_BUCKET"],
-                                                                                key_prefix=f"tmp/disp_s1/{batch_id}",
-                                                                                files=cslc_static_files_to_upload))
-            # For s3 we can use the files directly so simply copy over the paths
-            else:  # s3 or auto
-                self.logger.info("Skipping download CSLC static files and instead using ASF S3 paths for direct SCIFLO PGE ingestion")
-
-                cslc_static_products_to_filepaths = {} # Dummy when trying to delete files later in this function
-
-                for cslc_static_granule in cslc_static_granules:
-                    for url in cslc_static_granule["filtered_urls"]:
-                        if url.startswith("s3") and url not in cslc_static_s3paths:
-                            cslc_static_s3paths.append(url)
-
-                if len(cslc_static_s3paths) == 0:
-                    raise Exception(f"No s3_path found for static files for {batch_id}. You probably should specify https transfer protocol.")
-
-            # Download all Ionosphere files corresponding to the dates covered by the input CSLC set
-            # We always download ionosphere files, there is no direct S3 ingestion option
-            self.logger.info(f"Downloading Ionosphere files for {batch_id}")
-            ionosphere_paths = self.download_ionosphere_files_for_cslc_batch(cslc_files_to_upload,
-                                                                             self.downloads_dir)
-
-            self.logger.info(f"Uploading Ionosphere files to S3")
-            # TODO: since all ionosphere files now go to the same S3 location,
-            #  it should be possible to do a lookup before redownloading a file
-            ionosphere_s3paths.extend(concurrent_s3_client_try_upload_file(bucket=settings["DATASET_BUCKET"],
-                                                                           key_prefix=f"tmp/disp_s1/ionosphere",
-                                                                           files=ionosphere_paths))
-
-            # Delete the files from the file system after uploading to S3
-            if rm_downloads_dir:
-                self.logger.info("Removing downloaded files from local filesystem")
-                for fp_set in cslc_products_to_filepaths.values():
-                    for fp in fp_set:
-                        os.remove(fp)
+            self.logger.info("Uploading CSLC Static input files to S3")
+            cslc_static_files_to_upload = [fp for fp_set in cslc_static_products_to_filepaths.values() for fp in fp_set]
+            cslc_static_s3paths.extend(concurrent_s3_client_try_upload_file(bucket=settings["DATASET_BUCKET"],
+                                                                            key_prefix=f"tmp/disp_s1/{batch_ids[0]}",
+                                                                            files=cslc_static_files_to_upload))
+            downloaded_filepaths.extend(cslc_static_files_to_upload)
+        # For s3 we can use the files directly so simply copy over the paths
+        else:  # s3 or auto
+            self.logger.info("Skipping download CSLC static files and instead using ASF S3 paths for direct SCIFLO PGE ingestion")
 
-                for fp_set in cslc_static_products_to_filepaths.values():
-                    for fp in fp_set:
-                        os.remove(fp)
+            for cslc_static_granule in cslc_static_granules:
+                for url in cslc_static_granule["filtered_urls"]:
+                    if url.startswith("s3") and url not in cslc_static_s3paths:
+                        cslc_static_s3paths.append(url)
 
-                for iono_file in ionosphere_paths:
-                    os.remove(iono_file)
+            if len(cslc_static_s3paths) == 0:
+                raise Exception(f"No s3_path found for static files for {product_id}. You probably should specify https transfer protocol.")
 
         # Determine M Compressed CSLCs by querying compressed cslc GRQ ES   -------------->
         k, m = es_conn.get_k_and_m(args.batch_ids[0])
@@ -217,19 +209,24 @@ class AsfDaacCslcDownload(AsfDaacRtcDownload):
             c_cslc_s3paths.extend(cslc_path)
             self.logger.info(f"Adding {cslc_path} to c_cslc_s3paths")
 
-        # Now acquire the Ionosphere files for the reference dates of the Compressed CSLC products
-        self.logger.info(f"Downloading Ionosphere files for Compressed CSLCs")
-        ionosphere_paths = self.download_ionosphere_files_for_cslc_batch(c_cslc_s3paths,
+        # Download all Ionosphere files corresponding to the dates covered by the input CSLC set and the reference dates
+        # of the Compressed CSLC products. Each date's file is downloaded once, however many batches cover it.
+        # We always download ionosphere files, there is no direct S3 ingestion option
+        self.logger.info(f"Downloading Ionosphere files")
+        ionosphere_paths = self.download_ionosphere_files_for_cslc_batch(cslc_files + c_cslc_s3paths,
                                                                          self.downloads_dir)
 
-        self.logger.info(f"Uploading Ionosphere files for Compressed CSLCs to S3")
+        self.logger.info(f"Uploading Ionosphere files to S3")
         ionosphere_s3paths.extend(concurrent_s3_client_try_upload_file(bucket=settings["DATASET_BUCKET"],
                                                                        key_prefix=f"tmp/disp_s1/ionosphere",
                                                                        files=ionosphere_paths))
+        downloaded_filepaths.extend(ionosphere_paths)
 
-        # Remove potential duplicate ionosphere entries
-        # TODO: rework ionosphere download logic to check for files that have already been downloaded for a previous batch_id
-        ionosphere_s3paths = list(set(ionosphere_s3paths))
+        # Delete the files from the file system after uploading to S3
+        if rm_downloads_dir:
+            self.logger.info("Removing downloaded files from local filesystem")
+            for fp in downloaded_filepaths:
+                os.remove(fp)
 
         # Look up bounding box for frame
         bounding_box = get_bounding_box_for_frame(int(frame_id), self.frame_geo_map)
@@ -301,6 +298,25 @@ class AsfDaacCslcDownload(AsfDaacRtcDownload):
 
         return submitted
 
+    def get_s3_file_sizes(self, s3paths: list[str]) -> dict[str, int]:
+        """Checks that each of the given S3 objects exists, returning their sizes. Objects are checked concurrently."""
+
+        def head_object(s3path):
+            # Split the following into bucket name and key
+            # 's3://asf-cumulus-prod-opera-products/OPERA_L2_CSLC-S1/OPERA_L2_CSLC-S1_T122-260026-IW3_20231214T011435Z_20231215T075814Z_S1A_VV_v1.0/OPERA_L2_CSLC-S1_T122-260026-IW3_20231214T011435Z_20231215T075814Z_S1A_VV_v1.0.h5'
+            parsed_url = urllib.parse.urlparse(s3path)
+            try:
+                head_object = s3_client.head_object(Bucket=parsed_url.netloc, Key=parsed_url.path[1:])
+                self.logger.info(f"Adding CSLC file: {s3path}")
+            except Exception as e:
+                self.logger.error("Failed when accessing the S3 object:" + s3path)
+                raise e
+            return s3path, int(head_object["ContentLength"])
+
+        s3_client = get_s3_client()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_TRANSFERS) as executor:
+            return dict(executor.map(head_object, s3paths))
+
     def get_downloads(self, batch_id, es_conn):
         '''Returns items to download based on the batch_ids'''
 
@@ -373,32 +389,32 @@ class AsfDaacCslcDownload(AsfDaacRtcDownload):
 
 
     def download_ionosphere_files_for_cslc_batch(self, cslc_files, download_dir):
+        """Downloads the Ionosphere file of each acquisition date covered by the given CSLC files, each date once"""
         # Reduce the provided CSLC paths to just the filenames
         cslc_files = list(map(lambda path: basename(path), cslc_files))
 
-        downloaded_ionosphere_dates = set()
-        downloaded_ionosphere_files = set()
+        acq_date_to_cslc_file = {}
 
         for cslc_file in cslc_files:
-            self.logger.info(f'Downloading Ionosphere file for CSLC granule {cslc_file}')
-
             cslc_file_tokens = cslc_file.split('_')
             acq_datetime = cslc_file_tokens[4]
             acq_date = acq_datetime.split('T')[0]
 
             self.logger.debug(f'{acq_date=}')
 
-            if acq_date not in downloaded_ionosphere_dates:
-                ionosphere_filepath = ionosphere_download.download_ionosphere_correction_file(
-                    dataset_dir=download_dir, product_filepath=cslc_file
-                )
-
-                downloaded_ionosphere_dates.add(acq_date)
-                downloaded_ionosphere_files.add(ionosphere_filepath)
+            if acq_date not in acq_date_to_cslc_file:
+                acq_date_to_cslc_file[acq_date] = cslc_file
             else:
-                self.logger.info(f'Already downloaded Ionosphere file for date {acq_date}, skipping...')
+                self.logger.info(f'Already downloading Ionosphere file for date {acq_date}, skipping {cslc_file}...')
+
+        def download_ionosphere_file(cslc_file):
+            self.logger.info(f'Downloading Ionosphere file for CSLC granule {cslc_file}')
+            return ionosphere_download.download_ionosphere_correction_file(
+                dataset_dir=download_dir, product_filepath=cslc_file
+            )
 
-        return downloaded_ionosphere_files
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_TRANSFERS) as executor:
+            return set(executor.map(download_ionosphere_file, acq_date_to_cslc_file.values()))
 
     def create_job_params(self, product):
         return [
@@ -224,14 +224,10 @@ class AsfDaacRtcDownload(BaseDownload):
     def download_asf_product(self, product_url, token: str, target_dirpath: Path):
         self.logger.info(f"Requesting from {product_url}")
 
-        asf_response = self._handle_url_redirect(product_url, token)
-        asf_response.raise_for_status()
-
         product_filename = PurePath(product_url).name
         product_download_path = target_dirpath / product_filename
-        with open(product_download_path, "wb") as file:
-            file.write(asf_response.content)
-        return product_download_path.resolve()
+
+        return self._download_url_redirect(product_url, token, product_download_path).path
 
 
 def multithread_gather(job_submission_tasks):
@@ -1,14 +1,13 @@
 from pathlib import PurePath, Path
 import os
 import urllib
-import boto3
 from collections import defaultdict
 from datetime import datetime, timezone
 import hashlib
 import logging
 
 from util.ctx_util import JobContext
-from util.aws_util import concurrent_s3_client_try_upload_file
+from util.aws_util import concurrent_s3_client_try_upload_file, get_s3_client
 from util.job_util import is_running_outside_verdi_worker_context
 from util.job_submitter import try_submit_mozart_job
 
@@ -92,7 +91,7 @@ class AsfDaacRtcForDistDownload(AsfDaacCslcDownload):
                 granule_id = key.split("/")[-2]
 
                 try:
-                    head_object = boto3.client("s3").head_object(Bucket=bucket, Key=key)
+                    head_object = get_s3_client().head_object(Bucket=bucket, Key=key)
                     self.logger.info(f"Adding RTC file: {p}")
                 except Exception as e:
                     self.logger.error("Failed when accessing the S3 object:" + p)
@@ -1,8 +1,11 @@
 
+import concurrent.futures
 import glob
 import json
 import netrc
 import os
+import shutil
+from collections import deque, namedtuple
 from datetime import datetime, timedelta
 from pathlib import PurePath, Path
 from os.path import abspath, getsize, join
@@ -23,103 +26,191 @@ from util.dataspace_util import (NoQueryResultsException,
                                  NoSuitableOrbitFileException,
                                  DEFAULT_DATASPACE_ENDPOINT)
 
+IonosphereFile = namedtuple("IonosphereFile", ["filepath", "url"])
+
 
 class AsfDaacSlcDownload(BaseDownload):
+    PIPELINE_QUEUE_SIZE = 1
+    """
+    Maximum number of downloaded SLCs waiting on extraction while the next SLC
+    downloads. Bounds the disk space held by SLC archives in flight.
+    """
+
+    MAX_CONCURRENT_ANCILLARY_FETCHES = 2
+    """Maximum number of SLCs whose Orbit and Ionosphere files are fetched concurrently"""
+
+    MIN_FREE_DISK_SPACE_BYTES = 16 * 1024 ** 3
+    """
+    Free disk space under which the next SLC is not downloaded until the
+    pending extractions complete and their SLC archives are removed
+    """
 
     def __init__(self, provider):
         super().__init__(provider)
         self.daac_s3_cred_settings_key = "SLC_DOWNLOAD"
 
     def perform_download(self, session: requests.Session, es_conn, downloads: list[dict], args, token, job_id):
-        for download in downloads:
-            if not _has_url(download):
-                continue
+        """
+        Downloads and extracts each SLC, along with its Orbit and Ionosphere
+        files, as a pipeline:
+
+        * the Orbit and Ionosphere files of an SLC are fetched from its granule
+          name, concurrently with the transfer of the SLC archive;
+        * the extraction of an SLC overlaps the transfer of the next one, with
+          at most PIPELINE_QUEUE_SIZE downloaded SLCs awaiting extraction, and
+          none while free disk space is under MIN_FREE_DISK_SPACE_BYTES.
+
+        Any failure of a stage fails the download job, as it would have when
+        processing one SLC at a time.
+        """
+        pending_extractions = deque()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_ANCILLARY_FETCHES) as ancillary_executor, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=1) as extract_executor:
+            for download in downloads:
+                if not _has_url(download):
+                    continue
+
+                if args.transfer_protocol == "https":
+                    product_url = _to_https_urls(download)
+                else:
+                    product_url = _to_urls(download)
+
+                self.logger.info("Processing product_url=%s", product_url)
+                product_id = _slc_url_to_chunk_id(product_url, str(download['revision_id']))
+
+                product_download_dir = self.downloads_dir / product_id
+                product_download_dir.mkdir(exist_ok=True)
+
+                if args.dry_run:
+                    self.logger.info("args.dry_run=%s. Skipping download.", args.dry_run)
+                    continue
+
+                # The ancillary files only depend on the granule name, so need not wait on the SLC itself
+                ancillary_dir = product_download_dir / "ancillaries"
+                ancillary_future = ancillary_executor.submit(
+                    self.stage_ancillary_files, download, ancillary_dir, PurePath(product_url).name
+                )
 
-            if args.transfer_protocol == "https":
-                product_url = _to_https_urls(download)
-            else:
-                product_url = _to_urls(download)
+                self._wait_for_pending_extractions(pending_extractions)
 
-            self.logger.info("Processing product_url=%s", product_url)
-            product_id = _slc_url_to_chunk_id(product_url, str(download['revision_id']))
+                if product_url.startswith("s3"):
+                    product_filepath = self.download_product_using_s3(
+                        product_url, token, target_dirpath=product_download_dir.resolve(), args=args
+                    )
+                else:
+                    product_filepath = self.download_asf_product(
+                        product_url, token, product_download_dir
+                    )
 
-            product_download_dir = self.downloads_dir / product_id
-            product_download_dir.mkdir(exist_ok=True)
+                self.logger.info("Marking %s as downloaded.", product_filepath)
+                self.logger.debug("download['id']=%s", download['id'])
 
-            if args.dry_run:
-                self.logger.info("args.dry_run=%s. Skipping download.", args.dry_run)
-                continue
+                es_conn.mark_product_as_downloaded(download['id'], job_id)
 
-            if product_url.startswith("s3"):
-                product = product_filepath = self.download_product_using_s3(
-                    product_url, token, target_dirpath=product_download_dir.resolve(), args=args
-                )
-            else:
-                product = product_filepath = self.download_asf_product(
-                    product_url, token, product_download_dir
+                self.logger.debug(f"product_url_downloaded={product_url}")
+
+                pending_extractions.append(
+                    extract_executor.submit(self.extract_slc, download, product_filepath, ancillary_dir, ancillary_future)
                 )
 
-            self.logger.info("Marking %s as downloaded.", product_filepath)
-            self.logger.debug("download['id']=%s", download['id'])
+            while pending_extractions:
+                pending_extractions.popleft().result()
+
+    def _wait_for_pending_extractions(self, pending_extractions: deque):
+        """
+        Waits for pending extractions, oldest first, until at most
+        PIPELINE_QUEUE_SIZE remain to overlap the download of the next SLC, or
+        until all are done if free disk space is low. Raises the error of any
+        failed extraction.
+        """
+        while len(pending_extractions) > self.PIPELINE_QUEUE_SIZE:
+            pending_extractions.popleft().result()
+
+        while pending_extractions and shutil.disk_usage(self.downloads_dir).free < self.MIN_FREE_DISK_SPACE_BYTES:
+            self.logger.info("Free disk space is low. Waiting on pending extractions before the next download.")
+            pending_extractions.popleft().result()
+
+    def stage_ancillary_files(self, download: dict, ancillary_dir: Path, product_filename: str):
+        """
+        Fetches the Orbit file(s) of the SLC, and its Ionosphere file for
+        historical and reprocessing runs, to ancillary_dir. Returns the
+        Ionosphere file if one was fetched, else None.
+        """
+        ancillary_dir.mkdir(exist_ok=True)
+
+        self.download_orbit_file(ancillary_dir, product_filename)
+
+        if download.get("processing_mode") in ("historical", "reprocessing"):
+            self.logger.info(
+                "Processing mode is %s. Attempting to download ionosphere correction file.",
+                download["processing_mode"]
+            )
+            return self.fetch_ionosphere_file(ancillary_dir, product_filename)
 
-            es_conn.mark_product_as_downloaded(download['id'], job_id)
+        return None
 
-            self.logger.debug(f"product_url_downloaded={product_url}")
+    def extract_slc(self, download: dict, product_filepath: Path, ancillary_dir: Path,
+                    ancillary_future: concurrent.futures.Future):
+        """
+        Extracts the downloaded SLC to a dataset, then adds the ancillary files
+        staged by stage_ancillary_files once they are available, and removes
+        the SLC archive.
+        """
+        additional_metadata = {}
 
-            additional_metadata = {}
+        try:
+            additional_metadata['processing_mode'] = download['processing_mode']
+        except KeyError:
+            self.logger.warning("processing_mode not found in the slc_catalog ES index")
 
-            try:
-                additional_metadata['processing_mode'] = download['processing_mode']
-            except KeyError:
-                self.logger.warning("processing_mode not found in the slc_catalog ES index")
+        if download.get("intersects_north_america"):
+            self.logger.info("Adding intersects_north_america to dataset metadata")
+            additional_metadata["intersects_north_america"] = True
 
-            if download.get("intersects_north_america"):
-                self.logger.info("Adding intersects_north_america to dataset metadata")
-                additional_metadata["intersects_north_america"] = True
+        dataset_dir = self.extract_one_to_one(product_filepath, self.cfg, working_dir=Path.cwd(),
+                                              extra_metadata=additional_metadata,
+                                              name_postscript='-r'+str(download['revision_id']))
 
-            dataset_dir = self.extract_one_to_one(product, self.cfg, working_dir=Path.cwd(),
-                                                  extra_metadata=additional_metadata,
-                                                  name_postscript='-r'+str(download['revision_id']))
+        self.update_pending_dataset_with_index_name(dataset_dir, '-r' + str(download['revision_id']))
 
-            self.update_pending_dataset_with_index_name(dataset_dir, '-r' + str(download['revision_id']))
+        # Rename the dataset_dir to match the pattern w revision_id
+        new_dataset_dir = dataset_dir.parent / form_batch_id(dataset_dir.name, str(download['revision_id']))
+        self.logger.debug("new_dataset_dir=%s", str(new_dataset_dir))
 
-            # Rename the dataset_dir to match the pattern w revision_id
-            new_dataset_dir = dataset_dir.parent / form_batch_id(dataset_dir.name, str(download['revision_id']))
-            self.logger.debug("new_dataset_dir=%s", str(new_dataset_dir))
+        os.rename(str(dataset_dir), str(new_dataset_dir))
 
-            os.rename(str(dataset_dir), str(new_dataset_dir))
+        ionosphere_file = ancillary_future.result()
 
-            self.download_orbit_file(new_dataset_dir, product_filepath)
+        for ancillary_filename in os.listdir(ancillary_dir):
+            shutil.move(str(ancillary_dir / ancillary_filename), str(Path(new_dataset_dir) / ancillary_filename))
+        ancillary_dir.rmdir()
+        self.logger.info("Added orbit file(s) to dataset")
 
-            # We've observed cases where the orbit file download seems to complete
-            # successfully, but the resulting files are empty, causing the PGE/SAS to crash.
-            # Check for any empty files now, so we can fail during this download job
-            # rather than during the SCIFLO job.
-            self.check_for_empty_orbit_files(new_dataset_dir)
+        # We've observed cases where the orbit file download seems to complete
+        # successfully, but the resulting files are empty, causing the PGE/SAS to crash.
+        # Check for any empty files now, so we can fail during this download job
+        # rather than during the SCIFLO job.
+        self.check_for_empty_orbit_files(new_dataset_dir)
 
-            if additional_metadata['processing_mode'] in ("historical", "reprocessing"):
-                self.logger.info(
-                    "Processing mode is %s. Attempting to download ionosphere correction file.",
-                    additional_metadata['processing_mode']
-                )
-                self.download_ionosphere_file(new_dataset_dir, product_filepath)
+        if ionosphere_file:
+            # add ionosphere metadata to the dataset about to be ingested
+            ionosphere_metadata = ionosphere_download.generate_ionosphere_metadata(
+                Path(new_dataset_dir) / ionosphere_file.filepath.name, ionosphere_url=ionosphere_file.url,
+                s3_bucket="...", s3_key="..."
+            )
+            self.update_pending_dataset_metadata_with_ionosphere_metadata(new_dataset_dir, ionosphere_metadata)
 
-            self.logger.info("Removing %s", product_filepath)
-            product_filepath.unlink(missing_ok=True)
+        self.logger.info("Removing %s", product_filepath)
+        product_filepath.unlink(missing_ok=True)
 
     def download_asf_product(self, product_url, token: str, target_dirpath: Path):
         self.logger.info("Requesting from %s", product_url)
 
-        asf_response = self._handle_url_redirect(product_url, token)
-        asf_response.raise_for_status()
-
         product_filename = PurePath(product_url).name
         product_download_path = target_dirpath / product_filename
 
-        with open(product_download_path, "wb") as file:
-            file.write(asf_response.content)
-
-        return product_download_path.resolve()
+        return self._download_url_redirect(product_url, token, product_download_path).path
 
     def update_pending_dataset_with_index_name(self, dataset_dir: PurePath, postscript):
         self.logger.info("Updating dataset's dataset.json with index name")
@@ -246,6 +337,22 @@ class AsfDaacSlcDownload(BaseDownload):
         else:
             self.logger.info("All downloaded orbit files are non-empty")
     def download_ionosphere_file(self, dataset_dir, product_filepath):
+        ionosphere_file = self.fetch_ionosphere_file(dataset_dir, product_filepath)
+
+        if ionosphere_file:
+            # add ionosphere metadata to the dataset about to be ingested
+            ionosphere_metadata = ionosphere_download.generate_ionosphere_metadata(
+                ionosphere_file.filepath, ionosphere_url=ionosphere_file.url,
+                s3_bucket="...", s3_key="..."
+            )
+            self.update_pending_dataset_metadata_with_ionosphere_metadata(dataset_dir, ionosphere_metadata)
+
+    def fetch_ionosphere_file(self, dataset_dir, product_filepath):
+        """
+        Downloads the Ionosphere file of the product to dataset_dir, returning
+        its path and source URL. Returns None if no Ionosphere file is
+        available yet.
+        """
         try:
             output_ionosphere_filepath = ionosphere_download.download_ionosphere_correction_file(
                 dataset_dir=dataset_dir, product_filepath=product_filepath
@@ -253,16 +360,10 @@ class AsfDaacSlcDownload(BaseDownload):
             ionosphere_url = ionosphere_download.get_ionosphere_correction_file_url(
                 dataset_dir=dataset_dir, product_filepath=product_filepath
             )
-
-            # add ionosphere metadata to the dataset about to be ingested
-            ionosphere_metadata = ionosphere_download.generate_ionosphere_metadata(
-                output_ionosphere_filepath, ionosphere_url=ionosphere_url,
-                s3_bucket="...", s3_key="..."
-            )
-            self.update_pending_dataset_metadata_with_ionosphere_metadata(dataset_dir, ionosphere_metadata)
+            return IonosphereFile(output_ionosphere_filepath, ionosphere_url)
         except IonosphereFileNotFoundException:
             self.logger.warning("Ionosphere file not found remotely. Allowing job to continue.")
-            pass
+            return None
 
     def update_pending_dataset_metadata_with_ionosphere_metadata(self, dataset_dir: PurePath, ionosphere_metadata: dict):
         self.logger.info("Updating dataset's met.json with ionosphere metadata")
@@ -1,14 +1,20 @@
 
 import logging
+import time
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
 import elasticsearch
+import elasticsearch.helpers
 import backoff
+import opensearchpy
+from more_itertools import chunked
 
 from data_subscriber import es_conn_util
 from data_subscriber.url import form_batch_id
+from util.conf_util import SettingsConf
 
 null_logger = logging.getLogger('dummy')
 null_logger.addHandler(logging.NullHandler())
@@ -22,9 +28,18 @@ class ProductCatalog(ABC):
     ES_INDEX_PATTERNS = None
     NAME = None
 
+    BULK_CHUNK_SIZE = 500
+    """The number of actions sent per _bulk request"""
+    BULK_MAX_RETRIES = 3
+    """The number of times failed items of a _bulk request are retried"""
+    BULK_RETRY_DELAY_SECS = 1
+    BULK_THREAD_COUNT = 1
+    """The number of _bulk requests sent concurrently. Values greater than 1 use the parallel_bulk helper"""
+
     def __init__(self, logger=None):
         self.logger = logger or null_logger
         self.es_util = es_conn_util.get_es_connection(logger)
+        self._bulk_docs = None
 
     def _get_index_name_for(self, _id: str, default: str):
         """Gets the index name for the most recent ES doc matching the given _id"""
@@ -59,6 +74,34 @@ class ProductCatalog(ABC):
 
         return results
 
+    def _get_index_names_for(self, _ids, default):
+        """
+        Bulk variant of _get_index_name_for(). Gets the index name for the most recent ES doc matching each of the
+        given _ids, issuing one terms query per chunk of _ids.
+        """
+        id_to_index = {}
+
+        # Batch requests for larger number of docs
+        # see Elasticsearch documentation regarding "indices.query.bool.max_clause_count". Minimum is 1024
+        for ids_chunk in chunked(dict.fromkeys(_ids), 1024):
+            try:
+                results = self.es_util.query(
+                    index=self.ES_INDEX_PATTERNS,
+                    body={
+                        "query": {"bool": {"must": [{"terms": {"_id": ids_chunk}}]}},
+                        "sort": [{"creation_timestamp": "desc"}],
+                        "_source": {"includes": "false", "excludes": []}
+                    },
+                )
+            except Exception:
+                self.logger.info(f"{len(ids_chunk)} ids do not exist in {self.ES_INDEX_PATTERNS}")
+                results = None
+
+            for result in (results or []):
+                id_to_index.setdefault(result["_id"], result["_index"])  # results are sorted most recent first
+
+        return {_id: id_to_index.get(_id, default) for _id in _ids}
+
     @abstractmethod
     def process_query_result(self, query_result: list[dict]):
         pass
@@ -161,6 +204,45 @@ class ProductCatalog(ABC):
         else:
             self.logger.info(f"Document updated: {batch_id=} {job_id=} {result}")
 
+    def mark_download_job_ids(self, batch_id_to_job_id: dict[str, str]):
+        """
+        Bulk variant of mark_download_job_id(). Stores the download_job_id of each batch in the catalog for all granules
+        in that batch, using _bulk requests followed by a single refresh.
+        """
+        if not batch_id_to_job_id:
+            return
+
+        actions = []
+        updated_batch_ids = set()
+        es_engine = self._get_es_engine()
+
+        # Batch requests for larger number of batches
+        # see Elasticsearch documentation regarding "indices.query.bool.max_clause_count". Minimum is 1024
+        for batch_ids_chunk in chunked(batch_id_to_job_id, 1024):
+            results = self.es_util.query(
+                index=self.ES_INDEX_PATTERNS,
+                body={
+                    "query": {"bool": {"must": [{"terms": {"download_batch_id.keyword": batch_ids_chunk}}]}},
+                    "_source": {"includes": ["download_batch_id"], "excludes": []}
+                }
+            )
+
+            for result in (results or []):
+                batch_id = result["_source"]["download_batch_id"]
+                updated_batch_ids.add(batch_id)
+                actions.append(self._to_bulk_action(
+                    "update", index=result["_index"], _id=result["_id"], doc={"download_job_id": batch_id_to_job_id[batch_id]},
+                    es_engine=es_engine
+                ))
+
+        self.bulk(actions, es_engine=es_engine)
+        self.refresh()
+
+        not_updated_batch_ids = [batch_id for batch_id in batch_id_to_job_id if batch_id not in updated_batch_ids]
+        if not_updated_batch_ids:
+            self.logger.error(f"No documents updated for {len(not_updated_batch_ids)} batches: {not_updated_batch_ids}")
+        self.logger.info(f"{len(actions)} documents updated for {len(updated_batch_ids)} batches")
+
     def mark_product_as_downloaded(self, url, job_id, filesize=None, doc=None):
         filename = url.split("/")[-1]
 
@@ -192,7 +274,34 @@ class ProductCatalog(ABC):
             self.logger.warning(f'Granule {granule["granule_id"]} already exists in DB. No additional indexing needed.')
             return
 
-        doc = {
+        doc = self.form_granule_document(granule)
+
+        result = self.es_util.index_document(index=self.generate_es_index_name(), body=doc, id=granule["granule_id"])
+
+        self.logger.debug(f"Granule {granule['granule_id']} indexed: {result}")
+
+    def process_granules(self, granules: list[dict]):
+        """Bulk variant of process_granule(). Indexes all granules that don't already exist in the catalog."""
+        granule_id_to_index = self._get_index_names_for([granule["granule_id"] for granule in granules], default=None)
+        es_engine = self._get_es_engine()
+
+        actions = []
+        for granule in granules:
+            if granule_id_to_index[granule["granule_id"]] is not None:
+                self.logger.warning(f'Granule {granule["granule_id"]} already exists in DB. No additional indexing needed.')
+                continue
+
+            actions.append(self._to_bulk_action(
+                "index", index=self.generate_es_index_name(), _id=granule["granule_id"], doc=self.form_granule_document(granule),
+                es_engine=es_engine
+            ))
+            granule_id_to_index[granule["granule_id"]] = self.generate_es_index_name()  # skip repeated granules
+
+        self.bulk(actions, es_engine=es_engine)
+        self.logger.debug(f"{len(actions)} granules indexed")
+
+    def form_granule_document(self, granule: dict):
+        return {
             "id": granule["granule_id"],
             "provider": granule["provider"],
             "production_datetime": granule["production_datetime"],
@@ -203,13 +312,13 @@ class ProductCatalog(ABC):
             "creation_timestamp": datetime.now()
         }
 
-        result = self.es_util.index_document(index=self.generate_es_index_name(), body=doc, id=granule["granule_id"])
-
-        self.logger.debug(f"Granule {granule['granule_id']} indexed: {result}")
-
     def process_url(self, urls: list[str], granule: dict, job_id: str, query_dt: datetime,
                     temporal_extent_beginning_dt: datetime, revision_date_dt: datetime,
                     filename=None, *args, **kwargs):
+        """
+        Upserts a catalog document for the given URLs of a granule.
+        Within a bulk_upserts() context, the document is instead buffered and upserted in bulk when the context exits.
+        """
 
         if filename is None:
             if len(urls) == 0: # This is the case for CSLCProductCatalog and its children
@@ -237,12 +346,108 @@ class ProductCatalog(ABC):
 
         doc.update(kwargs)
 
+        if self._bulk_docs is not None:
+            self._bulk_docs.append(doc)
+            return
+
         index = self._get_index_name_for(_id=doc['id'], default=self.generate_es_index_name())
 
         result = self.es_util.update_document(index=index, body={"doc_as_upsert": True, "doc": doc}, id=doc['id'])
 
         self.logger.debug(f"Document {filename} upserted: {result}")
 
+    @contextmanager
+    def bulk_upserts(self):
+        """
+        Context manager that batches the documents of process_url() calls made within it. On exit, the existing index
+        of each document is resolved in bulk and all documents are upserted using _bulk requests.
+        """
+        self._bulk_docs = []
+        try:
+            yield self
+            docs = self._bulk_docs
+        finally:
+            self._bulk_docs = None
+
+        self.bulk_upsert_documents(docs)
+
+    def bulk_upsert_documents(self, docs: list[dict]):
+        """Upserts the given documents into their existing index (or a new one) using _bulk requests."""
+        doc_id_to_index = self._get_index_names_for([doc["id"] for doc in docs], default=self.generate_es_index_name())
+        es_engine = self._get_es_engine()
+
+        actions = [self._to_bulk_action("update", index=doc_id_to_index[doc["id"]], _id=doc["id"], doc=doc, es_engine=es_engine)
+                   for doc in docs]
+
+        self.bulk(actions, es_engine=es_engine)
+        self.logger.debug(f"{len(docs)} documents upserted")
+
+    @staticmethod
+    def _get_es_engine() -> str:
+        """The GRQ_ES_ENGINE of settings.yaml. Resolve it once per bulk operation, rather than once per action."""
+        return SettingsConf().cfg["GRQ_ES_ENGINE"]
+
+    def _to_bulk_action(self, op_type: str, index: str, _id: str, doc: dict, es_engine: str):
+        """Forms a _bulk action for the given ES engine (see _get_es_engine())"""
+        if op_type == "update":
+            action = {"_op_type": op_type, "_index": index, "_id": _id, "doc_as_upsert": True, "doc": doc}
+        else:
+            action = {"_op_type": op_type, "_index": index, "_id": _id, "_source": doc}
+
+        if "elasticsearch" == es_engine:
+            action["_type"] = "_doc"
+
+        return action
+
+    def bulk(self, actions: list[dict], chunk_size: int = None, thread_count: int = None, es_engine: str = None):
+        """
+        Performs the given actions using _bulk requests of chunk_size actions (default BULK_CHUNK_SIZE), sending up to
+        thread_count requests concurrently (default BULK_THREAD_COUNT). Items that fail are reported and retried on
+        their own, up to BULK_MAX_RETRIES times. Raises an exception if any items still fail after that.
+        """
+        es_engine = es_engine or self._get_es_engine()
+        if "opensearch" == es_engine:
+            helpers = opensearchpy.helpers
+        else:
+            helpers = elasticsearch.helpers
+
+        chunk_size = chunk_size or self.BULK_CHUNK_SIZE
+        thread_count = thread_count or self.BULK_THREAD_COUNT
+
+        for attempt in range(self.BULK_MAX_RETRIES + 1):
+            if not actions:
+                return
+
+            if attempt > 0:
+                time.sleep(self.BULK_RETRY_DELAY_SECS * 2 ** (attempt - 1))
+                self.logger.info(f"Retrying {len(actions)} failed _bulk items (attempt {attempt} of {self.BULK_MAX_RETRIES})")
+
+            if thread_count > 1:
+                errors = [
+                    item for ok, item in helpers.parallel_bulk(
+                        self.es_util.es, actions, thread_count=thread_count, chunk_size=chunk_size,
+                        raise_on_error=False, raise_on_exception=False
+                    )
+                    if not ok
+                ]
+            else:
+                _, errors = helpers.bulk(
+                    self.es_util.es, actions, chunk_size=chunk_size,
+                    raise_on_error=False, raise_on_exception=False, stats_only=False
+                )
+
+            failed_ids = set()
+            for error in errors:
+                (op_type, item), = error.items()
+                self.logger.warning(f"_bulk {op_type} failed for {item.get('_id')}: {item.get('status')} {item.get('error')}")
+                failed_ids.add(item.get("_id"))
+
+            actions = [action for action in actions if action["_id"] in failed_ids]
+
+        if actions:
+            raise Exception(f"{len(actions)} _bulk items failed after {self.BULK_MAX_RETRIES} retries: "
+                            f"{[action['_id'] for action in actions]}")
+
     def refresh(self):
         """
         Refresh the underlying indices, making recent operations visible to queries.
@@ -13,8 +13,7 @@ from data_subscriber.aws_token import supply_token
 from data_subscriber.rtc import mgrs_bursts_collection_db_client as mbc_client
 from more_itertools import first_true
 from rtc_utils import rtc_granule_regex
-from tools.ops.cmr_audit import cmr_client
-from tools.ops.cmr_audit.cmr_client import async_cmr_posts
+from tools.ops.cmr_audit.cmr_client import async_cmr_posts_windowed, async_cmr_posts_windowed_iter
 
 MAX_CHARS_PER_LINE = 250000
 """The maximum number of characters per line you can display in cloudwatch logs"""
@@ -161,6 +160,85 @@ async def async_query_cmr_v2(timerange=None, provider=None, collection=None, bbo
 async def async_query_cmr(args, token, cmr_hostname, settings, timerange, now: datetime, verbose=True) -> list:
     logger = get_logger()
     request_url = f"https://{cmr_hostname}/search/granules.umm_json"
+    params = _form_cmr_query_params(args, token, timerange, now)
+
+    logger.info(f"Querying CMR. endpoint: %s  provider: %s", cmr_hostname, args.provider)
+    logger.debug("request_url=%s", request_url)
+    logger.debug("params=%s", params)
+
+    product_granules = await _async_request_search_cmr_granules(args.collection, request_url, [params])
+    search_results_count = len(product_granules)
+
+    logger.info(f"CMR Query Complete. Found %d granule(s)", search_results_count)
+
+    # Default but this would never be used because we calculate dynamically below.
+    # Just here incase code moves around and we want a reasonable default
+    products_per_line = 1000
+
+    if verbose:
+        if search_results_count > 0:
+            # Print out all the query results but limit the number of characters per line
+            one_logout = f'{(product_granules[0]["granule_id"], "revision " + str(product_granules[0]["revision_id"]))}'
+            chars_per_line = len(one_logout) + 6  # 6 is a fudge factor
+            products_per_line = MAX_CHARS_PER_LINE // chars_per_line
+
+            for i in range(0, search_results_count, products_per_line):
+                end_range = i + products_per_line
+                if end_range > search_results_count:
+                    end_range = search_results_count
+
+                logger.info('QUERY RESULTS %d to %d of %d: ', i + 1, end_range, search_results_count)
+
+                for granule in product_granules[i:end_range]:
+                    logger.info(
+                        f'{(granule["granule_id"], "revision " + str(granule["revision_id"]))}'
+                    )
+
+    product_granules = filter_cmr_granules(product_granules, args, settings)
+
+    if len(product_granules) != search_results_count:
+        logger.info(f"Filtered to %d total granules after shortname filter check", len(product_granules))
+        for i in range(0, len(product_granules), products_per_line):
+            end_range = i + products_per_line
+            if end_range > len(product_granules):
+                end_range = len(product_granules)
+
+            logger.info(f'FILTERED RESULTS %d to %d of %d: ', i + 1, end_range, len(product_granules))
+
+            for granule in product_granules[i:end_range]:
+                logger.info(
+                    f'{(granule["granule_id"], "revision " + str(granule["revision_id"]))}'
+                )
+
+    return product_granules
+
+
+async def async_query_cmr_pages(args, token, cmr_hostname, settings, timerange, now: datetime):
+    """
+    Async generator variant of async_query_cmr(). Yields the filtered granules of each CMR search page as soon as the
+    page is received, so that they can be processed while later pages are still being fetched.
+    """
+    logger = get_logger()
+    request_url = f"https://{cmr_hostname}/search/granules.umm_json"
+    params = _form_cmr_query_params(args, token, timerange, now)
+
+    logger.info(f"Querying CMR. endpoint: %s  provider: %s", cmr_hostname, args.provider)
+    logger.debug("request_url=%s", request_url)
+    logger.debug("params=%s", params)
+
+    search_results_count = 0
+    async for response_json in async_cmr_posts_windowed_iter(request_url, [params]):
+        product_granules = response_jsons_to_cmr_granules(args.collection, [response_json])
+        search_results_count += len(product_granules)
+        logger.info("Received CMR search page of %d granule(s)", len(product_granules))
+
+        yield filter_cmr_granules(product_granules, args, settings)
+
+    logger.info(f"CMR Query Complete. Found %d granule(s)", search_results_count)
+
+
+def _form_cmr_query_params(args, token, timerange, now: datetime) -> dict:
+    logger = get_logger()
     bounding_box = args.bbox
 
     # Assert that timerange looks like this: 2016-08-22T23:00:00Z
@@ -235,37 +313,16 @@ async def async_query_cmr(args, token, cmr_hostname, settings, timerange, now: d
             logger.debug("Using args.temporal_start_date=%s", args.temporal_start_date)
             params["temporal"] = dateutil.parser.isoparse(args.temporal_start_date).strftime(CMR_TIME_FORMAT)
 
-    logger.info(f"Querying CMR. endpoint: %s  provider: %s", cmr_hostname, args.provider)
-    logger.debug("request_url=%s", request_url)
-    logger.debug("params=%s", params)
-
-    product_granules = await _async_request_search_cmr_granules(args.collection, request_url, [params])
-    search_results_count = len(product_granules)
-
-    logger.info(f"CMR Query Complete. Found %d granule(s)", search_results_count)
-
-    # Default but this would never be used because we calculate dynamically below.
-    # Just here incase code moves around and we want a reasonable default
-    products_per_line = 1000
-
-    if verbose:
-        if search_results_count > 0:
-            # Print out all the query results but limit the number of characters per line
-            one_logout = f'{(product_granules[0]["granule_id"], "revision " + str(product_granules[0]["revision_id"]))}'
-            chars_per_line = len(one_logout) + 6  # 6 is a fudge factor
-            products_per_line = MAX_CHARS_PER_LINE // chars_per_line
-
-            for i in range(0, search_results_count, products_per_line):
-                end_range = i + products_per_line
-                if end_range > search_results_count:
-                    end_range = search_results_count
+    return params
 
-                logger.info('QUERY RESULTS %d to %d of %d: ', i + 1, end_range, search_results_count)
 
-                for granule in product_granules[i:end_range]:
-                    logger.info(
-                        f'{(granule["granule_id"], "revision " + str(granule["revision_id"]))}'
-                    )
+def filter_cmr_granules(product_granules: list[dict], args, settings) -> list[dict]:
+    """
+    Filters out granules that exceed the max revision or don't match the collection's shortname filters, then sets the
+    "filtered_urls" of the remaining granules.
+    """
+    logger = get_logger()
+    search_results_count = len(product_granules)
 
     # Filter out granules with revision-id greater than max allowed
     least_revised_granules = []
@@ -289,20 +346,6 @@ async def async_query_cmr(args, token, cmr_hostname, settings, timerange, now: d
         product_granules = [granule for granule in product_granules
                             if _match_identifier(settings, args, granule)]
 
-    if len(product_granules) != search_results_count:
-        logger.info(f"Filtered to %d total granules after shortname filter check", len(product_granules))
-        for i in range(0, len(product_granules), products_per_line):
-            end_range = i + products_per_line
-            if end_range > len(product_granules):
-                end_range = len(product_granules)
-
-            logger.info(f'FILTERED RESULTS %d to %d of %d: ', i + 1, end_range, len(product_granules))
-
-            for granule in product_granules[i:end_range]:
-                logger.info(
-                    f'{(granule["granule_id"], "revision " + str(granule["revision_id"]))}'
-                )
-
     for granule in product_granules:
         granule["filtered_urls"] = _filter_granules(granule, args)
 
@@ -321,7 +364,7 @@ def _get_temporal_range(start: str, end: str, now: str) -> str:
 
 
 async def _async_request_search_cmr_granules(collection, request_url, paramss: Iterable[dict], convert_results=True):
-    response_jsons = await async_cmr_posts(request_url, cmr_client.paramss_to_request_body(paramss))
+    response_jsons = await async_cmr_posts_windowed(request_url, paramss)
     return response_jsons_to_cmr_granules(collection, response_jsons, convert_results=convert_results)
 
 
@@ -1,16 +1,18 @@
 
 import asyncio
 import json
-from collections import defaultdict
-from copy import deepcopy
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
 from functools import cache
 
 import dateutil
+import numpy as np
 
 from opera_commons.logger import get_logger
 from data_subscriber.cmr import async_query_cmr, CMR_TIME_FORMAT
 from data_subscriber.cslc_utils import (localize_anc_json,
                                         sensing_time_day_index,
+                                        _calculate_sensing_time_day_indices,
                                         parse_cslc_native_id,
                                         parse_cslc_file_name,
                                         download_batch_id_forward_reproc)
@@ -18,6 +20,13 @@ from data_subscriber.url import cslc_unique_id
 
 DEFAULT_DISP_BLACKOUT_DATE_NAME = 'opera-disp-s1-blackout-dates.json'
 
+_BlackoutWindows = namedtuple("_BlackoutWindows", ["starts", "running_max_ends", "covering_windows", "dates"])
+"""The blackout windows of a frame, in seconds since the first sensing time of the frame, sorted by start.
+running_max_ends[i] is the latest end of windows 0..i, and covering_windows[i] the window ending then."""
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
 
 @cache
 def localize_disp_blackout_dates():
@@ -60,28 +69,92 @@ class DispS1BlackoutDates:
     def __init__(self, frame_blackout_dates, frame_to_burst, burst_to_frames):
         self.frame_to_burst = frame_to_burst
         self.burst_to_frames = burst_to_frames
-        self.frame_blackout_acq_indices = defaultdict(list)
+        self.frame_blackout_windows = {}
 
-        # Populate for the beginning and end of the time range
+        # Populate for the beginning and end of the time range. The acquisition (day index, seconds) pairs order
+        # the same as the seconds alone, so the windows are indexed by seconds since the first sensing time.
         for frame_id, blackout_dates in frame_blackout_dates.items():
-            for start_date, end_date in blackout_dates:
-                acq_index_start = sensing_time_day_index(start_date, frame_id, self.frame_to_burst)
-                acq_index_end = sensing_time_day_index(end_date, frame_id, self.frame_to_burst)
-                self.frame_blackout_acq_indices[frame_id].append((acq_index_start, acq_index_end, start_date, end_date))
+            if not blackout_dates:
+                continue
+
+            windows = sorted(
+                (sensing_time_day_index(start_date, frame_id, self.frame_to_burst)[1],
+                 sensing_time_day_index(end_date, frame_id, self.frame_to_burst)[1],
+                 (start_date, end_date))
+                for start_date, end_date in blackout_dates
+            )
+            ends = np.array([end for _, end, _ in windows], dtype=np.int64)
+            running_max_ends = np.maximum.accumulate(ends)
+            covering_windows = np.zeros(len(windows), dtype=np.int64)
+            for i in range(1, len(windows)):
+                covering_windows[i] = i if ends[i] >= running_max_ends[i - 1] else covering_windows[i - 1]
+
+            self.frame_blackout_windows[frame_id] = _BlackoutWindows(
+                starts=np.array([start for start, _, _ in windows], dtype=np.int64),
+                running_max_ends=running_max_ends,
+                covering_windows=covering_windows,
+                dates=[dates for _, _, dates in windows]
+            )
+
+    def _find_blackout_windows(self, frame_id, sensing_seconds):
+        '''Returns the index of a blackout window of the frame covering each of the sensing seconds, or -1 if none does.
+        When windows overlap, the one of them ending last is returned.'''
+
+        windows = self.frame_blackout_windows[frame_id]
+
+        # The last window starting at or before the sensing time covers it if any window does, as long as it's
+        # taken to end at the latest end of the windows starting before it
+        last_started = np.searchsorted(windows.starts, sensing_seconds, side="right") - 1
+        candidates = np.maximum(last_started, 0)
+        covered = (last_started >= 0) & (windows.running_max_ends[candidates] >= sensing_seconds)
+
+        return np.where(covered, windows.covering_windows[candidates], -1)
 
     def is_in_blackout(self, frame_id, sensing_time):
         '''The sensing time of the frame is in blackout if any of its upto 27 bursts are in the blackout date range'''
 
-        if frame_id not in self.frame_blackout_acq_indices:
+        if frame_id not in self.frame_blackout_windows:
             return False, None
 
         # If the sensing_time is within the blackout date acquisition date index range, it's blacked out
-        acq_index = sensing_time_day_index(sensing_time, frame_id, self.frame_to_burst)
-        for acq_index_start, acq_index_end, start_date, end_date in self.frame_blackout_acq_indices[frame_id]:
-            if acq_index_start <= acq_index <= acq_index_end:
-                return True, (start_date, end_date)
+        _, seconds = sensing_time_day_index(sensing_time, frame_id, self.frame_to_burst)
+        windows = self.frame_blackout_windows[frame_id]
+        last_started = int(windows.starts.searchsorted(seconds, side="right")) - 1
+        if last_started < 0 or windows.running_max_ends[last_started] < seconds:
+            return False, None
+
+        return True, windows.dates[windows.covering_windows[last_started]]
+
+    def are_in_blackout(self, frame_ids, sensing_times):
+        '''Vectorized is_in_blackout over lists of frame ids and sensing times. Returns a boolean array of whether each
+        sensing time is in blackout, and a list of the blackout (start, end) dates of each, None if not in blackout.'''
 
-        return False, None
+        frame_ids = np.asarray(frame_ids, dtype=np.int64)
+        # Microseconds since the epoch. Much faster than converting the datetimes with dtype="datetime64[us]".
+        sensing_us = np.fromiter(((sensing_time - _EPOCH) // _MICROSECOND for sensing_time in sensing_times),
+                                 dtype=np.int64, count=len(sensing_times))
+        is_black_out = np.zeros(len(frame_ids), dtype=bool)
+        dates = [None] * len(frame_ids)
+
+        # Process the sensing times frame by frame
+        order = np.argsort(frame_ids, kind="stable")
+        unique_frame_ids, frame_starts = np.unique(frame_ids[order], return_index=True)
+        for frame_id, frame_indices in zip(unique_frame_ids.tolist(), np.split(order, frame_starts[1:])):
+            if frame_id not in self.frame_blackout_windows:
+                continue
+
+            # Same as sensing_time_day_index, for all the sensing times of the frame at once
+            first_sensing_us = (self.frame_to_burst[frame_id].sensing_datetimes[0] - _EPOCH) // _MICROSECOND
+            _, seconds = _calculate_sensing_time_day_indices(sensing_us[frame_indices] - first_sensing_us)
+
+            windows = self._find_blackout_windows(frame_id, seconds)
+            blacked_out = windows >= 0
+            is_black_out[frame_indices[blacked_out]] = True
+            frame_dates = self.frame_blackout_windows[frame_id].dates
+            for i, window in zip(frame_indices[blacked_out].tolist(), windows[blacked_out].tolist()):
+                dates[i] = frame_dates[window]
+
+        return is_black_out, dates
 
     def extend_additional_records(self, granules, proc_mode, no_duplicate=False, force_frame_id = None):
         """Add frame_id, burst_id, and acquisition_cycle to all granules.
@@ -106,10 +179,10 @@ class DispS1BlackoutDates:
             if proc_mode not in ["forward"] or no_duplicate:
                 continue
 
-            # If this burst belongs to two frames, make a deep copy of the granule and append to the list
+            # If this burst belongs to two frames, copy the granule for the other frame and append to the list.
+            # Only the frame-dependent fields differ, so the copy shares all other fields with the granule.
             if len(frame_ids) == 2:
-                new_granule = deepcopy(granule)
-                new_granule["frame_id"] = self.burst_to_frames[burst_id][1]
+                new_granule = {**granule, "frame_id": self.burst_to_frames[burst_id][1]}
                 granule["acquisition_cycle"] = acquisition_cycles[granule["frame_id"]]
                 new_granule["download_batch_id"] = download_batch_id_forward_reproc(new_granule)
                 new_granule["unique_id"] = cslc_unique_id(new_granule["download_batch_id"], new_granule["burst_id"])
@@ -134,20 +207,26 @@ def _filter_cslc_blackout_polarization(granules, proc_mode, blackout_dates_obj,
 
     blackout_dates_obj.extend_additional_records(relevant_granules, proc_mode, no_duplicate, force_frame_id)
 
+    polarization_granules = []
     for granule in relevant_granules:
 
         if vv_only and "_VV_" not in granule["granule_id"]:
             logger.info(f"Skipping granule %s because it doesn't have VV polarization", granule['granule_id'])
             continue
 
-        frame_id = granule["frame_id"]
+        polarization_granules.append(granule)
+
+    are_black_out, blackout_dates = blackout_dates_obj.are_in_blackout(
+        [granule["frame_id"] for granule in polarization_granules],
+        [granule["acquisition_ts"] for granule in polarization_granules]
+    )
 
-        is_black_out, dates = blackout_dates_obj.is_in_blackout(frame_id, granule["acquisition_ts"])
+    for granule, is_black_out, dates in zip(polarization_granules, are_black_out, blackout_dates):
         if is_black_out:
             blackout_start = dates[0].strftime(CMR_TIME_FORMAT)
             blackout_end = dates[1].strftime(CMR_TIME_FORMAT)
             logger.info(f"Skipping granule %s because frame_id=%s falls on a blackout date blackout_start=%s blackout_end=%s",
-                        granule['granule_id'], frame_id, blackout_start, blackout_end)
+                        granule['granule_id'], granule["frame_id"], blackout_start, blackout_end)
             continue
 
         filtered_granules.append(granule)
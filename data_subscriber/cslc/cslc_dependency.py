@@ -1,6 +1,13 @@
+import json
+import os
+import re
+import time
+from bisect import bisect_left
 from collections import defaultdict
-from copy import deepcopy
+from copy import copy
 from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
 
 import dateutil
 
@@ -11,8 +18,68 @@ from data_subscriber.cslc_utils import parse_cslc_file_name, determine_acquisiti
     build_ccslc_m_index, _C_CSLC_ES_INDEX_PATTERNS
 
 
+ACQUISITION_DAY_INDEX_TTL_SECS = 60 * 60
+"""How long CMR-discovered acquisition days of a frame are reused before CMR is queried for them again."""
+
+ACQUISITION_DAY_INDEX_SETTLE_PERIOD = timedelta(days=2)
+"""How long after an acquisition all of its CSLC granules are assumed to be published in CMR. Only acquisition days
+older than this are cached, so that acquisitions whose bursts arrive late are still picked up by later queries."""
+
+ACQUISITION_DAY_INDEX_QUERY_OVERLAP = timedelta(days=1)
+"""Overlap between consecutive CMR queries extending a frame's acquisition days, so that an acquisition whose CSLC
+granules straddle the end of the cached time range is queried again as a whole."""
+
+
+class AcquisitionDayIndexCache:
+    """
+    Per-frame cache of the acquisition day indices found in CMR after the end of the historical database. Each entry
+    records the day indices that satisfy the frame's burst pattern, along with the acquisition time of their last burst,
+    and the settled datetime up to which CMR has been queried, so that only newer acquisitions need to be queried for.
+
+    Entries are kept in memory and persisted as JSON files in `cache_dir`, to be shared by jobs on the same worker.
+    Entries expire `ttl` seconds after they were first created.
+    """
+
+    def __init__(self, cache_dir=None, ttl=ACQUISITION_DAY_INDEX_TTL_SECS):
+        cache_dir = cache_dir or os.environ.get(
+            "CSLC_ACQUISITION_DAY_INDEX_CACHE_DIR", "~/.cache/opera_pcm/cslc_acquisition_day_index")
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.ttl = ttl
+        self._entries: dict[str, dict] = {}
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            try:
+                entry = json.loads((self.cache_dir / f"{key}.json").read_text())
+            except (OSError, ValueError):
+                return None
+
+        if time.time() - entry["created_ts"] > self.ttl:
+            self._entries.pop(key, None)
+            return None
+
+        self._entries[key] = entry
+        return entry
+
+    def put(self, key: str, entry: dict):
+        self._entries[key] = entry
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_dir / f"{key}.json.{os.getpid()}"
+            tmp_path.write_text(json.dumps(entry))
+            os.replace(tmp_path, self.cache_dir / f"{key}.json")
+        except OSError as e:
+            get_logger().warning(f"Failed to persist acquisition day index {key}: {e}")
+
+
+acquisition_day_index_cache = AcquisitionDayIndexCache()
+"""The process-wide acquisition day index cache."""
+
+
 class CSLCDependency:
-    def __init__(self, k: int, m: int, frame_to_bursts, args, token, cmr, settings, blackout_dates_obj, VV_only = True):
+    def __init__(self, k: int, m: int, frame_to_bursts, args, token, cmr, settings, blackout_dates_obj, VV_only = True,
+                 day_index_cache: AcquisitionDayIndexCache = None):
         self.logger = get_logger()
         self.k = k
         self.m = m
@@ -23,6 +90,7 @@ class CSLCDependency:
         self.settings = settings
         self.blackout_dates_obj = blackout_dates_obj
         self.VV_only = VV_only
+        self.day_index_cache = day_index_cache if day_index_cache is not None else acquisition_day_index_cache
 
     def get_prev_day_indices(self, day_index: int, frame_number: int):
         '''Return the day indices of the previous acquisitions for the frame_number given the current day index'''
@@ -32,23 +100,73 @@ class CSLCDependency:
     OPERA does not process this frame for DISP-S1.")
 
         frame = self.frame_to_bursts[frame_number]
+        hist_day_indices = frame.sensing_datetime_days_index
 
-        if day_index <= frame.sensing_datetime_days_index[-1]:
+        if day_index <= hist_day_indices[-1]:
             # If the day index is within the historical database, simply return from the database
-            # ASSUMPTION: This is slow linear search but there will never be more than a couple hundred entries here so doesn't matter.
-            list_index = frame.sensing_datetime_days_index.index(day_index)
-            return frame.sensing_datetime_days_index[:list_index]
+            list_index = bisect_left(hist_day_indices, day_index)
+            if hist_day_indices[list_index] != day_index:
+                raise ValueError(f"{day_index} is not in list")
+            return hist_day_indices[:list_index]
         else:
-            # If not, we must query CMR and then append that to the database values
+            # If not, we must look up the acquisitions since the database (from CMR) and then append them to the database values
             start_date = frame.sensing_datetimes[-1] + timedelta(minutes=30)
-            days_delta = day_index - frame.sensing_datetime_days_index[-1]
+            days_delta = day_index - hist_day_indices[-1]
             end_date = start_date + timedelta(days=days_delta - 1) # We don't want the current day index in this
-            query_timerange = DateTimeRange(start_date.strftime(CMR_TIME_FORMAT), end_date.strftime(CMR_TIME_FORMAT))
-            acq_index_to_bursts, _ = self.get_k_granules_from_cmr(query_timerange, frame_number, verbose = False)
-            all_prev_indices = frame.sensing_datetime_days_index + sorted(list(acq_index_to_bursts.keys()))
+            cmr_day_indices = self.get_cmr_day_indices(end_date, frame_number, verbose=False)
+            all_prev_indices = hist_day_indices + cmr_day_indices[:bisect_left(cmr_day_indices, day_index)]
             self.logger.debug(f"All previous day indices: {all_prev_indices}")
             return all_prev_indices
 
+    def get_cmr_day_indices(self, end_date: datetime, frame_number: int, verbose = True) -> list[int]:
+        '''Return the sorted day indices of the acquisitions after the historical database, up to end_date, that satisfy
+        the burst pattern for the frame_number.
+        CMR is only queried for the time range not already covered by the acquisition day index cache.'''
+
+        frame = self.frame_to_bursts[frame_number]
+        start_date = frame.sensing_datetimes[-1] + timedelta(minutes=30)
+        if end_date <= start_date:
+            return []
+
+        # CMR venues list different granules, so never share entries between them
+        venue = re.sub(r"[^A-Za-z0-9.-]", "_", str(self.cmr))
+        key = f"{venue}_frame_{frame_number}_{'VV' if self.VV_only else 'all'}"
+        entry = self.day_index_cache.get(key)
+        if entry is None or entry["hist_last_day_index"] != frame.sensing_datetime_days_index[-1]:
+            entry = {
+                "created_ts": time.time(),
+                "hist_last_day_index": frame.sensing_datetime_days_index[-1],
+                "covered_until": None,
+                "day_index_acquisition_times": {}
+            }
+
+        # day index to the acquisition time of its last burst
+        day_index_acquisition_times = {int(day_index): datetime.strptime(acquisition_time, CMR_TIME_FORMAT)
+                                       for day_index, acquisition_time in entry["day_index_acquisition_times"].items()}
+        covered_until = datetime.strptime(entry["covered_until"], CMR_TIME_FORMAT) if entry["covered_until"] else None
+        if covered_until is None or covered_until < end_date:
+            query_start_date = start_date if covered_until is None else max(start_date, covered_until - ACQUISITION_DAY_INDEX_QUERY_OVERLAP)
+            query_timerange = DateTimeRange(query_start_date.strftime(CMR_TIME_FORMAT), end_date.strftime(CMR_TIME_FORMAT))
+            _, acq_index_to_granules = self.get_k_granules_from_cmr(query_timerange, frame_number, verbose)
+            for day_index, granules in acq_index_to_granules.items():
+                day_index_acquisition_times[day_index] = max(
+                    dateutil.parser.isoparse(parse_cslc_file_name(granule["granule_id"])[1][:-1]) for granule in granules)
+
+            # only cache the acquisitions that have settled, as bursts of newer acquisitions may yet be published
+            settled_until = min(end_date, datetime.utcnow() - ACQUISITION_DAY_INDEX_SETTLE_PERIOD)
+            if covered_until is None or covered_until < settled_until:
+                entry["covered_until"] = settled_until.strftime(CMR_TIME_FORMAT)
+                entry["day_index_acquisition_times"] = {
+                    str(day_index): acquisition_time.strftime(CMR_TIME_FORMAT)
+                    for day_index, acquisition_time in day_index_acquisition_times.items()
+                    if acquisition_time <= settled_until
+                }
+                self.day_index_cache.put(key, entry)
+
+        # same as querying CMR up to end_date: only the acquisitions all of whose bursts were acquired by then
+        return sorted(day_index for day_index, acquisition_time in day_index_acquisition_times.items()
+                      if acquisition_time <= end_date)
+
     def get_k_granules_from_cmr(self, query_timerange, frame_number: int, verbose = True):
         '''Return two dictionaries that satisfy the burst pattern for the frame_number within the time range:
         1. acq_index_to_bursts: day index to set of burst ids
@@ -57,7 +175,7 @@ class CSLCDependency:
 
         # Add native-id condition in args. This query is always by temporal time.
         l, native_id = build_cslc_native_ids(frame_number, self.frame_to_bursts)
-        args = deepcopy(self.args)
+        args = copy(self.args)
         args.native_id = native_id
         args.use_temporal = True
 
@@ -113,31 +231,30 @@ class CSLCDependency:
             day_index = determine_acquisition_cycle_cslc(acquisition_dts, frame_number, self.frame_to_bursts)
 
         # If the day index is within the historical database it's much simpler
-        # ASSUMPTION: This is slow linear search but there will never be more than a couple hundred entries here so doesn't matter.
-        # Clearly if we somehow end up with like 1000
-        try:
-            # array.index returns 0-based index so add 1
-            frame = self.frame_to_bursts[frame_number]
-            index_number = frame.sensing_datetime_days_index.index(day_index) + 1 # note "index" is overloaded term here
+        frame = self.frame_to_bursts[frame_number]
+        hist_day_indices = frame.sensing_datetime_days_index
+        list_index = bisect_left(hist_day_indices, day_index)
+        if list_index < len(hist_day_indices) and hist_day_indices[list_index] == day_index:
+            # list index is 0-based so add 1
+            index_number = list_index + 1 # note "index" is overloaded term here
             return index_number % self.k
-        except ValueError:
-            # If not, we have to query CMR for all records after the historical database, filter out ones that don't match the burst pattern,
-            # and then determine the k-cycle index
+        else:
+            # If not, we have to look up all acquisitions after the historical database that match the burst pattern
+            # (from CMR), and then determine the k-cycle index
             start_date = frame.sensing_datetimes[-1] + timedelta(minutes=30) # Make sure we are not counting this last sensing time cycle
 
             if acquisition_dts is None:
-                days_delta = day_index - frame.sensing_datetime_days_index[-1]
+                days_delta = day_index - hist_day_indices[-1]
                 end_date = start_date + timedelta(days=days_delta)
             else:
                 end_date = acquisition_dts
 
-            query_timerange = DateTimeRange(start_date.strftime(CMR_TIME_FORMAT), end_date.strftime(CMR_TIME_FORMAT))
-            acq_index_to_bursts, _ = self.get_k_granules_from_cmr(query_timerange, frame_number, verbose)
+            cmr_day_indices = self.get_cmr_day_indices(end_date, frame_number, verbose)
 
             # The k-index is then the complete index number (historical + post historical) mod k
-            self.logger.info(f"{len(acq_index_to_bursts.keys())} day indices since historical that match the burst pattern: {acq_index_to_bursts.keys()}")
-            self.logger.info(f"{len(frame.sensing_datetime_days_index)} day indices already in historical database.")
-            index_number = len(frame.sensing_datetime_days_index) + len(acq_index_to_bursts.keys()) + 1
+            self.logger.info(f"{len(cmr_day_indices)} day indices since historical that match the burst pattern: {cmr_day_indices}")
+            self.logger.info(f"{len(hist_day_indices)} day indices already in historical database.")
+            index_number = len(hist_day_indices) + len(cmr_day_indices) + 1
             return index_number % self.k
 
     def compressed_cslc_satisfied(self, frame_id, day_index, eu):
@@ -278,6 +278,9 @@ since the first CSLC file for the batch was ingested which is greater than the g
         # Move start and end date of new_args back and expand 5 days at both ends to capture all k granules
         shift_day_grouping = 12 * (k_minus_one * K_MULT_FACTOR) # Number of days by which to shift each iteration
 
+        cslc_dependency = CSLCDependency(
+            args.k, args.m, self.disp_burst_map_hist, args, self.token, self.cmr, self.settings, self.blackout_dates_obj, VV_only)
+
         counter = 1
         while k_satified < k_minus_one:
             start_date_shift = timedelta(days= counter * shift_day_grouping, hours=1)
@@ -295,8 +298,6 @@ since the first CSLC file for the batch was ingested which is greater than the g
                              start_date, end_date, frame_id)
 
             # Step 1 of 2: This will return dict of acquisition_cycle -> set of granules for only onse that match the burst pattern
-            cslc_dependency = CSLCDependency(
-                args.k, args.m, self.disp_burst_map_hist, args, self.token, self.cmr, self.settings, self.blackout_dates_obj, VV_only)
             _, granules_map = cslc_dependency.get_k_granules_from_cmr(query_timerange, frame_id, verbose=verbose)
 
             # Step 2 of 2 ...Sort that by acquisition_cycle in decreasing order and then pick the first k-1 frames
@@ -461,9 +462,9 @@ since the first CSLC file for the batch was ingested which is greater than the g
         for g in all_granules:
             acq_cycles_and_bursts[g["acquisition_cycle"]].add(g["burst_id"])
 
-        start_days_index, _ = get_nearest_sensing_datetime(self.disp_burst_map_hist[frame_id].sensing_datetimes,
+        start_days_index, _ = get_nearest_sensing_datetime(self.disp_burst_map_hist[frame_id].sensing_datetimes64,
                                                            datetime.strptime(timerange.start_date, CMR_TIME_FORMAT))
-        end_days_index, _ = get_nearest_sensing_datetime(self.disp_burst_map_hist[frame_id].sensing_datetimes,
+        end_days_index, _ = get_nearest_sensing_datetime(self.disp_burst_map_hist[frame_id].sensing_datetimes64,
                                                          datetime.strptime(timerange.end_date, CMR_TIME_FORMAT))
         all_acq_cyles_found = set(acq_cycles_and_bursts.keys())
         all_acq_cyles_needed = set(self.disp_burst_map_hist[frame_id].sensing_datetime_days_index[start_days_index:end_days_index])
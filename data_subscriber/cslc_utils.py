@@ -1,18 +1,24 @@
+import bisect
 import json
+import os
 import re
 from collections import defaultdict
+from collections.abc import Mapping
 from datetime import datetime
-from functools import cache
+from functools import cache, cached_property
 from urllib.parse import urlparse
 import backoff
 
 import boto3
 import dateutil
 import elasticsearch
+import numpy as np
 import opensearchpy
+from botocore.exceptions import BotoCoreError, ClientError
 
 from opera_commons.logger import get_logger
 from util import datasets_json_util
+from util.ancillary_cache_util import get_ancillary_file_cache
 from util.conf_util import SettingsConf
 
 DEFAULT_DISP_FRAME_BURST_DB_NAME = 'opera-disp-s1-consistent-burst-ids-with-datetimes.json'
@@ -21,6 +27,12 @@ PENDING_JOBS_ES_INDEX_NAME = "grq_pending_jobs"
 PENDING_TYPE_CSLC_DOWNLOAD = "cslc_download"
 _C_CSLC_ES_INDEX_PATTERNS = "grq_1_l2_cslc_s1_compressed*"
 
+COMPACT_DISP_FRAME_BURST_DB_VERSION = 1
+"""Version of the compact frame-burst database format, part of its file name. Bump on any change to its arrays."""
+
+_BURST_ID_PATTERN = re.compile(r"T(\d{3})-(\d{6})-IW([1-3])")
+_SENSING_TIME_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d{1,6})?")
+
 settings = SettingsConf().cfg
 
 class _HistBursts(object):
@@ -31,6 +43,68 @@ class _HistBursts(object):
         self.sensing_seconds_since_first = []  # Sensing time in seconds since the first sensing time
         self.sensing_datetime_days_index = []  # Sensing time in days since the first sensing time, rounded to the nearest day
 
+    @property
+    def sensing_datetimes64(self):
+        '''The sensing datetimes as a numpy datetime64 array, converted again only if sensing_datetimes is replaced or grown'''
+        if (getattr(self, "_sensing_datetimes64_source", None) is not self.sensing_datetimes
+                or len(self._sensing_datetimes64) != len(self.sensing_datetimes)):
+            self._sensing_datetimes64_source = self.sensing_datetimes
+            self._sensing_datetimes64 = np.array(self.sensing_datetimes, dtype="datetime64[us]")
+        return self._sensing_datetimes64
+
+class _CompactHistBursts(_HistBursts):
+    '''A frame of the compact frame-burst database. Its sensing times are held as numpy arrays, only converted to the
+    lists of _HistBursts when first accessed.'''
+
+    def __init__(self, frame_number, burst_ids, sensing_datetimes64, sensing_seconds_since_first, sensing_days_index):
+        self.frame_number = frame_number
+        self.burst_ids = burst_ids
+        self._sensing_datetimes64 = sensing_datetimes64
+        self.sensing_seconds_since_first64 = sensing_seconds_since_first
+        self.sensing_days_index64 = sensing_days_index
+
+    @property
+    def sensing_datetimes64(self):
+        return self._sensing_datetimes64
+
+    @cached_property
+    def sensing_datetimes(self):
+        return self._sensing_datetimes64.tolist()
+
+    @cached_property
+    def sensing_seconds_since_first(self):
+        return self.sensing_seconds_since_first64.tolist()
+
+    @cached_property
+    def sensing_datetime_days_index(self):
+        return self.sensing_days_index64.tolist()
+
+class _LazyDatetimeToFrames(Mapping):
+    '''The sensing datetime to frame numbers mapping of the frame-burst database, only built when first used.
+    Unlike the defaultdict(list) of process_disp_frame_burst_hist, looking up an unknown sensing datetime raises KeyError.'''
+
+    def __init__(self, frame_to_bursts):
+        self._frame_to_bursts = frame_to_bursts
+        self._datetime_to_frames = None
+
+    def _mapping(self):
+        if self._datetime_to_frames is None:
+            datetime_to_frames = {}
+            for frame_number, frame in self._frame_to_bursts.items():
+                for sensing_time in frame.sensing_datetimes:
+                    datetime_to_frames.setdefault(sensing_time, []).append(frame_number)
+            self._datetime_to_frames = datetime_to_frames
+        return self._datetime_to_frames
+
+    def __getitem__(self, sensing_time):
+        return self._mapping()[sensing_time]
+
+    def __iter__(self):
+        return iter(self._mapping())
+
+    def __len__(self):
+        return len(self._mapping())
+
 def get_s3_resource_from_settings(settings_field, settings_yaml_path=None):
 
     settings = SettingsConf(settings_yaml_path).cfg
@@ -52,9 +126,42 @@ def localize_anc_json(settings_field, settings_yaml_path=None):
 
     return file
 
+@backoff.on_exception(backoff.expo, (BotoCoreError, ClientError), max_time=30)
+def localize_compact_disp_frame_burst_db(settings_yaml_path=None):
+    '''Localize the DISP-S1 burst database defined in settings.yaml by DISP_S1_BURST_DB_S3PATH in its compact form.
+    The json file is converted once per version (ETag) of the S3 object when the local ancillary file cache is enabled,
+    or by each job otherwise.'''
+
+    s3, path, file, burst_file_url = get_s3_resource_from_settings("DISP_S1_BURST_DB_S3PATH", settings_yaml_path)
+    s3_object = s3.Object(burst_file_url.netloc, path)
+    etag = s3_object.e_tag.strip('"')
+    compact_file = f"{os.path.splitext(file)[0]}.{etag}.v{COMPACT_DISP_FRAME_BURST_DB_VERSION}.npz"
+
+    cache = get_ancillary_file_cache()
+    if cache is None:
+        s3_object.download_file(file)
+        build_compact_disp_frame_burst_db(file, compact_file)
+        return compact_file
+
+    with cache.lock(compact_file):
+        cached_file = cache.get(compact_file, os.getcwd())
+        if cached_file is None:
+            s3_object.download_file(file)
+            build_compact_disp_frame_burst_db(file, compact_file)
+            cache.put(compact_file, compact_file)
+            cached_file = compact_file
+
+    return cached_file
+
 @cache
 def localize_disp_frame_burst_hist(settings_yaml_path=None):
 
+    try:
+        return load_compact_disp_frame_burst_hist(localize_compact_disp_frame_burst_db(settings_yaml_path))
+    except (BotoCoreError, ClientError, ValueError) as e:
+        logger.warning(f"Could not localize the compact DISP-S1 burst database from settings.yaml field DISP_S1_BURST_DB_S3PATH: {e!r}. "
+                       "Falling back to the json file.")
+
     try:
         file = localize_anc_json("DISP_S1_BURST_DB_S3PATH", settings_yaml_path)
     except:
@@ -92,6 +199,22 @@ def _calculate_sensing_time_day_index(sensing_time: datetime, first_frame_time:
 
     return day_index, seconds
 
+def _calculate_sensing_time_day_indices(sensing_time_deltas_us: np.ndarray):
+    ''' Vectorized _calculate_sensing_time_day_index, over the microseconds from the first sensing time of the frame'''
+
+    seconds = np.sign(sensing_time_deltas_us) * (np.abs(sensing_time_deltas_us) // 1_000_000)
+    day_index_high_precision = seconds / (24 * 3600)
+
+    # Sanity check of the day index, 10 minute tolerance 10 / 24 / 60 = 0.0069444444 ~= 0.007
+    remainder = day_index_high_precision - np.trunc(day_index_high_precision)
+    ambiguous = (remainder > 0.493) & (remainder < 0.507)
+    assert not ambiguous.any(), \
+        f"Potential ambiguous day index grouping: day_index_high_precision={day_index_high_precision[ambiguous][0]}"
+
+    day_index = np.round(day_index_high_precision).astype(np.int64)
+
+    return day_index, seconds
+
 def sensing_time_day_index(sensing_time: datetime, frame_number: int, frame_to_bursts):
     ''' Return the day index of the sensing time relative to the first sensing time of the frame AND
     seconds since the first sensing time of the frame'''
@@ -101,17 +224,18 @@ def sensing_time_day_index(sensing_time: datetime, frame_number: int, frame_to_b
 
 def get_nearest_sensing_datetime(frame_sensing_datetimes, sensing_time):
     '''Return the nearest sensing datetime in the frame sensing datetime list that is not greater than the sensing time and
-    the number of sensing datetimes until that datetime.
-    It's a linear search in a sorted list but no big deal because there will only ever be a few hundred elements'''
+    the number of sensing datetimes until that datetime. The sensing datetimes may be a sorted list of datetimes or the
+    datetime64 array of a frame (sensing_datetimes64), which is searched with searchsorted.'''
 
     if len(frame_sensing_datetimes) == 0:
         return 0, None
 
-    for i, dt in enumerate(frame_sensing_datetimes):
-        if dt > sensing_time:
-            return i, frame_sensing_datetimes[i-1]
+    if isinstance(frame_sensing_datetimes, np.ndarray):
+        i = int(np.searchsorted(frame_sensing_datetimes, np.datetime64(sensing_time, "us"), side="right"))
+        return i, frame_sensing_datetimes[i-1].item()
 
-    return len(frame_sensing_datetimes), frame_sensing_datetimes[-1]
+    i = bisect.bisect_right(frame_sensing_datetimes, sensing_time)
+    return i, frame_sensing_datetimes[i-1]
 
 def calculate_historical_progress(frame_states: dict, end_date, frame_to_bursts, k=15):
     '''Assumes start date of historical processing as the earlest date possible which is really the only way it should be run'''
@@ -124,7 +248,7 @@ def calculate_historical_progress(frame_states: dict, end_date, frame_to_bursts,
     for frame, state in frame_states.items():
         logger.debug(f"Calculating percentage progress for {frame=}")
         frame = int(frame)
-        num_sensing_times, _ = get_nearest_sensing_datetime(frame_to_bursts[frame].sensing_datetimes, end_date)
+        num_sensing_times, _ = get_nearest_sensing_datetime(frame_to_bursts[frame].sensing_datetimes64, end_date)
 
         # Round down to the nearest k
         num_sensing_times = num_sensing_times - (num_sensing_times % k)
@@ -177,6 +301,108 @@ def process_disp_frame_burst_hist(file):
 
     return frame_to_bursts, burst_to_frames, datetime_to_frames
 
+def encode_burst_id(burst_id: str) -> int:
+    '''Encode a burst id, e.g. T042-088001-IW1, as an integer, e.g. 420880011'''
+
+    match = _BURST_ID_PATTERN.fullmatch(burst_id)
+    if match is None:
+        raise ValueError(f"Cannot encode burst id {burst_id}")
+
+    track, burst_number, subswath = match.groups()
+    return int(track) * 10_000_000 + int(burst_number) * 10 + int(subswath)
+
+def decode_burst_id(code: int) -> str:
+    '''Decode a burst id encoded by encode_burst_id'''
+
+    return f"T{code // 10_000_000:03d}-{code // 10 % 1_000_000:06d}-IW{code % 10}"
+
+def build_compact_disp_frame_burst_db(file, compact_file):
+    '''Convert the disp frame burst map json file to the compact form loaded by load_compact_disp_frame_burst_hist:
+    the numbers of the frames, their burst ids encoded as integers, and their sorted sensing times as datetime64 along with
+    their seconds and day indices since the first sensing time of the frame. The bursts and sensing times of each frame
+    are stored back to back, delimited by offset arrays.'''
+
+    try:
+        j = json.load(open(file))["data"]
+    except:
+        logger.warning("No 'data' key found in the json file. Attempting to load the json file as an older format.")
+        j = json.load(open(file))
+
+    frame_numbers = []
+    burst_codes, burst_offsets = [], [0]
+    sensing_times, sensing_offsets = [], [0]
+    burst_frame_counts = defaultdict(int)
+
+    for frame in j:
+        frame_numbers.append(int(frame))
+
+        for burst in j[frame]["burst_id_list"]:
+            code = encode_burst_id(burst.upper().replace("_", "-"))
+            burst_codes.append(code)
+
+            burst_frame_counts[code] += 1
+            assert burst_frame_counts[code] <= 2  # A burst can belong to at most two frames
+        burst_offsets.append(len(burst_codes))
+
+        # Sensing times with a timezone would be parsed to timezone-aware datetimes by process_disp_frame_burst_hist
+        for sensing_time in j[frame]["sensing_time_list"]:
+            if not _SENSING_TIME_PATTERN.fullmatch(sensing_time):
+                raise ValueError(f"Cannot convert sensing time {sensing_time} of frame {frame}")
+        sensing_times.extend(j[frame]["sensing_time_list"])
+        sensing_offsets.append(len(sensing_times))
+
+    sensing_datetimes = np.array(sensing_times, dtype="datetime64[us]")
+    frame_sizes = np.diff(sensing_offsets)
+    for start, end in zip(sensing_offsets[:-1], sensing_offsets[1:]):
+        sensing_datetimes[start:end].sort()
+
+    has_sensing_times = frame_sizes > 0
+    first_sensing_datetimes = np.repeat(sensing_datetimes[np.array(sensing_offsets[:-1])[has_sensing_times]],
+                                        frame_sizes[has_sensing_times])
+    day_indices, seconds = _calculate_sensing_time_day_indices(
+        (sensing_datetimes - first_sensing_datetimes).astype(np.int64))
+
+    with open(compact_file, "wb") as fp:
+        np.savez(fp,
+                 version=COMPACT_DISP_FRAME_BURST_DB_VERSION,
+                 frame_numbers=np.array(frame_numbers, dtype=np.int64),
+                 burst_codes=np.array(burst_codes, dtype=np.int64),
+                 burst_offsets=np.array(burst_offsets, dtype=np.int64),
+                 sensing_datetimes=sensing_datetimes,
+                 sensing_seconds_since_first=seconds,
+                 sensing_days_index=day_indices,
+                 sensing_offsets=np.array(sensing_offsets, dtype=np.int64))
+
+@cache
+def load_compact_disp_frame_burst_hist(compact_file):
+    '''Load the compact disp frame burst map written by build_compact_disp_frame_burst_db, returning the same 3
+    dictionaries as process_disp_frame_burst_hist'''
+
+    with np.load(compact_file) as db:
+        if int(db["version"]) != COMPACT_DISP_FRAME_BURST_DB_VERSION:
+            raise ValueError(f"Unsupported compact DISP-S1 burst database version {int(db['version'])}")
+        arrays = {name: db[name] for name in db.files}
+
+    frame_to_bursts = defaultdict(_HistBursts)
+    burst_to_frames = defaultdict(list)         # List of frame numbers
+
+    burst_offsets = arrays["burst_offsets"].tolist()
+    sensing_offsets = arrays["sensing_offsets"].tolist()
+    burst_ids = [decode_burst_id(code) for code in arrays["burst_codes"].tolist()]
+
+    for i, frame_number in enumerate(arrays["frame_numbers"].tolist()):
+        frame_burst_ids = burst_ids[burst_offsets[i]:burst_offsets[i + 1]]
+        for burst_id in frame_burst_ids:
+            burst_to_frames[burst_id].append(frame_number)
+
+        sensing = slice(sensing_offsets[i], sensing_offsets[i + 1])
+        frame_to_bursts[frame_number] = _CompactHistBursts(
+            frame_number, set(frame_burst_ids), arrays["sensing_datetimes"][sensing],
+            arrays["sensing_seconds_since_first"][sensing], arrays["sensing_days_index"][sensing]
+        )
+
+    return frame_to_bursts, burst_to_frames, _LazyDatetimeToFrames(frame_to_bursts)
+
 @cache
 def process_frame_geo_json(file):
     '''Process the frame-geometries-simple.geojson file as dictionary used for determining frame bounding box'''
@@ -216,9 +442,8 @@ def process_frame_geo_json(file):
 
 def parse_r2_product_file_name(native_id, product_type):
 
-    dataset_json = datasets_json_util.DatasetsJson()
-    cslc_granule_regex = dataset_json.get(product_type)["match_pattern"]
-    match_product_id = re.match(cslc_granule_regex, native_id)
+    cslc_granule_regex = datasets_json_util.DatasetsJson().get_match_pattern(product_type)
+    match_product_id = cslc_granule_regex.match(native_id)
 
     if not match_product_id:
         raise ValueError(f"{product_type} native ID {native_id} could not be parsed with regex from datasets.json")
@@ -1,22 +1,30 @@
 import sys
 import os
+import zipfile
 from functools import cache
-import pickle
 from copy import deepcopy
 
+import backoff
+import numpy as np
 import pandas as pd
 from collections import defaultdict, OrderedDict
+from collections.abc import Mapping
 import dateutil.parser
 from datetime import date, datetime, timedelta
+from botocore.exceptions import BotoCoreError, ClientError
 
 from opera_commons.logger import get_logger
-from rtc_utils import determine_acquisition_cycle
-from data_subscriber.cslc_utils import parse_r2_product_file_name, localize_anc_json
+from rtc_utils import determine_acquisition_cycle, determine_acquisition_cycles, parse_acquisition_ts
+from data_subscriber.cslc_utils import parse_r2_product_file_name, get_s3_resource_from_settings
 from data_subscriber.url import rtc_for_dist_unique_id
 from data_subscriber.cslc_utils import PENDING_JOBS_ES_INDEX_NAME
+from util.ancillary_cache_util import get_ancillary_file_cache
+from util.checksum_util import calculate_file_checksum
 
 DEFAULT_DIST_BURST_DB_NAME = "mgrs_burst_lookup_table.parquet"
-DIST_BURST_DB_PICKLE_NAME = "mgrs_burst_lookup_table.pickle"
+DIST_BURST_DB_CACHE_NAME = "mgrs_burst_lookup_table.npz"
+DIST_BURST_DB_CACHE_VERSION = 2
+DIST_BURST_DB_TABLE_NAMES = ["tile_ids", "product_ids", "burst_ids", "product_tile_codes", "row_product_codes", "row_burst_codes"]
 K_OFFSETS_AND_COUNTS = "[(365, 3), (730, 3), (1095, 3)]"
 PENDING_TYPE_RTC_FOR_DIST_DOWNLOAD = "rtc_for_download"
 
@@ -27,88 +35,178 @@ MAX_INTRA_PRODUCT_BURSTS_SPAN_SECS = 120
 
 logger = get_logger()
 
-def parse_local_burst_db_pickle(db_file_name, pickle_file_name):
-    """Parse the local DIST-S1 burst database pickle file or process the parquet file if the pickle file does not exist."""
-    try:
-        with open(pickle_file_name, "rb") as f:
-            dist_products, bursts_to_products, product_to_bursts, all_tile_ids = pickle.load(f)
-            logger.info("Loaded DIST-S1 burst database from pickle file.")
-    except FileNotFoundError:
-        logger.info(f"Could not find {pickle_file_name}. Processing DIST-S1 burst database file.")
-        logger.info(f"Using local DIST-S1 database parquet file: {db_file_name}")
-        dist_products, bursts_to_products, product_to_bursts, all_tile_ids = process_dist_burst_db(db_file_name)
-        # Check to see if the DIST_BURST_DB_PICKLE_NAME file exists and create it if it doesn't
-        if not os.path.isfile(pickle_file_name):
-            with open(pickle_file_name, "wb") as f:
-                pickle.dump((dist_products, bursts_to_products, product_to_bursts, all_tile_ids), f)
-                logger.info(f"Saved DIST-S1 burst database to {pickle_file_name}.")
+def parse_local_burst_db_cache(db_file_name, cache_file_name):
+    """Load the DIST-S1 burst database from its local cache file, or process the parquet file if the cache is missing or stale."""
+    logger.info(f"Using local DIST-S1 database parquet file: {db_file_name}")
+    return load_dist_burst_db_cache(db_file_name, cache_file_name)
 
-    return dist_products, bursts_to_products, product_to_bursts, all_tile_ids
 @cache
 def localize_dist_burst_db():
 
-    # First see if a pickle file exists
-    try:
-        with open(DIST_BURST_DB_PICKLE_NAME, "rb") as f:
-            dist_products, bursts_to_products, product_to_bursts, all_tile_ids = pickle.load(f)
-            logger.info("Loaded DIST-S1 burst database from pickle file.")
-            return dist_products, bursts_to_products, product_to_bursts, all_tile_ids
-    except FileNotFoundError:
-        logger.info(f"Could not find {DIST_BURST_DB_PICKLE_NAME}. Processing DIST-S1 burst database file.")
-
     try:
-        file = localize_anc_json("DIST_S1_BURST_DB_S3PATH")
+        return localize_dist_burst_db_cache()
     except:
-        logger.warning(f"Could not download DISD-S1 burst database json from settings.yaml field DIST_S1_BURST_DB_S3PATH from S3. "
+        logger.warning(f"Could not localize DISD-S1 burst database from settings.yaml field DIST_S1_BURST_DB_S3PATH from S3. "
                        f"Attempting to use local copy named {DEFAULT_DIST_BURST_DB_NAME}.")
-        file = DEFAULT_DIST_BURST_DB_NAME
 
-    dist_products, bursts_to_products, product_to_bursts, all_tile_ids = process_dist_burst_db(file)
+    return load_dist_burst_db_cache(DEFAULT_DIST_BURST_DB_NAME, DIST_BURST_DB_CACHE_NAME)
+
+@backoff.on_exception(backoff.expo, (BotoCoreError, ClientError), max_time=30)
+def localize_dist_burst_db_cache(settings_yaml_path=None):
+    """
+    Load the DIST-S1 burst database defined in settings.yaml by DIST_S1_BURST_DB_S3PATH from its cache file, which is
+    named by the version (ETag) of the S3 object. The parquet file is only downloaded and processed when no cache file
+    of that version exists, in the working directory or in the local ancillary file cache, if enabled.
+    """
+    s3, path, file, burst_file_url = get_s3_resource_from_settings("DIST_S1_BURST_DB_S3PATH", settings_yaml_path)
+    s3_object = s3.Object(burst_file_url.netloc, path)
+    etag = s3_object.e_tag.strip('"')
+    cache_file = f"{os.path.splitext(DIST_BURST_DB_CACHE_NAME)[0]}.{etag}.v{DIST_BURST_DB_CACHE_VERSION}.npz"
+
+    def build_cache_file():
+        s3_object.download_file(file)
+        tables = read_dist_burst_db_tables(file)
+        write_dist_burst_db_cache(cache_file, etag, tables)
+        return tables
+
+    if os.path.exists(cache_file):
+        return dist_burst_db_from_tables(read_dist_burst_db_cache(cache_file, etag))
+
+    cache = get_ancillary_file_cache()
+    if cache is None:
+        return dist_burst_db_from_tables(build_cache_file())
+
+    with cache.lock(cache_file):
+        cached_file = cache.get(cache_file, os.getcwd())
+        if cached_file is None:
+            tables = build_cache_file()
+            cache.put(cache_file, cache_file)
+            return dist_burst_db_from_tables(tables)
+
+    return dist_burst_db_from_tables(read_dist_burst_db_cache(cached_file, etag))
+
+def load_dist_burst_db_cache(db_file, cache_file):
+    """
+    Load the DIST-S1 burst database lookup tables from the cache file, which is only valid for the parquet file it was
+    built from. If the cache file is missing, of another format version, or was built from a different parquet file,
+    the parquet file is processed and the cache file is rewritten.
+    """
+    source_sha256 = calculate_file_checksum(db_file, "sha256")
 
-    # Check to see if the DIST_BURST_DB_PICKLE_NAME file exists and create it if it doesn't
-    if not os.path.isfile(DIST_BURST_DB_PICKLE_NAME):
-        with open(DIST_BURST_DB_PICKLE_NAME, "wb") as f:
-            pickle.dump((dist_products, bursts_to_products, product_to_bursts, all_tile_ids), f)
-            logger.info(f"Saved DIST-S1 burst database to {DIST_BURST_DB_PICKLE_NAME}.")
-
-    return dist_products, bursts_to_products, product_to_bursts, all_tile_ids
+    try:
+        tables = read_dist_burst_db_cache(cache_file, source_sha256)
+        logger.info(f"Loaded DIST-S1 burst database from {cache_file}.")
+        return dist_burst_db_from_tables(tables)
+    except (OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        logger.info(f"Could not use {cache_file} ({e}). Processing DIST-S1 burst database file.")
+
+    tables = read_dist_burst_db_tables(db_file)
+    write_dist_burst_db_cache(cache_file, source_sha256, tables)
+
+    return dist_burst_db_from_tables(tables)
+
+def read_dist_burst_db_cache(cache_file, source_id):
+    """
+    Read the DIST-S1 burst database lookup tables from the cache file. Raises ValueError if the cache file is of
+    another format version, or was not built from the version of the parquet file identified by source_id
+    (its SHA-256 digest, or the ETag of its S3 object).
+    """
+    with np.load(cache_file, allow_pickle=False) as cache_npz:
+        if int(cache_npz["format_version"]) != DIST_BURST_DB_CACHE_VERSION or str(cache_npz["source_id"]) != source_id:
+            raise ValueError(f"{cache_file} was not built from {source_id} with cache format version {DIST_BURST_DB_CACHE_VERSION}")
+        return {name: cache_npz[name] for name in DIST_BURST_DB_TABLE_NAMES}
+
+def write_dist_burst_db_cache(cache_file, source_id, tables):
+    """Write the DIST-S1 burst database lookup tables built from the version of the parquet file identified by source_id"""
+    tmp_cache_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_cache_file, "wb") as f:
+        np.savez(f, format_version=DIST_BURST_DB_CACHE_VERSION, source_id=source_id, **tables)
+    os.replace(tmp_cache_file, cache_file)
+    logger.info(f"Saved DIST-S1 burst database to {cache_file}.")
 
 @cache
 def process_dist_burst_db(file):
-    dist_products = defaultdict(set)
-    bursts_to_products = defaultdict(set)
-    product_to_bursts = defaultdict(set)
-
-    df = pd.read_parquet(file)
-    all_tile_ids = df['mgrs_tile_id'].unique()
-    all_burst_ids = set()
-
-    rtc_bursts_reused = 0
-
+    return dist_burst_db_from_tables(read_dist_burst_db_tables(file))
+
+def read_dist_burst_db_tables(file):
+    """
+    Read the DIST-S1 burst database parquet file into string tables of the unique tile, product and burst ids, and
+    integer codes into those tables. Tables are in order of first appearance in the file.
+    """
+    df = pd.read_parquet(file, columns=["mgrs_tile_id", "acq_group_id_within_mgrs_tile", "jpl_burst_id"])
     logger.info(f"Processing {df.shape[0]} rows in the DIST-S1 burst database file...")
 
-    # Create a dictionary of tile ids and the products that are associated with them
-    for index, row in df.iterrows():
-        #print(row['mgrs_tile_id'], row['acq_group_id_within_mgrs_tile'])
-        tile_id = row['mgrs_tile_id']
-        unique_acquisition = row['acq_group_id_within_mgrs_tile']
-        product_id = tile_id + "_" + str(unique_acquisition)
-        if product_id not in dist_products[tile_id]:
-            dist_products[tile_id].add(product_id)
-
-        jpl_burst_id = row['jpl_burst_id']
-        bursts_to_products[jpl_burst_id].add(product_id)
-        product_to_bursts[product_id].add(jpl_burst_id)
-
-        if jpl_burst_id in all_burst_ids:
-            rtc_bursts_reused += 1
-        all_burst_ids.add(row['jpl_burst_id'])
-
-    print(f"Total of {len(all_burst_ids)} unique RTC bursts in this database file.")
-    print(f"RTC Bursts were reused {rtc_bursts_reused} times in this database file.")
+    tile_codes, tile_ids = pd.factorize(df["mgrs_tile_id"])
+    burst_codes, burst_ids = pd.factorize(df["jpl_burst_id"])
+
+    # A product is a unique (tile, acquisition group) pair
+    product_codes, product_keys = pd.factorize(pd.MultiIndex.from_arrays([tile_codes, df["acq_group_id_within_mgrs_tile"]]))
+    product_tile_codes = product_keys.get_level_values(0).to_numpy()
+    product_ids = tile_ids.to_numpy()[product_tile_codes] + "_" + product_keys.get_level_values(1).astype(str).to_numpy()
+
+    print(f"Total of {len(burst_ids)} unique RTC bursts in this database file.")
+    print(f"RTC Bursts were reused {len(burst_codes) - len(burst_ids)} times in this database file.")
+
+    return {
+        "tile_ids": tile_ids.to_numpy().astype(str),
+        "product_ids": product_ids.astype(str),
+        "burst_ids": burst_ids.to_numpy().astype(str),
+        "product_tile_codes": product_tile_codes.astype(np.int32),
+        "row_product_codes": product_codes.astype(np.int32),
+        "row_burst_codes": burst_codes.astype(np.int32),
+    }
+
+def dist_burst_db_from_tables(tables):
+    """Build dist_products, bursts_to_products, product_to_bursts and all_tile_ids from the tables returned by read_dist_burst_db_tables"""
+    tile_ids = tables["tile_ids"].tolist()
+    product_ids = tables["product_ids"].tolist()
+    burst_ids = tables["burst_ids"].tolist()
+
+    dist_products = SetLookup(tile_ids, product_ids, tables["product_tile_codes"], np.arange(len(product_ids)))
+    bursts_to_products = SetLookup(burst_ids, product_ids, tables["row_burst_codes"], tables["row_product_codes"])
+    product_to_bursts = SetLookup(product_ids, burst_ids, tables["row_product_codes"], tables["row_burst_codes"])
+    all_tile_ids = np.array(tile_ids, dtype=object)
 
     return dist_products, bursts_to_products, product_to_bursts, all_tile_ids
 
+class SetLookup(Mapping):
+    """
+    A read-only mapping of keys to sets of values, built from pairs of (key code, value code) into the keys and values.
+    Each set is only built when first looked up, so that loading the DIST-S1 burst database does not build the sets of
+    every tile, product and burst. The sets are frozensets, since they are cached and shared by every caller.
+
+    Like the defaultdict(set) this replaces, unknown keys look up an empty set. Unlike it, the lookup does not add the
+    key, so `in`, `get`, iteration and `len` are unaffected by looking up unknown keys.
+    """
+    def __init__(self, keys, values, key_codes, value_codes):
+        self._keys = keys
+        self._values = values
+        self._key_to_code = dict(zip(keys, range(len(keys))))
+        self._value_codes = value_codes[np.argsort(key_codes, kind="stable")]
+        self._ends = np.cumsum(np.bincount(key_codes, minlength=len(keys)))
+        self._sets = {}
+
+    def __getitem__(self, key):
+        code = self._key_to_code.get(key)
+        if code is None:
+            return frozenset()
+        if code not in self._sets:
+            start = self._ends[code - 1] if code else 0
+            self._sets[code] = frozenset(self._values[i] for i in self._value_codes[start:self._ends[code]].tolist())
+        return self._sets[code]
+
+    def __contains__(self, key):
+        return key in self._key_to_code
+
+    def get(self, key, default=None):
+        return self[key] if key in self._key_to_code else default
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
 class DIST_S1_Product(object):
     def __init__(self):
         self.possible_bursts = 0
@@ -145,10 +243,15 @@ def dist_s1_split_download_batch_id(download_batch_id):
 
 def rtc_granules_by_acq_index(granules):
     '''Returns a dict where the key is the acq index and the value is a list of granules'''
+    parsed_granule_ids = [parse_r2_product_file_name(granule["granule_id"], "L2_RTC_S1") for granule in granules]
+    acquisition_indexes = determine_acquisition_cycles(
+        burst_ids=[burst_id for burst_id, _ in parsed_granule_ids],
+        acquisition_ts=parse_acquisition_ts(acquisition_dts for _, acquisition_dts in parsed_granule_ids),
+        satellites=[granule["granule_id"].split("_")[6] for granule in granules]
+    ).tolist()
+
     granules_by_acq_index = defaultdict(list)
-    for granule in granules:
-        burst_id, acquisition_dts = parse_r2_product_file_name(granule["granule_id"], "L2_RTC_S1")
-        acquisition_index = determine_acquisition_cycle(burst_id, acquisition_dts, granule["granule_id"])
+    for granule, acquisition_index in zip(granules, acquisition_indexes):
         granules_by_acq_index[acquisition_index].append(granule)
 
     return granules_by_acq_index
@@ -391,7 +494,7 @@ if __name__ == "__main__":
 
     #print(dist_products)
 
-    dist_products, bursts_to_products, product_to_bursts, all_tile_ids = parse_local_burst_db_pickle(db_file, db_file+".pickle")
+    dist_products, bursts_to_products, product_to_bursts, all_tile_ids = parse_local_burst_db_cache(db_file, db_file+".npz")
     print(f"There are {all_tile_ids.size} unique tiles.")
 
     row_count = df.shape[0]
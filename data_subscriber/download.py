@@ -5,7 +5,6 @@ from pathlib import PurePath, Path
 from typing import Iterable
 
 import backoff
-import boto3
 import dateutil.parser
 import os
 import requests
@@ -18,8 +17,10 @@ from opera_commons.logger import get_logger
 from data_subscriber.cmr import Provider, CMR_TIME_FORMAT
 from data_subscriber.query import DateTimeRange
 from data_subscriber.url import _to_batch_id, _to_orbit_number
+from util.aws_util import AWS_CREDENTIALS_TTL_SECS, get_s3_client, s3_client_pool
 from util.backoff_util import fatal_code
 from util.conf_util import SettingsConf
+from util.download_util import DownloadResult, stream_download
 from util.edl_util import SessionWithHeaderRedirection
 
 AWS_REGION = "us-west-2"
@@ -129,27 +130,25 @@ class BaseDownload:
         if self.cfg["USE_DAAC_S3_CREDENTIALS"] is True:
             aws_creds = self.get_aws_creds(token, endpoint=args.endpoint)
             self.logger.debug(f"{self.get_aws_creds.cache_info()=}")
-            s3 = boto3.Session(aws_access_key_id=aws_creds['accessKeyId'],
-                               aws_secret_access_key=aws_creds['secretAccessKey'],
-                               aws_session_token=aws_creds['sessionToken'],
-                               region_name=AWS_REGION).client("s3")
+            s3 = get_s3_client(aws_creds, region_name=AWS_REGION)
         else:
-            s3 = boto3.Session(region_name=AWS_REGION).client("s3")
+            s3 = get_s3_client(region_name=AWS_REGION)
 
         product_download_path = self._s3_download(url, s3, str(target_dirpath))
         return product_download_path.resolve()
 
     @backoff.on_exception(backoff.expo, exception=Exception, max_tries=3, jitter=None)
-    def _handle_url_redirect(self, url, token):
+    def _download_url_redirect(self, url, token, target_path: Path) -> DownloadResult:
+        """Streams the file at the redirected location of the given URL to `target_path`. See `stream_download`."""
         if not validators.url(url):
             raise Exception(f"Malformed URL: {url}")
 
         r = requests.get(url, allow_redirects=False)
 
         headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
-        return requests.get(r.headers["Location"], headers=headers, allow_redirects=True)
+        return stream_download(r.headers["Location"], target_path, headers=headers)
 
-    @ttl_cache(ttl=3300)  # 3300s == 55m. Refresh credentials before expiry. Note: validity period is 60 minutes
+    @ttl_cache(ttl=AWS_CREDENTIALS_TTL_SECS)  # Refresh credentials before expiry
     def get_aws_creds(self, token, endpoint=None):
         return self._get_aws_creds(token, endpoint=endpoint)
 
@@ -174,6 +173,6 @@ class BaseDownload:
         source_bucket = source[0]
         source_key = source[2]
 
-        s3.download_file(source_bucket, source_key, f"{tmp_dir}/{target_key}")
+        s3.download_file(source_bucket, source_key, f"{tmp_dir}/{target_key}", Config=s3_client_pool.transfer_config)
 
         return Path(f"{tmp_dir}/{target_key}")
@@ -3,7 +3,7 @@ import os
 import boto3
 
 from opera_commons.logger import get_logger
-from geo.geo_util import does_bbox_intersect_region
+from geo.geo_util import cached_load_region_filter, does_bbox_intersect_region
 from util.conf_util import SettingsConf
 
 
@@ -52,33 +52,41 @@ def filter_granules_by_regions(granules, include_regions, exclude_regions):
     logger = get_logger()
     filtered = []
 
-    for granule in granules:
+    bboxes = [granule["bounding_box"] for granule in granules]
+    included_regions = _intersecting_regions(bboxes, include_regions)
+    excluded_regions = _intersecting_regions(bboxes, exclude_regions)
+
+    for granule, included_region, excluded_region in zip(granules, included_regions, excluded_regions):
 
         # Skip this granule if it's not in the include list
-        if include_regions is not None:
-            (result, region) = does_granule_intersect_regions(granule, include_regions)
-            if result is False:
-                logger.info(
-                    "The following granule does not intersect with any include regions. "
-                    "Skipping processing %s" % granule.get("granule_id")
-                )
-                continue
+        if include_regions is not None and included_region is None:
+            logger.info(
+                "The following granule does not intersect with any include regions. "
+                "Skipping processing %s" % granule.get("granule_id")
+            )
+            continue
 
         # Skip this granule if it's in the exclude list
-        if exclude_regions is not None:
-            (result, region) = does_granule_intersect_regions(granule, exclude_regions)
-            if result is True:
-                logger.info(
-                    "The following granule intersects with the exclude region %s. "
-                    "Skipping processing %s" % (region, granule.get("granule_id"))
-                )
-                continue
+        if exclude_regions is not None and excluded_region is not None:
+            logger.info(
+                "The following granule intersects with the exclude region %s. "
+                "Skipping processing %s" % (excluded_region, granule.get("granule_id"))
+            )
+            continue
 
         # If both filters don't apply, add this granule to the list
         filtered.append(granule)
 
     return filtered
 
+def _intersecting_regions(bboxes, intersect_regions):
+    '''For each bbox, the first of the comma-separated regions it intersects, or None'''
+    if intersect_regions is None:
+        return [None] * len(bboxes)
+
+    regions = tuple(region.strip() for region in intersect_regions.split(','))
+    return cached_load_region_filter(regions).intersecting_regions(bboxes)
+
 def download_from_s3(bucket, file, path):
     s3 = boto3.resource('s3')
     try:
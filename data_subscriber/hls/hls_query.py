@@ -5,6 +5,12 @@ from data_subscriber.hls.hls_catalog import HLSSpatialProductCatalog
 
 class HlsCmrQuery(BaseQuery):
     """Class used to query the Common Metadata Repository (CMR) for Harmonized Landsat and Sentinel-1 (HLS) products."""
+    PIPELINED_QUERY = True
+
     def update_granule_index(self, granule):
         spatial_catalog_conn = HLSSpatialProductCatalog(self.logger)
         spatial_catalog_conn.process_granule(granule)
+
+    def update_granule_indexes(self, granules):
+        spatial_catalog_conn = HLSSpatialProductCatalog(self.logger)
+        spatial_catalog_conn.process_granules(granules)
@@ -12,6 +12,7 @@ import extractor.extract
 from data_subscriber.download import BaseDownload
 from data_subscriber.url import _to_urls, _to_https_urls, form_batch_id
 from product2dataset import product2dataset
+from util.download_util import DOWNLOAD_CHUNK_SIZE, stream_download
 
 
 class HLSDownload:
@@ -197,13 +198,9 @@ class DaacDownloadLpdaac(BaseDownload):
         shutil.rmtree(extracts_dir)
 
     def download_product_using_https(self, url, session: requests.Session, token, target_dirpath: Path,
-                                     chunk_size=25600) -> Path:
+                                     chunk_size=DOWNLOAD_CHUNK_SIZE) -> Path:
         headers = {"Echo-Token": token}
-        with session.get(url, headers=headers) as r:
-            r.raise_for_status()
-
-            file_name = PurePath(url).name
-            product_download_path = target_dirpath / file_name
-            with open(product_download_path, "wb") as output_file:
-                output_file.write(r.content)
-            return product_download_path.resolve()
\ No newline at end of file
+
+        file_name = PurePath(url).name
+        product_download_path = target_dirpath / file_name
+        return stream_download(url, product_download_path, session=session, headers=headers, chunk_size=chunk_size).path
\ No newline at end of file
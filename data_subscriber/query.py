@@ -1,17 +1,19 @@
 
 import argparse
 import asyncio
+import concurrent.futures
 import hashlib
 import uuid
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Iterable
 
 import dateutil.parser
 from more_itertools import chunked
 
 from opera_commons.logger import get_logger
-from data_subscriber.cmr import (async_query_cmr,
+from data_subscriber.cmr import (async_query_cmr, async_query_cmr_pages,
                                  ProductType, DateTimeRange, PGEProduct,
                                  COLLECTION_TO_PRODUCT_TYPE_MAP,
                                  COLLECTION_TO_PROVIDER_TYPE_MAP,
@@ -24,9 +26,21 @@ from data_subscriber.geojson_utils import (localize_include_exclude,
 from data_subscriber.rtc.rtc_download_job_submitter import submit_rtc_download_job_submissions_tasks
 from data_subscriber.url import form_batch_id, _slc_url_to_chunk_id
 from hysds_commons.job_utils import submit_mozart_job
+from util.job_submitter import try_submit_mozart_job
 
 
 class BaseQuery:
+    PIPELINED_QUERY = False
+    """
+    Whether run_query() processes CMR search pages through the stages of a pipeline as they are received.
+    Only query types whose stages handle each granule independently of the rest of the query results, and which don't
+    rely on refresh_index(), should enable this.
+    """
+    PIPELINE_QUEUE_SIZE = 4
+    """The maximum number of pages queued between two pipeline stages before the upstream stage is paused"""
+    MAX_CONCURRENT_JOB_SUBMISSIONS = 8
+    """The maximum number of download job submissions in flight at once"""
+
     def __init__(self, args, token, es_conn, cmr, job_id, settings):
         self.logger = get_logger()
         self.args = args
@@ -48,6 +62,9 @@ class BaseQuery:
         query_timerange: DateTimeRange = get_query_timerange(self.args, now)
 
         query_func = self._get_query_func()
+        if self.PIPELINED_QUERY and query_func == self.query_cmr and not self.args.smoke_run:
+            return asyncio.run(self.run_query_pipeline(query_timerange, now, query_dt))
+
         granules = query_func(query_timerange, now)
 
         # Get rid of duplicate granules. This happens often for CSLC and TODO: probably RTC
@@ -124,6 +141,142 @@ class BaseQuery:
             "download_granules": download_granules
         }
 
+    async def run_query_pipeline(self, query_timerange: DateTimeRange, now: datetime, query_dt: datetime):
+        """
+        Pipelined variant of run_query(). The granules of each CMR search page are deduplicated, region filtered and
+        catalogued while later pages are still being fetched, and download jobs are submitted for them once their
+        catalog writes have been acknowledged. The catalog is refreshed once all pages are catalogued, after which the
+        download job IDs are recorded in bulk.
+
+        Each stage consumes pages in the order they were received. The queues between stages are bounded by
+        PIPELINE_QUEUE_SIZE, so that fetching is paused when downstream stages fall behind. Download job chunks are
+        formed the same way as by run_query(), i.e. the URLs of a batch are never split across jobs.
+
+        Unlike run_query(), a granule passed on for download is not downloaded again when a later page has a higher
+        revision of it. The higher revision is still catalogued.
+        """
+        if self.args.subparser_name == "full":
+            self.logger.info("Skipping download job submission. Download will be performed directly.")
+            submit_download_jobs = False
+        elif self.args.no_schedule_download:
+            self.logger.info("Forcefully skipping download job submission.")
+            submit_download_jobs = False
+        elif not self.args.chunk_size:
+            self.logger.info("Insufficient chunk size (%s). Skipping download job submission.", str(self.args.chunk_size))
+            submit_download_jobs = False
+        else:
+            submit_download_jobs = True
+
+        # If processing mode is historical, apply the include/exclude-region filtering
+        if self.proc_mode == "historical":
+            self.logger.info(f"Processing mode is historical so applying include and exclude regions...")
+
+            # Fetch all necessary geojson files from S3
+            localize_include_exclude(self.args)
+
+        loop = asyncio.get_running_loop()
+        catalog_queue = asyncio.Queue(maxsize=self.PIPELINE_QUEUE_SIZE)
+        submission_queue = asyncio.Queue(maxsize=self.PIPELINE_QUEUE_SIZE)
+        download_granules = []
+        results = []
+        batch_id_to_download_job_id = {}
+
+        async def query_stage():
+            async for granules in self.query_cmr_pages(query_timerange, now):
+                await catalog_queue.put(granules)
+            await catalog_queue.put(None)
+
+        async def catalog_stage():
+            granule_id_to_revision_id = {}
+            download_granule_ids = set()
+            self.logger.info("Granule Cataloguing STARTED")
+
+            while (granules := await catalog_queue.get()) is not None:
+                # Get rid of duplicate granules, including revisions already seen on previous pages
+                granules = [
+                    granule for granule in self.eliminate_duplicate_granules(granules)
+                    if granule.get("revision_id") > granule_id_to_revision_id.get(granule.get("granule_id"), float("-inf"))
+                ]
+                granule_id_to_revision_id.update((granule.get("granule_id"), granule.get("revision_id")) for granule in granules)
+
+                if self.proc_mode == "historical":
+                    granules = await loop.run_in_executor(
+                        None, filter_granules_by_regions, granules, self.args.include_regions, self.args.exclude_regions
+                    )
+
+                page_download_granules = self.determine_download_granules(granules)
+
+                self.logger.info(f"Number of granules to be catalogued: {len(granules)}")
+                await loop.run_in_executor(None, self.catalog_granules, granules, query_dt)
+
+                # Don't download granules again for revisions found on later pages
+                redownload_granule_ids = [granule.get("granule_id") for granule in page_download_granules
+                                          if granule.get("granule_id") in download_granule_ids]
+                if redownload_granule_ids:
+                    self.logger.info(f"Skipping download of granules already passed on for download: {redownload_granule_ids}")
+                    page_download_granules = [granule for granule in page_download_granules
+                                              if granule.get("granule_id") not in download_granule_ids]
+                download_granule_ids.update(granule.get("granule_id") for granule in page_download_granules)
+
+                download_granules.extend(page_download_granules)
+                if submit_download_jobs:
+                    await submission_queue.put(page_download_granules)
+
+            self.logger.info("Granule Cataloguing FINISHED")
+            await submission_queue.put(None)
+
+        async def submission_stage():
+            pending_granules = []
+
+            while (granules := await submission_queue.get()) is not None:
+                # Only submit whole chunks of batches, carrying the remainder over to the next page
+                pending_granules.extend(granule for granule in granules if granule.get("filtered_urls"))
+                num_ready = len(pending_granules) - len(pending_granules) % self.args.chunk_size
+                if num_ready:
+                    ready_granules, pending_granules = pending_granules[:num_ready], pending_granules[num_ready:]
+                    results.extend(await loop.run_in_executor(
+                        None, self.download_job_submission_handler, ready_granules, query_timerange,
+                        batch_id_to_download_job_id
+                    ))
+
+            if pending_granules:
+                results.extend(await loop.run_in_executor(
+                    None, self.download_job_submission_handler, pending_granules, query_timerange,
+                    batch_id_to_download_job_id
+                ))
+
+        stages = [query_stage(), catalog_stage()] + ([submission_stage()] if submit_download_jobs else [])
+        await asyncio.gather(*stages)
+
+        if not submit_download_jobs:
+            return {"download_granules": download_granules}
+
+        # make the catalog writes visible to the download job id updates
+        self.es_conn.refresh()
+        self.es_conn.mark_download_job_ids(batch_id_to_download_job_id)
+        raise_for_failed_download_job_submissions(results)
+
+        succeeded = [job_id for job_id in results if isinstance(job_id, str)]
+        failed = [e for e in results if isinstance(e, Exception)]
+
+        self.logger.debug(f"{results=}")
+        self.logger.info(f"{len(succeeded)} download jobs {succeeded=}")
+        self.logger.info(f"{len(failed)} download jobs {failed=}")
+        self.logger.debug(f"{download_granules=}")
+
+        return {
+            "success": succeeded,
+            "fail": failed,
+            "download_granules": download_granules
+        }
+
+    async def query_cmr_pages(self, timerange: DateTimeRange, now: datetime):
+        """Async generator variant of query_cmr(), yielding the granules of each CMR search page as it is received."""
+        self.logger.info("CMR Query STARTED")
+        async for granules in async_query_cmr_pages(self.args, self.token, self.cmr, self.settings, timerange, now):
+            yield granules
+        self.logger.info("CMR Query FINISHED")
+
     def query_cmr(self, timerange: DateTimeRange, now: datetime) -> list:
         self.logger.info("CMR Query STARTED")
         granules = asyncio.run(async_query_cmr(self.args, self.token, self.cmr, self.settings, timerange, now))
@@ -184,23 +337,25 @@ class BaseQuery:
 
         es_conn = force_es_conn if force_es_conn else self.es_conn
 
-        for granule in granules:
-            granule_id = granule.get("granule_id")
-
-            additional_fields = self.prepare_additional_fields(granule, self.args, granule_id)
-
-            self.update_url_index(
-                es_conn,
-                granule.get("filtered_urls"),
-                granule,
-                self.job_id,
-                query_dt,
-                temporal_extent_beginning_dt=dateutil.parser.isoparse(granule["temporal_extent_beginning_datetime"]),
-                revision_date_dt=dateutil.parser.isoparse(granule["revision_date"]),
-                **additional_fields
-            )
+        # Catalog documents are upserted in bulk once all granules have been processed
+        with es_conn.bulk_upserts():
+            for granule in granules:
+                granule_id = granule.get("granule_id")
+
+                additional_fields = self.prepare_additional_fields(granule, self.args, granule_id)
+
+                self.update_url_index(
+                    es_conn,
+                    granule.get("filtered_urls"),
+                    granule,
+                    self.job_id,
+                    query_dt,
+                    temporal_extent_beginning_dt=dateutil.parser.isoparse(granule["temporal_extent_beginning_datetime"]),
+                    revision_date_dt=dateutil.parser.isoparse(granule["revision_date"]),
+                    **additional_fields
+                )
 
-            self.update_granule_index(granule)
+        self.update_granule_indexes(granules)
 
     def update_url_index(
             self,
@@ -227,11 +382,16 @@ class BaseQuery:
     def update_granule_index(self, granule):
         pass
 
+    def update_granule_indexes(self, granules):
+        for granule in granules:
+            self.update_granule_index(granule)
+
     def refresh_index(self):
         pass
 
-    def download_job_submission_handler(self, granules, query_timerange):
+    def download_job_submission_handler(self, granules, query_timerange, batch_id_to_download_job_id: dict = None):
         batch_id_to_urls_map = defaultdict(set)
+        batch_id_to_download_batch = {}
 
         # DIST-S1 products are generated from RTC input files. RTC input files are also used by DSWx-S1 products.
         # COLLECTION_TO_PRODUCT_TYPE_MAP does not allow for one collection to be used by multiple products so we'll deal piece-wise for now.
@@ -242,8 +402,7 @@ class BaseQuery:
             product_type = COLLECTION_TO_PRODUCT_TYPE_MAP[self.args.collection]
 
         for granule in granules:
-            granule_id = granule.get("granule_id")
-            revision_id = granule.get("revision_id")
+            download_batch = DownloadBatch(granule.get("granule_id"), granule.get("revision_id"))
 
             if granule.get("filtered_urls"):
                 # group URLs by this mapping func. E.g. group URLs by granule_id
@@ -264,25 +423,47 @@ class BaseQuery:
                 else:
                     raise ValueError(f"Can't use {self.args.collection=} to select grouping function.")
 
-                for filter_url in granule.get("filtered_urls"):
-                    if product_type == ProductType.CSLC or product_type == PGEProduct.DIST_1:
-                        batch_id_to_urls_map[granule["download_batch_id"]].add(filter_url)
-                    else:
-                        batch_id_to_urls_map[url_grouping_func(granule_id, revision_id)].add(filter_url)
+                if product_type == ProductType.CSLC or product_type == PGEProduct.DIST_1:
+                    batch_id = granule["download_batch_id"]
+                else:
+                    batch_id = url_grouping_func(download_batch.granule_id, download_batch.revision_id)
+                batch_id_to_urls_map[batch_id].update(granule.get("filtered_urls"))
+                batch_id_to_download_batch.setdefault(batch_id, download_batch)
 
         self.logger.debug(f"{batch_id_to_urls_map=}")
 
-        job_submission_tasks = self.submit_download_job_submissions_tasks(batch_id_to_urls_map, query_timerange)
+        job_submission_tasks = self.submit_download_job_submissions_tasks(
+            batch_id_to_urls_map, query_timerange, batch_id_to_download_batch, batch_id_to_download_job_id
+        )
 
         return job_submission_tasks
 
     def get_download_chunks(self, batch_id_to_urls_map):
         return chunked(batch_id_to_urls_map.items(), n=self.args.chunk_size)
 
-    def submit_download_job_submissions_tasks(self, batch_id_to_urls_map, query_timerange):
+    def submit_download_job_submissions_tasks(self, batch_id_to_urls_map, query_timerange,
+                                              batch_id_to_download_batch: dict[str, "DownloadBatch"] = None,
+                                              batch_id_to_download_job_id: dict[str, str] = None):
+        """
+        Submits a download job for each chunk of batches. Jobs are submitted concurrently, after which the download job
+        ID of every batch is recorded in the catalog in bulk. Returns the job ID of each job submitted. Raises if any
+        submission failed, once the download job IDs of the others are recorded.
+
+        The granule of each batch is taken from batch_id_to_download_batch, as carried through from the CMR granules
+        the batches were formed from. Batches missing from it have their granule parsed from the batch ID instead.
+
+        If batch_id_to_download_job_id is given, the download job IDs are added to it instead, for the caller to record.
+        The exception raised by each failed submission is then returned in place of its job ID, for the caller to raise
+        once recorded. See raise_for_failed_download_job_submissions().
+        """
         job_submission_tasks = []
+        download_job_submissions = []
+        mark_download_job_ids = batch_id_to_download_job_id is None
+        batch_id_to_download_job_id = {} if mark_download_job_ids else batch_id_to_download_job_id
+        batch_id_to_download_batch = batch_id_to_download_batch or {}
+        collection_product_type = COLLECTION_TO_PRODUCT_TYPE_MAP[self.args.collection]
 
-        if COLLECTION_TO_PRODUCT_TYPE_MAP[self.args.collection] == ProductType.CSLC:
+        if collection_product_type == ProductType.CSLC:
             # Note that self.disp_burst_map_hist and self.blackout_dates_obj are created in the child class
             cslc_dependency = CSLCDependency(
                 self.args.k, self.args.m, self.disp_burst_map_hist, self.args,
@@ -299,13 +480,11 @@ class BaseQuery:
             # If we are downlaoding SLC input data, we will compute payload hash using the granule_id without the revision_id
             # NOTE: This will only work properly if the chunk size is 1 which should always be the case for SLC downloads
             payload_hash = None
-            if COLLECTION_TO_PRODUCT_TYPE_MAP[self.args.collection] == ProductType.SLC:
-                granule_to_hash = ''
-                for batch_id in chunk_batch_ids:
-                    granule_id, revision_id = self.es_conn.granule_and_revision(batch_id)
-                    granule_to_hash += granule_id
-
-                payload_hash = hashlib.md5(granule_to_hash.encode()).hexdigest()
+            if collection_product_type == ProductType.SLC:
+                payload_hash = form_payload_hash(
+                    batch_id_to_download_batch.get(batch_id) or DownloadBatch(*self.es_conn.granule_and_revision(batch_id))
+                    for batch_id in chunk_batch_ids
+                )
 
             self.logger.debug(f"{chunk_batch_ids=}")
             self.logger.debug(f"{payload_hash=}")
@@ -313,8 +492,8 @@ class BaseQuery:
 
             params = self.create_download_job_params(query_timerange, chunk_batch_ids)
 
-            product_type = COLLECTION_TO_PRODUCT_TYPE_MAP[self.args.collection].lower()
-            if COLLECTION_TO_PRODUCT_TYPE_MAP[self.args.collection] == ProductType.CSLC:
+            product_type = collection_product_type.lower()
+            if collection_product_type == ProductType.CSLC:
                 frame_id = split_download_batch_id(chunk_batch_ids[0])[0]
                 acq_indices = [split_download_batch_id(chunk_batch_id)[1] for chunk_batch_id in chunk_batch_ids]
                 job_name = f"job-WF-{product_type}_download-frame-{frame_id}-acq_indices-{min(acq_indices)}-to-{max(acq_indices)}"
@@ -337,7 +516,7 @@ class BaseQuery:
                     # While we technically do not have a download job here, we mark it as so in ES.
                     # That's because this flag is used to determine if the granule has been triggered or not
                     for batch_id, urls in batch_chunk:
-                        self.es_conn.mark_download_job_id(batch_id, "PENDING")
+                        batch_id_to_download_job_id[batch_id] = "PENDING"
 
                     continue # don't actually submit download job
             elif self.args.product == PGEProduct.DIST_1:
@@ -347,19 +526,33 @@ class BaseQuery:
             else:
                 job_name = f"job-WF-{product_type}_download-{chunk_batch_ids[0]}"
 
-            download_job_id = submit_download_job(release_version=self.settings["RELEASE_VERSION"],
-                    product_type=product_type,
-                    params=params,
-                    job_queue=self.args.job_queue,
-                    job_name = job_name,
-                    payload_hash = payload_hash
-                )
-
-            # Record download job id in ES
-            for batch_id, urls in batch_chunk:
-                self.es_conn.mark_download_job_id(batch_id, download_job_id)
-
-            job_submission_tasks.append(download_job_id)
+            download_job_submissions.append(DownloadJobSubmission(
+                batch_ids=chunk_batch_ids,
+                job_kwargs={
+                    "product": {},
+                    "job_queue": self.args.job_queue,
+                    "rule_name": f"trigger-{product_type}_download",
+                    "params": params,
+                    "job_spec": f"job-{product_type}_download:{self.settings['RELEASE_VERSION']}",
+                    "job_name": job_name,
+                    "payload_hash": payload_hash
+                }
+            ))
+
+        results = submit_download_jobs(download_job_submissions, max_workers=self.MAX_CONCURRENT_JOB_SUBMISSIONS)
+        log_download_job_submission_report(results)
+
+        # Record download job ids in ES
+        for result in results:
+            if result.job_id is not None:
+                batch_id_to_download_job_id.update((batch_id, result.job_id) for batch_id in result.batch_ids)
+        if mark_download_job_ids:
+            self.es_conn.mark_download_job_ids(batch_id_to_download_job_id)
+
+        job_submission_tasks.extend(result.job_id if result.error is None else result.error for result in results)
+
+        if mark_download_job_ids:
+            raise_for_failed_download_job_submissions(job_submission_tasks)
 
         return job_submission_tasks
 
@@ -426,6 +619,67 @@ class BaseQuery:
         return download_job_params
 
 
+DownloadBatch = namedtuple("DownloadBatch", ["granule_id", "revision_id"])
+"""The CMR granule ID and revision ID a download batch was formed from"""
+
+DownloadJobSubmission = namedtuple("DownloadJobSubmission", ["batch_ids", "job_kwargs"])
+"""The batch IDs of a download job, and the keyword arguments of try_submit_mozart_job() to submit it with"""
+
+DownloadJobSubmissionResult = namedtuple("DownloadJobSubmissionResult", ["batch_ids", "job_name", "job_id", "error"])
+"""The outcome of a download job submission. Exactly one of job_id and error is set."""
+
+
+def form_payload_hash(download_batches: Iterable[DownloadBatch]) -> str:
+    """
+    The payload hash of a download job, used by Mozart to dedupe jobs submitted for the same granules. Only the granule
+    IDs are hashed, so that a job for a later revision of the same granules is deduped too.
+    """
+    return hashlib.md5("".join(download_batch.granule_id for download_batch in download_batches).encode()).hexdigest()
+
+
+def submit_download_jobs(submissions: list[DownloadJobSubmission], max_workers: int) -> list[DownloadJobSubmissionResult]:
+    """
+    Submits the given download jobs concurrently, with up to max_workers submissions in flight. Each submission is
+    retried with backoff (see try_submit_mozart_job()). Submissions that still fail are reported with their exception
+    rather than raised.
+    Results are returned in the order of the given submissions.
+    """
+    if not submissions:
+        return []
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(try_submit_mozart_job, **submission.job_kwargs) for submission in submissions]
+
+        results = []
+        for submission, future in zip(submissions, futures):
+            try:
+                results.append(DownloadJobSubmissionResult(
+                    submission.batch_ids, submission.job_kwargs.get("job_name"), job_id=future.result(), error=None
+                ))
+            except Exception as e:
+                results.append(DownloadJobSubmissionResult(
+                    submission.batch_ids, submission.job_kwargs.get("job_name"), job_id=None, error=e
+                ))
+
+    return results
+
+
+def log_download_job_submission_report(results: list[DownloadJobSubmissionResult]):
+    logger = get_logger()
+
+    failed = [result for result in results if result.error is not None]
+    logger.info(f"Download job submission report: {len(results) - len(failed)} succeeded, {len(failed)} failed")
+    for result in failed:
+        logger.error(f"Failed to submit download job {result.job_name} for batches {result.batch_ids}: {result.error!r}")
+
+
+def raise_for_failed_download_job_submissions(job_submission_tasks):
+    """Raises if any of the given download job submission results is the exception of a failed submission"""
+    failed = [e for e in job_submission_tasks if isinstance(e, Exception)]
+    if failed:
+        raise Exception(f"Failed to submit {len(failed)} of {len(job_submission_tasks)} download jobs") from failed[0]
+
+
 def submit_download_job(*, release_version=None, product_type: str, params: list[dict[str, str]],
                         job_queue: str, job_name = None, payload_hash = None) -> str:
     job_spec_str = f"job-{product_type}_download:{release_version}"
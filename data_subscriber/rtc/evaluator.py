@@ -1,23 +1,21 @@
 import argparse
 import json
 import logging
-import re
 import sys
 from collections import defaultdict
 from datetime import datetime, timedelta
-from functools import partial
 from itertools import chain
 from typing import Optional
 
 import dateutil.parser
 import pandas as pd
-from more_itertools import first, flatten
+from more_itertools import chunked, first, flatten
 
 from data_subscriber import es_conn_util
 from data_subscriber.rtc import evaluator_core
 from data_subscriber.rtc import mgrs_bursts_collection_db_client as mbc_client
 from data_subscriber.rtc.rtc_catalog import RTCProductCatalog
-from rtc_utils import rtc_granule_regex, rtc_relative_orbit_number_regex
+from rtc_utils import rtc_granule_pattern, rtc_relative_orbit_number_regex
 from util.grq_client import get_body
 
 logger = logging.getLogger(__name__)
@@ -46,16 +44,7 @@ def main(
 
     if mgrs_set_id_acquisition_ts_cycle_indexes:
         logger.info(f"Supplied {mgrs_set_id_acquisition_ts_cycle_indexes=}. Adding criteria to query")
-        es_docs = []
-        for mgrs_set_id_acquisition_ts_cycle_idx in mgrs_set_id_acquisition_ts_cycle_indexes:
-            body = get_body(match_all=False)
-            body["query"]["bool"]["must"].append({"match": {"mgrs_set_id_acquisition_ts_cycle_index": mgrs_set_id_acquisition_ts_cycle_idx}})
-            # this constraint seems redundant, but it results in more consistent results
-            body["query"]["bool"]["must"].append({"match": {"mgrs_set_id": mgrs_set_id_acquisition_ts_cycle_idx.split("$")[0]}})
-            tmp_es_docs = grq_es.query(body=body, index=RTCProductCatalog.ES_INDEX_PATTERNS)
-            # filter out any redundant results
-            tmp_es_docs = [doc for doc in tmp_es_docs if doc["_source"]["mgrs_set_id_acquisition_ts_cycle_index"] in mgrs_set_id_acquisition_ts_cycle_indexes]
-            es_docs.extend(tmp_es_docs)
+        es_docs = query_docs_by_mgrs_set_id_acquisition_ts_cycle_indexes(grq_es, mgrs_set_id_acquisition_ts_cycle_indexes)
         # NOTE: skipping job-submission filters to allow reprocessing
     else:
         # query 1: query for unsubmitted docs
@@ -106,7 +95,7 @@ def main(
     logger.info(f"{coverage_results_short=}")
 
     logger.info("Converting coverage results to evaluator results")
-    mgrs = mbc_client.cached_load_mgrs_burst_db(filter_land=True)
+    mgrs_index = mbc_client.cached_load_mgrs_burst_db_index(filter_land=True)
     for coverage_group, id_to_sets in coverage_result_set_id_to_product_sets_map.items():
         if coverage_group == -1:
             logger.info(f"Skipping results that don't meet the target coverage ({coverage_target=}), {coverage_group=}: {list(id_to_sets)}")
@@ -115,7 +104,7 @@ def main(
         mgrs_set_id_to_product_sets_docs_map = join_product_file_docs(id_to_sets, product_id_to_product_files_map)
         for mgrs_set_id, product_sets_docs in mgrs_set_id_to_product_sets_docs_map.items():
             for product_set_docs in product_sets_docs:
-                number_of_bursts_expected = mgrs[mgrs["mgrs_set_id"] == mgrs_set_id].iloc[0]["number_of_bursts"]
+                number_of_bursts_expected = mgrs_index.number_of_bursts[mgrs_set_id]
                 number_of_bursts_actual = len(product_set_docs)
                 coverage_actual = int(number_of_bursts_actual / number_of_bursts_expected * 100)
                 evaluator_results["mgrs_sets"][mgrs_set_id].append({
@@ -185,10 +174,11 @@ def current_evaluation_datetime():
 
 def evaluate_rtc_products(rtc_product_ids, coverage_target, *args, **kwargs):
     # load MGRS tile collection DB
-    mgrs_burst_collections_gdf = mbc_client.cached_load_mgrs_burst_db(filter_land=True)
+    mgrs_burst_set_index = mbc_client.cached_load_mgrs_burst_db_index(filter_land=True)
+    mgrs_burst_collections_gdf = mgrs_burst_set_index.gdf
 
     # transform product list to DataFrame for evaluation
-    cmr_df = load_cmr_df(rtc_product_ids, mgrs_burst_collections_gdf)
+    cmr_df = load_cmr_df(rtc_product_ids, mgrs_burst_set_index)
     cmr_df = cmr_df.sort_values(by=["relative_orbit_number", "acquisition_dt", "burst_id_normalized", "product_id"])
     cmr_orbits = list(set(flatten(cmr_df["relative_orbit_numbers"].to_list())))
     # a_cmr_df = cmr_df[cmr_df["product_id"].apply(lambda x: x.endswith("S1A_30_v0.4"))]
@@ -197,54 +187,59 @@ def evaluate_rtc_products(rtc_product_ids, coverage_target, *args, **kwargs):
     mbc_filtered_gdf = mgrs_burst_collections_gdf[mgrs_burst_collections_gdf["relative_orbit_number"].isin(cmr_orbits)]
     logger.info(f"{len(mbc_filtered_gdf)=}")
 
-    # group by orbit and acquisition time (and burst ID)
-    orbit_to_products_map = defaultdict(
-        partial(defaultdict, partial(defaultdict, list)))  # optimized data structure to avoid dataframe queries
-    for record in cmr_df.to_dict('records'):
-        for relative_orbit_number in record["relative_orbit_numbers"]:
-            orbit_to_products_map[relative_orbit_number][record["acquisition_dt"]][
-                record["burst_id_normalized"]].append(record)
-    # TODO chrisjrd: group by time window to eliminate downstream for-loop
-
-    # split into orbits frames
-    orbit_to_mbc_orbit_dfs_map = {
-        orbit: mbc_filtered_gdf[mbc_filtered_gdf["relative_orbit_number"] == orbit]
-        for orbit in cmr_orbits
-    }
-
     logger.info("grouping by sliding time windows")
-    orbit_to_interval_to_products_map = evaluator_core.create_orbit_to_interval_to_products_map(orbit_to_products_map, cmr_orbits)
-    coverage_result_set_id_to_product_sets_map = evaluator_core.process(orbit_to_interval_to_products_map, orbit_to_mbc_orbit_dfs_map, coverage_target)
+    coverage_result_set_id_to_product_sets_map = evaluator_core.process(cmr_df, mbc_filtered_gdf, coverage_target)
     return coverage_result_set_id_to_product_sets_map
 
 
-def load_cmr_df(rtc_product_ids, gdf):
-    cmr_df_records = []
-    for product_id in rtc_product_ids:
-        match_product_id = re.match(rtc_granule_regex, product_id)
-        acquisition_dts = match_product_id.group("acquisition_ts")
-        burst_id = match_product_id.group("burst_id")
-
-        burst_id_normalized = mbc_client.product_burst_id_to_mapping_burst_id(burst_id)
-        match_burst_id = re.match(rtc_relative_orbit_number_regex, burst_id_normalized)
-        relative_orbit_number = int(match_burst_id.group("relative_orbit_number"))
-        relative_orbit_numbers = mbc_client.burst_id_to_relative_orbit_numbers(gdf, burst_id_normalized)
-
-        cmr_df_record = {
-            "product_id": product_id,
-            "acquisition_dts": acquisition_dts,
-            "acquisition_dt": dateutil.parser.parse(acquisition_dts),
-            "burst_id": burst_id,
-            "burst_id_normalized": burst_id_normalized,
-            "relative_orbit_number": relative_orbit_number,
-            "relative_orbit_numbers": relative_orbit_numbers,
-            "product_id_short": (burst_id_normalized, acquisition_dts),
-        }
-        cmr_df_records.append(cmr_df_record)
-    cmr_df = pd.DataFrame(cmr_df_records)
+def load_cmr_df(rtc_product_ids, mgrs_burst_set_index: mbc_client.MgrsBurstSetIndex):
+    """Parses the RTC product IDs into a DataFrame of products for evaluation, building each column in bulk."""
+    product_ids = list(rtc_product_ids)
+    match_product_ids = [rtc_granule_pattern.match(product_id) for product_id in product_ids]
+    acquisition_dts = pd.Series([match_product_id.group("acquisition_ts") for match_product_id in match_product_ids], dtype=object)
+    burst_ids = pd.Series([match_product_id.group("burst_id") for match_product_id in match_product_ids], dtype=object)
+
+    burst_ids_normalized = burst_ids.str.lower().str.replace("-", "_", regex=False)
+    relative_orbit_numbers = burst_ids_normalized.str.extract(rtc_relative_orbit_number_regex, expand=False).astype(int)
+
+    cmr_df = pd.DataFrame({
+        "product_id": pd.Series(product_ids, dtype=object),
+        "acquisition_dts": acquisition_dts,
+        "acquisition_dt": pd.to_datetime(acquisition_dts, format="ISO8601", utc=True),
+        "burst_id": burst_ids,
+        "burst_id_normalized": burst_ids_normalized,
+        "relative_orbit_number": relative_orbit_numbers,
+        "relative_orbit_numbers": mgrs_burst_set_index.burst_ids_to_relative_orbit_numbers(burst_ids_normalized),
+        "product_id_short": list(zip(burst_ids_normalized, acquisition_dts)),
+    })
     return cmr_df
 
 
+def query_docs_by_mgrs_set_id_acquisition_ts_cycle_indexes(grq_es, mgrs_set_id_acquisition_ts_cycle_indexes, chunk_size=1024) -> list[dict]:
+    """
+    Queries the RTC catalog for the docs of the given MGRS set ID acquisition cycle indexes, issuing one terms query
+    per chunk of indexes rather than one query per index. The query results are paged through by the ES client.
+
+    Returns the docs grouped by index, in the order of the given indexes.
+    """
+    mgrs_set_id_acquisition_ts_cycle_indexes = list(dict.fromkeys(mgrs_set_id_acquisition_ts_cycle_indexes))
+
+    # see Elasticsearch documentation regarding "indices.query.bool.max_clause_count". Minimum is 1024
+    grouped_es_docs = defaultdict(list)
+    for indexes_chunk in chunked(mgrs_set_id_acquisition_ts_cycle_indexes, chunk_size):
+        body = get_body(match_all=False)
+        body["query"]["bool"]["must"].append({"terms": {"mgrs_set_id_acquisition_ts_cycle_index.keyword": indexes_chunk}})
+        for es_doc in grq_es.query(body=body, index=RTCProductCatalog.ES_INDEX_PATTERNS):
+            grouped_es_docs[es_doc["_source"]["mgrs_set_id_acquisition_ts_cycle_index"]].append(es_doc)
+
+    # filter out any redundant results
+    return [
+        es_doc
+        for mgrs_set_id_acquisition_ts_cycle_idx in mgrs_set_id_acquisition_ts_cycle_indexes
+        for es_doc in grouped_es_docs.get(mgrs_set_id_acquisition_ts_cycle_idx, [])
+    ]
+
+
 def join_product_file_docs(result_set_id_to_product_sets_map, product_id_to_product_files_map):
     set_to_product_file_docs_map = defaultdict(list)
     for mgrs_set_id, sets in result_set_id_to_product_sets_map.items():
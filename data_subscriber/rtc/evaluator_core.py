@@ -1,198 +1,203 @@
-import concurrent
-import itertools
 import logging
 import math
-from collections import defaultdict, namedtuple
-from datetime import datetime, timedelta
-from functools import partial
-from typing import Iterable
+from datetime import timedelta
 
+import numpy as np
+import pandas as pd
 from geopandas import GeoDataFrame
-from pandas import Series
-
-from util.sds_itertools import windowed_by_predicate
+from pandas import DataFrame, Series
 
 logger = logging.getLogger(__name__)
 
-Interval = namedtuple("Interval", ["start", "end"])
-
-
-def create_orbit_to_interval_to_products_map(orbit_to_products_map, orbits: Iterable[int]):
-
-    orbit_to_interval_to_products_map = defaultdict(partial(defaultdict, partial(defaultdict, set)))
-    futures = []
-    with concurrent.futures.ProcessPoolExecutor() as executor:
-        for orbit in orbits:
-            future = executor.submit(_create_orbit_to_interval_to_products_map_helper, orbit_to_products_map, orbit)
-            futures.append(future)
-        for future in concurrent.futures.as_completed(futures):
-            orbit_to_interval_to_products_map.update(future.result())
-
-    return orbit_to_interval_to_products_map
-
-
-def _create_orbit_to_interval_to_products_map_helper(orbit_to_products_map, orbit: int):
-    orbit_to_interval_to_products_map = defaultdict(partial(defaultdict, partial(defaultdict, set)))
-
-    acquisition_dts = sorted(orbit_to_products_map[orbit].keys())
-    BURST_SET_MAX_DURATION_SECONDS = 123 * 2.7 + 1  # 123==max_sized burst set (e.g. MS_175_137), 2.7 ~ time between bursts, 1 == safe margin
-    BURST_SET_MAX_DURATION_MINUTES = math.ceil(BURST_SET_MAX_DURATION_SECONDS / 60)
-    dt_windows = windowed_by_predicate(iterable=acquisition_dts, pred=lambda a, b: max(a, b) - min(a, b) <= timedelta(minutes=BURST_SET_MAX_DURATION_MINUTES), sorted_=True, set_=False)
-
-    # remove redundant subsets
-    dt_intervals = [Interval(w[0], w[-1]) for w in dt_windows]
-    dt_intervals = [a for a in dt_intervals if not any(issubinterval(a, b) for b in dt_intervals)]
+BURST_SET_MAX_DURATION_SECONDS = 123 * 2.7 + 1  # 123==max_sized burst set (e.g. MS_175_137), 2.7 ~ time between bursts, 1 == safe margin
+BURST_SET_MAX_DURATION_MINUTES = math.ceil(BURST_SET_MAX_DURATION_SECONDS / 60)
 
-    for dt_interval in dt_intervals:
-        acquisition_dts = orbit_to_products_map[orbit].keys()
-        for acquisition_dt in acquisition_dts:
-            if dt_interval.start <= acquisition_dt <= dt_interval.end:
-                orbit_to_interval_to_products_map[orbit][dt_interval].update(orbit_to_products_map[orbit][acquisition_dt])
 
-    return orbit_to_interval_to_products_map
+def process(cmr_df: DataFrame, mbc_gdf: GeoDataFrame, coverage_target: int):
+    """
+    The main entry point into evaluator core. Evaluates the burst set coverage of the given RTC products.
 
+    Acquisition datetimes, bursts and burst sets are encoded as integer codes, and the coverage of every burst set in
+    every time window is computed at once with numpy, rather than by walking each burst set of each time window.
 
-def issubinterval(x: tuple[datetime], y: tuple[datetime], strict=True):
-    if strict:  # half-open interval
-        return (x[0] > y[0] and x[1] <= y[1]) or (x[0] >= y[0] and x[1] < y[1])
-    else:  # closed interval
-        return x[0] >= y[0] and x[1] <= y[1]
-
-
-def process(orbit_to_interval_to_products_map: dict, orbit_to_mbc_orbit_dfs_map: dict, coverage_target: int):
-    """The main entry point into evaluator core"""
+    :param cmr_df: the RTC products, with the columns of `evaluator.load_cmr_df`, sorted by relative orbit number,
+        acquisition datetime, burst ID and product ID.
+    :param mbc_gdf: the MGRS burst sets of the relative orbits of the products.
+    :param coverage_target: the minimum coverage percentage of a burst set for it to be grouped under the target.
+    :return: a map of coverage group (100, coverage_target, or -1) to MGRS set ID to the set of product ID sets.
+    """
     logger.info("BEGIN")
 
-    coverage_to_mgrs_set_id_to_product_sets_maps = concurrent_find_set_coverage_in_orbit(orbit_to_interval_to_products_map, orbit_to_mbc_orbit_dfs_map, coverage_target)
+    acquisitions_df, products_df = encode_products(cmr_df)
+    windows = create_windows(acquisitions_df)
+    points_df = find_set_points(products_df, mbc_gdf, cmr_df["burst_id_normalized"])
+    set_window_coverage_df = find_set_window_coverage(points_df, windows, mbc_gdf, coverage_target)
     logger.info("DONE")
 
-    logger.info("Cleaning up the sets")
-
-    logger.info("Collecting as set of sets")
-    coverage_result_set_id_to_product_sets_map = defaultdict(dict)
-    for coverage_to_mgrs_set_id_to_product_sets_map in coverage_to_mgrs_set_id_to_product_sets_maps:
-        for coverage_group, mgrs_set_id_to_product_sets_map in coverage_to_mgrs_set_id_to_product_sets_map.items():
-            for mgrs_set_id, product_sets in mgrs_set_id_to_product_sets_map.items():
-                s = product_sets
-                r = {a for a in s if not any(a < b for b in s)}  # remove redundant subsets
-                r = {max(r, key=len)}  # reduce_to_largest_set
-                coverage_result_set_id_to_product_sets_map[coverage_group][mgrs_set_id] = r
-
-    # remove redundant sets across coverage groups. the above removes redundant sets within a single group
-    mgrs_set_id_to_sets_count_map = defaultdict(int)
-    for coverage_group in coverage_result_set_id_to_product_sets_map:
-        for mgrs_set_id in coverage_result_set_id_to_product_sets_map[coverage_group]:
-            mgrs_set_id_to_sets_count_map[mgrs_set_id] = 1 + mgrs_set_id_to_sets_count_map[mgrs_set_id]
-    for mgrs_set_id in mgrs_set_id_to_sets_count_map:
-        if mgrs_set_id_to_sets_count_map[mgrs_set_id] > 1:
-            for coverage_group in [coverage_group for coverage_group in sorted(coverage_result_set_id_to_product_sets_map, reverse=True) if coverage_group != 100]:
-                if mgrs_set_id in coverage_result_set_id_to_product_sets_map[coverage_group].keys():
-                    del coverage_result_set_id_to_product_sets_map[coverage_group][mgrs_set_id]
-                    mgrs_set_id_to_sets_count_map[mgrs_set_id] = -1 + mgrs_set_id_to_sets_count_map[mgrs_set_id]
-
-    return dict(coverage_result_set_id_to_product_sets_map)
-
-
-def concurrent_find_set_coverage_in_orbit(orbit_to_interval_to_products_map: dict, orbit_to_mbc_orbit_dfs_map: dict, coverage_target: int):
-    with concurrent.futures.ProcessPoolExecutor() as executor:
-        futures = [
-            executor.submit(_find_set_coverage_in_orbit, orbit_to_interval_to_products_map, orbit, mbc_orbit_df, coverage_target)
-            for orbit, mbc_orbit_df in orbit_to_mbc_orbit_dfs_map.items()
-        ]
-        coverage_to_mgrs_set_id_to_product_sets_maps = [future.result() for future in concurrent.futures.as_completed(futures)]
-    return coverage_to_mgrs_set_id_to_product_sets_maps
-
-
-def _find_set_coverage_in_orbit(orbit_to_window_to_records_map: dict, orbit, mbc_orbit_df: GeoDataFrame, coverage_target: int):
-    if not orbit_to_window_to_records_map:
+    if set_window_coverage_df.empty:
         return {}
-    if mbc_orbit_df is None or mbc_orbit_df.empty:
-        return {}
-
-    logger.info(f"Processing {orbit=}")
-
-    coverage_to_mgrs_set_id_to_product_sets_maps = concurrent_find_set_coverage_in_time_window(orbit, orbit_to_window_to_records_map, mbc_orbit_df, coverage_target)
-
-    coverage_set_id_to_product_sets_map_final = defaultdict(partial(defaultdict, set))
-    for coverage_to_mgrs_set_id_to_product_sets_map in coverage_to_mgrs_set_id_to_product_sets_maps:
-        for coverage_group, mgrs_set_id_to_product_sets_map in coverage_to_mgrs_set_id_to_product_sets_map.items():
-            for mgrs_set_id, product_set in mgrs_set_id_to_product_sets_map.items():
-                coverage_set_id_to_product_sets_map_final[coverage_group][mgrs_set_id].add(product_set)
-
-    return dict(coverage_set_id_to_product_sets_map_final)
-
-
-def concurrent_find_set_coverage_in_time_window(orbit, orbit_to_window_to_records_map: dict, mbc_orbit_df: GeoDataFrame, coverage_target: int):
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = [
-            executor.submit(_find_set_coverage_in_time_window, window, orbit_to_window_to_records_map, mbc_orbit_df, coverage_target)
-            for window in orbit_to_window_to_records_map[orbit]
-        ]
-        coverage_to_mgrs_set_id_to_product_sets_maps = [future.result() for future in concurrent.futures.as_completed(futures)]
-    return coverage_to_mgrs_set_id_to_product_sets_maps
-
-
-def _find_set_coverage_in_time_window(time_window, orbit_to_window_to_products_map: dict, mbc_orbit_df: GeoDataFrame, coverage_target: int):
-    logger.debug(f"Processing {time_window=}")
-
-    coverage_product_sets = concurrent_find_set_coverage_in_burst(time_window, orbit_to_window_to_products_map, mbc_orbit_df)
-
-    coverage_to_mgrs_set_id_to_product_sets_map = defaultdict(partial(defaultdict, set))
-    for coverage_product_set in coverage_product_sets:
-        mgrs_set_id, product_set, coverage = coverage_product_set
-        if not product_set:
-            continue  # filter out empty/partial results
-        if coverage == 100:
-            coverage_to_mgrs_set_id_to_product_sets_map[100][mgrs_set_id].add(product_set)
-        elif coverage >= coverage_target:
-            coverage_to_mgrs_set_id_to_product_sets_map[coverage_target][mgrs_set_id].add(product_set)
-        else:
-            coverage_to_mgrs_set_id_to_product_sets_map[-1][mgrs_set_id].add(product_set)
-
-    for coverage_group in coverage_to_mgrs_set_id_to_product_sets_map:
-        coverage_to_mgrs_set_id_to_product_sets_map[coverage_group] = remove_redundant_subsets(coverage_to_mgrs_set_id_to_product_sets_map[coverage_group])
-    return dict(coverage_to_mgrs_set_id_to_product_sets_map)
-
-
-def concurrent_find_set_coverage_in_burst(time_window, orbit_to_window_to_products_map: dict, mbc_orbit_df: GeoDataFrame):
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = [
-            executor.submit(_find_set_coverage_in_burst, burst_set_row, orbit_to_window_to_products_map, time_window)
-            for index, burst_set_row in mbc_orbit_df.iterrows()
-        ]
-        coverage_product_sets = [future.result() for future in concurrent.futures.as_completed(futures)]
-    return coverage_product_sets
-
-
-def _find_set_coverage_in_burst(burst_set_row: Series, orbit_to_window_to_products_map: dict, time_window):
-    orbits = burst_set_row["orbits"]
-    cmr_bursts = set(itertools.chain.from_iterable(
-        orbit_to_window_to_products_map[orbit][time_window].keys()
-        for orbit in orbits
-    ))
-    found_bursts = set(burst_set_row["bursts_parsed"]).intersection(cmr_bursts)
-    mgrs_set_id = burst_set_row["mgrs_set_id"]
-
-    coverage = len(found_bursts) / burst_set_row["number_of_bursts"]
-
-    logger.debug(f"{mgrs_set_id=}")
-    product_set = {
-        product["product_id"]  # TODO chrisjrd: consider returning full product. client code can filter for ID
-        for burst in found_bursts
-        for orbit in orbits
-        # the defaultdict creates an empty set() upon lookup with []. workaround is using .get() to return a default empty list
-        for product in orbit_to_window_to_products_map[orbit][time_window].get(burst, [])[-1:]  # add latest revision
-    }
-
-    return mgrs_set_id, frozenset(product_set), int(coverage * 100)
 
+    logger.info("Cleaning up the sets")
+    largest_sets_df = reduce_to_largest_sets(set_window_coverage_df)
 
-def remove_redundant_subsets(mgrs_set_id_to_product_sets_map: dict):
-    mgrs_set_id_to_product_sets_clean_map = {}
-    for mgrs_set_id, sets in mgrs_set_id_to_product_sets_map.items():
-        mgrs_set_id_to_product_sets_clean_map[mgrs_set_id] = reduce_to_largest_set(sets)
+    # remove redundant sets across coverage groups, keeping only the 100% coverage set, if any
+    coverage_groups = sorted(set_window_coverage_df["coverage_group"].unique().tolist(), reverse=True)
+    num_coverage_groups = largest_sets_df.groupby("set_idx")["coverage_group"].transform("size")
+    largest_sets_df = largest_sets_df[(num_coverage_groups == 1) | (largest_sets_df["coverage_group"] == 100)]
 
-    return mgrs_set_id_to_product_sets_clean_map
+    logger.info("Collecting as set of sets")
+    mgrs_set_ids = mbc_gdf["mgrs_set_id"].to_numpy()
+    product_ids = cmr_df["product_id"].to_numpy()
+    point_product_idxs = points_df["product_idx"].to_numpy()
+    coverage_result_set_id_to_product_sets_map = {coverage_group: {} for coverage_group in coverage_groups}
+    for coverage_group, set_idx, lo, hi in largest_sets_df[["coverage_group", "set_idx", "lo", "hi"]].itertuples(index=False):
+        coverage_result_set_id_to_product_sets_map[coverage_group][mgrs_set_ids[set_idx]] = {frozenset(product_ids[point_product_idxs[lo:hi]])}
+
+    return coverage_result_set_id_to_product_sets_map
+
+
+def encode_products(cmr_df: DataFrame) -> tuple[DataFrame, DataFrame]:
+    """
+    Maps each product to every relative orbit of its burst, and encodes the distinct (orbit, acquisition datetime)
+    pairs and the burst IDs as integer codes.
+
+    :return: the acquisitions (orbit and acquisition datetime in nanoseconds, sorted, where the position is the
+        acquisition code), and the latest product of each burst of each acquisition (orbit, acquisition_idx,
+        burst_idx (the code of the burst ID among the burst IDs of cmr_df), and product_idx (the position in cmr_df)).
+    """
+    products_df = pd.DataFrame({
+        "product_idx": np.arange(len(cmr_df)),
+        "orbit": cmr_df["relative_orbit_numbers"].to_numpy(),
+        "acquisition_dt": pd.DatetimeIndex(pd.to_datetime(cmr_df["acquisition_dt"])).asi8,
+        "burst_idx": pd.factorize(cmr_df["burst_id_normalized"])[0],
+    }).explode("orbit").dropna(subset=["orbit"])
+    products_df["orbit"] = products_df["orbit"].astype(np.int64)
+
+    acquisitions_df = products_df[["orbit", "acquisition_dt"]].drop_duplicates().sort_values(["orbit", "acquisition_dt"], ignore_index=True)
+    acquisitions_df["acquisition_idx"] = acquisitions_df.index
+    products_df = products_df.merge(acquisitions_df, on=["orbit", "acquisition_dt"])
+
+    # the latest revision of a burst is its last product, in cmr_df order
+    products_df = products_df.sort_values("product_idx").drop_duplicates(["acquisition_idx", "burst_idx"], keep="last")
+    return acquisitions_df[["orbit", "acquisition_dt"]], products_df[["orbit", "acquisition_idx", "burst_idx", "product_idx"]]
+
+
+def create_windows(acquisitions_df: DataFrame):
+    """
+    Creates the sliding time windows of each relative orbit.
+
+    The windows of an orbit start at each of its acquisition datetimes and span the acquisition datetimes that follow
+    within BURST_SET_MAX_DURATION_MINUTES. Windows that are sub-intervals of another are dropped.
+
+    :return: the first and last acquisition codes of each window, and the first and (exclusive) last window codes of
+        the windows spanning each acquisition. Windows are ordered by orbit, then time.
+    """
+    max_duration = np.int64(timedelta(minutes=BURST_SET_MAX_DURATION_MINUTES) // timedelta(microseconds=1)) * 1000
+    acquisition_dts = acquisitions_df["acquisition_dt"].to_numpy()
+    orbits, orbit_starts = np.unique(acquisitions_df["orbit"].to_numpy(), return_index=True)
+    orbit_ends = np.append(orbit_starts[1:], len(acquisitions_df)).astype(np.int64)
+
+    window_firsts = []
+    window_lasts = []
+    acquisition_window_starts = np.empty(len(acquisitions_df), dtype=np.int64)
+    acquisition_window_ends = np.empty(len(acquisitions_df), dtype=np.int64)
+    num_windows = 0
+    for orbit_start, orbit_end in zip(orbit_starts, orbit_ends):
+        dts = acquisition_dts[orbit_start:orbit_end]
+        # the last acquisition of the window starting at each acquisition
+        last = np.searchsorted(dts, dts + max_duration, side="right") - 1
+        # windows are ordered by start and end, so a window is a sub-interval of another only when it ends with its
+        #  predecessor
+        first = np.flatnonzero(np.concatenate(([True], last[1:] != last[:-1])))
+        last = last[first]
+        window_firsts.append(orbit_start + first)
+        window_lasts.append(orbit_start + last)
+
+        # each acquisition is spanned by a contiguous run of windows
+        acquisition_idxs = np.arange(len(dts))
+        acquisition_window_starts[orbit_start:orbit_end] = num_windows + np.searchsorted(last, acquisition_idxs, side="left")
+        acquisition_window_ends[orbit_start:orbit_end] = num_windows + np.searchsorted(first, acquisition_idxs, side="right")
+        num_windows += len(first)
+
+    window_firsts = np.concatenate(window_firsts) if window_firsts else np.empty(0, dtype=np.int64)
+    window_lasts = np.concatenate(window_lasts) if window_lasts else np.empty(0, dtype=np.int64)
+    return window_firsts, window_lasts, acquisition_window_starts, acquisition_window_ends
+
+
+def find_set_points(products_df: DataFrame, mbc_gdf: GeoDataFrame, burst_ids: Series) -> DataFrame:
+    """
+    Finds the latest products of the bursts of each burst set, in the burst set's relative orbit.
+
+    A burst set spanning several orbits would also take the products of the same time window in its other orbits.
+    Those products are mapped to the burst set's orbit too, as a burst is mapped to the orbit of each burst set that
+    contains it, so they are found in the burst set's orbit alone.
+
+    :return: the set_idx (the position of the burst set in mbc_gdf), acquisition_idx and product_idx of each product,
+        sorted by burst set and acquisition.
+    """
+    burst_index = pd.Index(pd.unique(burst_ids))
+    set_orbits = mbc_gdf["relative_orbit_number"].to_numpy().astype(np.int64)
+    set_bursts_df = pd.DataFrame({
+        "set_idx": np.arange(len(mbc_gdf)),
+        "orbit": set_orbits,
+        "burst_id": [list(bursts) if orbit in orbits else [] for orbit, orbits, bursts in zip(set_orbits, mbc_gdf["orbits"], mbc_gdf["bursts_parsed"])],
+    }).explode("burst_id").dropna()
+    set_bursts_df["burst_idx"] = burst_index.get_indexer(set_bursts_df["burst_id"])
+
+    points_df = set_bursts_df[set_bursts_df["burst_idx"] >= 0].merge(products_df, on=["orbit", "burst_idx"])
+    return points_df.sort_values(["set_idx", "acquisition_idx"], ignore_index=True)[["set_idx", "acquisition_idx", "product_idx"]]
+
+
+def find_set_window_coverage(points_df: DataFrame, windows, mbc_gdf: GeoDataFrame, coverage_target: int) -> DataFrame:
+    """
+    Computes the coverage of each burst set in each time window spanning at least one of its products, and groups it as
+    100, coverage_target, or -1.
+
+    The products of a burst set in a window are a contiguous run of its (sorted) points, as a burst is acquired at most
+    once within a window.
+
+    :return: a DataFrame of set_idx, window_idx, coverage_group, and lo and hi, the run of points of the window.
+    """
+    window_firsts, window_lasts, acquisition_window_starts, acquisition_window_ends = windows
+    set_idxs = points_df["set_idx"].to_numpy()
+    acquisition_idxs = points_df["acquisition_idx"].to_numpy()
+
+    # the windows of a burst set are the union of the runs of windows spanning its points. Runs are ordered, as
+    #  points are, so the union only needs each run to be clipped to the end of the previous run
+    starts = acquisition_window_starts[acquisition_idxs]
+    ends = acquisition_window_ends[acquisition_idxs]
+    is_same_set = np.concatenate(([False], set_idxs[1:] == set_idxs[:-1]))
+    starts = np.where(is_same_set, np.maximum(starts, np.concatenate(([0], ends[:-1]))), starts)
+    num_windows = np.maximum(ends - starts, 0)
+
+    pair_set_idxs = np.repeat(set_idxs, num_windows)
+    pair_window_idxs = np.repeat(starts - np.cumsum(num_windows) + num_windows, num_windows) + np.arange(num_windows.sum())
+
+    num_acquisitions = len(acquisition_window_starts)
+    point_keys = set_idxs * num_acquisitions + acquisition_idxs
+    los = np.searchsorted(point_keys, pair_set_idxs * num_acquisitions + window_firsts[pair_window_idxs], side="left")
+    his = np.searchsorted(point_keys, pair_set_idxs * num_acquisitions + window_lasts[pair_window_idxs], side="right")
+
+    number_of_bursts = mbc_gdf["number_of_bursts"].to_numpy()[pair_set_idxs]
+    coverage = ((his - los) / number_of_bursts * 100).astype(np.int64)
+    return pd.DataFrame({
+        "set_idx": pair_set_idxs,
+        "window_idx": pair_window_idxs,
+        "coverage_group": np.where(coverage == 100, 100, np.where(coverage >= coverage_target, coverage_target, -1)),
+        "lo": los,
+        "hi": his,
+    })
+
+
+def reduce_to_largest_sets(set_window_coverage_df: DataFrame) -> DataFrame:
+    """
+    Keeps the largest product set of each burst set within each coverage group, preferring the earliest time window.
+
+    Removing redundant subsets first would not change the result, as a subset of another set is never the largest.
+    """
+    df = set_window_coverage_df
+    order = np.lexsort((df["window_idx"].to_numpy(), df["lo"].to_numpy() - df["hi"].to_numpy(), df["set_idx"].to_numpy(), df["coverage_group"].to_numpy()))
+    return df.iloc[order].drop_duplicates(["coverage_group", "set_idx"])
 
 
 def reduce_to_largest_set(sets):
@@ -202,8 +207,20 @@ def reduce_to_largest_set(sets):
 
 
 def remove_subsets(sets):
-    sets_fs = frozenset(filter(lambda it: it, sets))  # filter out empty results. dedupe
-    s = sets_fs
-    r = {a for a in s if not any(a < b for b in s)}  # remove redundant subsets
-    sets_fs = frozenset(r)
-    return sets_fs
+    """
+    Removes empty sets, duplicate sets, and sets that are a subset of another set.
+
+    Sets are encoded as bitmasks over their elements and compared in order of decreasing size, so each set is only
+    compared with the (larger) sets kept so far.
+    """
+    sets_fs = sorted(frozenset(filter(lambda it: it, sets)), key=len, reverse=True)  # filter out empty results. dedupe
+    element_to_bit = {element: 1 << i for i, element in enumerate({element for set_ in sets_fs for element in set_})}
+
+    kept_sets = []
+    kept_masks = []
+    for set_ in sets_fs:
+        mask = sum(element_to_bit[element] for element in set_)
+        if not any(mask & kept_mask == mask for kept_mask in kept_masks):
+            kept_sets.append(set_)
+            kept_masks.append(mask)
+    return frozenset(kept_sets)
@@ -1,15 +1,18 @@
 
 import ast
+import json
 import os
 import re
 from collections import defaultdict
-from functools import cache
+from functools import cache, cached_property
 from pathlib import Path
+from typing import Iterable
 
 import boto3
 import geopandas as gpd
+import pandas as pd
+import shapely
 from geopandas import GeoDataFrame
-from mypy_boto3_s3 import S3Client
 from pyproj import Transformer
 
 from opera_commons.logger import get_logger
@@ -39,11 +42,111 @@ def cached_load_mgrs_burst_db(filter_land=True):
     return load_mgrs_burst_db(filter_land)
 
 
+@cache
+def cached_load_mgrs_burst_db_index(filter_land=True) -> "MgrsBurstSetIndex":
+    """Returns the index over the cached MGRS burst database. See :class:`MgrsBurstSetIndex`."""
+    logger = get_logger()
+    logger.info(f"Building MGRS burst database index.")
+    return MgrsBurstSetIndex(cached_load_mgrs_burst_db(filter_land))
+
+
+class MgrsBurstSetIndex:
+    """
+    Lookup tables over the MGRS burst database, built once so that per-granule lookups don't scan the database.
+
+    * burst ID -> MGRS set IDs (naturally sorted), matching :func:`burst_id_to_mgrs_set_ids`
+    * MGRS set ID -> row position in the database (the first row, if repeated)
+    * MGRS set ID -> number of bursts
+    * burst ID -> relative orbit numbers (sorted), matching :func:`burst_id_to_relative_orbit_numbers`
+    * MGRS set ID -> bounding box (WSEN), matching :func:`get_bounding_box_for_mgrs_set_id`. Computed on first use.
+    """
+
+    def __init__(self, gdf: GeoDataFrame):
+        self.gdf = gdf
+
+        set_ids = gdf["mgrs_set_id"].to_numpy()
+        self.mgrs_set_id_to_row: dict[str, int] = {}
+        for row, mgrs_set_id in enumerate(set_ids):
+            self.mgrs_set_id_to_row.setdefault(mgrs_set_id, row)
+
+        first_rows = list(self.mgrs_set_id_to_row.values())
+        self.number_of_bursts: dict[str, int] = dict(zip(
+            self.mgrs_set_id_to_row, gdf["number_of_bursts"].iloc[first_rows].astype(int).tolist()
+        ))
+
+        bursts_df = pd.DataFrame({
+            "mgrs_set_id": set_ids,
+            "burst_id": gdf["bursts_parsed"].to_numpy(),
+            "relative_orbit_number": gdf["relative_orbit_number"].to_numpy()
+        })
+        # NOTE: match the proper subset test of burst_id_to_mgrs_set_ids, which excludes single-burst sets
+        bursts_df = bursts_df[gdf["bursts_parsed"].map(len).to_numpy() > 1].explode("burst_id")
+        self.burst_id_to_mgrs_set_ids: dict[str, list[str]] = {
+            burst_id: sorted(set(mgrs_set_ids), key=natural_keys)
+            for burst_id, mgrs_set_ids in bursts_df.groupby("burst_id", sort=False)["mgrs_set_id"]
+        }
+
+        orbits_df = bursts_df[["burst_id", "relative_orbit_number"]].drop_duplicates().sort_values("relative_orbit_number", kind="stable")
+        self.burst_id_to_relative_orbit_numbers: dict[str, list[int]] = defaultdict(list)
+        for burst_id, relative_orbit_number in zip(orbits_df["burst_id"].tolist(), orbits_df["relative_orbit_number"].tolist()):
+            self.burst_id_to_relative_orbit_numbers[burst_id].append(relative_orbit_number)
+        self.burst_id_to_relative_orbit_numbers = dict(self.burst_id_to_relative_orbit_numbers)
+
+    def burst_ids_to_mgrs_set_ids(self, burst_ids: Iterable[str]) -> list[list[str]]:
+        """Batch version of :func:`burst_id_to_mgrs_set_ids`. Returns the MGRS set IDs of each burst ID, in order."""
+        return [list(self.burst_id_to_mgrs_set_ids.get(burst_id, ())) for burst_id in burst_ids]
+
+    def burst_ids_to_relative_orbit_numbers(self, burst_ids: Iterable[str]) -> list[list[int]]:
+        """Batch version of :func:`burst_id_to_relative_orbit_numbers`. Returns the relative orbit numbers of each burst ID, in order."""
+        return [list(self.burst_id_to_relative_orbit_numbers.get(burst_id, ())) for burst_id in burst_ids]
+
+    def mgrs_set_ids_to_number_of_bursts(self, mgrs_set_ids: Iterable[str]) -> list[int]:
+        return [self.number_of_bursts[mgrs_set_id] for mgrs_set_id in mgrs_set_ids]
+
+    def get_bounding_box(self, mgrs_set_id) -> list:
+        """See :func:`get_bounding_box_for_mgrs_set_id`"""
+        if mgrs_set_id not in self.bounding_boxes:
+            raise Exception(f"No MGRS burst database entry for {mgrs_set_id}")
+        return self.bounding_boxes[mgrs_set_id]
+
+    @cached_property
+    def bounding_boxes(self) -> dict[str, list]:
+        """The WSEN bounding box of every MGRS set, transformed in bulk per source projection."""
+        df = self.gdf.iloc[list(self.mgrs_set_id_to_row.values())][["mgrs_set_id", "EPSG", "xmin", "ymin", "xmax", "ymax"]]
+
+        bounding_boxes = {}
+        for epsg, epsg_df in df.groupby("EPSG", sort=False):
+            transformer = Transformer.from_crs(f"EPSG:{epsg}", self.gdf.crs)
+            # NOTE: see get_bounding_box_for_mgrs_set_id regarding the reversed lat/lon order
+            ymins, xmins = transformer.transform(xx=epsg_df["xmin"].to_numpy(), yy=epsg_df["ymin"].to_numpy())
+            ymaxs, xmaxs = transformer.transform(xx=epsg_df["xmax"].to_numpy(), yy=epsg_df["ymax"].to_numpy())
+            for mgrs_set_id, xmin, ymin, xmax, ymax in zip(epsg_df["mgrs_set_id"], xmins, ymins, xmaxs, ymaxs):
+                bounding_boxes[mgrs_set_id] = [float(xmin), float(ymin), float(xmax), float(ymax)]
+        return bounding_boxes
+
+
+LAND_OCEAN_FLAGS_LAND = ["water/land", "land"]
+"""Values of the land_ocean_flag column of burst sets over land. Others (water) have no relevant data."""
+
+MGRS_BURST_DB_PARQUET_VERSION = 1
+"""Version of the columnar copy of the MGRS Tile Collection Database. Increment when its columns or encoding change."""
+
+
 def load_mgrs_burst_db(filter_land=True):
-    """see :func:`~data_subscriber.rtc.mgrs_bursts_collection_db_client.load_mgrs_burst_db_raw`"""
+    """
+    see :func:`~data_subscriber.rtc.mgrs_bursts_collection_db_client.load_mgrs_burst_db_raw`
+
+    Loads the columnar copy of the database instead, if one was converted from the current version of the database.
+    See :func:`get_mgrs_burst_db_parquet_filepath`.
+    """
     logger = get_logger()
     logger.info(f"Initial load of MGRS burst database from disk.")
 
+    parquet_filepath = get_mgrs_burst_db_parquet_filepath()
+    if parquet_filepath.exists():
+        logger.info(f"Loading columnar MGRS burst database {parquet_filepath}")
+        return load_mgrs_burst_db_parquet(parquet_filepath, filter_land)
+
     vector_gdf = load_mgrs_burst_db_raw(filter_land)
 
     # parse collection columns encoded as string to collections
@@ -56,33 +159,157 @@ def load_mgrs_burst_db(filter_land=True):
 
 
 def load_mgrs_burst_db_raw(filter_land=True) -> GeoDataFrame:
-    """Loads the MGRS Tile Collection Database. On AWS environments, this will localize from a known S3 location."""
+    """
+    Loads the MGRS Tile Collection Database. On AWS environments, this will localize from a known S3 location.
+
+    The database is also converted to its columnar copy, replacing copies converted from previous versions of it.
+    """
     logger = get_logger()
-    mtc_local_filepath = Path(os.environ.get("MGRS_TILE_COLLECTION_DB_FILEPATH", "~/Downloads/MGRS_tile_collection_v0.3.sqlite")).expanduser()
+    mtc_local_filepath = get_mgrs_burst_db_filepath()
 
     if mtc_local_filepath.exists():
+        source_id = get_mgrs_burst_db_source_id(mtc_local_filepath)
         vector_gdf = gpd.read_file(mtc_local_filepath, crs="EPSG:4326")  # , bbox=(-230, 0, -10, 90))  # bbox=(-180, -90, 180, 90)  # global
     else:
-        settings = SettingsConf().cfg
-        mgrs_tile_collection_db_s3path = settings["MGRS_TILE_COLLECTION_DB_S3PATH"]
-        match_s3path = re.match("s3://(?P<bucket_name>[^/]+)/(?P<object_key>.+)", mgrs_tile_collection_db_s3path)
-
-        s3_client: S3Client = boto3.session.Session().client("s3")
-        mtc_download_filepath = Path(Path(mgrs_tile_collection_db_s3path).name)
-        s3_client.download_file(Bucket=match_s3path.group("bucket_name"), Key=match_s3path.group("object_key"), Filename=str(mtc_download_filepath))
+        s3_object = get_mgrs_burst_db_s3_object()
+        source_id = s3_object.e_tag.strip('"')
+        mtc_download_filepath = Path(Path(s3_object.key).name)
+        s3_object.download_file(str(mtc_download_filepath))
         vector_gdf = gpd.read_file(mtc_download_filepath, crs="EPSG:4326")  # , bbox=(-230, 0, -10, 90))  # bbox=(-180, -90, 180, 90)  # global
 
+    # convert once per version of the database, so that later loads on this host read the columnar copy instead
+    try:
+        parquet_filepath = get_mgrs_burst_db_parquet_filepath(source_id)
+        parquet_filepath.parent.mkdir(parents=True, exist_ok=True)
+        write_mgrs_burst_db_parquet(vector_gdf, parquet_filepath)
+        for stale_parquet_filepath in parquet_filepath.parent.glob(f"{mtc_local_filepath.stem}.*.parquet"):
+            if stale_parquet_filepath != parquet_filepath:
+                logger.info(f"Removing stale columnar MGRS burst database {stale_parquet_filepath}")
+                stale_parquet_filepath.unlink(missing_ok=True)
+    except Exception:
+        logger.warning("Failed to convert MGRS burst database to Parquet. Continuing.", exc_info=True)
+
     # na_gdf = gpd.read_file(Path("geo/north_america_opera.geojson"), crs="EPSG:4326")
     # vector_gdf = vector_gdf.overlay(na_gdf, how="intersection")
     logger.debug(f"pre water/land filter: {len(vector_gdf)=}")
 
     if filter_land:
-        vector_gdf = vector_gdf[vector_gdf["land_ocean_flag"].isin(["water/land", "land"])]  # filter out water (water == no relevant data)
+        vector_gdf = vector_gdf[vector_gdf["land_ocean_flag"].isin(LAND_OCEAN_FLAGS_LAND)]  # filter out water (water == no relevant data)
         logger.debug(f"post water/land filter: {len(vector_gdf)=}")
 
     return vector_gdf
 
 
+def get_mgrs_burst_db_filepath() -> Path:
+    """The local path of the MGRS Tile Collection Database (SQLite). See MGRS_TILE_COLLECTION_DB_FILEPATH."""
+    return Path(os.environ.get("MGRS_TILE_COLLECTION_DB_FILEPATH", "~/Downloads/MGRS_tile_collection_v0.3.sqlite")).expanduser()
+
+
+def get_mgrs_burst_db_s3_object():
+    """The MGRS Tile Collection Database S3 object defined in settings.yaml by MGRS_TILE_COLLECTION_DB_S3PATH"""
+    settings = SettingsConf().cfg
+    mgrs_tile_collection_db_s3path = settings["MGRS_TILE_COLLECTION_DB_S3PATH"]
+    match_s3path = re.match("s3://(?P<bucket_name>[^/]+)/(?P<object_key>.+)", mgrs_tile_collection_db_s3path)
+    return boto3.resource("s3").Object(match_s3path.group("bucket_name"), match_s3path.group("object_key"))
+
+
+def get_mgrs_burst_db_parquet_filepath(source_id=None) -> Path:
+    """
+    The local path of the columnar copy of the MGRS Tile Collection Database, next to the local SQLite database.
+
+    The copy is named by the version of the database it was converted from, and by the version of the columnar format,
+    so that a copy converted from a previous version of either is never loaded. The version of the database is the
+    size and modification time of the local SQLite database if one exists (see :func:`get_mgrs_burst_db_source_id`),
+    or the ETag of the S3 object otherwise. Neither requires reading the database.
+    """
+    mtc_local_filepath = get_mgrs_burst_db_filepath()
+    if source_id is None:
+        if mtc_local_filepath.exists():
+            source_id = get_mgrs_burst_db_source_id(mtc_local_filepath)
+        else:
+            source_id = get_mgrs_burst_db_s3_object().e_tag.strip('"')
+    return mtc_local_filepath.with_name(get_mgrs_burst_db_parquet_filename(mtc_local_filepath, source_id))
+
+
+def get_mgrs_burst_db_source_id(db_filepath) -> str:
+    """
+    Identifies the version of a local MGRS Tile Collection Database by its size and modification time (ns), so that
+    an updated database is detected without reading it
+    """
+    stat = os.stat(db_filepath)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def get_mgrs_burst_db_parquet_filename(db_filepath, source_id) -> str:
+    """The filename of the columnar copy of the given version of the MGRS Tile Collection Database"""
+    return f"{Path(db_filepath).stem}.{source_id}.v{MGRS_BURST_DB_PARQUET_VERSION}.parquet"
+
+
+def convert_mgrs_burst_db_to_parquet(db_filepath, parquet_filepath):
+    """Converts the MGRS Tile Collection Database (SQLite) to a columnar Parquet file. See :func:`write_mgrs_burst_db_parquet`."""
+    write_mgrs_burst_db_parquet(gpd.read_file(db_filepath, crs="EPSG:4326"), parquet_filepath)
+
+
+def write_mgrs_burst_db_parquet(vector_gdf: GeoDataFrame, parquet_filepath):
+    """
+    Writes the loaded MGRS Tile Collection Database to a columnar Parquet file, which loads without per-row parsing.
+
+    * the bursts and mgrs_tiles collections, and the orbits of the bursts, are stored as JSON arrays alongside the
+      original string columns, so that each column is decoded with a single JSON parse
+    * geometries are stored as WKB
+    * an is_land flag column is added, and burst sets over land are written to their own row group, so that the land
+      filter skips the other row group when reading. The original row order is kept in a row_idx column.
+    """
+    df = pd.DataFrame(vector_gdf.drop(columns=vector_gdf.geometry.name))
+    bursts_lists = [ast.literal_eval(it) for it in df["bursts"]]
+    df["bursts_json"] = [json.dumps(bursts) for bursts in bursts_lists]
+    df["mgrs_tiles_json"] = [json.dumps(ast.literal_eval(it)) for it in df["mgrs_tiles"]]
+    df["orbits_json"] = [json.dumps(sorted({int(b[1:4]) for b in bursts})) for bursts in bursts_lists]
+    df["geometry_wkb"] = shapely.to_wkb(vector_gdf.geometry.values)
+    df["is_land"] = df["land_ocean_flag"].isin(LAND_OCEAN_FLAGS_LAND)
+    df["row_idx"] = range(len(df))
+    df = df.sort_values("is_land", kind="stable")
+
+    num_water = int((~df["is_land"]).sum())
+    row_group_offsets = [0, num_water] if 0 < num_water < len(df) else [0]
+
+    tmp_filepath = f"{parquet_filepath}.{os.getpid()}.tmp"
+    df.to_parquet(
+        tmp_filepath, engine="fastparquet", index=False, row_group_offsets=row_group_offsets, stats=["is_land"],
+        object_encoding={column: "bytes" if column == "geometry_wkb" else "utf8" for column in df.columns if df[column].dtype == object}
+    )
+    os.replace(tmp_filepath, parquet_filepath)
+
+
+def load_mgrs_burst_db_parquet(parquet_filepath, filter_land=True) -> GeoDataFrame:
+    """
+    Loads the columnar copy of the MGRS Tile Collection Database written by :func:`write_mgrs_burst_db_parquet`.
+    Returns the same GeoDataFrame as :func:`load_mgrs_burst_db`.
+    """
+    df = pd.read_parquet(parquet_filepath, engine="fastparquet", filters=[("is_land", "==", True)] if filter_land else None)
+    df = df.set_index("row_idx").sort_index()
+    df.index.name = None
+    if not filter_land:
+        df.index = pd.RangeIndex(len(df))
+
+    def parse_json_column(column):
+        return json.loads("[" + ",".join(df.pop(column)) + "]")
+
+    bursts_lists = parse_json_column("bursts_json")
+    mgrs_tiles_lists = parse_json_column("mgrs_tiles_json")
+    orbits_lists = parse_json_column("orbits_json")
+    geometry = gpd.GeoSeries.from_wkb(df.pop("geometry_wkb").to_numpy(), index=df.index, crs="EPSG:4326")
+    df = df.drop(columns="is_land")
+
+    vector_gdf = GeoDataFrame(df, geometry=geometry, crs="EPSG:4326")
+    vector_gdf["bursts_parsed"] = [set(bursts) for bursts in bursts_lists]
+    vector_gdf["mgrs_tiles_parsed"] = [set(mgrs_tiles) for mgrs_tiles in mgrs_tiles_lists]
+    # some burst sets are composed of bursts from different orbits
+    vector_gdf["orbits"] = [set(orbits) for orbits in orbits_lists]
+
+    return vector_gdf
+
+
 def get_bounding_box_for_mgrs_set_id(mgrs_burst_collections_gdf: GeoDataFrame, mgrs_set_id):
     """
     Extracts the bounding box for the provided MGRS tile set ID from within the
@@ -3,22 +3,18 @@ from collections import defaultdict
 from datetime import datetime
 
 import dateutil
-import elasticsearch.helpers
-import opensearchpy
 from more_itertools import last, chunked
 
 from data_subscriber.catalog import ProductCatalog
 from data_subscriber.rtc import mgrs_bursts_collection_db_client
-from util.conf_util import SettingsConf
 from util.grq_client import get_body
 
-settings = SettingsConf().cfg
-
 
 class RTCProductCatalog(ProductCatalog):
     """Cataloging class for downloaded Radiometric Terrain Corrected (RTC) products."""
     NAME = "rtc_catalog"
     ES_INDEX_PATTERNS = "rtc_catalog*"
+    BULK_THREAD_COUNT = 4
 
     def process_query_result(self, query_result):
         return [result["_source"] for result in (query_result or [])]
@@ -64,12 +60,13 @@ class RTCProductCatalog(ProductCatalog):
 
     def mark_products_as_download_job_submitted(self, batch_id_to_products_map: dict):
         operations = []
-        mgrs = mgrs_bursts_collection_db_client.cached_load_mgrs_burst_db(filter_land=True)
+        es_engine = self._get_es_engine()
+        mgrs_index = mgrs_bursts_collection_db_client.cached_load_mgrs_burst_db_index(filter_land=True)
         for batch_id, product_id_to_products_map in batch_id_to_products_map.items():
             download_job_dts = datetime.now().isoformat(timespec="seconds").replace("+00:00", "Z")
 
             mgrs_set_id = batch_id.split("$")[0]
-            number_of_bursts_expected = mgrs[mgrs["mgrs_set_id"] == mgrs_set_id].iloc[0]["number_of_bursts"]
+            number_of_bursts_expected = mgrs_index.number_of_bursts[mgrs_set_id]
             number_of_bursts_actual = len(product_id_to_products_map)
             coverage = int(number_of_bursts_actual / number_of_bursts_expected * 100)
 
@@ -88,33 +85,10 @@ class RTCProductCatalog(ProductCatalog):
                         "number_of_bursts_actual": number_of_bursts_actual,
                         "coverage": coverage
                     }
-                    if "elasticsearch" == settings["GRQ_ES_ENGINE"]:
-                        operation = {
-                            "_op_type": "update",
-                            "_index": index,
-                            "_type": "_doc",
-                            "_id": doc["id"],
-                            "doc_as_upsert": True,
-                            "doc": op_doc
-                        }
-                    elif "opensearch" == settings["GRQ_ES_ENGINE"]:
-                        operation = {
-                            "_op_type": "update",
-                            "_index": index,
-                            # "_type": "_doc",
-                            "_id": doc["id"],
-                            "doc_as_upsert": True,
-                            "doc": op_doc,
-                            # "update": op_doc
-                        }
-                    operations.append(operation)
+                    operations.append(self._to_bulk_action("update", index=index, _id=doc["id"], doc=op_doc, es_engine=es_engine))
 
         self.logger.info(f"Marking {set(batch_id_to_products_map.keys())} products as download job-submitted, in bulk")
-
-        if "elasticsearch" == settings["GRQ_ES_ENGINE"]:
-            elasticsearch.helpers.bulk(self.es_util.es, operations)
-        if "opensearch" == settings["GRQ_ES_ENGINE"]:
-            opensearchpy.helpers.bulk(self.es_util.es, operations)
+        self.bulk(operations, es_engine=es_engine)
 
         self.logger.debug("Performing index refresh")
         self.refresh()
@@ -142,6 +116,7 @@ class RTCProductCatalog(ProductCatalog):
 
     def mark_products_as_job_submitted(self, batch_id_to_products_map: dict):
         operations = []
+        es_engine = self._get_es_engine()
         dswx_s1_job_dts = datetime.now().isoformat(timespec="seconds").replace("+00:00", "Z")
 
         for batch_id, products in batch_id_to_products_map.items():
@@ -161,32 +136,10 @@ class RTCProductCatalog(ProductCatalog):
                     "latest_production_datetime": latest_production_datetime,
                     "latest_creation_timestamp": latest_creation_timestamp
                 }
-                if "elasticsearch" == settings["GRQ_ES_ENGINE"]:
-                    operation = {
-                        "_op_type": "update",
-                        "_index": index,
-                        "_type": "_doc",
-                        "_id": doc["id"],
-                        "doc_as_upsert": True,
-                        "doc": op_doc
-                    }
-                elif "opensearch" == settings["GRQ_ES_ENGINE"]:
-                    operation = {
-                        "_op_type": "update",
-                        "_index": index,
-                        # "_type": "_doc",
-                        "_id": doc["id"],
-                        "doc_as_upsert": True,
-                        "doc": op_doc,
-                        # "update": op_doc
-                    }
-                operations.append(operation)
+                operations.append(self._to_bulk_action("update", index=index, _id=doc["id"], doc=op_doc, es_engine=es_engine))
 
         self.logger.info(f"Marking {set(batch_id_to_products_map.keys())} products as job-submitted, in bulk")
-        if "elasticsearch" == settings["GRQ_ES_ENGINE"]:
-            elasticsearch.helpers.bulk(self.es_util.es, operations)
-        if "opensearch" == settings["GRQ_ES_ENGINE"]:
-            opensearchpy.helpers.bulk(self.es_util.es, operations)
+        self.bulk(operations, es_engine=es_engine)
 
         self.logger.debug("Performing index refresh")
         self.refresh()
@@ -215,11 +168,59 @@ class RTCProductCatalog(ProductCatalog):
     def update_granule_index(self, granule: dict, job_id: str, query_dt: datetime,
                              mgrs_set_id_acquisition_ts_cycle_indexes: list[str],
                              **kwargs):
+        docs = self.form_granule_index_documents(granule, job_id, query_dt, mgrs_set_id_acquisition_ts_cycle_indexes, **kwargs)
+
+        for doc in docs:
+            index = self._get_index_name_for(_id=doc['id'], default=self.generate_es_index_name())
+
+            body = {
+                "doc_as_upsert": True,
+                "doc": doc
+            }
+
+            self.es_util.update_document(index=index, body=body, id=doc['id'])
+
+    def bulk_update_granule_index(self, granule_updates: list[dict], job_id: str, query_dt: datetime,
+                                  chunk_size: int = None, thread_count: int = None):
+        """
+        Bulk variant of update_granule_index(). Each item of granule_updates holds the keyword arguments of a single
+        update_granule_index() call (i.e. granule, mgrs_set_id_acquisition_ts_cycle_indexes, and any additional fields).
+
+        The existing index of every document is resolved with chunked queries, then all documents are upserted using
+        _bulk requests of chunk_size actions, with up to thread_count requests in flight.
+        The caller is responsible for refreshing the index afterwards.
+        """
+        docs = [
+            doc
+            for granule_update in granule_updates
+            for doc in self.form_granule_index_documents(job_id=job_id, query_dt=query_dt, **granule_update)
+        ]
+        if not docs:
+            return
+
+        doc_id_to_index_cache = self.create_doc_id_to_index_cache(docs)
+        default_index = self.generate_es_index_name()
+        es_engine = self._get_es_engine()
+
+        actions = [
+            self._to_bulk_action("update", index=last(doc_id_to_index_cache[doc["id"]], default_index), _id=doc["id"], doc=doc,
+                                 es_engine=es_engine)
+            for doc in docs
+        ]
+
+        self.logger.info(f"Upserting {len(actions)} granule documents, in bulk")
+        self.bulk(actions, chunk_size=chunk_size, thread_count=thread_count, es_engine=es_engine)
+
+    def form_granule_index_documents(self, granule: dict, job_id: str, query_dt: datetime,
+                                     mgrs_set_id_acquisition_ts_cycle_indexes: list[str],
+                                     **kwargs) -> list[dict]:
+        """Forms one catalog document for the given granule per MGRS set ID acquisition cycle index"""
         urls = granule.get("filtered_urls")
         granule_id = granule.get("granule_id")
         temporal_extent_beginning_dt: datetime = dateutil.parser.isoparse(granule["temporal_extent_beginning_datetime"])
         revision_date_dt: datetime = dateutil.parser.isoparse(granule["revision_date"])
 
+        docs = []
         for mgrs_set_id_acquisition_ts_cycle_index in mgrs_set_id_acquisition_ts_cycle_indexes:
             doc = {
                 "id": f"{granule_id}${mgrs_set_id_acquisition_ts_cycle_index}",
@@ -236,11 +237,6 @@ class RTCProductCatalog(ProductCatalog):
                 "production_datetime": granule["production_datetime"]
             }
             doc.update(kwargs)
-            index = self._get_index_name_for(_id=doc['id'], default=self.generate_es_index_name())
+            docs.append(doc)
 
-            body = {
-                "doc_as_upsert": True,
-                "doc": doc
-            }
-
-            self.es_util.update_document(index=index, body=body, id=doc['id'])
+        return docs
@@ -27,10 +27,10 @@ async def example(batch_id_to_urls_map, args):
 
 def submit_dswx_s1_job_submissions_tasks(uploaded_batch_id_to_s3paths_map, args, settings=None):
     job_submission_tasks = []
-    mgrs = mbc_client.cached_load_mgrs_burst_db(filter_land=True)
+    mgrs_index = mbc_client.cached_load_mgrs_burst_db_index(filter_land=True)
     for batch_id, s3paths in uploaded_batch_id_to_s3paths_map.items():
         mgrs_set_id = batch_id.split("$")[0]
-        bounding_box = mbc_client.get_bounding_box_for_mgrs_set_id(mgrs, mgrs_set_id)
+        bounding_box = mgrs_index.get_bounding_box(mgrs_set_id)
 
         product = {
             "_id": batch_id,
@@ -16,9 +16,8 @@ from data_subscriber.geojson_utils import localize_include_exclude, filter_granu
 from data_subscriber.query import BaseQuery, get_query_timerange
 from data_subscriber.rtc import mgrs_bursts_collection_db_client as mbc_client, evaluator
 from data_subscriber.rtc.rtc_download_job_submitter import submit_rtc_download_job_submissions_tasks
-from data_subscriber.url import determine_acquisition_cycle
 from geo.geo_util import does_bbox_intersect_region
-from rtc_utils import rtc_granule_regex
+from rtc_utils import rtc_granule_regex, determine_acquisition_cycles, parse_acquisition_ts
 
 DateTimeRange = namedtuple("DateTimeRange", ["start_date", "end_date"])
 
@@ -66,14 +65,26 @@ class RtcCmrQuery(BaseQuery):
 
         self.logger.info("Filtered to %d granules", len(granules))
 
-        mgrs = mbc_client.cached_load_mgrs_burst_db(filter_land=True)
+        mgrs_index = mbc_client.cached_load_mgrs_burst_db_index(filter_land=True)
         if self.args.native_id:
             match_native_id = re.match(rtc_granule_regex, self.args.native_id)
             burst_id = mbc_client.product_burst_id_to_mapping_burst_id(match_native_id.group("burst_id"))
 
-            native_id_mgrs_burst_set_ids = mbc_client.burst_id_to_mgrs_set_ids(mgrs, mbc_client.product_burst_id_to_mapping_burst_id(burst_id))
+            native_id_mgrs_burst_set_ids, = mgrs_index.burst_ids_to_mgrs_set_ids([burst_id])
+
+        granules_match_product_id = [re.match(rtc_granule_regex, granule.get("granule_id")) for granule in granules]
+        granules_mgrs_burst_set_ids = mgrs_index.burst_ids_to_mgrs_set_ids(
+            mbc_client.product_burst_id_to_mapping_burst_id(match_product_id.group("burst_id"))
+            for match_product_id in granules_match_product_id
+        )
+        granules_acquisition_cycle = determine_acquisition_cycles(
+            burst_ids=[match_product_id.group("burst_id") for match_product_id in granules_match_product_id],
+            acquisition_ts=parse_acquisition_ts(match_product_id.group("acquisition_ts") for match_product_id in granules_match_product_id),
+            satellites=[granule.get("granule_id").split("_")[6] for granule in granules]
+        ).tolist()
 
         num_granules = len(granules)
+        granule_updates = []
         for i, granule in enumerate(granules):
             self.logger.debug("Processing granule %d of %d", i + 1, num_granules)
 
@@ -86,15 +97,11 @@ class RtcCmrQuery(BaseQuery):
 
             additional_fields["instrument"] = "S1A" if "S1A" in granule_id else "S1B"
 
-            match_product_id = re.match(rtc_granule_regex, granule_id)
-            acquisition_dts = match_product_id.group("acquisition_ts")  # e.g. 20210705T183117Z
-            burst_id = match_product_id.group("burst_id")  # e.g. T074-157286-IW3
-
-            # Returns up to two mgrs_set_ids. e.g. MS_74_76
-            mgrs_burst_set_ids = mbc_client.burst_id_to_mgrs_set_ids(mgrs, mbc_client.product_burst_id_to_mapping_burst_id(burst_id))
+            # Up to two mgrs_set_ids. e.g. MS_74_76
+            mgrs_burst_set_ids = granules_mgrs_burst_set_ids[i]
             additional_fields["mgrs_set_ids"] = mgrs_burst_set_ids
 
-            acquisition_cycle = determine_acquisition_cycle(burst_id, acquisition_dts, granule_id)
+            acquisition_cycle = granules_acquisition_cycle[i]
             additional_fields["acquisition_cycle"] = acquisition_cycle
 
             mgrs_set_id_acquisition_ts_cycle_indexes = update_additional_fields_mgrs_set_id_acquisition_ts_cycle_indexes(
@@ -105,13 +112,13 @@ class RtcCmrQuery(BaseQuery):
             else:
                 update_affected_mgrs_set_ids(acquisition_cycle, affected_mgrs_set_id_acquisition_ts_cycle_indexes, mgrs_burst_set_ids)
 
-            self.es_conn.update_granule_index(
-                granule=granule,
-                job_id=self.job_id,
-                query_dt=query_dt,
-                mgrs_set_id_acquisition_ts_cycle_indexes=mgrs_set_id_acquisition_ts_cycle_indexes,
+            granule_updates.append({
+                "granule": granule,
+                "mgrs_set_id_acquisition_ts_cycle_indexes": mgrs_set_id_acquisition_ts_cycle_indexes,
                 **additional_fields
-            )
+            })
+
+        self.es_conn.bulk_update_granule_index(granule_updates, job_id=self.job_id, query_dt=query_dt)
 
         self.logger.info("Granule Cataloguing FINISHED")
 
@@ -241,16 +248,15 @@ class RtcCmrQuery(BaseQuery):
     def filter_granules_rtc(self, granules):
         self.logger.info("Applying land/water filter on CMR granules")
 
-        filtered_granules = []
-        for granule in granules:
-            granule_id = granule.get("granule_id")
+        burst_ids = [re.match(rtc_granule_regex, granule.get("granule_id")).group("burst_id") for granule in granules]
 
-            match_product_id = re.match(rtc_granule_regex, granule_id)
-            burst_id = match_product_id.group("burst_id")
+        mgrs_index = mbc_client.cached_load_mgrs_burst_db_index(filter_land=True)
+        granules_mgrs_sets = mgrs_index.burst_ids_to_mgrs_set_ids(
+            mbc_client.product_burst_id_to_mapping_burst_id(burst_id) for burst_id in burst_ids
+        )
 
-            mgrs = mbc_client.cached_load_mgrs_burst_db(filter_land=True)
-            mgrs_sets = mbc_client.burst_id_to_mgrs_set_ids(mgrs,
-                                                            mbc_client.product_burst_id_to_mapping_burst_id(burst_id))
+        filtered_granules = []
+        for granule, burst_id, mgrs_sets in zip(granules, burst_ids, granules_mgrs_sets):
             if not mgrs_sets:
                 self.logger.debug("burst_id=%s not associated with land or land/water data. Skipping.", burst_id)
                 continue
@@ -9,6 +9,7 @@ from collections import defaultdict
 
 
 class SlcCmrQuery(BaseQuery):
+    PIPELINED_QUERY = True
 
     def __init__(self,  args, token, es_conn, cmr, job_id, settings):
         super().__init__(args, token, es_conn, cmr, job_id, settings)
@@ -20,6 +21,10 @@ class SlcCmrQuery(BaseQuery):
         spatial_catalog_conn = SLCSpatialProductCatalog(self.logger)
         spatial_catalog_conn.process_granule(granule)
 
+    def update_granule_indexes(self, granules):
+        spatial_catalog_conn = SLCSpatialProductCatalog(self.logger)
+        spatial_catalog_conn.process_granules(granules)
+
     def prepare_additional_fields(self, granule, args, granule_id):
         additional_fields = super().prepare_additional_fields(granule, args, granule_id)
         if does_bbox_intersect_north_america(granule["bounding_box"]):
@@ -269,15 +269,16 @@ def extract_metadata(product, product_types, catalog_met=None):
             logger.info(f"Found match pattern with type {product_type}")
             extractor = product_types[product_type][EXTRACTOR_KEY]
             pattern = product_types[product_type]["Pattern"].pattern
-            ds_met = product_types[product_type]["Dataset_Keys"]
+            # copy, as the product types config is shared and read-only
+            ds_met = dict(product_types[product_type]["Dataset_Keys"])
             ds_met.update({"type": product_type})
 
             if "Alt_Dataset_Keys" in product_types[product_type]:
-                alt_ds_met = product_types[product_type]["Alt_Dataset_Keys"]
+                alt_ds_met = dict(product_types[product_type]["Alt_Dataset_Keys"])
                 alt_ds_met.update({"type": product_type})
 
             if extractor is not None:
-                config = product_types[product_type].get('Configuration', {})
+                config = dict(product_types[product_type].get('Configuration', {}))
 
                 if catalog_met is not None:
                     config["catalog_metadata"] = catalog_met
@@ -1,11 +1,15 @@
 
 import json
 from functools import cache
-from typing import TypedDict
+from typing import Iterable, Optional, TypedDict
 
+import numpy as np
+import shapely
 from osgeo import ogr
+from shapely.strtree import STRtree
 
 from opera_commons.logger import get_logger
+from util.geo_util import check_dateline
 
 
 _NORTH_AMERICA = "north_america_opera"
@@ -66,6 +70,76 @@ def does_bbox_intersect_region(bbox: list[Coordinate], region) -> bool:
     return is_bbox_in_region
 
 
+class RegionFilter:
+    """
+    Spatial index over the geometries of one or more regions, each defined by a geojson file, for testing many
+    bboxes at once. Equivalent to calling :func:`does_bbox_intersect_region` for each bbox and region, in order, except
+    that bboxes crossing the antimeridian are split using the same rules as :func:`util.geo_util.check_dateline`.
+    """
+
+    def __init__(self, regions: Iterable[str]):
+        self.regions = list(regions)
+
+        parts, part_region_indexes = [], []
+        for region_index, region in enumerate(self.regions):
+            for feature in _cached_load_region_opera_geojson(region)["features"]:
+                feature_parts = shapely.get_parts(shapely.from_geojson(json.dumps(feature["geometry"])))
+                parts.extend(feature_parts)
+                part_region_indexes.extend([region_index] * len(feature_parts))
+
+        self._parts = np.array(parts, dtype=object)
+        self._part_region_indexes = np.array(part_region_indexes, dtype=int)
+        shapely.prepare(self._parts)
+        self._tree = STRtree(self._parts)
+
+    def intersecting_regions(self, bboxes: list[list[Coordinate]]) -> list[Optional[str]]:
+        """
+        For each bbox, returns the first region (in the order given to the filter) that it intersects, or None.
+
+        :param bboxes: a list of bboxes, each a list of coordinate dicts. See :func:`does_bbox_intersect_region`.
+        """
+        if not bboxes:
+            return []
+
+        polys = _bboxes_to_polygons(bboxes)
+        bbox_indexes = np.arange(len(polys))
+
+        # split bboxes crossing the antimeridian
+        xmins, _, xmaxs, _ = shapely.bounds(polys).T
+        crosses_dateline = (xmaxs - xmins > 180.0) | ((xmins <= 180.0) & (180.0 <= xmaxs))
+        if crosses_dateline.any():
+            split_polys, split_bbox_indexes = [], []
+            for i in np.flatnonzero(crosses_dateline):
+                pieces = check_dateline(polys[i])
+                split_polys.extend(pieces)
+                split_bbox_indexes.extend([i] * len(pieces))
+            polys = np.concatenate([polys[~crosses_dateline], np.array(split_polys, dtype=object)])
+            bbox_indexes = np.concatenate([bbox_indexes[~crosses_dateline], np.array(split_bbox_indexes, dtype=int)])
+
+        # candidate pairs by envelope, then exact tests against the prepared region geometries
+        poly_indexes, part_indexes = self._tree.query(polys)
+        intersects = shapely.intersects(self._parts[part_indexes], polys[poly_indexes])
+
+        region_indexes = np.full(len(bboxes), len(self.regions))
+        np.minimum.at(region_indexes, bbox_indexes[poly_indexes[intersects]], self._part_region_indexes[part_indexes[intersects]])
+        return [self.regions[i] if i < len(self.regions) else None for i in region_indexes]
+
+
+@cache
+def cached_load_region_filter(regions: tuple[str, ...]) -> RegionFilter:
+    """Returns the :class:`RegionFilter` for the given regions, building it once per process."""
+    logger = get_logger()
+    region_filter = RegionFilter(regions)
+    logger.info("Loaded regions %s as spatial index", regions)
+    return region_filter
+
+
+def _bboxes_to_polygons(bboxes: list[list[Coordinate]]) -> np.ndarray:
+    coords = np.array([(coordinate["lon"], coordinate["lat"]) for bbox in bboxes for coordinate in bbox], dtype=float)
+    ring_indexes = np.repeat(np.arange(len(bboxes)), [len(bbox) for bbox in bboxes])
+    return shapely.polygons(shapely.linearrings(coords, indices=ring_indexes))
+
+
 @cache
 def _load_region_opera_geometry_collection(region) -> ogr.Geometry:
     logger = get_logger()
@@ -24,7 +24,7 @@ from opera_commons.logger import logger
 from data_subscriber.cslc_utils import build_ccslc_m_index
 from extractor import extract
 from util import datasets_json_util, job_json_util
-from util.checksum_util import create_dataset_checksums
+from util.checksum_util import copy_with_checksum, create_checksum_files
 from util.conf_util import SettingsConf, PGEOutputsConf
 
 PRIMARY_KEY = "Primary"
@@ -70,6 +70,7 @@ def convert(
 
     # Create the datasets
     created_datasets = set()
+    files_to_checksum = []
     output_types = [PRIMARY_KEY, OPTIONAL_KEY]
 
     for output_type in output_types:
@@ -87,10 +88,13 @@ def convert(
 
             if hashcheck:
                 hash_algo = products[output_type][product].get("hash_algo", DEFAULT_HASH_ALGO)
-                create_dataset_checksums(os.path.join(dataset_dir, product), hash_algo)
+                files_to_checksum.append((os.path.join(dataset_dir, product), hash_algo))
 
             created_datasets.add(dataset_dir)
 
+    # Checksum the products of all datasets concurrently
+    create_checksum_files(files_to_checksum)
+
     for dataset_dir in created_datasets:
         logger.debug(f"{dataset_dir=}")
 
@@ -114,13 +118,15 @@ def convert(
             source = os.path.join(product_dir, secondary_product)
             target = os.path.join(dataset_dir, secondary_product)
             logger.info(f"Copying {source} to {target}")
-            shutil.copy(source, target)
 
             hashcheck = products[SECONDARY_KEY][secondary_product].get("hashcheck", False)
 
             if hashcheck:
+                # Checksum while copying, so the file is only read once
                 hash_algo = products[SECONDARY_KEY][secondary_product].get("hash_algo", DEFAULT_HASH_ALGO)
-                create_dataset_checksums(target, hash_algo)
+                copy_with_checksum(source, target, hash_algo)
+            else:
+                shutil.copy(source, target)
 
         # Add fields to the top-level of the .met.json file
         dataset_met_json["FileSize"] = combined_file_size
@@ -1,6 +1,8 @@
 import re
-from datetime import timedelta
+from datetime import timedelta, timezone
 
+import numpy as np
+import pandas as pd
 from dateutil.parser import isoparse
 
 # EPOCH dates for the Sentinel-1 missions. The exact date doesn't matter - they just need to be right in the 12-day cycle.
@@ -16,6 +18,30 @@ _EPOCH_MAP = {
     "S1D": _EPOCH_S1D
 }
 
+
+def _parse_epochs():
+    epochs = {}
+    for satellite, epoch in _EPOCH_MAP.items():
+        try:
+            epochs[satellite] = isoparse(epoch)
+        except ValueError:
+            pass  # not yet determined. See determine_acquisition_cycle
+    return epochs
+
+
+_EPOCH_DATETIME_MAP = _parse_epochs()
+"""The parsed mission epochs of the satellites whose epochs are determined."""
+
+_EPOCH_DATETIME64_MAP = {
+    satellite: np.datetime64(epoch.astimezone(timezone.utc).replace(tzinfo=None), "us")
+    for satellite, epoch in _EPOCH_DATETIME_MAP.items()
+}
+"""The parsed mission epochs, as UTC datetime64 for :func:`determine_acquisition_cycles`."""
+
+ACQUISITION_CYCLE_DAYS = 12
+MAX_BURST_IDENTIFICATION_NUMBER = 375887  # gleamed from MGRS burst collection database
+ACQUISITION_CYCLE_DURATION_SECS = timedelta(days=ACQUISITION_CYCLE_DAYS).total_seconds()
+
 rtc_granule_regex = (
     r'(?P<id>'
     r'(?P<project>OPERA)_'
@@ -34,6 +60,9 @@ rtc_granule_regex = (
 Example: "OPERA_L2_RTC-S1_T118-252624-IW1_20250512T193408Z_20250513T011557Z_S1A_30_v1.0
 """
 
+rtc_granule_pattern = re.compile(rtc_granule_regex)
+"""Compiled :data:`rtc_granule_regex`, for bulk matching (e.g. with `Series.str.extract`)."""
+
 rtc_product_file_regex = (
     rtc_granule_regex + ''
     r'(_'
@@ -75,16 +104,12 @@ def determine_acquisition_cycle(burst_id, acquisition_dts, granule_id, epoch = N
     The cycle restarts periodically with some miniscule drift over time and the life of the mission."""
     # RTC/CSLC: Calculating the Collection Cycle Index (Part 1):
     #  required constants
-    cycle_days = 12
     satellite = granule_id.split("_")[6] # S1A, S1B, S1C, S1D
 
     if epoch is not None:
         instrument_epoch = isoparse(epoch)  # We use whatever was passed in
     else:
-        instrument_epoch = isoparse(_EPOCH_MAP[satellite])  # set approximate mission start date
-
-    MAX_BURST_IDENTIFICATION_NUMBER = 375887  # gleamed from MGRS burst collection database
-    ACQUISITION_CYCLE_DURATION_SECS = timedelta(days=cycle_days).total_seconds()
+        instrument_epoch = _get_instrument_epoch(satellite)  # set approximate mission start date
 
     # RTC/CSLC: Calculating the Collection Cycle Index (Part 2):
     #  RTC/CSLC products can be indexed into their respective elapsed collection cycle since mission start/epoch.
@@ -99,3 +124,55 @@ def determine_acquisition_cycle(burst_id, acquisition_dts, granule_id, epoch = N
     acquisition_cycle = round(acquisition_index)
     assert acquisition_cycle >= 0, f"Acquisition cycle is negative: {acquisition_cycle=}"
     return acquisition_cycle
+
+
+def determine_acquisition_cycles(burst_ids, acquisition_ts, satellites) -> np.ndarray:
+    """
+    Vectorized :func:`determine_acquisition_cycle`, over many products at once.
+
+    :param burst_ids: the burst IDs of the products. e.g. T074-157286-IW3
+    :param acquisition_ts: the acquisition datetimes of the products, as UTC datetime64. See :func:`parse_acquisition_ts`.
+    :param satellites: the satellites of the products. e.g. S1A
+    :return: the acquisition cycle of each product, as an int64 array
+    """
+    satellites = np.asarray(satellites, dtype=str)
+    acquisition_ts = np.asarray(acquisition_ts, dtype="datetime64[us]")
+    if not len(satellites):
+        return np.empty(0, dtype=np.int64)
+
+    instrument_epochs = np.empty(len(satellites), dtype="datetime64[us]")
+    for satellite in np.unique(satellites).tolist():
+        if satellite not in _EPOCH_DATETIME64_MAP:
+            _get_instrument_epoch(satellite)  # raises, like determine_acquisition_cycle
+        instrument_epochs[satellites == satellite] = _EPOCH_DATETIME64_MAP[satellite]
+
+    burst_identification_numbers = _parse_burst_identification_numbers(burst_ids)
+    # NOTE: microseconds / 10^6 matches timedelta.total_seconds() exactly, so the arithmetic below matches the scalar function
+    seconds_after_mission_epoch = (acquisition_ts - instrument_epochs).astype(np.int64) / 1_000_000
+    acquisition_indexes = (
+                                  seconds_after_mission_epoch - (ACQUISITION_CYCLE_DURATION_SECS * (
+                                      burst_identification_numbers / MAX_BURST_IDENTIFICATION_NUMBER))
+                          ) / ACQUISITION_CYCLE_DURATION_SECS
+
+    # NOTE: np.rint rounds half to even, like round()
+    acquisition_cycles = np.rint(acquisition_indexes).astype(np.int64)
+    assert (acquisition_cycles >= 0).all(), f"Acquisition cycle is negative: acquisition_cycle={acquisition_cycles[acquisition_cycles < 0][0]}"
+    return acquisition_cycles
+
+
+def parse_acquisition_ts(acquisition_dts) -> np.ndarray:
+    """Parses product acquisition timestamps (e.g. 20210705T183117Z) to UTC datetime64, for :func:`determine_acquisition_cycles`."""
+    acquisition_ts = pd.to_datetime(list(acquisition_dts), format="%Y%m%dT%H%M%SZ", utc=True)
+    return acquisition_ts.tz_convert(None).to_numpy().astype("datetime64[us]")
+
+
+def _parse_burst_identification_numbers(burst_ids) -> np.ndarray:
+    """The burst identification numbers (e.g. 157286 of T074-157286-IW3) of the burst IDs."""
+    burst_identification_numbers = pd.Series(list(burst_ids), dtype=object).str.extract(r"^[^-]*-(\d+)-", expand=False)
+    return burst_identification_numbers.astype(np.int64).to_numpy()
+
+
+def _get_instrument_epoch(satellite):
+    if satellite in _EPOCH_DATETIME_MAP:
+        return _EPOCH_DATETIME_MAP[satellite]
+    return isoparse(_EPOCH_MAP[satellite])
@@ -29,6 +29,7 @@ setup(
             "yamale==3.0.6",
             "ruamel.yaml",
             "elasticmock",
+            "moto[s3]",
             "geopandas",
             "smart_open",
             "fastparquet", # To parse parquet files which is the format for DIST-S1 database
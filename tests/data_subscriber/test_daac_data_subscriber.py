@@ -493,7 +493,7 @@ def test_download_from_asf(monkeypatch):
     # mock ASF download functions
     monkeypatch.setattr(
         download,
-        download._handle_url_redirect.__name__,
+        download._download_url_redirect.__name__,
         MagicMock()
     )
 
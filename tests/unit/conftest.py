@@ -9,6 +9,8 @@ import pytest
 import requests
 from geopandas import GeoDataFrame
 
+_session_request = requests.sessions.Session.request
+
 
 # create mocks for HySDS modules which would otherwise prevent unit testing
 # this leverages sys.modules[] which is used during repeated imports when
@@ -79,3 +81,33 @@ mock_commons_es_connection.get_grq_es = lambda *args, **kwargs: None
 @pytest.fixture(autouse=True)
 def deny_network_requests(monkeypatch):
     monkeypatch.delattr(requests.sessions.Session, requests.sessions.Session.request.__name__)
+
+
+@pytest.fixture
+def fake_cmr_server(monkeypatch):
+    """Factory fixture for a local, synthetic CMR search API. See tests.unit.fake_cmr_server.FakeCmrServer."""
+    from tests.unit.fake_cmr_server import FakeCmrServer
+
+    monkeypatch.setenv("USER", "pytest")
+    servers = []
+
+    def _fake_cmr_server(items, latency=0.0) -> FakeCmrServer:
+        server = FakeCmrServer(items, latency=latency).__enter__()
+        servers.append(server)
+        return server
+
+    yield _fake_cmr_server
+
+    for server in servers:
+        server.__exit__()
+
+
+@pytest.fixture
+def fake_http_server(monkeypatch):
+    """A local HTTP file server. See tests.unit.fake_http_server.FakeHttpFileServer. Allows requests to be made to it."""
+    from tests.unit.fake_http_server import FakeHttpFileServer
+
+    monkeypatch.setattr(requests.sessions.Session, "request", _session_request, raising=False)
+
+    with FakeHttpFileServer() as server:
+        yield server
@@ -5,6 +5,7 @@ import pytest
 from mock import patch
 
 from data_subscriber.rtc import evaluator
+from tests.unit.fake_es import FakeEsUtil
 
 
 def setup_module():
@@ -208,3 +209,33 @@ def test_native_id__when_min_bursts_A__and__bursts_found_B(es_conn_util, test_mi
     ]
     evaluator_results = evaluator.main(min_num_bursts=test_min_num_bursts, coverage_target=None)
     assert evaluator_results["mgrs_sets"] == expected_sets or evaluator_results["mgrs_sets"].keys() == expected_sets
+
+
+def test_query_docs_by_mgrs_set_id_acquisition_ts_cycle_indexes__queries_per_chunk():
+    # ARRANGE
+    es_util = FakeEsUtil()
+    mgrs_set_id_acquisition_ts_cycle_indexes = [f"MS_{i % 175}_{i}${i % 30}" for i in range(2500)]
+    for i, mgrs_set_id_acquisition_ts_cycle_index in enumerate(mgrs_set_id_acquisition_ts_cycle_indexes):
+        for burst in range(2):
+            es_util.index_document(index="rtc_catalog-2024.01", id=f"granule_{i}_{burst}", body={
+                "granule_id": f"granule_{i}_{burst}",
+                "mgrs_set_id_acquisition_ts_cycle_index": mgrs_set_id_acquisition_ts_cycle_index
+            })
+    es_util.index_document(index="rtc_catalog-2024.01", id="granule_other", body={
+        "granule_id": "granule_other",
+        "mgrs_set_id_acquisition_ts_cycle_index": "MS_1_1$2"
+    })
+    es_util.requests.clear()
+
+    # ACT
+    es_docs = evaluator.query_docs_by_mgrs_set_id_acquisition_ts_cycle_indexes(
+        es_util, set(reversed(mgrs_set_id_acquisition_ts_cycle_indexes[1:]))
+    )
+
+    # ASSERT
+    assert es_util.requests == {"query": 3}
+    assert all(len(query["query"]["bool"]["must"][0]["terms"]["mgrs_set_id_acquisition_ts_cycle_index.keyword"]) <= 1024
+               for query in es_util.queries)
+    assert sorted(es_doc["_id"] for es_doc in es_docs) == sorted(f"granule_{i}_{burst}" for i in range(1, 2500) for burst in range(2))
+    grouped_indexes = [es_doc["_source"]["mgrs_set_id_acquisition_ts_cycle_index"] for es_doc in es_docs]
+    assert grouped_indexes == sorted(grouped_indexes, key=grouped_indexes.index)
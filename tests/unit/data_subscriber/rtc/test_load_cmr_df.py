@@ -0,0 +1,120 @@
+import logging
+import random
+import re
+import time
+
+import dateutil.parser
+import pandas as pd
+import pytest
+
+from data_subscriber.rtc import evaluator
+from data_subscriber.rtc import mgrs_bursts_collection_db_client as mbc_client
+from data_subscriber.rtc.mgrs_bursts_collection_db_client import MgrsBurstSetIndex
+from rtc_utils import rtc_granule_regex, rtc_relative_orbit_number_regex
+from tests.unit.synthetic_mgrs_burst_db import make_mgrs_burst_db_raw
+
+
+@pytest.fixture(scope="module")
+def mgrs():
+    # NOTE: synthetic burst IDs of orbits over 99 are not valid product burst IDs
+    raw_gdf = make_mgrs_burst_db_raw(num_orbits=99, sets_per_orbit=60)
+    raw_gdf = raw_gdf[raw_gdf["land_ocean_flag"].isin(mbc_client.LAND_OCEAN_FLAGS_LAND)]
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(mbc_client, "get_mgrs_burst_db_parquet_filepath", lambda: mbc_client.Path("/nonexistent.parquet"))
+        monkeypatch.setattr(mbc_client, "load_mgrs_burst_db_raw", lambda filter_land=True: raw_gdf)
+        gdf = mbc_client.load_mgrs_burst_db(filter_land=True)
+    # sets that also cover a burst of the previous orbit, like the sets that cross orbits in the real database
+    for orbit in range(2, 100, 10):
+        previous_orbit_burst_id = min(gdf[gdf["relative_orbit_number"] == orbit - 1]["bursts_parsed"].iloc[0])
+        gdf.at[gdf.index[gdf["relative_orbit_number"] == orbit][0], "bursts_parsed"] |= {previous_orbit_burst_id}
+    return gdf
+
+
+def make_rtc_product_ids(gdf, num_products, burst_ids=None, seed=0):
+    """RTC product IDs of the given bursts, by default bursts of the database"""
+    rng = random.Random(seed)
+    if burst_ids is None:
+        burst_ids = sorted({burst_id for bursts in gdf["bursts_parsed"] for burst_id in bursts})
+    return [
+        f"OPERA_L2_RTC-S1_{mbc_client.mapping_burst_id_to_product_burst_id(rng.choice(burst_ids))}_"
+        f"2024{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}{rng.randint(0, 59):02d}{rng.randint(0, 59):02d}Z_"
+        f"20241231T000000Z_{rng.choice(['S1A', 'S1B'])}_30_v1.0"
+        for _ in range(num_products)
+    ]
+
+
+def load_cmr_df_reference(rtc_product_ids, gdf):
+    """The original per product parse, which scans the database for the relative orbit numbers of each product"""
+    cmr_df_records = []
+    for product_id in rtc_product_ids:
+        match_product_id = re.match(rtc_granule_regex, product_id)
+        acquisition_dts = match_product_id.group("acquisition_ts")
+        burst_id = match_product_id.group("burst_id")
+
+        burst_id_normalized = mbc_client.product_burst_id_to_mapping_burst_id(burst_id)
+        match_burst_id = re.match(rtc_relative_orbit_number_regex, burst_id_normalized)
+        relative_orbit_number = int(match_burst_id.group("relative_orbit_number"))
+        relative_orbit_numbers = mbc_client.burst_id_to_relative_orbit_numbers(gdf, burst_id_normalized)
+
+        cmr_df_records.append({
+            "product_id": product_id,
+            "acquisition_dts": acquisition_dts,
+            "acquisition_dt": dateutil.parser.parse(acquisition_dts),
+            "burst_id": burst_id,
+            "burst_id_normalized": burst_id_normalized,
+            "relative_orbit_number": relative_orbit_number,
+            "relative_orbit_numbers": relative_orbit_numbers,
+            "product_id_short": (burst_id_normalized, acquisition_dts),
+        })
+    cmr_df = pd.DataFrame(cmr_df_records)
+    # NOTE: dateutil parses "Z" as the local timezone where that is UTC
+    cmr_df["acquisition_dt"] = cmr_df["acquisition_dt"].dt.tz_convert("UTC")
+    return cmr_df
+
+
+def test_load_cmr_df__parity_with_reference(mgrs):
+    # ARRANGE
+    index = MgrsBurstSetIndex(mgrs)
+    cross_orbit_burst_ids = sorted(burst_id for burst_id, relative_orbit_numbers in index.burst_id_to_relative_orbit_numbers.items()
+                                   if len(relative_orbit_numbers) > 1)
+    rtc_product_ids = (
+        make_rtc_product_ids(mgrs, num_products=1_000)
+        + make_rtc_product_ids(mgrs, num_products=20, burst_ids=cross_orbit_burst_ids)
+        + make_rtc_product_ids(mgrs, num_products=1, burst_ids=["t099_999999_iw1"])  # a burst that is not in the database
+    )
+
+    # ACT
+    cmr_df = evaluator.load_cmr_df(rtc_product_ids, index)
+
+    # ASSERT
+    expected = load_cmr_df_reference(rtc_product_ids, mgrs)
+    pd.testing.assert_frame_equal(cmr_df, expected)
+    assert any(len(relative_orbit_numbers) == 2 for relative_orbit_numbers in cmr_df["relative_orbit_numbers"])
+    assert any(len(relative_orbit_numbers) == 0 for relative_orbit_numbers in cmr_df["relative_orbit_numbers"])
+
+
+@pytest.mark.benchmark
+def test_benchmark__load_cmr_df_200k_products(mgrs):
+    # ARRANGE
+    rtc_product_ids = make_rtc_product_ids(mgrs, num_products=200_000)
+
+    # ACT
+    start = time.perf_counter()
+    index = MgrsBurstSetIndex(mgrs)
+    index_build_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cmr_df = evaluator.load_cmr_df(rtc_product_ids, index)
+    load_secs = time.perf_counter() - start
+
+    # the reference is too slow to run for 200k products, so time a sample
+    sampled_product_ids = rtc_product_ids[:500]
+    start = time.perf_counter()
+    expected = load_cmr_df_reference(sampled_product_ids, mgrs)
+    reference_secs = (time.perf_counter() - start) * len(rtc_product_ids) / len(sampled_product_ids)
+
+    # ASSERT
+    logging.info(f"{len(rtc_product_ids):,} products: index build {index_build_secs:.2f}s + load {load_secs:.2f}s, "
+                 f"reference (extrapolated) {reference_secs:.1f}s")
+    pd.testing.assert_frame_equal(cmr_df.iloc[:len(sampled_product_ids)], expected)
+    assert index_build_secs + load_secs < reference_secs / 10
@@ -0,0 +1,255 @@
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import boto3
+import pandas as pd
+import pytest
+from moto import mock_aws
+
+from data_subscriber.rtc import mgrs_bursts_collection_db_client as mbc_client
+from data_subscriber.rtc.mgrs_bursts_collection_db_client import MgrsBurstSetIndex
+from tests.unit.synthetic_mgrs_burst_db import make_mgrs_burst_db_raw
+
+
+@pytest.fixture
+def mgrs(monkeypatch):
+    raw_gdf = make_mgrs_burst_db_raw()
+    # a single-burst set, which the proper subset test of burst_id_to_mgrs_set_ids never matches
+    raw_gdf.loc[0, ["bursts", "number_of_bursts", "land_ocean_flag"]] = ["['t001_999999_iw1']", 1, "land"]
+    monkeypatch.setattr(mbc_client, "get_mgrs_burst_db_parquet_filepath", lambda: mbc_client.Path("/nonexistent.parquet"))
+    monkeypatch.setattr(mbc_client, "load_mgrs_burst_db_raw", lambda filter_land=True: raw_gdf[raw_gdf["land_ocean_flag"].isin(["water/land", "land"])] if filter_land else raw_gdf)
+    return mbc_client.load_mgrs_burst_db(filter_land=True)
+
+
+def test_index_parity_with_scan(mgrs):
+    # ARRANGE
+    burst_ids = sorted({burst_id for bursts in mgrs["bursts_parsed"] for burst_id in bursts}) + ["t999_000000_iw1"]
+
+    # ACT
+    index = MgrsBurstSetIndex(mgrs)
+
+    # ASSERT
+    assert index.burst_ids_to_mgrs_set_ids(burst_ids) == [mbc_client.burst_id_to_mgrs_set_ids(mgrs, burst_id) for burst_id in burst_ids]
+    assert any(len(mgrs_set_ids) == 2 for mgrs_set_ids in index.burst_ids_to_mgrs_set_ids(burst_ids))
+    assert index.burst_ids_to_mgrs_set_ids(["t001_999999_iw1"]) == [[]]
+
+    for mgrs_set_id in mgrs["mgrs_set_id"]:
+        assert index.number_of_bursts[mgrs_set_id] == mgrs[mgrs["mgrs_set_id"] == mgrs_set_id].iloc[0]["number_of_bursts"]
+        assert mgrs.iloc[index.mgrs_set_id_to_row[mgrs_set_id]]["mgrs_set_id"] == mgrs_set_id
+
+
+def test_index_relative_orbit_numbers_parity(mgrs):
+    # ARRANGE
+    # a set of orbit 2 that also covers a burst of orbit 1, like the sets that cross orbits in the real database
+    orbit_1_burst_id = min(mgrs[(mgrs["relative_orbit_number"] == 1) & (mgrs["bursts_parsed"].map(len) > 1)]["bursts_parsed"].iloc[0])
+    mgrs.at[mgrs.index[mgrs["relative_orbit_number"] == 2][0], "bursts_parsed"] |= {orbit_1_burst_id}
+    burst_ids = sorted({burst_id for bursts in mgrs["bursts_parsed"] for burst_id in bursts}) + ["t999_000000_iw1"]
+
+    # ACT
+    index = MgrsBurstSetIndex(mgrs)
+
+    # ASSERT
+    assert index.burst_ids_to_relative_orbit_numbers(burst_ids) == [mbc_client.burst_id_to_relative_orbit_numbers(mgrs, burst_id) for burst_id in burst_ids]
+    assert index.burst_ids_to_relative_orbit_numbers([orbit_1_burst_id]) == [[1, 2]]
+    assert index.burst_ids_to_relative_orbit_numbers(["t999_000000_iw1"]) == [[]]
+
+
+def test_index_bounding_box_parity(mgrs):
+    # ARRANGE
+    index = MgrsBurstSetIndex(mgrs)
+
+    for mgrs_set_id in mgrs["mgrs_set_id"].sample(50, random_state=0):
+        # ACT
+        bounding_box = index.get_bounding_box(mgrs_set_id)
+
+        # ASSERT
+        assert bounding_box == pytest.approx(mbc_client.get_bounding_box_for_mgrs_set_id(mgrs, mgrs_set_id))
+
+    with pytest.raises(Exception):
+        index.get_bounding_box("MS_0_0")
+
+
+@pytest.mark.benchmark
+def test_benchmark__batch_lookup_of_100k_granules(mgrs):
+    # ARRANGE
+    rng = random.Random(0)
+    all_burst_ids = sorted({burst_id for bursts in mgrs["bursts_parsed"] for burst_id in bursts})
+    burst_ids = [rng.choice(all_burst_ids) for _ in range(100_000)]
+
+    # ACT
+    start = time.perf_counter()
+    index = MgrsBurstSetIndex(mgrs)
+    index_build_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = index.burst_ids_to_mgrs_set_ids(burst_ids)
+    index_lookup_secs = time.perf_counter() - start
+
+    # the scan is too slow to run 100k times, so time a sample
+    sampled_burst_ids = burst_ids[:200]
+    start = time.perf_counter()
+    sampled_results = [mbc_client.burst_id_to_mgrs_set_ids(mgrs, burst_id) for burst_id in sampled_burst_ids]
+    scan_secs = (time.perf_counter() - start) * len(burst_ids) / len(sampled_burst_ids)
+
+    # ASSERT
+    logging.info(f"{len(burst_ids):,} granules: index build {index_build_secs:.3f}s + lookups {index_lookup_secs:.3f}s, "
+                 f"scan (extrapolated) {scan_secs:.1f}s")
+    assert results[:len(sampled_burst_ids)] == sampled_results
+    assert index_build_secs + index_lookup_secs < scan_secs / 10
+
+
+@pytest.fixture
+def mgrs_db_files(tmp_path, monkeypatch):
+    """A real-shaped synthetic MGRS Tile Collection Database (SQLite), and its columnar copy"""
+    raw_gdf = make_mgrs_burst_db_raw(num_orbits=175, sets_per_orbit=200)
+    db_filepath = tmp_path / "MGRS_tile_collection.sqlite"
+    raw_gdf.to_file(db_filepath, driver="GPKG")
+    monkeypatch.setenv("MGRS_TILE_COLLECTION_DB_FILEPATH", str(db_filepath))
+    parquet_filepath = mbc_client.get_mgrs_burst_db_parquet_filepath()
+    mbc_client.convert_mgrs_burst_db_to_parquet(db_filepath, parquet_filepath)
+    return db_filepath, parquet_filepath
+
+
+@pytest.mark.parametrize("filter_land", [True, False])
+def test_load_mgrs_burst_db_parquet__parity_with_sqlite(mgrs_db_files, filter_land):
+    # ARRANGE
+    db_filepath, parquet_filepath = mgrs_db_files
+    os.rename(parquet_filepath, f"{parquet_filepath}.bak")
+    expected = mbc_client.load_mgrs_burst_db(filter_land)
+    os.rename(f"{parquet_filepath}.bak", parquet_filepath)
+
+    # ACT
+    actual = mbc_client.load_mgrs_burst_db(filter_land)
+
+    # ASSERT
+    assert 0 < len(actual) < 175 * 200 if filter_land else len(actual) == 175 * 200
+    assert list(actual.columns) == list(expected.columns)
+    assert actual.crs == expected.crs
+    assert actual.geometry.name == expected.geometry.name
+    assert actual.geometry.geom_equals_exact(expected.geometry, tolerance=0).all()
+    pd.testing.assert_frame_equal(pd.DataFrame(actual.drop(columns="geometry")), pd.DataFrame(expected.drop(columns="geometry")))
+
+
+def test_load_mgrs_burst_db__when_sqlite_updated__then_parquet_rebuilt(mgrs_db_files):
+    # ARRANGE
+    db_filepath, stale_parquet_filepath = mgrs_db_files
+    make_mgrs_burst_db_raw(num_orbits=2, sets_per_orbit=10).to_file(db_filepath, driver="GPKG")
+
+    # ACT
+    loaded_from_sqlite = mbc_client.load_mgrs_burst_db(filter_land=False)
+    parquet_filepath = mbc_client.get_mgrs_burst_db_parquet_filepath()
+    loaded_from_parquet = mbc_client.load_mgrs_burst_db(filter_land=False)
+
+    # ASSERT
+    assert parquet_filepath != stale_parquet_filepath
+    assert not stale_parquet_filepath.exists()
+    assert list(db_filepath.parent.glob("*.parquet")) == [parquet_filepath]
+    assert len(loaded_from_sqlite) == len(loaded_from_parquet) == 2 * 10
+
+
+def test_get_mgrs_burst_db_parquet_filepath__when_sqlite_modified__then_renamed(mgrs_db_files):
+    # ARRANGE
+    db_filepath, parquet_filepath = mgrs_db_files
+    stat = os.stat(db_filepath)
+
+    # ACT
+    unmodified_parquet_filepath = mbc_client.get_mgrs_burst_db_parquet_filepath()
+    os.utime(db_filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    modified_parquet_filepath = mbc_client.get_mgrs_burst_db_parquet_filepath()
+
+    # ASSERT
+    assert unmodified_parquet_filepath == parquet_filepath
+    assert modified_parquet_filepath != parquet_filepath
+    assert modified_parquet_filepath.name == f"{db_filepath.stem}.{stat.st_size}-{stat.st_mtime_ns + 1}.v{mbc_client.MGRS_BURST_DB_PARQUET_VERSION}.parquet"
+
+
+def test_load_mgrs_burst_db__when_parquet_version_changed__then_parquet_rebuilt(mgrs_db_files, monkeypatch):
+    # ARRANGE
+    db_filepath, stale_parquet_filepath = mgrs_db_files
+    monkeypatch.setattr(mbc_client, "MGRS_BURST_DB_PARQUET_VERSION", mbc_client.MGRS_BURST_DB_PARQUET_VERSION + 1)
+    monkeypatch.setattr(mbc_client, "load_mgrs_burst_db_parquet", lambda *args: pytest.fail("loaded a stale copy"))
+
+    # ACT
+    gdf = mbc_client.load_mgrs_burst_db(filter_land=False)
+
+    # ASSERT
+    assert len(gdf) == 175 * 200
+    assert mbc_client.get_mgrs_burst_db_parquet_filepath().exists()
+    assert not stale_parquet_filepath.exists()
+
+
+def test_load_mgrs_burst_db__when_s3__then_converted_once_per_etag(tmp_path, monkeypatch):
+    # ARRANGE
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-west-2")
+    monkeypatch.setenv("MGRS_TILE_COLLECTION_DB_FILEPATH", str(tmp_path / "cache" / "MGRS_tile_collection.sqlite"))
+    monkeypatch.chdir(tmp_path)
+
+    def put_db(num_orbits):
+        make_mgrs_burst_db_raw(num_orbits=num_orbits, sets_per_orbit=10).to_file(tmp_path / "upload.sqlite", driver="GPKG")
+        s3_object.upload_file(str(tmp_path / "upload.sqlite"))
+
+    with mock_aws():
+        s3 = boto3.resource("s3")
+        s3.create_bucket(Bucket="opera-ancillaries", CreateBucketConfiguration={"LocationConstraint": "us-west-2"})
+        s3_object = s3.Object("opera-ancillaries", "mgrs_tiles/MGRS_tile_collection.sqlite")
+        monkeypatch.setattr(mbc_client, "get_mgrs_burst_db_s3_object", lambda: s3.Object(s3_object.bucket_name, s3_object.key))
+        requests = Counter()
+        s3.meta.client.meta.events.register("before-call.s3", lambda model, **kwargs: requests.update([model.name]))
+
+        # ACT
+        put_db(num_orbits=2)
+        requests.clear()
+        first_gdf = mbc_client.load_mgrs_burst_db(filter_land=False)
+        second_gdf = mbc_client.load_mgrs_burst_db(filter_land=False)
+        requests_before_update = requests.copy()
+
+        put_db(num_orbits=3)
+        requests.clear()
+        third_gdf = mbc_client.load_mgrs_burst_db(filter_land=False)
+
+    # ASSERT
+    assert requests_before_update["GetObject"] == 1
+    assert len(first_gdf) == len(second_gdf) == 2 * 10
+    assert requests["GetObject"] == 1
+    assert len(third_gdf) == 3 * 10
+    assert len(list((tmp_path / "cache").glob("*.parquet"))) == 1
+
+
+LOAD_SCRIPT = """
+import json, re, sys, time
+start = time.perf_counter()
+from data_subscriber.rtc import mgrs_bursts_collection_db_client as mbc_client
+gdf = mbc_client.load_mgrs_burst_db(filter_land=True)
+print(json.dumps({"secs": time.perf_counter() - start, "max_rss_mb": int(re.search(r"VmHWM:\\s+(\\d+)", open("/proc/self/status").read()).group(1)) / 1024}))
+"""
+
+
+@pytest.mark.benchmark
+def test_benchmark__cold_start_load(mgrs_db_files):
+    # ARRANGE
+    db_filepath, parquet_filepath = mgrs_db_files
+
+    def cold_start_load():
+        """Loads the database in a new process, returning the load time and peak RSS"""
+        result = subprocess.run([sys.executable, "-c", LOAD_SCRIPT], capture_output=True, text=True, check=True,
+                                env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)})
+        return json.loads(result.stdout.splitlines()[-1])
+
+    # ACT
+    parquet = cold_start_load()
+    os.remove(parquet_filepath)
+    sqlite = cold_start_load()
+
+    # ASSERT
+    logging.info(f"{175 * 200:,} burst sets, cold start: "
+                 f"SQLite {sqlite['secs']:.2f}s (peak RSS {sqlite['max_rss_mb']:.0f} MB), "
+                 f"Parquet {parquet['secs']:.2f}s (peak RSS {parquet['max_rss_mb']:.0f} MB)")
+    assert parquet["secs"] < sqlite["secs"]
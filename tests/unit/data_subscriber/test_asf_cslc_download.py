@@ -0,0 +1,258 @@
+import logging
+import threading
+import time
+from argparse import Namespace
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from moto import mock_aws
+
+from data_subscriber import asf_cslc_download, ionosphere_download
+from data_subscriber.asf_cslc_download import AsfDaacCslcDownload
+from data_subscriber.cmr import Provider
+from data_subscriber.cslc_utils import parse_cslc_burst_id
+from data_subscriber.download import BaseDownload
+from util import aws_util
+from util.aws_util import S3ClientPool, get_s3_client
+
+ASF_BUCKET = "asf-cumulus-prod-opera-products"
+DATASET_BUCKET = "test-dataset-bucket"
+FRAME_ID = 11115
+NUM_BATCHES = 30
+NUM_BURSTS = 27
+NUM_COMPRESSED_CSLCS = 3
+LATENCY_SECS = 0.005
+"""The simulated latency of each S3 request"""
+ANCILLARY_LATENCY_SECS = 0.05
+"""The simulated latency of each CSLC static layer query and ionosphere file download"""
+
+
+def acquisition_date(acq_cycle_index):
+    return datetime(2024, 1, 1, 1, 14, 35) + timedelta(days=12 * (acq_cycle_index - 100))
+
+
+def cslc_s3path(burst_number, acq_cycle_index):
+    burst_id = f"T042-{88000 + burst_number:06d}-IW{burst_number % 3 + 1}"
+    acq_dt = acquisition_date(acq_cycle_index)
+    native_id = f"OPERA_L2_CSLC-S1_{burst_id}_{acq_dt:%Y%m%dT%H%M%S}Z_{acq_dt + timedelta(days=1):%Y%m%dT%H%M%S}Z_S1A_VV_v1.0"
+    return f"s3://{ASF_BUCKET}/OPERA_L2_CSLC-S1/{native_id}/{native_id}.h5"
+
+
+class FakeCslcCatalog:
+    """Serves the CSLC files of each batch, recording the files marked as downloaded"""
+
+    def __init__(self):
+        self.es_util = None
+        self.marked_downloaded = []
+
+    def get_download_granule_revision(self, batch_id):
+        acq_cycle_index = int(batch_id.split("_a")[1])
+        return [{"s3_url": cslc_s3path(burst_number, acq_cycle_index)} for burst_number in range(NUM_BURSTS)]
+
+    def get_k_and_m(self, batch_id):
+        return NUM_BATCHES, NUM_COMPRESSED_CSLCS
+
+    def mark_product_as_downloaded(self, unique_id, job_id, filesize=None):
+        self.marked_downloaded.append((unique_id, filesize))
+
+
+class FakeCSLCDependency:
+    """Returns compressed CSLCs referencing the acquisition dates of the oldest batches"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get_dependent_compressed_cslcs(self, frame_id, day_index, eu):
+        return [{"_source": {"metadata": {"product_s3_paths": [cslc_s3path(0, 100 + i).replace("CSLC-S1", "COMPRESSED-CSLC-S1")]}}}
+                for i in range(NUM_COMPRESSED_CSLCS)]
+
+    def determine_k_cycle(self, acquisition_dts, day_index, frame_number):
+        return 1
+
+
+class FakeAncillaries:
+    """Serves CSLC static layer queries and ionosphere file downloads, counting each fetch"""
+
+    def __init__(self):
+        self.static_layer_queries = []
+        self.ionosphere_downloads = Counter()
+        self._lock = threading.Lock()
+
+    def query_cslc_static_files_for_cslc_batch(self, cslc_files, args, token, job_id, settings):
+        time.sleep(ANCILLARY_LATENCY_SECS)
+        burst_ids = [parse_cslc_burst_id(cslc_file.stem) for cslc_file in cslc_files]
+        with self._lock:
+            self.static_layer_queries.append(burst_ids)
+        return [{"filtered_urls": [f"s3://{ASF_BUCKET}/OPERA_L2_CSLC-S1-STATIC/{burst_id}.h5"]} for burst_id in burst_ids]
+
+    def download_ionosphere_correction_file(self, dataset_dir, product_filepath):
+        time.sleep(ANCILLARY_LATENCY_SECS)
+        acq_date = product_filepath.split("_")[4].split("T")[0]
+        with self._lock:
+            self.ionosphere_downloads[acq_date] += 1
+        ionosphere_filepath = Path(dataset_dir) / f"jplg{acq_date}.24i"
+        ionosphere_filepath.write_text(acq_date)
+        return ionosphere_filepath
+
+
+@pytest.fixture
+def s3_requests(monkeypatch):
+    """Mocked S3 buckets holding the CSLC files of each batch. Counts the S3 requests made, each taking LATENCY_SECS."""
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-west-2")
+    monkeypatch.setattr(aws_util, "s3_client_pool", S3ClientPool())
+
+    with mock_aws():
+        s3_client = get_s3_client()
+        for bucket in (ASF_BUCKET, DATASET_BUCKET):
+            s3_client.create_bucket(Bucket=bucket, CreateBucketConfiguration={"LocationConstraint": "us-west-2"})
+        for acq_cycle_index in range(100, 100 + NUM_BATCHES):
+            for burst_number in range(NUM_BURSTS):
+                s3_client.put_object(Bucket=ASF_BUCKET, Key=cslc_s3path(burst_number, acq_cycle_index).split(f"{ASF_BUCKET}/")[1],
+                                     Body=b"cslc")
+
+        requests = Counter()
+
+        def count_request(model, **kwargs):
+            requests[model.name] += 1
+            time.sleep(LATENCY_SECS)
+
+        s3_client.meta.events.register("before-call.s3", count_request)
+        yield requests
+
+
+@pytest.fixture
+def cslc_download(s3_requests, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(asf_cslc_download, "localize_disp_frame_burst_hist", lambda: ({}, {}, {}))
+    monkeypatch.setattr(asf_cslc_download, "localize_frame_geo_json", lambda: {FRAME_ID: [-120, 35, -119, 36]})
+    monkeypatch.setattr(asf_cslc_download, "localize_disp_blackout_dates", lambda: None)
+    monkeypatch.setattr(asf_cslc_download, "DispS1BlackoutDates", lambda *args: None)
+    monkeypatch.setattr(asf_cslc_download, "CSLCDependency", FakeCSLCDependency)
+    monkeypatch.setattr(asf_cslc_download, "parse_cslc_native_id",
+                        lambda native_id, *args: (parse_cslc_burst_id(native_id), None, None, None))
+    monkeypatch.setattr(asf_cslc_download, "SettingsConf",
+                        lambda: SimpleNamespace(cfg={"DATASET_BUCKET": DATASET_BUCKET, "RELEASE_VERSION": "test"}))
+
+    es_conn = FakeCslcCatalog()
+    monkeypatch.setattr(asf_cslc_download, "KCSLCProductCatalog", lambda logger: es_conn)
+
+    ancillaries = FakeAncillaries()
+    monkeypatch.setattr(ionosphere_download, "download_ionosphere_correction_file",
+                        ancillaries.download_ionosphere_correction_file)
+
+    submitted_products = []
+    monkeypatch.setattr(asf_cslc_download, "try_submit_mozart_job",
+                        lambda product, **kwargs: submitted_products.append(product) or "job-1")
+
+    download = AsfDaacCslcDownload(Provider.ASF_CSLC)
+    monkeypatch.setattr(download, "query_cslc_static_files_for_cslc_batch",
+                        ancillaries.query_cslc_static_files_for_cslc_batch)
+
+    return SimpleNamespace(download=download, es_conn=es_conn, ancillaries=ancillaries, submitted_products=submitted_products)
+
+
+def run_disp_s1_download(cslc_download):
+    args = Namespace(batch_ids=[f"f{FRAME_ID}_a{100 + i}" for i in range(NUM_BATCHES)], transfer_protocol="s3",
+                     proc_mode="forward", dry_run=False, smoke_run=False, endpoint="OPS")
+    return cslc_download.download.run_download(args, "token", cslc_download.es_conn, "netloc", "username", "password",
+                                               "cmr.test", "job_id")
+
+
+def test_run_download__when_s3__then_files_checked_once_and_ancillaries_fetched_once(cslc_download, s3_requests):
+    # ACT
+    run_disp_s1_download(cslc_download)
+
+    # ASSERT
+    ancillaries = cslc_download.ancillaries
+    assert len(ancillaries.static_layer_queries) == 1
+    assert sorted(ancillaries.static_layer_queries[0]) == sorted({parse_cslc_burst_id(Path(cslc_s3path(b, 100)).stem)
+                                                                  for b in range(NUM_BURSTS)})
+    # the compressed CSLCs reference dates already covered by the batches
+    assert len(ancillaries.ionosphere_downloads) == NUM_BATCHES
+    assert set(ancillaries.ionosphere_downloads.values()) == {1}
+
+    assert s3_requests == {"HeadObject": NUM_BATCHES * NUM_BURSTS, "PutObject": NUM_BATCHES}
+
+    product_paths = cslc_download.submitted_products[0]["_source"]["metadata"]["product_paths"]
+    assert len(product_paths["L2_CSLC_S1"]) == NUM_BATCHES * NUM_BURSTS
+    assert len(product_paths["L2_CSLC_S1_STATIC"]) == NUM_BURSTS
+    assert len(product_paths["IONOSPHERE_TEC"]) == NUM_BATCHES
+    assert len(cslc_download.es_conn.marked_downloaded) == NUM_BATCHES * NUM_BURSTS
+    assert {filesize for _, filesize in cslc_download.es_conn.marked_downloaded} == {len(b"cslc")}
+
+
+def test_run_download__when_s3_object_missing__then_raises(cslc_download):
+    # ARRANGE
+    get_s3_client().delete_object(Bucket=ASF_BUCKET, Key=cslc_s3path(5, 110).split(f"{ASF_BUCKET}/")[1])
+
+    # ACT & ASSERT
+    with pytest.raises(Exception):
+        run_disp_s1_download(cslc_download)
+
+
+def test_run_download__when_https__then_each_batch_removed_after_upload(cslc_download, s3_requests, tmp_path,
+                                                                        monkeypatch):
+    # ARRANGE
+    local_files_per_download = []
+
+    def download_batch(self, args, token, es_conn, netloc, username, password, cmr, job_id, rm_downloads_dir=True):
+        local_files_per_download.append(len(list(tmp_path.glob("*.h5"))))
+        acq_cycle_index = int(args.batch_ids[0].split("_a")[1])
+        products_to_filepaths = {}
+        for burst_number in range(NUM_BURSTS):
+            filepath = tmp_path / Path(cslc_s3path(burst_number, acq_cycle_index)).name
+            filepath.write_bytes(b"cslc")
+            products_to_filepaths[filepath.name] = {filepath}
+        return products_to_filepaths
+
+    monkeypatch.setattr(BaseDownload, "run_download", download_batch)
+    monkeypatch.setattr(cslc_download.download, "download_cslc_static_files_for_cslc_batch",
+                        lambda cslc_static_granules, *args: {})
+
+    args = Namespace(batch_ids=[f"f{FRAME_ID}_a{100 + i}" for i in range(NUM_BATCHES)], transfer_protocol="https",
+                     proc_mode="forward", dry_run=False, smoke_run=False, endpoint="OPS")
+
+    # ACT
+    cslc_download.download.run_download(args, "token", cslc_download.es_conn, "netloc", "username", "password",
+                                        "cmr.test", "job_id")
+
+    # ASSERT
+    assert local_files_per_download == [0] * NUM_BATCHES
+    assert not list(tmp_path.glob("*.h5"))
+    assert s3_requests["PutObject"] == NUM_BATCHES * NUM_BURSTS + NUM_BATCHES
+    assert len(cslc_download.es_conn.marked_downloaded) == NUM_BATCHES * NUM_BURSTS
+    assert {filesize for _, filesize in cslc_download.es_conn.marked_downloaded} == {len(b"cslc")}
+
+
+@pytest.mark.benchmark
+def test_benchmark__run_download_30_batches(cslc_download, s3_requests):
+    # ACT
+    start = time.perf_counter()
+    run_disp_s1_download(cslc_download)
+    three_phase_secs = time.perf_counter() - start
+    three_phase_s3_requests = sum(s3_requests.values())
+
+    # one batch at a time: a HEAD request per file in sequence, a static layer query and an ionosphere download
+    # and upload per batch, then an ionosphere download and upload per compressed CSLC. HEAD requests are sampled.
+    s3_client = get_s3_client()
+    num_sampled = NUM_BURSTS
+    start = time.perf_counter()
+    for burst_number in range(num_sampled):
+        s3_client.head_object(Bucket=ASF_BUCKET, Key=cslc_s3path(burst_number, 100).split(f"{ASF_BUCKET}/")[1])
+    head_secs = (time.perf_counter() - start) * NUM_BATCHES * NUM_BURSTS / num_sampled
+    num_ancillary_fetches = NUM_BATCHES + (NUM_BATCHES + NUM_COMPRESSED_CSLCS)
+    sequential_secs = head_secs + num_ancillary_fetches * ANCILLARY_LATENCY_SECS \
+                      + (NUM_BATCHES + NUM_COMPRESSED_CSLCS) * LATENCY_SECS
+    sequential_s3_requests = NUM_BATCHES * NUM_BURSTS + NUM_BATCHES + NUM_COMPRESSED_CSLCS
+
+    logging.info(f"Three phases: {three_phase_secs:.2f}s, S3 requests: {three_phase_s3_requests}")
+    logging.info(f"Sequential (estimated): {sequential_secs:.2f}s, S3 requests: {sequential_s3_requests}")
+
+    # ASSERT
+    assert three_phase_s3_requests < sequential_s3_requests
+    assert three_phase_secs < sequential_secs / 2
@@ -0,0 +1,239 @@
+import json
+import logging
+import os
+import threading
+import time
+from argparse import Namespace
+from collections import namedtuple
+from pathlib import Path, PurePath
+
+import pytest
+
+from data_subscriber import asf_slc_download, ionosphere_download
+from data_subscriber.asf_slc_download import AsfDaacSlcDownload
+from data_subscriber.cmr import Provider
+from data_subscriber.url import _slc_url_to_chunk_id, form_batch_id
+from tools import stage_orbit_file
+
+NUM_SLCS = 6
+DOWNLOAD_SECS = 0.1
+"""The simulated transfer time of each SLC archive"""
+EXTRACT_SECS = 0.08
+"""The simulated extraction time of each SLC archive"""
+ANCILLARY_SECS = 0.05
+"""The simulated time to fetch each Orbit or Ionosphere file"""
+
+Interval = namedtuple("Interval", ["stage", "granule", "start", "end"])
+
+
+def granule_name(slc_number):
+    return f"S1A_IW_SLC__1SDV_202401{slc_number + 1:02d}T011435_202401{slc_number + 1:02d}T011502_052027_064A3F_AB{slc_number:02d}"
+
+
+def slc_downloads():
+    return [{"id": f"{granule_name(i)}-SLC", "revision_id": 1, "processing_mode": "historical",
+             "s3_url": f"s3://asf-bucket/SA/{granule_name(i)}.zip"}
+            for i in range(NUM_SLCS)]
+
+
+class Timeline:
+    """Records when each stage of each granule ran"""
+
+    def __init__(self):
+        self.intervals = []
+        self._lock = threading.Lock()
+
+    def run(self, stage, granule, secs):
+        start = time.perf_counter()
+        time.sleep(secs)
+        with self._lock:
+            self.intervals.append(Interval(stage, granule, start, time.perf_counter()))
+
+    def interval(self, stage, granule):
+        interval, = [interval for interval in self.intervals if (interval.stage, interval.granule) == (stage, granule)]
+        return interval
+
+
+def overlap(interval, other):
+    return interval.start < other.end and other.start < interval.end
+
+
+class FakeSlcCatalog:
+    def __init__(self):
+        self.marked_downloaded = []
+
+    def mark_product_as_downloaded(self, unique_id, job_id):
+        self.marked_downloaded.append(unique_id)
+
+
+@pytest.fixture
+def fake_stages(monkeypatch):
+    """Simulates the SLC transfers, extractions and Orbit and Ionosphere file fetches, recording when each ran"""
+    timeline = Timeline()
+
+    def download_product_using_s3(self, url, token, target_dirpath, args):
+        name = PurePath(url).stem
+        timeline.run("download", name, DOWNLOAD_SECS)
+        product_filepath = target_dirpath / PurePath(url).name
+        product_filepath.write_text(f"slc {name}")
+        return product_filepath
+
+    def extract_one_to_one(self, product, settings_cfg, working_dir, extra_metadata=None, name_postscript=''):
+        name = product.stem
+        timeline.run("extract", name, EXTRACT_SECS)
+        dataset_dir = working_dir / name
+        dataset_dir.mkdir()
+        (dataset_dir / f"{name}.tiff").write_text(product.read_text())
+        (dataset_dir / f"{name}{name_postscript}.met.json").write_text(json.dumps({"ProductType": "SLC", **extra_metadata}))
+        (dataset_dir / f"{name}{name_postscript}.dataset.json").write_text(json.dumps({"version": "v1"}))
+        return PurePath(dataset_dir)
+
+    def stage_orbit_file_main(args):
+        name = PurePath(args.input_safe_file).stem
+        timeline.run("orbit", name, ANCILLARY_SECS)
+        Path(args.output_directory, f"S1A_OPER_AUX_{args.orbit_type}_{name[17:32]}.EOF").write_text(f"orbit {name}")
+
+    def download_ionosphere_correction_file(dataset_dir, product_filepath):
+        name = PurePath(product_filepath).stem
+        timeline.run("ionosphere", name, ANCILLARY_SECS)
+        ionosphere_filepath = Path(dataset_dir, f"jplg{name[17:25]}.24i")
+        ionosphere_filepath.write_text(f"ionosphere {name}")
+        return PurePath(ionosphere_filepath)
+
+    monkeypatch.setattr(AsfDaacSlcDownload, "download_product_using_s3", download_product_using_s3)
+    monkeypatch.setattr(AsfDaacSlcDownload, "extract_one_to_one", extract_one_to_one)
+    monkeypatch.setattr(AsfDaacSlcDownload, "get_dataspace_login", lambda self: ("user", "pass"))
+    monkeypatch.setattr(stage_orbit_file, "main", stage_orbit_file_main)
+    monkeypatch.setattr(ionosphere_download, "download_ionosphere_correction_file", download_ionosphere_correction_file)
+    monkeypatch.setattr(ionosphere_download, "get_ionosphere_correction_file_url",
+                        lambda dataset_dir, product_filepath: f"https://ionex.test/{PurePath(product_filepath).stem}")
+
+    return timeline
+
+
+def perform_download_one_at_a_time(slc_download, es_conn, downloads):
+    """Processes each SLC strictly in sequence, as perform_download did before it was pipelined"""
+    for download in downloads:
+        product_url = download["s3_url"]
+        product_download_dir = slc_download.downloads_dir / _slc_url_to_chunk_id(product_url, str(download["revision_id"]))
+        product_download_dir.mkdir(exist_ok=True)
+        product_filepath = slc_download.download_product_using_s3(product_url, "token", product_download_dir.resolve(), None)
+        es_conn.mark_product_as_downloaded(download["id"], "job_id")
+
+        dataset_dir = slc_download.extract_one_to_one(product_filepath, slc_download.cfg, working_dir=Path.cwd(),
+                                                      extra_metadata={"processing_mode": download["processing_mode"]},
+                                                      name_postscript="-r1")
+        slc_download.update_pending_dataset_with_index_name(dataset_dir, "-r1")
+        new_dataset_dir = dataset_dir.parent / form_batch_id(dataset_dir.name, "1")
+        os.rename(str(dataset_dir), str(new_dataset_dir))
+
+        slc_download.download_orbit_file(new_dataset_dir, product_filepath)
+        slc_download.check_for_empty_orbit_files(new_dataset_dir)
+        slc_download.download_ionosphere_file(new_dataset_dir, product_filepath)
+        product_filepath.unlink()
+
+
+def run_download(working_dir, monkeypatch, pipelined=True):
+    """Downloads the SLCs within working_dir, returning the contents of the resulting datasets"""
+    working_dir.mkdir()
+    monkeypatch.chdir(working_dir)
+    slc_download = AsfDaacSlcDownload(Provider.ASF)
+    es_conn = FakeSlcCatalog()
+
+    if pipelined:
+        args = Namespace(transfer_protocol="s3", dry_run=False)
+        slc_download.perform_download(None, es_conn, slc_downloads(), args, "token", "job_id")
+    else:
+        perform_download_one_at_a_time(slc_download, es_conn, slc_downloads())
+
+    assert es_conn.marked_downloaded == [download["id"] for download in slc_downloads()]
+    assert not list(slc_download.downloads_dir.glob("*/*")), "SLC archives and ancillary files are left behind"
+
+    datasets = {}
+    for dataset_dir in sorted(path for path in working_dir.iterdir() if path.name != "downloads"):
+        for filepath in sorted(dataset_dir.iterdir()):
+            contents = json.loads(filepath.read_text()) if filepath.suffix == ".json" else filepath.read_text()
+            if isinstance(contents, dict) and "ionosphere" in contents:
+                for run_specific_key in ("job_id", "download_datetime", "FileLocation"):
+                    contents["ionosphere"].pop(run_specific_key)
+            datasets[f"{dataset_dir.name}/{filepath.name}"] = contents
+    return datasets
+
+
+def test_perform_download__then_datasets_identical_to_sequential(fake_stages, tmp_path, monkeypatch):
+    # ARRANGE
+    sequential_datasets = run_download(tmp_path / "sequential", monkeypatch, pipelined=False)
+
+    # ACT
+    pipelined_datasets = run_download(tmp_path / "pipelined", monkeypatch)
+
+    # ASSERT
+    assert pipelined_datasets == sequential_datasets
+    assert len(pipelined_datasets) == NUM_SLCS * 6
+    assert pipelined_datasets[f"{granule_name(0)}-r1/{granule_name(0)}-r1.met.json"]["ionosphere"] == {
+        "source_url": f"https://ionex.test/{granule_name(0)}",
+        "s3_url": f"s3://.../.../jplg{granule_name(0)[17:25]}.24i",
+        "FileSize": len(f"ionosphere {granule_name(0)}"),
+        "FileName": f"jplg{granule_name(0)[17:25]}.24i"
+    }
+
+
+def test_perform_download__then_ancillaries_and_extraction_overlap_downloads(fake_stages, tmp_path, monkeypatch):
+    # ACT
+    run_download(tmp_path / "pipelined", monkeypatch)
+
+    # ASSERT
+    timeline = fake_stages
+    for i in range(NUM_SLCS):
+        assert overlap(timeline.interval("orbit", granule_name(i)), timeline.interval("download", granule_name(i)))
+    for i in range(NUM_SLCS - 1):
+        assert overlap(timeline.interval("extract", granule_name(i)), timeline.interval("download", granule_name(i + 1)))
+
+    # at most one extraction pending while the next SLC downloads
+    for i in range(NUM_SLCS - 2):
+        assert timeline.interval("extract", granule_name(i)).end <= timeline.interval("download", granule_name(i + 2)).start
+
+
+def test_perform_download__when_low_disk_space__then_extraction_completes_before_next_download(fake_stages, tmp_path,
+                                                                                                 monkeypatch):
+    # ARRANGE
+    monkeypatch.setattr(asf_slc_download.shutil, "disk_usage",
+                        lambda path: Namespace(total=100, used=100, free=0))
+
+    # ACT
+    run_download(tmp_path / "pipelined", monkeypatch)
+
+    # ASSERT
+    timeline = fake_stages
+    for i in range(NUM_SLCS - 1):
+        assert timeline.interval("extract", granule_name(i)).end <= timeline.interval("download", granule_name(i + 1)).start
+
+
+def test_perform_download__when_empty_orbit_file__then_raises(fake_stages, tmp_path, monkeypatch):
+    # ARRANGE
+    def stage_empty_orbit_file(args):
+        Path(args.output_directory, "S1A_OPER_AUX_POEORB.EOF").touch()
+
+    monkeypatch.setattr(stage_orbit_file, "main", stage_empty_orbit_file)
+
+    # ACT & ASSERT
+    with pytest.raises(RuntimeError, match="was downloaded but empty"):
+        run_download(tmp_path / "pipelined", monkeypatch)
+
+
+@pytest.mark.benchmark
+def test_benchmark__perform_download_6_slcs(fake_stages, tmp_path, monkeypatch):
+    # ACT
+    start = time.perf_counter()
+    run_download(tmp_path / "pipelined", monkeypatch)
+    pipelined_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    run_download(tmp_path / "sequential", monkeypatch, pipelined=False)
+    sequential_secs = time.perf_counter() - start
+
+    logging.info(f"Pipelined: {pipelined_secs:.2f}s")
+    logging.info(f"One SLC at a time: {sequential_secs:.2f}s")
+
+    # ASSERT
+    assert pipelined_secs < sequential_secs / 1.8
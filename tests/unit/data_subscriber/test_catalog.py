@@ -1,8 +1,11 @@
-
+import json
 from datetime import date, datetime, timedelta
 from unittest import TestCase
 from unittest.mock import patch
 
+import pytest
+
+from data_subscriber.catalog import ProductCatalog
 from data_subscriber.cslc.cslc_catalog import CSLCProductCatalog
 from data_subscriber.cslc.cslc_catalog import CSLCStaticProductCatalog
 from data_subscriber.gcov.gcov_catalog import NisarGcovProductCatalog
@@ -237,6 +240,10 @@ def test_slc_spatial_product_catalog():
 def test_rtc_product_catalog(patch_mgrs_bursts_collection_db_client):
     from tests.unit.conftest import mock_load_mgrs_burst_db_raw
     patch_mgrs_bursts_collection_db_client.cached_load_mgrs_burst_db = mock_load_mgrs_burst_db_raw
+    mgrs = mock_load_mgrs_burst_db_raw(filter_land=True)
+    patch_mgrs_bursts_collection_db_client.cached_load_mgrs_burst_db_index.return_value.number_of_bursts = dict(
+        zip(mgrs["mgrs_set_id"], mgrs["number_of_bursts"])
+    )
 
     """Tests for functionality specific to the RTCProductCatalog class"""
     rtc_product_catalog = RTCProductCatalog()
@@ -311,7 +318,7 @@ def test_rtc_product_catalog(patch_mgrs_bursts_collection_db_client):
         ]
     }
 
-    with patch("elasticsearch.helpers.bulk") as mock_bulk:
+    with patch("elasticsearch.helpers.bulk", return_value=(3, [])) as mock_bulk:
         with patch("tests.unit.conftest.MockIndicesClient.refresh") as mock_refresh:
             with patch("tests.unit.conftest.MockElasticsearchUtility.query"):
                 # Tests for RTCProductCatalog.mark_products_as_download_job_submitted()
@@ -450,3 +457,226 @@ def test_nisar_gcov_product_catalog():
 
     assert granule == "NISAR_L2_PR_GCOV_001_001_A_000_2000_SHNA_A_20240609T045403_20240609T045413_T00777_M_F_J_777.h5"
     assert revision == "86"
+
+
+@pytest.fixture
+def fake_es_util(monkeypatch):
+    from tests.unit.fake_es import FakeEsUtil
+
+    monkeypatch.setattr(ProductCatalog, "BULK_RETRY_DELAY_SECS", 0)
+    return FakeEsUtil()
+
+
+def to_test_url_granule(i):
+    return {
+        "granule_id": f"GRANULE_{i:05d}",
+        "unique_id": f"GRANULE_{i:05d}",
+        "filtered_urls": [f"s3://path/to/GRANULE_{i:05d}.h5", f"https://path/to/GRANULE_{i:05d}.h5"]
+    }
+
+
+@pytest.mark.parametrize("catalog_class", [
+    HLSProductCatalog, SLCProductCatalog, CSLCProductCatalog, CSLCStaticProductCatalog, RTCProductCatalog,
+    NisarGcovProductCatalog
+])
+def test_bulk_upserts__then_requests_scale_with_chunks(catalog_class, fake_es_util):
+    # ARRANGE
+    catalog = catalog_class()
+    catalog.es_util = fake_es_util
+    granules = [to_test_url_granule(i) for i in range(2_500)]
+
+    # ACT
+    with catalog.bulk_upserts():
+        for granule in granules:
+            catalog.process_url(granule["filtered_urls"], granule, "job_id", datetime.now(), datetime.now(),
+                                datetime.now(), revision_id=1)
+
+    # ASSERT
+    assert fake_es_util.requests == {"query": 3, "bulk": 5}  # ceil(2,500 / 1,024) and ceil(2,500 / 500)
+    assert len(fake_es_util.es.docs[catalog.generate_es_index_name()]) == 2_500
+
+
+def test_bulk_upserts__then_settings_read_once(fake_es_util, monkeypatch):
+    # ARRANGE
+    from data_subscriber import catalog as catalog_module
+
+    catalog = HLSProductCatalog()
+    catalog.es_util = fake_es_util
+    granules = [to_test_url_granule(i) for i in range(2_500)]
+    settings_reads = []
+    settings_conf = catalog_module.SettingsConf
+    monkeypatch.setattr(catalog_module, "SettingsConf", lambda: settings_reads.append(1) or settings_conf())
+
+    # ACT
+    with catalog.bulk_upserts():
+        for granule in granules:
+            catalog.process_url(granule["filtered_urls"], granule, "job_id", datetime.now(), datetime.now(),
+                                datetime.now(), revision_id=1)
+
+    # ASSERT
+    assert len(settings_reads) == 1
+    assert len(fake_es_util.es.docs[catalog.generate_es_index_name()]) == 2_500
+
+
+def test_bulk_upserts__when_doc_exists__then_upserted_into_existing_index(fake_es_util):
+    # ARRANGE
+    catalog = HLSProductCatalog()
+    catalog.es_util = fake_es_util
+    granule = to_test_url_granule(1)
+    fake_es_util.index_document(index="hls_catalog-2020.01", id="GRANULE_00001.h5-r1", body={"downloaded": True})
+
+    # ACT
+    with catalog.bulk_upserts():
+        catalog.process_url(granule["filtered_urls"], granule, "job_id", datetime.now(), datetime.now(),
+                            datetime.now(), revision_id=1)
+
+    # ASSERT
+    doc = fake_es_util.es.docs["hls_catalog-2020.01"]["GRANULE_00001.h5-r1"]
+    assert doc["downloaded"] is True
+    assert doc["query_job_id"] == "job_id"
+    assert catalog.generate_es_index_name() not in fake_es_util.es.docs
+
+
+def test_bulk__when_items_fail__then_only_failed_items_retried(fake_es_util):
+    # ARRANGE
+    catalog = HLSProductCatalog()
+    catalog.es_util = fake_es_util
+    docs = [{"id": f"doc_{i}"} for i in range(10)]
+    fake_es_util.es.fail_next.update({"doc_3": 1, "doc_7": 2})
+
+    bulk_bodies = []
+    bulk = fake_es_util.es.bulk
+    fake_es_util.es.bulk = lambda body, *args, **kwargs: bulk_bodies.append(body) or bulk(body, *args, **kwargs)
+
+    # ACT
+    catalog.bulk_upsert_documents(docs)
+
+    # ASSERT
+    assert len(bulk_bodies) == 3
+    assert bulk_bodies[1].count('"update"') == 2
+    assert bulk_bodies[2].count('"update"') == 1
+    assert len(fake_es_util.es.docs[catalog.generate_es_index_name()]) == 10
+
+
+def test_bulk__when_items_keep_failing__then_raises(fake_es_util):
+    # ARRANGE
+    catalog = HLSProductCatalog()
+    catalog.es_util = fake_es_util
+    fake_es_util.es.fail_next.update({"doc_1": catalog.BULK_MAX_RETRIES + 1})
+
+    # ACT/ASSERT
+    with pytest.raises(Exception, match="doc_1"):
+        catalog.bulk_upsert_documents([{"id": "doc_0"}, {"id": "doc_1"}])
+
+
+def test_mark_download_job_ids__then_all_docs_of_each_batch_marked_in_bulk(fake_es_util):
+    # ARRANGE
+    catalog = CSLCProductCatalog()
+    catalog.es_util = fake_es_util
+    for i in range(6):
+        fake_es_util.index_document(index="cslc_catalog-2024.01", id=f"doc_{i}", body={"download_batch_id": f"batch_{i // 2}"})
+    fake_es_util.requests.clear()
+
+    # ACT
+    catalog.mark_download_job_ids({"batch_0": "job_0", "batch_1": "PENDING", "batch_9": "job_9"})
+
+    # ASSERT
+    docs = fake_es_util.es.docs["cslc_catalog-2024.01"]
+    assert [docs[f"doc_{i}"].get("download_job_id") for i in range(6)] == ["job_0", "job_0", "PENDING", "PENDING", None, None]
+    assert fake_es_util.requests == {"query": 1, "bulk": 1, "refresh": 1}
+
+
+def test_process_granules__then_only_new_granules_indexed(fake_es_util):
+    # ARRANGE
+    catalog = HLSSpatialProductCatalog()
+    catalog.es_util = fake_es_util
+    fake_es_util.index_document(index="hls_spatial_catalog-2020.01", id="GRANULE_00001", body={"id": "GRANULE_00001"})
+    granules = [
+        {"granule_id": f"GRANULE_{i:05d}", "provider": "LPCLOUD", "production_datetime": None, "short_name": "HLS",
+         "identifier": f"GRANULE_{i:05d}", "bounding_box": []}
+        for i in range(3)
+    ]
+
+    # ACT
+    catalog.process_granules(granules)
+
+    # ASSERT
+    assert set(fake_es_util.es.docs[catalog.generate_es_index_name()]) == {"GRANULE_00000", "GRANULE_00002"}
+    assert fake_es_util.requests["bulk"] == 1
+
+
+def to_test_rtc_granule_update(i):
+    granule_id = f"OPERA_L2_RTC-S1_T011-{i:06d}-IW1_20231019T111602Z_20231019T214046Z_S1A_30_v1.0"
+    return {
+        "granule": {
+            "granule_id": granule_id,
+            "filtered_urls": [f"s3://path/to/{granule_id}_VV.tif", f"https://path/to/{granule_id}_VV.tif"],
+            "temporal_extent_beginning_datetime": "2023-10-19T11:16:02Z",
+            "revision_date": "2023-10-19T21:40:46Z",
+            "production_datetime": "2023-10-19T21:40:46Z"
+        },
+        "mgrs_set_id_acquisition_ts_cycle_indexes": [f"MS_11_{i % 50}$145", f"MS_11_{i % 50 + 1}$145"],
+        "revision_id": 1
+    }
+
+
+@pytest.mark.parametrize("thread_count", [1, 4])
+def test_bulk_update_granule_index__then_requests_scale_with_chunks_and_rerun_is_idempotent(thread_count, fake_es_util):
+    # ARRANGE
+    catalog = RTCProductCatalog()
+    catalog.es_util = fake_es_util
+    granule_updates = [to_test_rtc_granule_update(i) for i in range(1_250)]
+    query_dt = datetime.now()
+
+    # ACT
+    catalog.bulk_update_granule_index(granule_updates, "job_id", query_dt, chunk_size=500, thread_count=thread_count)
+    first_run_requests = dict(fake_es_util.requests)
+    first_run_docs = {_id: dict(doc) for _id, doc in fake_es_util.es.docs[catalog.generate_es_index_name()].items()}
+
+    fake_es_util.requests.clear()
+    catalog.bulk_update_granule_index(granule_updates, "job_id", query_dt, chunk_size=500, thread_count=thread_count)
+
+    # ASSERT
+    assert first_run_requests == {"query": 3, "bulk": 5}  # ceil(2,500 / 1,024) and ceil(2,500 / 500)
+    assert fake_es_util.requests == {"query": 3, "bulk": 5}
+    assert list(fake_es_util.es.docs) == [catalog.generate_es_index_name()]
+
+    docs = fake_es_util.es.docs[catalog.generate_es_index_name()]
+    assert len(docs) == 2_500
+    for _id, doc in docs.items():
+        assert {k: v for k, v in doc.items() if k != "creation_timestamp"} \
+               == {k: v for k, v in first_run_docs[_id].items() if k != "creation_timestamp"}
+
+
+def test_bulk_update_granule_index__then_same_documents_as_update_granule_index(fake_es_util):
+    # ARRANGE
+    from tests.unit.fake_es import FakeEsUtil
+
+    granule_updates = [to_test_rtc_granule_update(i) for i in range(3)]
+    query_dt = datetime.now()
+
+    catalog = RTCProductCatalog()
+    catalog.es_util = fake_es_util
+    fake_es_util.index_document(index="rtc_catalog-2020.01",
+                                id=f"{granule_updates[0]['granule']['granule_id']}$MS_11_0$145",
+                                body={"id": f"{granule_updates[0]['granule']['granule_id']}$MS_11_0$145", "downloaded": True})
+
+    serial_catalog = RTCProductCatalog()
+    serial_catalog.es_util = FakeEsUtil()
+    serial_catalog.es_util.es.docs = {index: {_id: dict(doc) for _id, doc in index_docs.items()}
+                                      for index, index_docs in fake_es_util.es.docs.items()}
+
+    # ACT
+    catalog.bulk_update_granule_index(granule_updates, "job_id", query_dt)
+    for granule_update in granule_updates:
+        serial_catalog.update_granule_index(job_id="job_id", query_dt=query_dt, **granule_update)
+
+    # ASSERT
+    def without_creation_timestamp(docs):
+        docs = json.loads(json.dumps(docs, default=lambda o: o.isoformat()))  # as serialized by a _bulk request
+        return {index: {_id: {k: v for k, v in doc.items() if k != "creation_timestamp"} for _id, doc in index_docs.items()}
+                for index, index_docs in docs.items()}
+
+    assert without_creation_timestamp(fake_es_util.es.docs) == without_creation_timestamp(serial_catalog.es_util.es.docs)
+    assert fake_es_util.es.docs["rtc_catalog-2020.01"][f"{granule_updates[0]['granule']['granule_id']}$MS_11_0$145"]["downloaded"] is True
+    assert fake_es_util.requests["bulk"] == 1
@@ -0,0 +1,206 @@
+import logging
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from data_subscriber.cslc.cslc_blackout import DispS1BlackoutDates
+from data_subscriber.cslc_utils import sensing_time_day_index
+
+NUM_FRAMES = 20
+NUM_ACQUISITIONS = 300
+"""The number of 12-day acquisition cycles of each frame"""
+
+
+class OneWindowAtATimeBlackoutDates:
+    """DispS1BlackoutDates.is_in_blackout as it was before the blackout windows were indexed"""
+
+    def __init__(self, frame_blackout_dates, frame_to_burst):
+        self.frame_to_burst = frame_to_burst
+        self.frame_blackout_acq_indices = defaultdict(list)
+
+        for frame_id, blackout_dates in frame_blackout_dates.items():
+            for start_date, end_date in blackout_dates:
+                acq_index_start = sensing_time_day_index(start_date, frame_id, self.frame_to_burst)
+                acq_index_end = sensing_time_day_index(end_date, frame_id, self.frame_to_burst)
+                self.frame_blackout_acq_indices[frame_id].append((acq_index_start, acq_index_end, start_date, end_date))
+
+    def is_in_blackout(self, frame_id, sensing_time):
+        if frame_id not in self.frame_blackout_acq_indices:
+            return False, None
+
+        acq_index = sensing_time_day_index(sensing_time, frame_id, self.frame_to_burst)
+        for acq_index_start, acq_index_end, start_date, end_date in self.frame_blackout_acq_indices[frame_id]:
+            if acq_index_start <= acq_index <= acq_index_end:
+                return True, (start_date, end_date)
+
+        return False, None
+
+
+def frame_first_sensing_time(frame_id):
+    return datetime(2016, 7, 1, 0, 0, 0) + timedelta(hours=frame_id % 24, minutes=frame_id)
+
+
+def acquisition_time(frame_id, cycle, rng):
+    """A sensing time of the given acquisition cycle of the frame, up to a few hours off the nominal time"""
+    return frame_first_sensing_time(frame_id) + timedelta(days=12 * cycle, seconds=rng.randint(-4 * 3600, 4 * 3600))
+
+
+def random_blackout_dates(rng, overlapping):
+    """Random blackout windows per frame, listed out of order. A frame without windows, or missing altogether."""
+    frame_blackout_dates = {}
+    for frame_id in range(NUM_FRAMES - 1):
+        if frame_id == 0:
+            frame_blackout_dates[frame_id] = []
+            continue
+
+        num_windows = rng.randint(1, 10)
+        if overlapping:
+            cycles = [sorted(rng.sample(range(-5, NUM_ACQUISITIONS + 5), 2)) for _ in range(num_windows)]
+        else:
+            bounds = sorted(rng.sample(range(-5, NUM_ACQUISITIONS + 5), 2 * num_windows))
+            cycles = [bounds[i:i + 2] for i in range(0, len(bounds), 2)]
+        rng.shuffle(cycles)
+
+        frame_blackout_dates[frame_id] = [(acquisition_time(frame_id, start, rng), acquisition_time(frame_id, end, rng))
+                                          for start, end in cycles]
+
+    return frame_blackout_dates
+
+
+def random_granules(frame_blackout_dates, rng, num_granules):
+    """Random frame ids and sensing times, including the bounds of each blackout window"""
+    frame_ids = [rng.randrange(NUM_FRAMES) for _ in range(num_granules)]
+    sensing_times = [acquisition_time(frame_id, rng.randrange(-10, NUM_ACQUISITIONS + 10), rng) for frame_id in frame_ids]
+
+    for frame_id, blackout_dates in frame_blackout_dates.items():
+        for start_date, end_date in blackout_dates:
+            for sensing_time in (start_date, end_date, start_date - timedelta(seconds=1), end_date + timedelta(seconds=1)):
+                frame_ids.append(frame_id)
+                sensing_times.append(sensing_time)
+
+    return frame_ids, sensing_times
+
+
+@pytest.fixture
+def frame_to_burst():
+    return {frame_id: SimpleNamespace(sensing_datetimes=[frame_first_sensing_time(frame_id)])
+            for frame_id in range(NUM_FRAMES)}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_is_in_blackout__when_random_windows__then_same_as_one_window_at_a_time(frame_to_burst, seed):
+    # ARRANGE
+    rng = random.Random(seed)
+    frame_blackout_dates = random_blackout_dates(rng, overlapping=False)
+    frame_ids, sensing_times = random_granules(frame_blackout_dates, rng, num_granules=2000)
+
+    blackout_dates_obj = DispS1BlackoutDates(frame_blackout_dates, frame_to_burst, {})
+
+    # ACT
+    results = [blackout_dates_obj.is_in_blackout(frame_id, sensing_time)
+               for frame_id, sensing_time in zip(frame_ids, sensing_times)]
+    are_black_out, blackout_dates = blackout_dates_obj.are_in_blackout(frame_ids, sensing_times)
+
+    # ASSERT
+    one_window_at_a_time = OneWindowAtATimeBlackoutDates(frame_blackout_dates, frame_to_burst)
+    expected_results = [one_window_at_a_time.is_in_blackout(frame_id, sensing_time)
+                        for frame_id, sensing_time in zip(frame_ids, sensing_times)]
+    assert results == expected_results
+    assert list(zip(are_black_out.tolist(), blackout_dates)) == expected_results
+    assert any(is_black_out for is_black_out, _ in expected_results)
+    assert not all(is_black_out for is_black_out, _ in expected_results)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_is_in_blackout__when_overlapping_windows__then_covering_window_returned(frame_to_burst, seed):
+    # ARRANGE
+    rng = random.Random(seed)
+    frame_blackout_dates = random_blackout_dates(rng, overlapping=True)
+    frame_ids, sensing_times = random_granules(frame_blackout_dates, rng, num_granules=2000)
+
+    blackout_dates_obj = DispS1BlackoutDates(frame_blackout_dates, frame_to_burst, {})
+
+    # ACT
+    are_black_out, blackout_dates = blackout_dates_obj.are_in_blackout(frame_ids, sensing_times)
+
+    # ASSERT
+    one_window_at_a_time = OneWindowAtATimeBlackoutDates(frame_blackout_dates, frame_to_burst)
+    for frame_id, sensing_time, is_black_out, dates in zip(frame_ids, sensing_times, are_black_out, blackout_dates):
+        assert is_black_out == one_window_at_a_time.is_in_blackout(frame_id, sensing_time)[0]
+        assert blackout_dates_obj.is_in_blackout(frame_id, sensing_time) == (is_black_out, dates)
+        if is_black_out:
+            assert dates in frame_blackout_dates[frame_id]
+            covering_window = OneWindowAtATimeBlackoutDates({frame_id: [dates]}, frame_to_burst)
+            assert covering_window.is_in_blackout(frame_id, sensing_time)[0]
+
+
+def test_are_in_blackout__when_ambiguous_day_index__then_raises(frame_to_burst):
+    # ARRANGE
+    frame_blackout_dates = {1: [(frame_first_sensing_time(1), frame_first_sensing_time(1) + timedelta(days=12))]}
+    blackout_dates_obj = DispS1BlackoutDates(frame_blackout_dates, frame_to_burst, {})
+
+    # ACT & ASSERT
+    with pytest.raises(AssertionError, match="Potential ambiguous day index grouping"):
+        blackout_dates_obj.are_in_blackout([1], [frame_first_sensing_time(1) + timedelta(hours=12)])
+
+
+def test_extend_additional_records__when_burst_in_two_frames__then_granule_copied_for_second_frame(frame_to_burst):
+    # ARRANGE
+    burst_id = "T042-088001-IW1"
+    blackout_dates_obj = DispS1BlackoutDates({}, frame_to_burst, {burst_id: [1, 2]})
+    acquisition_ts = frame_first_sensing_time(1) + timedelta(days=120)
+    granule = {"granule_id": f"OPERA_L2_CSLC-S1_{burst_id}_{acquisition_ts:%Y%m%dT%H%M%S}Z_20240102T000000Z_S1A_VV_v1.1",
+               "related_urls": ["s3://bucket/granule.h5"]}
+    granules = [granule]
+
+    # ACT
+    blackout_dates_obj.extend_additional_records(granules, "forward")
+
+    # ASSERT
+    granule, new_granule = granules
+    assert (granule["frame_id"], granule["download_batch_id"]) == (1, "f1_a120")
+    assert granule["unique_id"] == f"f1_a120_{burst_id}"
+    assert (new_granule["frame_id"], new_granule["download_batch_id"]) == (2, "f2_a120")
+    assert new_granule["unique_id"] == f"f2_a120_{burst_id}"
+    assert new_granule["related_urls"] is granule["related_urls"]
+    assert {key: value for key, value in new_granule.items() if key not in ("frame_id", "download_batch_id", "unique_id")} \
+           == {key: value for key, value in granule.items() if key not in ("frame_id", "download_batch_id", "unique_id")}
+
+
+@pytest.mark.benchmark
+def test_benchmark__are_in_blackout_1m_granules(frame_to_burst):
+    # ARRANGE
+    rng = random.Random(0)
+    frame_blackout_dates = random_blackout_dates(rng, overlapping=False)
+    frame_ids, sensing_times = random_granules(frame_blackout_dates, rng, num_granules=1_000_000)
+    blackout_dates_obj = DispS1BlackoutDates(frame_blackout_dates, frame_to_burst, {})
+
+    # ACT
+    start = time.perf_counter()
+    are_black_out, _ = blackout_dates_obj.are_in_blackout(frame_ids, sensing_times)
+    batch_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for frame_id, sensing_time in zip(frame_ids, sensing_times):
+        blackout_dates_obj.is_in_blackout(frame_id, sensing_time)
+    indexed_secs = time.perf_counter() - start
+
+    # one window at a time, sampled
+    one_window_at_a_time = OneWindowAtATimeBlackoutDates(frame_blackout_dates, frame_to_burst)
+    num_sampled = 100_000
+    start = time.perf_counter()
+    for frame_id, sensing_time in zip(frame_ids[:num_sampled], sensing_times[:num_sampled]):
+        one_window_at_a_time.is_in_blackout(frame_id, sensing_time)
+    one_window_at_a_time_secs = (time.perf_counter() - start) * len(frame_ids) / num_sampled
+
+    logging.info(f"Batch: {batch_secs:.2f}s")
+    logging.info(f"Indexed, one granule at a time: {indexed_secs:.2f}s")
+    logging.info(f"One window at a time (estimated): {one_window_at_a_time_secs:.2f}s")
+
+    # ASSERT
+    assert are_black_out.any()
+    assert batch_secs < one_window_at_a_time_secs / 2
@@ -0,0 +1,201 @@
+from argparse import Namespace
+from datetime import datetime, timedelta
+
+import dateutil
+import pytest
+
+from data_subscriber.cslc import cslc_dependency as cslc_dependency_module
+from data_subscriber.cslc.cslc_dependency import (ACQUISITION_DAY_INDEX_SETTLE_PERIOD, AcquisitionDayIndexCache,
+                                                   CSLCDependency)
+from data_subscriber.cslc_utils import _HistBursts
+
+NUM_FRAMES = 500
+NUM_HIST_ACQUISITIONS = 30
+NUM_CMR_ACQUISITIONS = 10
+INCOMPLETE_CMR_ACQUISITION = 4
+K = 15
+
+
+def make_frame_to_bursts():
+    """Creates frames with 4 bursts each, acquired every 12 days in the historical database."""
+    frame_to_bursts = {}
+    for frame_number in range(1, NUM_FRAMES + 1):
+        frame = _HistBursts()
+        frame.frame_number = frame_number
+        frame.burst_ids = {f"T{frame_number % 175:03d}-{frame_number * 10 + i:06d}-IW{i % 3 + 1}" for i in range(4)}
+        first = datetime(2022, 1, 1, 0, 0, 0) + timedelta(seconds=frame_number * 17)
+        frame.sensing_datetimes = [first + timedelta(days=12 * i) for i in range(NUM_HIST_ACQUISITIONS)]
+        frame.sensing_seconds_since_first = [(t - first).total_seconds() for t in frame.sensing_datetimes]
+        frame.sensing_datetime_days_index = [12 * i for i in range(NUM_HIST_ACQUISITIONS)]
+        frame_to_bursts[frame_number] = frame
+    return frame_to_bursts
+
+
+class FakeCmr:
+    """Serves CSLC granules acquired every 12 days after the historical database, counting the queries made."""
+
+    def __init__(self, frame_to_bursts):
+        self.frame_to_bursts = frame_to_bursts
+        self.queries = []
+        self.late_acquisitions = set()
+        """Acquisitions whose last burst is not published yet"""
+
+    def __call__(self, args, token, cmr, settings, query_timerange, now, verbose, blackout_dates_obj, no_duplicate,
+                 force_frame_id, vv_only=True):
+        self.queries.append((force_frame_id, query_timerange))
+        start_date = dateutil.parser.isoparse(query_timerange.start_date[:-1])
+        end_date = dateutil.parser.isoparse(query_timerange.end_date[:-1])
+
+        frame = self.frame_to_bursts[force_frame_id]
+        granules = []
+        for i in range(1, NUM_CMR_ACQUISITIONS + 1):
+            acquisition_dts = frame.sensing_datetimes[-1] + timedelta(days=12 * i, seconds=5)
+            if not start_date <= acquisition_dts <= end_date:
+                continue
+            burst_ids = sorted(frame.burst_ids)
+            if i == INCOMPLETE_CMR_ACQUISITION or i in self.late_acquisitions:
+                burst_ids = burst_ids[:-1]  # doesn't suffice the burst pattern
+            for burst_id in burst_ids:
+                granules.append({"granule_id": f"OPERA_L2_CSLC-S1_{burst_id}_{acquisition_dts:%Y%m%dT%H%M%SZ}_"
+                                               f"20240101T000000Z_S1A_VV_v1.1"})
+        return granules
+
+
+def cmr_day_index(i):
+    return 12 * (NUM_HIST_ACQUISITIONS - 1 + i)
+
+
+CMR_DAY_INDICES = [cmr_day_index(i) for i in range(1, NUM_CMR_ACQUISITIONS + 1) if i != INCOMPLETE_CMR_ACQUISITION]
+
+
+@pytest.fixture
+def fake_cmr(monkeypatch):
+    frame_to_bursts = make_frame_to_bursts()
+    fake_cmr = FakeCmr(frame_to_bursts)
+    monkeypatch.setattr(cslc_dependency_module, "query_cmr_cslc_blackout_polarization", fake_cmr)
+    return fake_cmr
+
+
+def process_forward(frame_to_bursts, day_index, day_index_cache):
+    """Determines the k-cycle and previous day indices of every frame, like a forward mode CSLC download job."""
+    results = {}
+    for frame_number in frame_to_bursts:
+        cslc_dependency = CSLCDependency(K, 5, frame_to_bursts, Namespace(), None, None, None, None,
+                                         day_index_cache=day_index_cache)
+        results[frame_number] = (cslc_dependency.determine_k_cycle(None, day_index, frame_number),
+                                 cslc_dependency.get_prev_day_indices(day_index, frame_number))
+    return results
+
+
+def test_forward_mode__when_frames_processed_again__then_cmr_not_queried_again(fake_cmr, tmp_path):
+    # ARRANGE
+    frame_to_bursts = fake_cmr.frame_to_bursts
+    day_index = cmr_day_index(6)
+    hist_day_indices = [12 * i for i in range(NUM_HIST_ACQUISITIONS)]
+    cmr_day_indices_until = [d for d in CMR_DAY_INDICES if d <= day_index]
+
+    # ACT
+    results = process_forward(frame_to_bursts, day_index, AcquisitionDayIndexCache(cache_dir=tmp_path))
+    first_pass_queries = len(fake_cmr.queries)
+
+    # a new process on the same worker, sharing the cache files
+    results_again = process_forward(frame_to_bursts, day_index, AcquisitionDayIndexCache(cache_dir=tmp_path))
+
+    # ASSERT
+    assert first_pass_queries == NUM_FRAMES
+    assert len(fake_cmr.queries) == NUM_FRAMES
+    assert results_again == results
+    for k_cycle, prev_day_indices in results.values():
+        assert k_cycle == (NUM_HIST_ACQUISITIONS + len(cmr_day_indices_until) + 1) % K
+        assert prev_day_indices == hist_day_indices + [d for d in CMR_DAY_INDICES if d < day_index]
+
+
+def test_forward_mode__when_next_acquisition__then_only_new_acquisitions_queried(fake_cmr, tmp_path):
+    # ARRANGE
+    frame_to_bursts = fake_cmr.frame_to_bursts
+    day_index_cache = AcquisitionDayIndexCache(cache_dir=tmp_path)
+    process_forward(frame_to_bursts, cmr_day_index(6), day_index_cache)
+    fake_cmr.queries.clear()
+
+    # ACT
+    results = process_forward(frame_to_bursts, cmr_day_index(7), day_index_cache)
+
+    # ASSERT
+    assert len(fake_cmr.queries) == NUM_FRAMES
+    for frame_number, query_timerange in fake_cmr.queries:
+        query_start_date = dateutil.parser.isoparse(query_timerange.start_date[:-1])
+        assert query_start_date > frame_to_bursts[frame_number].sensing_datetimes[-1] + timedelta(days=12 * 5)
+    for k_cycle, prev_day_indices in results.values():
+        assert k_cycle == (NUM_HIST_ACQUISITIONS + 6 + 1) % K
+        assert prev_day_indices[NUM_HIST_ACQUISITIONS:] == [d for d in CMR_DAY_INDICES if d < cmr_day_index(7)]
+
+
+def test_determine_k_cycle__when_day_index_in_historical_database__then_cmr_not_queried(fake_cmr, tmp_path):
+    # ARRANGE
+    cslc_dependency = CSLCDependency(K, 5, fake_cmr.frame_to_bursts, Namespace(), None, None, None, None,
+                                     day_index_cache=AcquisitionDayIndexCache(cache_dir=tmp_path))
+
+    # ACT
+    k_cycle = cslc_dependency.determine_k_cycle(None, 12 * 20, 1)
+    prev_day_indices = cslc_dependency.get_prev_day_indices(12 * 20, 1)
+
+    # ASSERT
+    assert k_cycle == 21 % K
+    assert prev_day_indices == [12 * i for i in range(20)]
+    assert fake_cmr.queries == []
+    with pytest.raises(ValueError):
+        cslc_dependency.get_prev_day_indices(12 * 20 + 1, 1)
+
+
+def test_acquisition_day_index_cache__when_expired__then_cmr_queried_again(fake_cmr, tmp_path):
+    # ARRANGE
+    day_index_cache = AcquisitionDayIndexCache(cache_dir=tmp_path, ttl=-1)
+    cslc_dependency = CSLCDependency(K, 5, fake_cmr.frame_to_bursts, Namespace(), None, None, None, None,
+                                     day_index_cache=day_index_cache)
+
+    # ACT
+    cslc_dependency.determine_k_cycle(None, cmr_day_index(3), 1)
+    cslc_dependency.determine_k_cycle(None, cmr_day_index(3), 1)
+
+    # ASSERT
+    assert len(fake_cmr.queries) == 2
+    assert fake_cmr.queries[0] == fake_cmr.queries[1]
+
+
+def test_get_cmr_day_indices__when_recent_acquisition_completed_late__then_picked_up(fake_cmr, tmp_path):
+    # ARRANGE
+    # the first acquisition after the historical database was acquired within the settle period
+    frame = fake_cmr.frame_to_bursts[1]
+    shift = datetime.utcnow() - ACQUISITION_DAY_INDEX_SETTLE_PERIOD * 3 / 4 - timedelta(days=12) - frame.sensing_datetimes[-1]
+    frame.sensing_datetimes = [sensing_datetime + shift for sensing_datetime in frame.sensing_datetimes]
+
+    cslc_dependency = CSLCDependency(K, 5, fake_cmr.frame_to_bursts, Namespace(), None, "cmr.earthdata.nasa.gov", None,
+                                     None, day_index_cache=AcquisitionDayIndexCache(cache_dir=tmp_path))
+    fake_cmr.late_acquisitions.add(1)
+    k_cycle_before = cslc_dependency.determine_k_cycle(None, cmr_day_index(2), 1)
+
+    # ACT
+    fake_cmr.late_acquisitions.clear()
+    k_cycle_after = cslc_dependency.determine_k_cycle(None, cmr_day_index(2), 1)
+
+    # ASSERT
+    # the historical acquisitions, the current one and, once complete, the late one
+    assert k_cycle_before == (NUM_HIST_ACQUISITIONS + 1 + 1) % K
+    assert k_cycle_after == (NUM_HIST_ACQUISITIONS + 2 + 1) % K
+    assert len(fake_cmr.queries) == 2
+
+
+def test_get_cmr_day_indices__when_different_cmr_venues__then_not_shared(fake_cmr, tmp_path):
+    # ARRANGE
+    day_index_cache = AcquisitionDayIndexCache(cache_dir=tmp_path)
+
+    # ACT
+    for cmr in ("cmr.earthdata.nasa.gov", "cmr.uat.earthdata.nasa.gov", "cmr.earthdata.nasa.gov"):
+        cslc_dependency = CSLCDependency(K, 5, fake_cmr.frame_to_bursts, Namespace(), None, cmr, None, None,
+                                         day_index_cache=day_index_cache)
+        cslc_dependency.determine_k_cycle(None, cmr_day_index(3), 1)
+
+    # ASSERT
+    assert len(fake_cmr.queries) == 2
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "cmr.earthdata.nasa.gov_frame_1_VV.json", "cmr.uat.earthdata.nasa.gov_frame_1_VV.json"]
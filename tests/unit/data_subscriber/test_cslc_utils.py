@@ -0,0 +1,312 @@
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from data_subscriber import cslc_utils
+from data_subscriber.cslc_utils import (build_compact_disp_frame_burst_db, get_nearest_sensing_datetime,
+                                        load_compact_disp_frame_burst_hist, localize_compact_disp_frame_burst_db,
+                                        localize_disp_frame_burst_hist, process_disp_frame_burst_hist)
+from util.ancillary_cache_util import ANCILLARY_CACHE_DIR_ENV
+
+BURST_DB_BUCKET = "opera-ancillaries"
+BURST_DB_KEY = "disp_frames/disp_s1_consistent_burst_db/opera-disp-s1-consistent-burst-ids.json"
+
+
+def synthetic_frame_burst_db(num_frames, num_acquisitions, seed=0):
+    """A frame-burst database of frames with 27 bursts each, the last 3 shared with the next frame of the same track,
+    acquired every 12 days. Sensing times are listed out of order."""
+    rng = random.Random(seed)
+    data = {}
+    for frame_number in range(1, num_frames + 1):
+        track = frame_number // 10 % 175 + 1
+        first = datetime(2016, 7, 1) + timedelta(minutes=frame_number)
+        sensing_times = [first + timedelta(days=12 * i, seconds=rng.randint(-1800, 1800)) if i else first
+                         for i in range(num_acquisitions)]
+        rng.shuffle(sensing_times)
+        data[str(frame_number)] = {
+            "burst_id_list": [f"t{track:03d}_{frame_number * 24 + i:06d}_iw{i % 3 + 1}" for i in range(27)],
+            "sensing_time_list": [sensing_time.strftime("%Y-%m-%dT%H:%M:%S") for sensing_time in sensing_times]
+        }
+    return {"metadata": {}, "data": data}
+
+
+def write_json(path, contents):
+    with open(path, "w") as fp:
+        json.dump(contents, fp)
+    return str(path)
+
+
+def test_load_compact_disp_frame_burst_hist__then_same_as_json(tmp_path):
+    # ARRANGE
+    json_file = write_json(tmp_path / "burst_db.json", synthetic_frame_burst_db(num_frames=50, num_acquisitions=40))
+    frame_to_bursts, burst_to_frames, datetime_to_frames = process_disp_frame_burst_hist(json_file)
+
+    # ACT
+    build_compact_disp_frame_burst_db(json_file, str(tmp_path / "burst_db.npz"))
+    compact_frame_to_bursts, compact_burst_to_frames, compact_datetime_to_frames = \
+        load_compact_disp_frame_burst_hist(str(tmp_path / "burst_db.npz"))
+
+    # ASSERT
+    assert compact_frame_to_bursts.keys() == frame_to_bursts.keys()
+    for frame_number, frame in frame_to_bursts.items():
+        compact_frame = compact_frame_to_bursts[frame_number]
+        assert compact_frame.frame_number == frame.frame_number
+        assert compact_frame.burst_ids == frame.burst_ids
+        assert compact_frame.sensing_datetimes == frame.sensing_datetimes
+        assert compact_frame.sensing_seconds_since_first == frame.sensing_seconds_since_first
+        assert compact_frame.sensing_datetime_days_index == frame.sensing_datetime_days_index
+        assert compact_frame.sensing_datetimes64.tolist() == frame.sensing_datetimes64.tolist()
+
+    assert dict(compact_burst_to_frames) == dict(burst_to_frames)
+    assert any(len(frame_numbers) == 2 for frame_numbers in burst_to_frames.values())
+    assert dict(compact_datetime_to_frames) == dict(datetime_to_frames)
+
+
+def test_load_compact_disp_frame_burst_hist__when_unknown_sensing_time__then_not_in_datetime_to_frames(tmp_path):
+    # ARRANGE
+    json_file = write_json(tmp_path / "burst_db.json", synthetic_frame_burst_db(num_frames=3, num_acquisitions=5))
+    build_compact_disp_frame_burst_db(json_file, str(tmp_path / "burst_db.npz"))
+    frame_to_bursts, _, datetime_to_frames = load_compact_disp_frame_burst_hist(str(tmp_path / "burst_db.npz"))
+    sensing_time = frame_to_bursts[1].sensing_datetimes[0]
+    unknown_sensing_time = sensing_time - timedelta(days=1)
+
+    # ACT & ASSERT
+    assert unknown_sensing_time not in datetime_to_frames
+    assert datetime_to_frames.get(unknown_sensing_time) is None
+    with pytest.raises(KeyError):
+        datetime_to_frames[unknown_sensing_time]
+    assert unknown_sensing_time not in datetime_to_frames
+    assert len(datetime_to_frames) == 3 * 5
+
+    assert sensing_time in datetime_to_frames
+    assert datetime_to_frames.get(sensing_time) == [1]
+
+
+def test_build_compact_disp_frame_burst_db__when_timezone_in_sensing_time__then_raises(tmp_path):
+    # ARRANGE
+    db = synthetic_frame_burst_db(num_frames=2, num_acquisitions=3)
+    db["data"]["2"]["sensing_time_list"][1] += "Z"
+    json_file = write_json(tmp_path / "burst_db.json", db)
+
+    # ACT & ASSERT
+    with pytest.raises(ValueError, match="Cannot convert sensing time"):
+        build_compact_disp_frame_burst_db(json_file, str(tmp_path / "burst_db.npz"))
+
+
+def test_get_nearest_sensing_datetime__when_datetime64_array__then_same_as_list(tmp_path):
+    # ARRANGE
+    json_file = write_json(tmp_path / "burst_db.json", synthetic_frame_burst_db(num_frames=3, num_acquisitions=40))
+    build_compact_disp_frame_burst_db(json_file, str(tmp_path / "burst_db.npz"))
+    frame = load_compact_disp_frame_burst_hist(str(tmp_path / "burst_db.npz"))[0][2]
+
+    rng = random.Random(0)
+    first, last = frame.sensing_datetimes[0], frame.sensing_datetimes[-1]
+    sensing_times = [first - timedelta(days=1), last + timedelta(days=1), *frame.sensing_datetimes] + \
+                    [first + timedelta(seconds=rng.randint(0, int((last - first).total_seconds()))) for _ in range(200)]
+
+    # ACT & ASSERT
+    for sensing_time in sensing_times:
+        expected = get_nearest_sensing_datetime(list(frame.sensing_datetimes), sensing_time)
+        assert get_nearest_sensing_datetime(frame.sensing_datetimes64, sensing_time) == expected
+
+    assert get_nearest_sensing_datetime(frame.sensing_datetimes64, first) == (1, first)
+    assert get_nearest_sensing_datetime(frame.sensing_datetimes64, last + timedelta(days=1)) == (40, last)
+
+
+@pytest.fixture
+def burst_db_s3(tmp_path, monkeypatch):
+    """The frame-burst database json in a mocked S3 bucket. Counts the S3 requests made."""
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-west-2")
+
+    with mock_aws():
+        s3 = boto3.resource("s3")
+        s3.create_bucket(Bucket=BURST_DB_BUCKET, CreateBucketConfiguration={"LocationConstraint": "us-west-2"})
+        s3.Object(BURST_DB_BUCKET, BURST_DB_KEY).put(
+            Body=json.dumps(synthetic_frame_burst_db(num_frames=20, num_acquisitions=10)))
+
+        requests = Counter()
+        s3.meta.client.meta.events.register("before-call.s3", lambda model, **kwargs: requests.update([model.name]))
+
+        burst_file_url = urlparse(f"s3://{BURST_DB_BUCKET}/{BURST_DB_KEY}")
+        monkeypatch.setattr(cslc_utils, "get_s3_resource_from_settings", lambda settings_field, settings_yaml_path=None: (
+            s3, BURST_DB_KEY, BURST_DB_KEY.split("/")[-1], burst_file_url))
+
+        yield s3, requests
+
+
+def localize_in_job_dir(job_dir, monkeypatch):
+    """Localizes the compact frame-burst database from a fresh working directory, as a download job would"""
+    job_dir.mkdir()
+    monkeypatch.chdir(job_dir)
+    return load_compact_disp_frame_burst_hist(os.path.abspath(localize_compact_disp_frame_burst_db()))
+
+
+def test_localize_compact_disp_frame_burst_db__when_cached__then_converted_once_per_etag(burst_db_s3, tmp_path,
+                                                                                          monkeypatch):
+    # ARRANGE
+    s3, requests = burst_db_s3
+    monkeypatch.setenv(ANCILLARY_CACHE_DIR_ENV, str(tmp_path / "cache"))
+
+    # ACT
+    first_job_frames = localize_in_job_dir(tmp_path / "job_1", monkeypatch)[0]
+    second_job_frames = localize_in_job_dir(tmp_path / "job_2", monkeypatch)[0]
+    requests_before_update = requests.copy()
+
+    s3.Object(BURST_DB_BUCKET, BURST_DB_KEY).put(
+        Body=json.dumps(synthetic_frame_burst_db(num_frames=25, num_acquisitions=10)))
+    requests.clear()
+    third_job_frames = localize_in_job_dir(tmp_path / "job_3", monkeypatch)[0]
+
+    # ASSERT
+    assert requests_before_update["GetObject"] == 1
+    assert requests_before_update["HeadObject"] == 3  # the ETag check of each job, and the download of the first
+    assert not (tmp_path / "job_2" / BURST_DB_KEY.split("/")[-1]).exists()
+    assert len(first_job_frames) == len(second_job_frames) == 20
+    assert [frame.burst_ids for frame in second_job_frames.values()] == \
+           [frame.burst_ids for frame in first_job_frames.values()]
+
+    assert requests["GetObject"] == 1
+    assert len(third_job_frames) == 25
+
+
+def test_localize_compact_disp_frame_burst_db__when_not_cached__then_converted(burst_db_s3, tmp_path, monkeypatch):
+    # ARRANGE
+    monkeypatch.delenv(ANCILLARY_CACHE_DIR_ENV, raising=False)
+
+    # ACT
+    frame_to_bursts = localize_in_job_dir(tmp_path / "job_1", monkeypatch)[0]
+
+    # ASSERT
+    assert len(frame_to_bursts) == 20
+    assert frame_to_bursts[1].sensing_datetime_days_index == [12 * i for i in range(10)]
+
+
+def test_localize_compact_disp_frame_burst_db__when_build_fails__then_not_retried(burst_db_s3, tmp_path,
+                                                                                   monkeypatch):
+    # ARRANGE
+    s3, requests = burst_db_s3
+    monkeypatch.delenv(ANCILLARY_CACHE_DIR_ENV, raising=False)
+    builds = []
+
+    def build_compact_disp_frame_burst_db(json_file, compact_file):
+        builds.append(json_file)
+        raise AssertionError("burst_id_list and sensing_time_list differ in length")
+
+    monkeypatch.setattr(cslc_utils, "build_compact_disp_frame_burst_db", build_compact_disp_frame_burst_db)
+
+    # ACT & ASSERT
+    with pytest.raises(AssertionError):
+        localize_in_job_dir(tmp_path / "job_1", monkeypatch)
+
+    assert len(builds) == 1
+    assert requests["GetObject"] == 1
+
+
+@pytest.fixture
+def uncached_localize_disp_frame_burst_hist():
+    localize_disp_frame_burst_hist.cache_clear()
+    yield localize_disp_frame_burst_hist
+    localize_disp_frame_burst_hist.cache_clear()
+
+
+def test_localize_disp_frame_burst_hist__when_compact_db_invalid__then_falls_back_to_json(
+        burst_db_s3, uncached_localize_disp_frame_burst_hist, tmp_path, monkeypatch):
+    # ARRANGE
+    monkeypatch.delenv(ANCILLARY_CACHE_DIR_ENV, raising=False)
+    monkeypatch.chdir(tmp_path)
+    version_error = ValueError("Unsupported compact DISP-S1 burst database version 0")
+
+    def load_compact_disp_frame_burst_hist(compact_file):
+        raise version_error
+
+    monkeypatch.setattr(cslc_utils, "load_compact_disp_frame_burst_hist", load_compact_disp_frame_burst_hist)
+    warnings = []
+    monkeypatch.setattr(cslc_utils.logger, "warning", warnings.append)
+
+    # ACT
+    frame_to_bursts, _, _ = uncached_localize_disp_frame_burst_hist()
+
+    # ASSERT
+    assert len(frame_to_bursts) == 20
+    assert len(warnings) == 1
+    assert repr(version_error) in warnings[0]
+
+
+def test_localize_disp_frame_burst_hist__when_compact_db_build_asserts__then_raises(
+        burst_db_s3, uncached_localize_disp_frame_burst_hist, tmp_path, monkeypatch):
+    # ARRANGE
+    monkeypatch.delenv(ANCILLARY_CACHE_DIR_ENV, raising=False)
+    monkeypatch.chdir(tmp_path)
+
+    def build_compact_disp_frame_burst_db(json_file, compact_file):
+        raise AssertionError("ambiguous sensing time day index")
+
+    monkeypatch.setattr(cslc_utils, "build_compact_disp_frame_burst_db", build_compact_disp_frame_burst_db)
+    monkeypatch.setattr(cslc_utils, "localize_anc_json", lambda *args, **kwargs: pytest.fail("fell back to the json file"))
+
+    # ACT & ASSERT
+    with pytest.raises(AssertionError, match="ambiguous"):
+        uncached_localize_disp_frame_burst_hist()
+
+
+STARTUP_SCRIPT = """
+import os, sys, time
+from data_subscriber import cslc_utils
+
+def rss_kb():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+rss_before = rss_kb()
+start = time.perf_counter()
+if sys.argv[1] == "json":
+    frame_to_bursts, burst_to_frames, _ = cslc_utils.process_disp_frame_burst_hist(sys.argv[2])
+else:
+    frame_to_bursts, burst_to_frames, _ = cslc_utils.load_compact_disp_frame_burst_hist(sys.argv[2])
+secs = time.perf_counter() - start
+print(len(frame_to_bursts), len(burst_to_frames), secs, rss_kb() - rss_before)
+"""
+
+
+def measure_startup(db_format, file):
+    """Loads the frame-burst database in a fresh interpreter, returning the load time and the resident memory it added"""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, db_format, file], env=env, check=True,
+                            capture_output=True, text=True).stdout.splitlines()[-1]
+    num_frames, num_bursts, secs, rss_kb = output.split()
+    return int(num_frames), int(num_bursts), float(secs), int(rss_kb) / 1024
+
+
+@pytest.mark.benchmark
+def test_benchmark__disp_frame_burst_hist_startup_full_size(tmp_path):
+    # ARRANGE
+    # as many frames as the DISP-S1 database, acquired every 12 days from 2016-07 to 2024-12
+    json_file = write_json(tmp_path / "burst_db.json", synthetic_frame_burst_db(num_frames=1427, num_acquisitions=260))
+    compact_file = str(tmp_path / "burst_db.npz")
+    build_compact_disp_frame_burst_db(json_file, compact_file)
+
+    # ACT
+    json_num_frames, json_num_bursts, json_secs, json_rss_mb = measure_startup("json", json_file)
+    compact_num_frames, compact_num_bursts, compact_secs, compact_rss_mb = measure_startup("compact", compact_file)
+
+    logging.info(f"json: {json_secs:.2f}s, +{json_rss_mb:.0f} MiB RSS ({os.path.getsize(json_file) / 2 ** 20:.0f} MiB file)")
+    logging.info(f"compact: {compact_secs:.2f}s, +{compact_rss_mb:.0f} MiB RSS "
+                 f"({os.path.getsize(compact_file) / 2 ** 20:.0f} MiB file)")
+
+    # ASSERT
+    assert (compact_num_frames, compact_num_bursts) == (json_num_frames, json_num_bursts)
+    assert json_num_frames == 1427
+    assert compact_secs < json_secs / 10
+    assert compact_rss_mb < json_rss_mb / 2
@@ -0,0 +1,273 @@
+import logging
+import os
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlparse
+
+import boto3
+import numpy as np
+import pandas as pd
+import pytest
+from moto import mock_aws
+
+from data_subscriber import dist_s1_utils
+from util.ancillary_cache_util import ANCILLARY_CACHE_DIR_ENV
+
+DIST_BURST_DB_BUCKET = "opera-ancillaries"
+DIST_BURST_DB_KEY = "dist_s1/mgrs_burst_lookup_table.parquet"
+
+
+def make_dist_burst_db(num_tiles, acq_groups_per_tile=5, bursts_per_product=16, seed=0) -> pd.DataFrame:
+    """
+    Creates a synthetic DIST-S1 burst database, shaped like the real parquet file. Neighbouring products share bursts,
+    so each RTC burst is used by about 3 products, like the real database.
+    """
+    rng = np.random.default_rng(seed)
+    num_rows = num_tiles * acq_groups_per_tile * bursts_per_product
+    burst_numbers = np.arange(num_rows) // 3 + rng.integers(0, 3, num_rows)
+    return pd.DataFrame({
+        "mgrs_tile_id": np.repeat([f"{i // 676 % 60 + 1:02d}{chr(65 + i // 26 % 26)}{chr(65 + i % 26)}{i // 40560}" for i in range(num_tiles)],
+                                  acq_groups_per_tile * bursts_per_product),
+        "acq_group_id_within_mgrs_tile": np.tile(np.repeat(np.arange(acq_groups_per_tile), bursts_per_product), num_tiles),
+        "jpl_burst_id": [f"T{n % 175 + 1:03d}-{n:06d}-IW{n % 3 + 1}" for n in burst_numbers],
+    })
+
+
+def process_dist_burst_db_reference(df):
+    """The original row by row construction of the lookup dictionaries"""
+    dist_products = defaultdict(set)
+    bursts_to_products = defaultdict(set)
+    product_to_bursts = defaultdict(set)
+    for index, row in df.iterrows():
+        product_id = row["mgrs_tile_id"] + "_" + str(row["acq_group_id_within_mgrs_tile"])
+        dist_products[row["mgrs_tile_id"]].add(product_id)
+        bursts_to_products[row["jpl_burst_id"]].add(product_id)
+        product_to_bursts[product_id].add(row["jpl_burst_id"])
+    return dist_products, bursts_to_products, product_to_bursts, df["mgrs_tile_id"].unique()
+
+
+def assert_matches_reference(actual, reference):
+    for actual_lookup, reference_lookup in zip(actual[:3], reference[:3]):
+        assert actual_lookup == reference_lookup
+        assert list(actual_lookup) == list(reference_lookup)
+    np.testing.assert_array_equal(actual[3], reference[3])
+
+
+@pytest.fixture
+def dist_burst_db_file(tmp_path):
+    df = make_dist_burst_db(num_tiles=100)
+    db_file = str(tmp_path / "mgrs_burst_lookup_table.parquet")
+    df.to_parquet(db_file, index=False)
+    return db_file, df
+
+
+def test_process_dist_burst_db__parity_with_row_by_row(dist_burst_db_file):
+    # ARRANGE
+    db_file, df = dist_burst_db_file
+
+    # ACT
+    result = dist_s1_utils.process_dist_burst_db(db_file)
+
+    # ASSERT
+    assert_matches_reference(result, process_dist_burst_db_reference(df))
+    assert len(result[0]) == 100
+    assert len(result[2]) == 500
+    assert any(len(products) > 1 for products in result[1].values())
+    assert result[1]["T999-999999-IW1"] == set()
+    assert "T999-999999-IW1" not in result[1]
+    assert result[1].get("T999-999999-IW1") is None
+
+
+def test_process_dist_burst_db__when_looked_up__then_lookups_unchanged(dist_burst_db_file):
+    # ARRANGE
+    db_file, df = dist_burst_db_file
+    dist_products, bursts_to_products, product_to_bursts, _ = dist_s1_utils.process_dist_burst_db(db_file)
+    _, reference_bursts_to_products, _, _ = process_dist_burst_db_reference(df)
+    burst_id = df["jpl_burst_id"].iloc[0]
+
+    # ACT
+    products = bursts_to_products[burst_id]
+    missing_products = bursts_to_products["T999-999999-IW1"]
+    reference_missing_products = reference_bursts_to_products["T999-999999-IW1"]
+
+    # ASSERT
+    assert isinstance(products, frozenset)
+    assert products == reference_bursts_to_products[burst_id]
+    with pytest.raises(AttributeError):
+        products.add("01ABC0_0")
+    assert bursts_to_products[burst_id] is products
+
+    # the defaultdict(set) added the unknown key on lookup. The lookup does not.
+    assert missing_products == reference_missing_products == set()
+    assert isinstance(missing_products, frozenset)
+    assert "T999-999999-IW1" in reference_bursts_to_products
+    assert "T999-999999-IW1" not in bursts_to_products
+    assert len(bursts_to_products) == len(reference_bursts_to_products) - 1
+
+
+def test_load_dist_burst_db_cache__reuses_cache(dist_burst_db_file, tmp_path, monkeypatch):
+    # ARRANGE
+    db_file, df = dist_burst_db_file
+    cache_file = str(tmp_path / "mgrs_burst_lookup_table.npz")
+    built = dist_s1_utils.load_dist_burst_db_cache(db_file, cache_file)
+
+    def fail(file):
+        raise AssertionError("the parquet file should not be processed")
+    monkeypatch.setattr(dist_s1_utils, "read_dist_burst_db_tables", fail)
+
+    # ACT
+    loaded = dist_s1_utils.load_dist_burst_db_cache(db_file, cache_file)
+
+    # ASSERT
+    assert_matches_reference(built, process_dist_burst_db_reference(df))
+    assert_matches_reference(loaded, process_dist_burst_db_reference(df))
+
+
+def test_load_dist_burst_db_cache__rebuilds_when_source_changes(dist_burst_db_file, tmp_path):
+    # ARRANGE
+    db_file, df = dist_burst_db_file
+    cache_file = str(tmp_path / "mgrs_burst_lookup_table.npz")
+    dist_s1_utils.load_dist_burst_db_cache(db_file, cache_file)
+
+    df = df[df["mgrs_tile_id"] != df["mgrs_tile_id"].iloc[0]]
+    df.to_parquet(db_file, index=False)
+
+    # ACT
+    result = dist_s1_utils.load_dist_burst_db_cache(db_file, cache_file)
+
+    # ASSERT
+    assert_matches_reference(result, process_dist_burst_db_reference(df))
+    assert len(result[0]) == 99
+
+
+@pytest.mark.parametrize("cache_content", [b"", b"not a cache file", None])
+def test_load_dist_burst_db_cache__rebuilds_invalid_cache(dist_burst_db_file, tmp_path, cache_content):
+    # ARRANGE
+    db_file, df = dist_burst_db_file
+    cache_file = str(tmp_path / "mgrs_burst_lookup_table.npz")
+    if cache_content is None:
+        # a cache file of another format version
+        tables = dist_s1_utils.read_dist_burst_db_tables(db_file)
+        with open(cache_file, "wb") as f:
+            np.savez(f, format_version=dist_s1_utils.DIST_BURST_DB_CACHE_VERSION - 1,
+                     source_id=dist_s1_utils.calculate_file_checksum(db_file, "sha256"), **tables)
+    else:
+        with open(cache_file, "wb") as f:
+            f.write(cache_content)
+
+    # ACT
+    result = dist_s1_utils.load_dist_burst_db_cache(db_file, cache_file)
+
+    # ASSERT
+    assert_matches_reference(result, process_dist_burst_db_reference(df))
+    with np.load(cache_file, allow_pickle=False) as cache_npz:
+        assert int(cache_npz["format_version"]) == dist_s1_utils.DIST_BURST_DB_CACHE_VERSION
+    assert not [file for file in os.listdir(tmp_path) if file.endswith(".tmp")]
+
+
+@pytest.fixture
+def dist_burst_db_s3(tmp_path, monkeypatch):
+    """The DIST-S1 burst database parquet file in a mocked S3 bucket. Counts the S3 requests made."""
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-west-2")
+
+    with mock_aws():
+        s3 = boto3.resource("s3")
+        s3.create_bucket(Bucket=DIST_BURST_DB_BUCKET, CreateBucketConfiguration={"LocationConstraint": "us-west-2"})
+
+        def put_dist_burst_db(num_tiles):
+            s3.Object(DIST_BURST_DB_BUCKET, DIST_BURST_DB_KEY).put(
+                Body=make_dist_burst_db(num_tiles=num_tiles).to_parquet(index=False))
+        put_dist_burst_db(num_tiles=20)
+
+        requests = Counter()
+        s3.meta.client.meta.events.register("before-call.s3", lambda model, **kwargs: requests.update([model.name]))
+
+        burst_file_url = urlparse(f"s3://{DIST_BURST_DB_BUCKET}/{DIST_BURST_DB_KEY}")
+        monkeypatch.setattr(dist_s1_utils, "get_s3_resource_from_settings", lambda settings_field, settings_yaml_path=None: (
+            s3, DIST_BURST_DB_KEY, DIST_BURST_DB_KEY.split("/")[-1], burst_file_url))
+
+        yield put_dist_burst_db, requests
+
+
+def localize_in_job_dir(job_dir, monkeypatch):
+    """Localizes the DIST-S1 burst database from a fresh working directory, as a query job would"""
+    job_dir.mkdir()
+    monkeypatch.chdir(job_dir)
+    return dist_s1_utils.localize_dist_burst_db_cache()
+
+
+def test_localize_dist_burst_db_cache__when_cached__then_downloaded_once_per_etag(dist_burst_db_s3, tmp_path,
+                                                                                   monkeypatch):
+    # ARRANGE
+    put_dist_burst_db, requests = dist_burst_db_s3
+    monkeypatch.setenv(ANCILLARY_CACHE_DIR_ENV, str(tmp_path / "cache"))
+
+    # ACT
+    first_job_db = localize_in_job_dir(tmp_path / "job_1", monkeypatch)
+    second_job_db = localize_in_job_dir(tmp_path / "job_2", monkeypatch)
+    requests_before_update = requests.copy()
+
+    put_dist_burst_db(num_tiles=25)
+    requests.clear()
+    third_job_db = localize_in_job_dir(tmp_path / "job_3", monkeypatch)
+
+    # ASSERT
+    assert requests_before_update["GetObject"] == 1
+    assert not (tmp_path / "job_2" / DIST_BURST_DB_KEY.split("/")[-1]).exists()
+    assert len(first_job_db[0]) == len(second_job_db[0]) == 20
+    assert second_job_db[2] == first_job_db[2]
+
+    assert requests["GetObject"] == 1
+    assert len(third_job_db[0]) == 25
+
+
+def test_localize_dist_burst_db_cache__when_not_cached__then_reuses_working_directory_cache(dist_burst_db_s3, tmp_path,
+                                                                                             monkeypatch):
+    # ARRANGE
+    put_dist_burst_db, requests = dist_burst_db_s3
+    monkeypatch.delenv(ANCILLARY_CACHE_DIR_ENV, raising=False)
+    built = localize_in_job_dir(tmp_path / "job_1", monkeypatch)
+    requests.clear()
+
+    # ACT
+    loaded = dist_s1_utils.localize_dist_burst_db_cache()
+
+    # ASSERT
+    assert requests["GetObject"] == 0
+    assert requests["HeadObject"] == 1
+    assert len(loaded[0]) == len(built[0]) == 20
+    assert loaded[2] == built[2]
+
+
+@pytest.mark.benchmark
+def test_benchmark__build_and_load(tmp_path):
+    # ARRANGE
+    # about the size of the production database
+    df = make_dist_burst_db(num_tiles=18_000)
+    db_file = str(tmp_path / "mgrs_burst_lookup_table.parquet")
+    cache_file = str(tmp_path / "mgrs_burst_lookup_table.npz")
+    df.to_parquet(db_file, index=False)
+
+    # ACT
+    start = time.perf_counter()
+    built = dist_s1_utils.load_dist_burst_db_cache(db_file, cache_file)
+    build_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loaded = dist_s1_utils.load_dist_burst_db_cache(db_file, cache_file)
+    load_secs = time.perf_counter() - start
+
+    # the row by row reference, over a sample of the rows
+    sample_df = df.iloc[:len(df) // 20]
+    start = time.perf_counter()
+    process_dist_burst_db_reference(sample_df)
+    reference_secs = (time.perf_counter() - start) * len(df) / len(sample_df)
+
+    # ASSERT
+    logging.info(f"{len(df):,} rows: build {build_secs:.2f}s, load from cache {load_secs:.2f}s, "
+                 f"row by row reference (extrapolated) {reference_secs:.2f}s")
+    assert loaded[2] == built[2]
+    assert build_secs < reference_secs / 5
+    assert load_secs < build_secs
@@ -1,151 +1,119 @@
 import itertools
+import logging
+import math
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from functools import partial
 
 import more_itertools
+import pandas as pd
+import pytest
 
-from data_subscriber.rtc.evaluator_core import remove_subsets, reduce_to_largest_set, _find_set_coverage_in_burst
+from data_subscriber.rtc import evaluator_core
+from data_subscriber.rtc import mgrs_bursts_collection_db_client as mbc_client
+from data_subscriber.rtc.evaluator_core import remove_subsets, reduce_to_largest_set
+from tests.unit.synthetic_mgrs_burst_db import make_mgrs_burst_db_raw
+from util.sds_itertools import windowed_by_predicate
 
 
-def test_find_set_coverage_in_burst__when_full_coverage():
+def make_cmr_df(records):
+    """Creates a products DataFrame shaped like evaluator.load_cmr_df, sorted as evaluator.evaluate_rtc_products does"""
+    cmr_df = pd.DataFrame(records, columns=["product_id", "acquisition_dt", "burst_id_normalized", "relative_orbit_number", "relative_orbit_numbers"])
+    return cmr_df.sort_values(by=["relative_orbit_number", "acquisition_dt", "burst_id_normalized", "product_id"])
+
+
+def make_mbc_gdf(records):
+    return pd.DataFrame(records, columns=["mgrs_set_id", "relative_orbit_number", "orbits", "bursts_parsed", "number_of_bursts"])
+
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+MBC_GDF = make_mbc_gdf([("test_mgrs_set_id", 1, {1}, {"t001_000001_iw1", "t001_000001_iw2", "t001_000001_iw3"}, 3)])
+
+
+def test_process__when_full_coverage():
+    # ARRANGE
+    cmr_df = make_cmr_df([
+        ("A", T0, "t001_000001_iw1", 1, [1]),
+        ("B", T0, "t001_000001_iw2", 1, [1]),
+        ("C", T0, "t001_000001_iw3", 1, [1]),
+    ])
+
+    # ACT
+    r = evaluator_core.process(cmr_df, MBC_GDF, coverage_target=50)
+
+    # ASSERT
+    assert r == {100: {"test_mgrs_set_id": {frozenset({"A", "B", "C"})}}}
+
+
+def test_process__when_full_coverage__and_multi_revisions():
     # ARRANGE
-    mgrs_tile_collection_db_row = {
-        "orbits": [1],
-        "bursts_parsed": {"T1-1-IW1", "T1-1-IW2", "T1-1-IW3"},
-        "mgrs_set_id": "test_mgrs_set_id",
-        "number_of_bursts": 3
-    }
+    cmr_df = make_cmr_df([
+        ("A", T0, "t001_000001_iw1", 1, [1]),
+        ("B", T0, "t001_000001_iw2", 1, [1]),
+        ("C-r1", T0, "t001_000001_iw3", 1, [1]),
+        ("C-r2", T0, "t001_000001_iw3", 1, [1]),
+    ])
 
     # ACT
-    id, set_, coverage = _find_set_coverage_in_burst(
-        burst_set_row=mgrs_tile_collection_db_row,
-        orbit_to_window_to_products_map={
-            1: {
-                (0, 1): {
-                    "T1-1-IW1": [{"product_id": "A"}],
-                    "T1-1-IW2": [{"product_id": "B"}],
-                    "T1-1-IW3": [{"product_id": "C"}]
-                }
-            }
-        },
-        time_window=(0, 1)
-    )
+    r = evaluator_core.process(cmr_df, MBC_GDF, coverage_target=50)
 
     # ASSERT
-    assert id == "test_mgrs_set_id"
-    assert set_ == {"A", "B", "C"}
-    assert coverage == 100
+    assert r == {100: {"test_mgrs_set_id": {frozenset({"A", "B", "C-r2"})}}}
 
 
-def test_find_set_coverage_in_burst__when_full_coverage__and_multi_revisions():
+def test_process__when_partial_coverage():
     # ARRANGE
-    mgrs_tile_collection_db_row = {
-        "orbits": [1],
-        "bursts_parsed": {"T1-1-IW1", "T1-1-IW2", "T1-1-IW3"},
-        "mgrs_set_id": "test_mgrs_set_id",
-        "number_of_bursts": 3
-    }
+    cmr_df = make_cmr_df([
+        ("A", T0, "t001_000001_iw1", 1, [1]),
+        ("B", T0 + timedelta(seconds=2), "t001_000001_iw2", 1, [1]),
+    ])
 
     # ACT
-    id, set_, coverage = _find_set_coverage_in_burst(
-        burst_set_row=mgrs_tile_collection_db_row,
-        orbit_to_window_to_products_map={
-            1: {
-                (0, 1): {
-                    "T1-1-IW1": [{"product_id": "A"}],
-                    "T1-1-IW2": [{"product_id": "B"}],
-                    "T1-1-IW3": [{"product_id": "C-r1"}, {"product_id": "C-r2"}]
-                }
-            }
-        },
-        time_window=(0, 1)
-    )
+    r = evaluator_core.process(cmr_df, MBC_GDF, coverage_target=50)
 
     # ASSERT
-    assert id == "test_mgrs_set_id"
-    assert set_ == {"A", "B", "C-r2"}
-    assert coverage == 100
+    assert r == {50: {"test_mgrs_set_id": {frozenset({"A", "B"})}}}
 
 
-def test_find_set_coverage_in_burst__when_partial_coverage():
+def test_process__when_partial_coverage_2():
     # ARRANGE
-    mgrs_tile_collection_db_row = {
-        "orbits": [1],
-        "bursts_parsed": {"T1-1-IW1", "T1-1-IW2", "T1-1-IW3"},
-        "mgrs_set_id": "test_mgrs_set_id",
-        "number_of_bursts": 3
-    }
+    cmr_df = make_cmr_df([("A", T0, "t001_000001_iw1", 1, [1])])
 
     # ACT
-    id, set_, coverage = _find_set_coverage_in_burst(
-        burst_set_row=mgrs_tile_collection_db_row,
-        orbit_to_window_to_products_map={
-            1: {
-                (0, 1): {
-                    "T1-1-IW1": [{"product_id": "A"}],
-                    "T1-1-IW2": [{"product_id": "B"}]
-                }
-            }
-        },
-        time_window=(0, 1)
-    )
+    r = evaluator_core.process(cmr_df, MBC_GDF, coverage_target=50)
 
     # ASSERT
-    assert id == "test_mgrs_set_id"
-    assert set_ == {"A", "B"}
-    assert coverage == 66
+    assert r == {-1: {"test_mgrs_set_id": {frozenset({"A"})}}}
 
 
-def test_find_set_coverage_in_burst__when_partial_coverage_2():
+def test_process__when_no_coverage():
     # ARRANGE
-    mgrs_tile_collection_db_row = {
-        "orbits": [1],
-        "bursts_parsed": {"T1-1-IW1", "T1-1-IW2", "T1-1-IW3"},
-        "mgrs_set_id": "test_mgrs_set_id",
-        "number_of_bursts": 3
-    }
+    cmr_df = make_cmr_df([("A", T0, "t002_000001_iw1", 2, [2])])
 
     # ACT
-    id, set_, coverage = _find_set_coverage_in_burst(
-        burst_set_row=mgrs_tile_collection_db_row,
-        orbit_to_window_to_products_map={
-            1: {
-                (0, 1): {
-                    "T1-1-IW1": [{"product_id": "A"}]
-                }
-            }
-        },
-        time_window=(0, 1)
-    )
+    r = evaluator_core.process(cmr_df, MBC_GDF, coverage_target=50)
 
     # ASSERT
-    assert id == "test_mgrs_set_id"
-    assert set_ == {"A"}
-    assert coverage == 33
+    assert r == {}
 
 
-def test_find_set_coverage_in_burst__when_no_coverage():
+def test_process__when_full_and_partial_coverage_in_different_windows__then_only_full():
     # ARRANGE
-    mgrs_tile_collection_db_row = {
-        "orbits": [1],
-        "bursts_parsed": {"T1-1-IW1", "T1-1-IW2", "T1-1-IW3"},
-        "mgrs_set_id": "test_mgrs_set_id",
-        "number_of_bursts": 3
-    }
+    cycle = timedelta(days=12)
+    cmr_df = make_cmr_df([
+        ("A", T0, "t001_000001_iw1", 1, [1]),
+        ("B", T0, "t001_000001_iw2", 1, [1]),
+        ("C", T0, "t001_000001_iw3", 1, [1]),
+        ("D", T0 + cycle, "t001_000001_iw1", 1, [1]),
+    ])
 
     # ACT
-    id, set_, coverage = _find_set_coverage_in_burst(
-        burst_set_row=mgrs_tile_collection_db_row,
-        orbit_to_window_to_products_map={
-            1: {
-                (0, 1): {}
-            }
-        },
-        time_window=(0, 1)
-    )
+    r = evaluator_core.process(cmr_df, MBC_GDF, coverage_target=50)
 
     # ASSERT
-    assert id == "test_mgrs_set_id"
-    assert set_ == set()
-    assert coverage == 0
+    assert r == {100: {"test_mgrs_set_id": {frozenset({"A", "B", "C"})}}, -1: {}}
 
 
 def test_reduce_to_largest_set():
@@ -176,6 +144,17 @@ def test_remove_subsets():
     assert r == frozenset({frozenset({"A", "B", "C"})})
 
 
+def test_remove_subsets__when_overlapping_sets():
+    # ARRANGE
+    sets = [frozenset("AB"), frozenset("BC"), frozenset("ABC"), frozenset("CD"), frozenset("D"), frozenset("CD")]
+
+    # ACT
+    r = remove_subsets(sets)
+
+    # ASSERT
+    assert r == frozenset({frozenset("ABC"), frozenset("CD")})
+
+
 def test_remove_subsets__when_empty_return_empty():
     # ARRANGE
     sets = set()
@@ -196,3 +175,159 @@ def test_remove_subsets__when_contains_empty_return_empty():
 
     # ASSERT
     assert r == set()
+
+
+def make_synthetic_evaluator_inputs(num_orbits, sets_per_orbit, num_cycles, seed=0):
+    """
+    Creates a synthetic MGRS burst set database and the RTC products of `num_cycles` passes over each orbit.
+
+    The last burst set of each orbit also spans the first bursts of the next orbit, as burst sets crossing the
+    ascending node do. Passes may start or end part way along the orbit, and some bursts are missing or revised.
+    """
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.setattr(mbc_client, "get_mgrs_burst_db_parquet_filepath", lambda: mbc_client.Path("/nonexistent.parquet"))
+    monkeypatch.setattr(mbc_client, "load_mgrs_burst_db_raw", lambda filter_land: make_mgrs_burst_db_raw(num_orbits, sets_per_orbit))
+    mbc_gdf = mbc_client.load_mgrs_burst_db()
+    monkeypatch.undo()
+
+    num_positions = sets_per_orbit * 8 + 1
+    for orbit in range(1, num_orbits):
+        row = mbc_gdf.index[mbc_gdf["mgrs_set_id"] == f"MS_{orbit}_{sets_per_orbit - 1}"][0]
+        next_bursts = {f"t{orbit + 1:03d}_{(orbit + 1) * 10_000 + i:06d}_iw{swath}" for i in range(3) for swath in (1, 2, 3)}
+        mbc_gdf.at[row, "bursts_parsed"] = mbc_gdf.at[row, "bursts_parsed"] | next_bursts
+        mbc_gdf.at[row, "orbits"] = {orbit, orbit + 1}
+        mbc_gdf.at[row, "number_of_bursts"] = len(mbc_gdf.at[row, "bursts_parsed"])
+
+    burst_to_orbits = defaultdict(set)
+    for orbit, bursts in zip(mbc_gdf["relative_orbit_number"], mbc_gdf["bursts_parsed"]):
+        for burst in bursts:
+            burst_to_orbits[burst].add(orbit)
+
+    rng = random.Random(seed)
+    records = []
+    for cycle in range(num_cycles):
+        for orbit in range(1, num_orbits + 1):
+            pass_start = T0 + timedelta(days=12 * cycle, minutes=98.6 * (orbit - 1))
+            first_position = rng.choice([0, 0, rng.randrange(num_positions)])
+            last_position = rng.choice([num_positions, num_positions, rng.randrange(first_position, num_positions + 1)])
+            for position in range(first_position, last_position):
+                acquisition_dt = (pass_start + timedelta(seconds=2.7 * position)).replace(microsecond=0)
+                for swath in (1, 2, 3):
+                    if rng.random() < 0.03:
+                        continue
+                    burst_id = f"t{orbit:03d}_{orbit * 10_000 + position:06d}_iw{swath}"
+                    for revision in range(1 if rng.random() < 0.9 else 2):
+                        product_id = (f"OPERA_L2_RTC-S1_{burst_id.upper().replace('_', '-')}_{acquisition_dt:%Y%m%dT%H%M%SZ}_"
+                                      f"2024{cycle + 2:02d}{revision + 10:02d}T000000Z_S1A_30_v1.0")
+                        records.append((product_id, acquisition_dt, burst_id, orbit, sorted(burst_to_orbits[burst_id])))
+
+    return make_cmr_df(records), mbc_gdf
+
+
+def process_reference(cmr_df, mbc_gdf, coverage_target):
+    """
+    The previous, nested-loop evaluator core, run in a single process. As ties between the largest product sets were
+    broken arbitrarily, every largest set is returned.
+    """
+    orbit_to_products_map = defaultdict(partial(defaultdict, partial(defaultdict, list)))
+    for record in cmr_df.to_dict('records'):
+        for relative_orbit_number in record["relative_orbit_numbers"]:
+            orbit_to_products_map[relative_orbit_number][record["acquisition_dt"]][record["burst_id_normalized"]].append(record)
+
+    max_duration = timedelta(minutes=math.ceil((123 * 2.7 + 1) / 60))
+    orbit_to_window_to_products_map = defaultdict(partial(defaultdict, partial(defaultdict, set)))
+    for orbit in orbit_to_products_map:
+        acquisition_dts = sorted(orbit_to_products_map[orbit].keys())
+        dt_windows = windowed_by_predicate(iterable=acquisition_dts, pred=lambda a, b: max(a, b) - min(a, b) <= max_duration, sorted_=True, set_=False)
+        dt_intervals = [(w[0], w[-1]) for w in dt_windows]
+        dt_intervals = [a for a in dt_intervals if not any((a[0] > b[0] and a[1] <= b[1]) or (a[0] >= b[0] and a[1] < b[1]) for b in dt_intervals)]
+        for dt_interval in dt_intervals:
+            for acquisition_dt in orbit_to_products_map[orbit].keys():
+                if dt_interval[0] <= acquisition_dt <= dt_interval[1]:
+                    orbit_to_window_to_products_map[orbit][dt_interval].update(orbit_to_products_map[orbit][acquisition_dt])
+
+    coverage_to_mgrs_set_id_to_product_sets_map = defaultdict(partial(defaultdict, set))
+    for orbit in list(orbit_to_products_map):
+        for time_window in list(orbit_to_window_to_products_map[orbit]):
+            for _, row in mbc_gdf[mbc_gdf["relative_orbit_number"] == orbit].iterrows():
+                cmr_bursts = set(itertools.chain.from_iterable(orbit_to_window_to_products_map[o][time_window].keys() for o in row["orbits"]))
+                found_bursts = set(row["bursts_parsed"]).intersection(cmr_bursts)
+                coverage = int(len(found_bursts) / row["number_of_bursts"] * 100)
+                product_set = frozenset(
+                    product["product_id"]
+                    for burst in found_bursts
+                    for o in row["orbits"]
+                    for product in orbit_to_window_to_products_map[o][time_window].get(burst, [])[-1:]
+                )
+                if not product_set:
+                    continue
+                coverage_group = 100 if coverage == 100 else coverage_target if coverage >= coverage_target else -1
+                coverage_to_mgrs_set_id_to_product_sets_map[coverage_group][row["mgrs_set_id"]].add(product_set)
+
+    result = defaultdict(dict)
+    for coverage_group, mgrs_set_id_to_product_sets_map in coverage_to_mgrs_set_id_to_product_sets_map.items():
+        for mgrs_set_id, product_sets in mgrs_set_id_to_product_sets_map.items():
+            r = {a for a in product_sets if not any(a < b for b in product_sets)}
+            result[coverage_group][mgrs_set_id] = {a for a in r if len(a) == max(map(len, r))}
+
+    mgrs_set_id_to_sets_count_map = defaultdict(int)
+    for coverage_group in result:
+        for mgrs_set_id in result[coverage_group]:
+            mgrs_set_id_to_sets_count_map[mgrs_set_id] += 1
+    for mgrs_set_id, count in mgrs_set_id_to_sets_count_map.items():
+        if count > 1:
+            for coverage_group in [coverage_group for coverage_group in result if coverage_group != 100]:
+                result[coverage_group].pop(mgrs_set_id, None)
+    return dict(result)
+
+
+def assert_matches_reference(r, reference):
+    assert r.keys() == reference.keys()
+    for coverage_group in reference:
+        assert r[coverage_group].keys() == reference[coverage_group].keys()
+        for mgrs_set_id, product_sets in r[coverage_group].items():
+            assert len(product_sets) == 1
+            assert product_sets <= reference[coverage_group][mgrs_set_id]
+
+
+@pytest.mark.parametrize("coverage_target", [0, 50, 100])
+def test_process__matches_reference_on_multi_orbit_data(coverage_target):
+    # ARRANGE
+    cmr_df, mbc_gdf = make_synthetic_evaluator_inputs(num_orbits=6, sets_per_orbit=10, num_cycles=3)
+
+    # ACT
+    r = evaluator_core.process(cmr_df, mbc_gdf, coverage_target)
+
+    # ASSERT
+    reference = process_reference(cmr_df, mbc_gdf, coverage_target)
+    assert 100 in reference and len(reference) > 1
+    assert any(len(product_sets) > 1 for group in reference.values() for product_sets in group.values())  # ties
+    assert_matches_reference(r, reference)
+
+
+@pytest.mark.benchmark
+def test_benchmark__process_10k_to_1m_products():
+    # ARRANGE
+    # (number of orbits, number of cycles) of roughly 10k, 100k and 1M products
+    sizes = [(2, 6), (18, 6), (175, 8)]
+
+    # ACT
+    timings = {}
+    for num_orbits, num_cycles in sizes:
+        cmr_df, mbc_gdf = make_synthetic_evaluator_inputs(num_orbits=num_orbits, sets_per_orbit=40, num_cycles=num_cycles)
+        start = time.perf_counter()
+        r = evaluator_core.process(cmr_df, mbc_gdf, coverage_target=50)
+        timings[len(cmr_df)] = time.perf_counter() - start
+        assert len(r[100]) > 0
+
+    cmr_df, mbc_gdf = make_synthetic_evaluator_inputs(num_orbits=sizes[0][0], sets_per_orbit=40, num_cycles=sizes[0][1])
+    start = time.perf_counter()
+    reference = process_reference(cmr_df, mbc_gdf, coverage_target=50)
+    reference_secs = time.perf_counter() - start
+
+    # ASSERT
+    logging.info(", ".join(f"{num_products:,} products: {secs:.2f}s" for num_products, secs in timings.items())
+                 + f", reference {len(cmr_df):,} products: {reference_secs:.2f}s")
+    assert_matches_reference(evaluator_core.process(cmr_df, mbc_gdf, coverage_target=50), reference)
+    assert timings[len(cmr_df)] < reference_secs / 10
+    assert max(timings) >= 1_000_000
@@ -0,0 +1,391 @@
+import copy
+import hashlib
+import logging
+import time
+from datetime import datetime
+
+import pytest
+
+from data_subscriber import es_conn_util, query as query_module
+from data_subscriber.cmr import DateTimeRange
+from data_subscriber.hls.hls_catalog import HLSProductCatalog
+from data_subscriber.hls.hls_query import HlsCmrQuery
+from data_subscriber.parser import create_parser
+from data_subscriber.query import BaseQuery
+from data_subscriber.slc.slc_catalog import SLCProductCatalog
+from tests.unit.fake_cmr_server import make_umm_granules
+from tests.unit.fake_es import FakeEsUtil
+from tests.unit.fake_mozart_server import FakeMozartServer
+from tools.ops.cmr_audit import cmr_client
+from util.conf_util import SettingsConf
+
+START = datetime(2024, 1, 1, 0, 0, 0)
+END = datetime(2024, 1, 1, 1, 0, 0)
+HLS_BANDS = ["B02", "B03", "B04", "B8A", "B11", "B12", "Fmask"]
+QUERY_TIMERANGE = DateTimeRange("2024-01-01T00:00:00Z", "2024-01-01T01:00:00Z")
+
+
+def make_hls_umm_granules(count):
+    items = make_umm_granules(count, START, END, collection="HLSS30")
+    for item in items:
+        granule_id = item["umm"]["GranuleUR"]
+        item["umm"]["AdditionalAttributes"] = [{"Name": "PRODUCT_URI", "Values": [f"S2A_{granule_id}"]}]
+        item["umm"]["RelatedUrls"] = [{"URL": f"https://example.com/{granule_id}.{band}.tif"} for band in HLS_BANDS]
+    return items
+
+
+class FakeMozart:
+    """Records download job submissions, taking `latency` seconds for each."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.submissions = []
+
+    def submit_mozart_job(self, *, hysdsio, job_name, **kwargs):
+        time.sleep(self.latency)
+        self.submissions.append((time.perf_counter(), job_name, hysdsio["params"][0]["value"]))
+        return f"job-{len(self.submissions)}"
+
+
+@pytest.fixture
+def fake_cmr(fake_cmr_server, monkeypatch):
+    """Serves synthetic HLS granules, 10 per search page, from a local CMR search API with 0.1 seconds of latency"""
+    server = fake_cmr_server(make_hls_umm_granules(60), latency=0.1)
+
+    fetch_post_url = cmr_client.fetch_post_url
+    monkeypatch.setattr(cmr_client, "CMR_PAGE_SIZE", 10)
+    monkeypatch.setattr(cmr_client, "fetch_post_url",
+                        lambda session, url, data, headers: fetch_post_url(session, server.url, data, headers))
+    return server
+
+
+@pytest.fixture
+def fake_cmr_with_later_revision(fake_cmr_server, monkeypatch):
+    """Like fake_cmr, but the latest granule, on the first search page, has a higher revision on the last page"""
+    items = make_hls_umm_granules(60)
+    revised_item = copy.deepcopy(items[-1])
+    revised_item["meta"]["revision-id"] = 2
+    revised_item["umm"]["TemporalExtent"] = copy.deepcopy(items[0]["umm"]["TemporalExtent"])
+    server = fake_cmr_server(items + [revised_item], latency=0.1)
+
+    fetch_post_url = cmr_client.fetch_post_url
+    monkeypatch.setattr(cmr_client, "CMR_PAGE_SIZE", 10)
+    monkeypatch.setattr(cmr_client, "fetch_post_url",
+                        lambda session, url, data, headers: fetch_post_url(session, server.url, data, headers))
+    return revised_item["umm"]["GranuleUR"]
+
+
+def run_hls_query(monkeypatch, pipelined: bool):
+    fake_es_util = FakeEsUtil()
+    fake_mozart = FakeMozart(latency=0.02)
+    monkeypatch.setattr(es_conn_util, "get_es_connection", lambda logger=None: fake_es_util)
+    monkeypatch.setattr("util.job_submitter.submit_job", fake_mozart.submit_mozart_job)
+
+    args = create_parser().parse_args([
+        "query", "--collection-shortname=HLSS30", "--start-date=2024-01-01T00:00:00Z",
+        "--end-date=2024-01-01T01:00:00Z", "--use-temporal", "--chunk-size=2", "--job-queue=test-queue",
+        "--transfer-protocol=https"
+    ])
+    settings = {**SettingsConf().cfg, "RELEASE_VERSION": "test"}
+
+    es_conn = HLSProductCatalog()
+    query = HlsCmrQuery(args, "token", es_conn, "cmr.test", "job_id", settings)
+    query.PIPELINED_QUERY = pipelined
+
+    start = time.perf_counter()
+    result = query.run_query()
+    total_secs = time.perf_counter() - start
+    first_submission_secs = fake_mozart.submissions[0][0] - start
+
+    return result, fake_es_util, fake_mozart, first_submission_secs, total_secs
+
+
+def test_run_query__when_pipelined__then_same_catalog_and_jobs_as_sequential(fake_cmr, monkeypatch):
+    # ACT
+    sequential_result, sequential_es, sequential_mozart, _, _ = run_hls_query(monkeypatch, pipelined=False)
+    pipelined_result, pipelined_es, pipelined_mozart, _, _ = run_hls_query(monkeypatch, pipelined=True)
+
+    # ASSERT
+    def doc_ids(fake_es_util):
+        return {index.split("-")[0]: sorted(docs) for index, docs in fake_es_util.es.docs.items()}
+
+    assert doc_ids(pipelined_es) == doc_ids(sequential_es)
+    assert len(doc_ids(pipelined_es)["hls_catalog"]) == 60 * len(HLS_BANDS)
+    assert len(doc_ids(pipelined_es)["hls_spatial_catalog"]) == 60
+
+    # batches are chunked the same way, with the URLs of a batch never split across jobs
+    assert sorted(submission[1:] for submission in pipelined_mozart.submissions) \
+           == sorted(submission[1:] for submission in sequential_mozart.submissions)
+    assert len(pipelined_result["success"]) == 30
+    assert [granule["granule_id"] for granule in pipelined_result["download_granules"]] \
+           == [granule["granule_id"] for granule in sequential_result["download_granules"]]
+
+
+def test_run_query__when_pipelined_and_higher_revision_on_later_page__then_submitted_once(fake_cmr_with_later_revision,
+                                                                                          monkeypatch):
+    # ARRANGE
+    revised_granule_id = fake_cmr_with_later_revision
+
+    # ACT
+    result, fake_es_util, fake_mozart, _, _ = run_hls_query(monkeypatch, pipelined=True)
+
+    # ASSERT
+    revised_granule_submissions = [submission for submission in fake_mozart.submissions if revised_granule_id in submission[2]]
+    assert len(revised_granule_submissions) == 1
+    assert len(fake_mozart.submissions) == 30
+    assert [granule["granule_id"] for granule in result["download_granules"]].count(revised_granule_id) == 1
+
+    # the higher revision is still catalogued
+    assert {source.get("revision_id") for index, docs in fake_es_util.es.docs.items() if index.startswith("hls_catalog")
+            for _id, source in docs.items() if revised_granule_id in _id} >= {2}
+
+    # the catalog is refreshed once for all pages, and once more after recording the download job ids
+    assert fake_es_util.requests["refresh"] == 2
+
+
+@pytest.mark.benchmark
+def test_run_query__when_pipelined__then_jobs_submitted_sooner_and_faster(fake_cmr, monkeypatch):
+    # ACT
+    _, _, _, sequential_first_submission_secs, sequential_total_secs = run_hls_query(monkeypatch, pipelined=False)
+    _, _, _, pipelined_first_submission_secs, pipelined_total_secs = run_hls_query(monkeypatch, pipelined=True)
+
+    logging.info(f"First job submission: sequential={sequential_first_submission_secs:.2f}s, "
+                 f"pipelined={pipelined_first_submission_secs:.2f}s")
+    logging.info(f"Total: sequential={sequential_total_secs:.2f}s, pipelined={pipelined_total_secs:.2f}s")
+
+    # ASSERT
+    assert pipelined_first_submission_secs < sequential_first_submission_secs / 2
+    assert pipelined_total_secs < sequential_total_secs
+
+
+@pytest.fixture
+def fake_mozart(monkeypatch):
+    """A local Mozart job submission API taking 0.01 seconds per submission, used by data_subscriber.query"""
+    with FakeMozartServer(latency=0.01) as server:
+        monkeypatch.setattr("data_subscriber.query.submit_mozart_job", server.submit_mozart_job)
+        monkeypatch.setattr("util.job_submitter.submit_job", server.submit_mozart_job)
+        yield server
+
+
+@pytest.fixture
+def hls_query(monkeypatch):
+    fake_es_util = FakeEsUtil()
+    monkeypatch.setattr(es_conn_util, "get_es_connection", lambda logger=None: fake_es_util)
+    monkeypatch.setattr(HLSProductCatalog, "BULK_RETRY_DELAY_SECS", 0)
+
+    args = create_parser().parse_args([
+        "query", "--collection-shortname=HLSS30", "--start-date=2024-01-01T00:00:00Z",
+        "--end-date=2024-01-01T01:00:00Z", "--chunk-size=1", "--job-queue=test-queue", "--transfer-protocol=https"
+    ])
+    settings = {**SettingsConf().cfg, "RELEASE_VERSION": "test"}
+
+    return HlsCmrQuery(args, "token", HLSProductCatalog(), "cmr.test", "job_id", settings)
+
+
+def index_batches(fake_es_util, num_batches) -> dict:
+    """Catalogs one document per batch, returning the URLs of each batch"""
+    batch_id_to_urls_map = {}
+    for i in range(num_batches):
+        batch_id = f"HLS.S30.T{i:05d}.2024001T000000.v2.0-r1"
+        fake_es_util.index_document(index="hls_catalog-2024.01", id=f"{batch_id}.B02.tif",
+                                    body={"id": f"{batch_id}.B02.tif", "download_batch_id": batch_id})
+        batch_id_to_urls_map[batch_id] = {f"https://example.com/{batch_id}.B02.tif"}
+    return batch_id_to_urls_map
+
+
+def test_submit_download_job_submissions_tasks__then_job_ids_marked_in_bulk(hls_query, fake_mozart):
+    # ARRANGE
+    fake_es_util = hls_query.es_conn.es_util
+    batch_id_to_urls_map = index_batches(fake_es_util, 2_000)
+    fake_es_util.requests.clear()
+
+    # ACT
+    results = hls_query.submit_download_job_submissions_tasks(batch_id_to_urls_map, QUERY_TIMERANGE)
+
+    # ASSERT
+    assert fake_mozart.request_count == 2_000
+    assert fake_es_util.requests == {"query": 2, "bulk": 4, "refresh": 1}  # ceil(2,000 / 1,024) and ceil(2,000 / 500)
+
+    job_ids = [fake_mozart.job_ids[f"job-WF-hls_download-{batch_id}"] for batch_id in batch_id_to_urls_map]
+    assert results == job_ids
+    assert [doc["download_job_id"] for doc in fake_es_util.es.docs["hls_catalog-2024.01"].values()] == job_ids
+
+
+def test_submit_download_job_submissions_tasks__when_submissions_fail__then_retried_and_raised(hls_query, fake_mozart):
+    # ARRANGE
+    fake_es_util = hls_query.es_conn.es_util
+    batch_id_to_urls_map = index_batches(fake_es_util, 10)
+    batch_ids = list(batch_id_to_urls_map)
+    fake_mozart.fail_next.update({f"job-WF-hls_download-{batch_ids[2]}": 1, f"job-WF-hls_download-{batch_ids[5]}": 3})
+
+    # ACT
+    with pytest.raises(Exception, match="Failed to submit 1 of 10 download jobs"):
+        hls_query.submit_download_job_submissions_tasks(batch_id_to_urls_map, QUERY_TIMERANGE)
+
+    # ASSERT
+    assert fake_mozart.requests[f"job-WF-hls_download-{batch_ids[2]}"] == 2
+    assert fake_mozart.requests[f"job-WF-hls_download-{batch_ids[5]}"] == 3
+
+    # the download job ids of the other submissions are recorded before raising
+    docs = fake_es_util.es.docs["hls_catalog-2024.01"]
+    assert "download_job_id" not in docs[f"{batch_ids[5]}.B02.tif"]
+    assert docs[f"{batch_ids[2]}.B02.tif"]["download_job_id"] == fake_mozart.job_ids[f"job-WF-hls_download-{batch_ids[2]}"]
+    assert all(docs[f"{batch_id}.B02.tif"]["download_job_id"] for i, batch_id in enumerate(batch_ids) if i != 5)
+
+
+def test_run_query__when_pipelined_and_submission_fails__then_raised_after_job_ids_marked(fake_cmr, monkeypatch):
+    # ARRANGE
+    submit_mozart_job = FakeMozart().submit_mozart_job
+
+    def fail_first_chunk(*, hysdsio, job_name, **kwargs):
+        if job_name.endswith("GRANULE_00000059-r1"):
+            raise Exception("Service Unavailable")
+        return submit_mozart_job(hysdsio=hysdsio, job_name=job_name, **kwargs)
+
+    fake_es_util = FakeEsUtil()
+    monkeypatch.setattr(es_conn_util, "get_es_connection", lambda logger=None: fake_es_util)
+    monkeypatch.setattr("util.job_submitter.submit_job", fail_first_chunk)
+
+    args = create_parser().parse_args([
+        "query", "--collection-shortname=HLSS30", "--start-date=2024-01-01T00:00:00Z",
+        "--end-date=2024-01-01T01:00:00Z", "--use-temporal", "--chunk-size=2", "--job-queue=test-queue",
+        "--transfer-protocol=https"
+    ])
+    es_conn = HLSProductCatalog()
+    marked_batch_id_to_job_id = {}
+    monkeypatch.setattr(es_conn, "mark_download_job_ids", marked_batch_id_to_job_id.update)
+    query = HlsCmrQuery(args, "token", es_conn, "cmr.test", "job_id", {**SettingsConf().cfg, "RELEASE_VERSION": "test"})
+    query.PIPELINED_QUERY = True
+
+    # ACT
+    with pytest.raises(Exception, match="Failed to submit 1 of 30 download jobs"):
+        query.run_query()
+
+    # ASSERT
+    # the download job ids of the other submissions are recorded before raising
+    assert len(marked_batch_id_to_job_id) == 29 * 2
+    assert "HLSS30_GRANULE_00000059-r1" not in marked_batch_id_to_job_id
+
+
+@pytest.mark.benchmark
+def test_benchmark__submit_2k_download_jobs(hls_query, fake_mozart):
+    # ARRANGE
+    fake_es_util = hls_query.es_conn.es_util
+    batch_id_to_urls_map = index_batches(fake_es_util, 2_000)
+    fake_es_util.requests.clear()
+
+    # ACT
+    start = time.perf_counter()
+    hls_query.submit_download_job_submissions_tasks(batch_id_to_urls_map, QUERY_TIMERANGE)
+    concurrent_secs = time.perf_counter() - start
+    concurrent_es_requests = dict(fake_es_util.requests)
+
+    # one job submission and one update_by_query per batch, sampled
+    num_sampled = 100
+    fake_es_util.requests.clear()
+    start = time.perf_counter()
+    for batch_id in list(batch_id_to_urls_map)[:num_sampled]:
+        job_id = query_module.submit_download_job(
+            release_version="test", product_type="hls", params=[], job_queue="test-queue",
+            job_name=f"job-WF-hls_download-{batch_id}-sequential"
+        )
+        hls_query.es_conn.mark_download_job_id(batch_id, job_id)
+    sequential_secs = (time.perf_counter() - start) * len(batch_id_to_urls_map) / num_sampled
+    sequential_es_requests = {api: count * len(batch_id_to_urls_map) // num_sampled
+                              for api, count in fake_es_util.requests.items()}
+
+    logging.info(f"Concurrent: {concurrent_secs:.2f}s, ES requests: {concurrent_es_requests}")
+    logging.info(f"Sequential (extrapolated): {sequential_secs:.2f}s, ES requests: {sequential_es_requests}")
+
+    # ASSERT
+    assert concurrent_secs < sequential_secs / 2
+
+
+@pytest.fixture
+def slc_query(monkeypatch):
+    fake_es_util = FakeEsUtil()
+    monkeypatch.setattr(es_conn_util, "get_es_connection", lambda logger=None: fake_es_util)
+
+    args = create_parser().parse_args([
+        "query", "--collection-shortname=SENTINEL-1A_SLC", "--start-date=2024-01-01T00:00:00Z",
+        "--end-date=2024-01-01T01:00:00Z", "--chunk-size=1", "--job-queue=test-queue", "--transfer-protocol=s3"
+    ])
+    settings = {**SettingsConf().cfg, "RELEASE_VERSION": "test"}
+
+    return BaseQuery(args, "token", SLCProductCatalog(), "cmr.test", "job_id", settings)
+
+
+def make_slc_granules(count):
+    granules = []
+    for i in range(count):
+        name = f"S1A_IW_SLC__1SDV_20240101T000000_20240101T000027_0{i:05d}_05308F_86F3"
+        granules.append({
+            "granule_id": f"{name}-SLC",
+            "revision_id": i % 3 + 1,
+            "filtered_urls": [f"s3://asf-cumulus-prod-slc/SA/{name}.zip"]
+        })
+    return granules
+
+
+def test_download_job_submission_handler__when_slc__then_payload_hashes_unchanged_without_es_reads(slc_query, fake_mozart, monkeypatch):
+    # ARRANGE
+    granules = make_slc_granules(50)
+    granule_and_revision = slc_query.es_conn.granule_and_revision
+
+    # payload hashes as formed from the granules parsed out of each batch ID
+    batch_ids = [f"{granule['granule_id'][:-4]}.zip-r{granule['revision_id']}" for granule in granules]
+    expected_payload_hashes = [hashlib.md5(granule_and_revision(batch_id)[0].encode()).hexdigest() for batch_id in batch_ids]
+
+    granule_and_revision_calls = []
+    monkeypatch.setattr(slc_query.es_conn, "granule_and_revision",
+                        lambda es_id: granule_and_revision_calls.append(es_id) or granule_and_revision(es_id))
+    submitted_job_kwargs = []
+    monkeypatch.setattr(query_module, "try_submit_mozart_job",
+                        lambda **kwargs: submitted_job_kwargs.append(kwargs) or f"job-{len(submitted_job_kwargs)}")
+    fake_es_util = slc_query.es_conn.es_util
+
+    # ACT
+    results = slc_query.download_job_submission_handler(granules, QUERY_TIMERANGE)
+
+    # ASSERT
+    assert len(results) == 50
+    assert sorted(kwargs["payload_hash"] for kwargs in submitted_job_kwargs) == sorted(expected_payload_hashes)
+    assert sorted(kwargs["job_name"] for kwargs in submitted_job_kwargs) \
+           == sorted(f"job-WF-slc_download-{batch_id}" for batch_id in batch_ids)
+
+    assert granule_and_revision_calls == []
+    # the only ES requests left are the lookup and refresh recording the download job ids, made once for all batches
+    assert fake_es_util.requests == {"query": 1, "refresh": 1}
+
+
+def test_download_job_submission_handler__when_slc_revisions__then_batch_per_revision_with_same_payload_hash(slc_query, fake_mozart, monkeypatch):
+    # ARRANGE
+    granule = make_slc_granules(1)[0]
+    granules = [granule, {**granule, "revision_id": 7}]
+    submitted_job_kwargs = []
+    monkeypatch.setattr(query_module, "try_submit_mozart_job",
+                        lambda **kwargs: submitted_job_kwargs.append(kwargs) or f"job-{len(submitted_job_kwargs)}")
+
+    # ACT
+    slc_query.download_job_submission_handler(granules, QUERY_TIMERANGE)
+
+    # ASSERT
+    batch_id = granule["granule_id"][:-4] + ".zip"
+    assert sorted(kwargs["job_name"] for kwargs in submitted_job_kwargs) \
+           == [f"job-WF-slc_download-{batch_id}-r1", f"job-WF-slc_download-{batch_id}-r7"]
+    assert {kwargs["payload_hash"] for kwargs in submitted_job_kwargs} == {hashlib.md5(granule["granule_id"].encode()).hexdigest()}
+
+
+def test_submit_download_job_submissions_tasks__when_no_download_batches__then_granule_parsed_from_batch_id(slc_query, monkeypatch):
+    # ARRANGE
+    batch_id = "S1A_IW_SLC__1SDV_20220601T000522_20220601T000549_043462_05308F_86F3.zip-r5"
+    submitted_job_kwargs = []
+    monkeypatch.setattr(query_module, "try_submit_mozart_job",
+                        lambda **kwargs: submitted_job_kwargs.append(kwargs) or "job-1")
+
+    # ACT
+    slc_query.submit_download_job_submissions_tasks({batch_id: {"s3://bucket/file.zip"}}, QUERY_TIMERANGE)
+
+    # ASSERT
+    assert submitted_job_kwargs[0]["payload_hash"] \
+           == hashlib.md5(b"S1A_IW_SLC__1SDV_20220601T000522_20220601T000549_043462_05308F_86F3-SLC").hexdigest()
@@ -0,0 +1,129 @@
+import asyncio
+import bisect
+import threading
+from datetime import datetime
+
+from aiohttp import web
+
+CMR_SEARCH_PATH = "/search/granules.umm_json"
+
+
+def make_umm_granules(count, start: datetime, end: datetime, collection="SENTINEL-1A_SLC", revision_id=1) -> list[dict]:
+    """Creates `count` synthetic UMM-JSON granule search items, evenly spaced in time between `start` and `end`."""
+    step = (end - start) / count
+    items = []
+    for i in range(count):
+        begin = (start + step * i).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        granule_id = f"{collection}_GRANULE_{i:08d}"
+        items.append({
+            "meta": {
+                "concept-id": f"G{i:010d}-ASF",
+                "native-id": granule_id,
+                "revision-id": revision_id,
+                "provider-id": "ASF",
+                "revision-date": begin,
+            },
+            "umm": {
+                "GranuleUR": granule_id,
+                "TemporalExtent": {"RangeDateTime": {"BeginningDateTime": begin, "EndingDateTime": begin}},
+                "DataGranule": {"ProductionDateTime": begin},
+                "ProviderDates": [{"Type": "Insert", "Date": begin}],
+                "Platforms": [{"ShortName": "Sentinel-1A"}],
+                "SpatialExtent": {"HorizontalSpatialDomain": {"Geometry": {"GPolygons": [{"Boundary": {"Points": [
+                    {"Latitude": 0.0, "Longitude": 0.0},
+                    {"Latitude": 1.0, "Longitude": 0.0},
+                    {"Latitude": 1.0, "Longitude": 1.0},
+                    {"Latitude": 0.0, "Longitude": 0.0},
+                ]}}]}}},
+                "RelatedUrls": [{"URL": f"https://example.com/{granule_id}_IW.zip"}],
+                "AdditionalAttributes": [],
+            },
+        })
+    return items
+
+
+class FakeCmrServer:
+    """
+    A local stand-in for the CMR granule search API. Serves the given UMM-JSON items, filtered by the "temporal" and
+    "revision_date" ranges of the request, sorted by "-start_date", and paged using CMR-Search-After.
+
+    The server runs its own event loop in a background thread, so it can be used from both sync and async tests.
+    """
+
+    def __init__(self, items: list[dict], latency=0.0):
+        self.items = sorted(items, key=_begin_datetime)
+        self._begin_datetimes = [_parse(_begin_datetime(item)) for item in self.items]
+        self.latency = latency
+        self.request_count = 0
+        self.url = None
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._started = threading.Event()
+
+    def __enter__(self):
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def __exit__(self, *args):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _serve(self):
+        asyncio.set_event_loop(self._loop)
+
+        app = web.Application()
+        app.router.add_post(CMR_SEARCH_PATH, self._search)
+        runner = web.AppRunner(app)
+        self._loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        self._loop.run_until_complete(site.start())
+
+        host, port = site._server.sockets[0].getsockname()[:2]
+        self.url = f"http://{host}:{port}{CMR_SEARCH_PATH}"
+        self._started.set()
+
+        self._loop.run_forever()
+        self._loop.run_until_complete(runner.cleanup())
+        self._loop.close()
+
+    async def _search(self, request: web.Request):
+        self.request_count += 1
+        await asyncio.sleep(self.latency)
+
+        form = await request.post()
+        page_size = int(form.get("page_size", 10))
+
+        matches = self.items
+        if "," in form.get("temporal", ""):
+            start, end = form["temporal"].split(",")
+            lo = bisect.bisect_left(self._begin_datetimes, _parse(start))
+            hi = bisect.bisect_right(self._begin_datetimes, _parse(end))
+            matches = matches[lo:hi]
+        if "," in form.get("revision_date", ""):
+            start, end = form["revision_date"].split(",")
+            matches = [item for item in matches if _in_range(item["meta"]["revision-date"], start, end)]
+        matches = matches[::-1]  # sort_key=-start_date
+
+        offset = int(request.headers.get("CMR-Search-After", 0))
+        page = matches[offset:offset + page_size]
+
+        headers = {"CMR-Hits": str(len(matches))}
+        if offset + page_size < len(matches):
+            headers["CMR-Search-After"] = str(offset + page_size)
+
+        return web.json_response({"hits": len(matches), "took": 1, "items": page}, headers=headers)
+
+
+def _begin_datetime(item) -> str:
+    return item["umm"]["TemporalExtent"]["RangeDateTime"]["BeginningDateTime"]
+
+
+def _in_range(dt: str, start: str, end: str) -> bool:
+    """Inclusive range check, like CMR's."""
+    return _parse(start) <= _parse(dt) <= _parse(end)
+
+
+def _parse(dt: str) -> datetime:
+    return datetime.fromisoformat(dt.replace("Z", "+00:00"))
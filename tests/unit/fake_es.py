@@ -0,0 +1,136 @@
+import fnmatch
+import json
+from collections import Counter
+from datetime import date, datetime
+from types import SimpleNamespace
+
+
+class _JSONSerializer:
+    def dumps(self, data):
+        if isinstance(data, str):
+            return data
+        return json.dumps(data, default=lambda o: o.isoformat() if isinstance(o, (date, datetime)) else str(o))
+
+    def loads(self, s):
+        return json.loads(s)
+
+
+class FakeIndicesClient:
+    def __init__(self, es: "FakeElasticsearch"):
+        self._es = es
+
+    def refresh(self, index=None, **kwargs):
+        self._es.requests["refresh"] += 1
+
+
+class FakeElasticsearch:
+    """
+    In-memory stand-in for the elasticsearch/opensearch client. Supports the subset of the API used by the product
+    catalogs: `bulk` (as used by the helpers module), `update_by_query` of a script over matching docs, and index
+    refreshes. Every request is counted in `requests`, keyed by API name.
+    """
+
+    def __init__(self):
+        self.docs: dict[str, dict[str, dict]] = {}  # index -> _id -> _source
+        self.requests = Counter()
+        self.transport = SimpleNamespace(serializer=_JSONSerializer())
+        self.indices = FakeIndicesClient(self)
+        self.fail_next = Counter()
+        """Number of times _bulk items for a given _id are rejected before succeeding"""
+
+    def bulk(self, body, *args, **kwargs):
+        self.requests["bulk"] += 1
+
+        lines = [json.loads(line) for line in body.splitlines() if line]
+        items = []
+        i = 0
+        while i < len(lines):
+            (op_type, meta), = lines[i].items()
+            source = lines[i + 1] if op_type != "delete" else None
+            i += 2 if op_type != "delete" else 1
+
+            if self.fail_next[meta["_id"]] > 0:
+                self.fail_next[meta["_id"]] -= 1
+                items.append({op_type: {**meta, "status": 429, "error": {"type": "es_rejected_execution_exception"}}})
+                continue
+
+            index_docs = self.docs.setdefault(meta["_index"], {})
+            if op_type == "update":
+                index_docs.setdefault(meta["_id"], {}).update(source["doc"])
+            elif op_type in ("index", "create"):
+                index_docs[meta["_id"]] = source
+            elif op_type == "delete":
+                index_docs.pop(meta["_id"], None)
+            items.append({op_type: {**meta, "status": 200, "result": "updated"}})
+
+        return {"took": 1, "errors": any(item[op]["status"] >= 300 for item in items for op in item), "items": items}
+
+    def update_by_query(self, index, body=None, refresh=None, **kwargs):
+        self.requests["update_by_query"] += 1
+
+        field, value = body["script"]["source"].removeprefix("ctx._source.").split(" = ")
+        hits = self.search_docs(index, body["query"])
+        for hit in hits:
+            hit["_source"][field] = value.strip("'")
+        return {"updated": len(hits)}
+
+    def search_docs(self, index_pattern, query) -> list[dict]:
+        return [
+            {"_index": index, "_id": _id, "_source": source}
+            for index, index_docs in self.docs.items() if fnmatch.fnmatch(index, index_pattern)
+            for _id, source in index_docs.items() if _matches(_id, source, query)
+        ]
+
+
+class FakeEsUtil:
+    """In-memory stand-in for the es_util (hysds_commons ElasticsearchUtility) interface used by the product catalogs."""
+
+    def __init__(self):
+        self.es = FakeElasticsearch()
+        self.queries: list[dict] = []
+        """The body of each query, in order"""
+
+    @property
+    def requests(self) -> Counter:
+        return self.es.requests
+
+    @property
+    def request_count(self) -> int:
+        return sum(self.es.requests.values())
+
+    def query(self, index, body=None, **kwargs):
+        self.es.requests["query"] += 1
+        self.queries.append(body)
+
+        hits = self.es.search_docs(index, (body or {}).get("query", {"match_all": {}}))
+        for sort in (body or {}).get("sort", []):
+            (field, order), = sort.items()
+            hits.sort(key=lambda hit: str(hit["_source"].get(field, "")), reverse=(order == "desc"))
+        return hits
+
+    def index_document(self, index, body, id=None, **kwargs):
+        self.es.requests["index"] += 1
+        self.es.docs.setdefault(index, {})[id] = body
+
+    def update_document(self, index, id, body, **kwargs):
+        self.es.requests["update"] += 1
+        self.es.docs.setdefault(index, {}).setdefault(id, {}).update(body["doc"])
+
+
+def _matches(_id, source, query) -> bool:
+    (clause, arg), = query.items()
+    if clause == "match_all":
+        return True
+    if clause == "bool":
+        return (all(_matches(_id, source, q) for q in arg.get("must", []))
+                and not any(_matches(_id, source, q) for q in arg.get("must_not", []))
+                and (not arg.get("should") or any(_matches(_id, source, q) for q in arg["should"])))
+    (field, value), = arg.items()
+    actual = _id if field == "_id" else source.get(field.removesuffix(".keyword"))
+    if clause in ("term", "match"):
+        return actual == value or str(actual) == str(value)
+    if clause == "terms":
+        return actual in value
+    if clause == "exists":
+        return source.get(value) is not None
+    raise NotImplementedError(f"Unsupported query clause {clause}")
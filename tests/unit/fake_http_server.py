@@ -0,0 +1,96 @@
+import re
+import socket
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_RANGE_RE = re.compile(r"^bytes=(\d+)-$")
+
+
+class FakeHttpFileServer:
+    """
+    A local HTTP file server for download tests. Serves the registered files, supporting `Range: bytes=N-` requests.
+
+    Mid-stream disconnects can be injected per path with `drop_after`: the next responses for the path are cut off
+    after the given number of bytes. Every GET is counted in `requests`, keyed by path.
+
+    Misbehaving servers can be simulated per path with `range_offset`, shifting the bytes served for a Range request
+    (and its Content-Range) by the given offset, or with `ignore_range`, answering Range requests with the whole file.
+    """
+
+    def __init__(self):
+        self.files: dict[str, bytes] = {}
+        self.drop_after: dict[str, list[int]] = {}
+        self.range_offset: dict[str, int] = {}
+        self.ignore_range: set[str] = set()
+        self.requests = Counter()
+        self.range_requests = Counter()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server._handle_get(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        host, port = self._httpd.server_address[:2]
+        self.url = f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+    def add_file(self, path: str, content: bytes, drop_after: list[int] = (), range_offset: int = 0,
+                 ignore_range: bool = False) -> str:
+        """Registers a file, returning its URL."""
+        self.files[path] = content
+        self.drop_after[path] = list(drop_after)
+        self.range_offset[path] = range_offset
+        if ignore_range:
+            self.ignore_range.add(path)
+        return self.url + path
+
+    def _handle_get(self, handler: BaseHTTPRequestHandler):
+        self.requests[handler.path] += 1
+
+        content = self.files.get(handler.path)
+        if content is None:
+            handler.send_response(404)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+
+        start = 0
+        match = _RANGE_RE.match(handler.headers.get("Range", ""))
+        if match:
+            self.range_requests[handler.path] += 1
+        if match and handler.path not in self.ignore_range:
+            start = int(match.group(1)) + self.range_offset[handler.path]
+            handler.send_response(206)
+            handler.send_header("Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}")
+        else:
+            handler.send_response(200)
+        handler.send_header("Content-Length", str(len(content) - start))
+        handler.end_headers()
+
+        body = memoryview(content)[start:]
+        drop_after = self.drop_after[handler.path]
+        if drop_after:
+            handler.wfile.write(body[:drop_after.pop(0)])
+            handler.wfile.flush()
+            handler.close_connection = True
+            handler.connection.shutdown(socket.SHUT_RDWR)
+            return
+        handler.wfile.write(body)
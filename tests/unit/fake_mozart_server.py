@@ -0,0 +1,92 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MOZART_SUBMIT_PATH = "/api/v0.1/job/submit"
+
+
+class FakeMozartServer:
+    """
+    A local stand-in for the Mozart job submission API. Each submission takes `latency` seconds and returns a new job ID.
+
+    Failures can be injected per job name with `fail_next`: the next submissions of the job are rejected with a 503.
+    Every request is counted in `requests`, keyed by job name.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = Counter()
+        self.fail_next = Counter()
+        self.job_ids: dict[str, str] = {}
+        """The job ID of each successfully submitted job, keyed by job name"""
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                server._handle_submit(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        host, port = self._httpd.server_address[:2]
+        self.url = f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+    @property
+    def request_count(self) -> int:
+        return sum(self.requests.values())
+
+    def submit_mozart_job(self, *, hysdsio, job_name, **kwargs) -> str:
+        """Client for this server, with the signature of hysds_commons.job_utils.submit_mozart_job()"""
+        request = urllib.request.Request(
+            self.url + MOZART_SUBMIT_PATH,
+            data=json.dumps({"job_name": job_name, "params": hysdsio["params"]}).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return json.loads(response.read())["result"]
+        except urllib.error.HTTPError as e:
+            raise Exception(f"Job submission failed: {e.code} {e.read().decode()}") from e
+
+    def _handle_submit(self, handler: BaseHTTPRequestHandler):
+        body = json.loads(handler.rfile.read(int(handler.headers["Content-Length"])))
+        job_name = body["job_name"]
+        time.sleep(self.latency)
+
+        with self._lock:
+            self.requests[job_name] += 1
+            if self.fail_next[job_name] > 0:
+                self.fail_next[job_name] -= 1
+                status, response = 503, {"success": False, "message": "Service Unavailable"}
+            else:
+                job_id = f"job-{len(self.job_ids) + 1:06d}"
+                self.job_ids[job_name] = job_id
+                status, response = 200, {"success": True, "result": job_id}
+
+        content = json.dumps(response).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(content)))
+        handler.end_headers()
+        handler.wfile.write(content)
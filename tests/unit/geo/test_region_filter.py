@@ -0,0 +1,113 @@
+import logging
+import random
+import time
+from pathlib import Path
+
+import pytest
+from shapely.geometry import Polygon
+
+import geo
+from geo.geo_util import Coordinate, RegionFilter, does_bbox_intersect_region
+from util.geo_util import check_dateline
+
+GEO_DATA_DIR = Path(geo.__file__).parent / "data"
+
+REGIONS = [
+    str(GEO_DATA_DIR / region) for region in (
+        "california_opera",
+        "nevada_opera",
+        "10TFP",
+        "42QYM",
+        "cslc-s1_priority_framebased",
+        "calval_test_frame_only",
+        "north_america_opera",
+    )
+]
+
+
+def random_bbox(rng: random.Random, antimeridian=False) -> list[Coordinate]:
+    """Returns a closed, CMR-style bbox ring. Antimeridian-crossing bboxes have longitudes wrapped to [-180, 180]."""
+    width, height = rng.uniform(0.5, 6), rng.uniform(0.5, 4)
+    west = rng.uniform(180 - width + 0.01, 179.99) if antimeridian else rng.uniform(-180, 180 - width)
+    south = rng.uniform(-60, 75)
+    east = west + width
+    if east > 180:
+        east -= 360
+    ring = [(west, south), (east, south), (east, south + height), (west, south + height)]
+    return [{"lon": lon, "lat": lat} for lon, lat in ring + ring[:1]]
+
+
+def ogr_intersecting_region(bbox: list[Coordinate], regions) -> str:
+    """The current OGR path, applied to each side of the antimeridian as split by check_dateline."""
+    pieces = check_dateline(Polygon([(c["lon"], c["lat"]) for c in bbox]))
+    for region in regions:
+        for piece in pieces:
+            if does_bbox_intersect_region([{"lon": lon, "lat": lat} for lon, lat in piece.exterior.coords], region):
+                return region
+    return None
+
+
+@pytest.mark.parametrize("antimeridian", [False, True])
+def test_region_filter_parity_with_ogr(antimeridian):
+    # ARRANGE
+    rng = random.Random(antimeridian)
+    bboxes = [random_bbox(rng, antimeridian) for _ in range(500)]
+    if not antimeridian:
+        bboxes.append([{"lon": -118.17243, "lat": 34.20025}, {"lon": -118.17243, "lat": 34.19831},
+                       {"lon": -118.17558, "lat": 34.19831}, {"lon": -118.17558, "lat": 34.20025},
+                       {"lon": -118.17243, "lat": 34.20025}])  # JPL-ish bbox
+
+    # ACT
+    regions = RegionFilter(REGIONS).intersecting_regions(bboxes)
+
+    # ASSERT
+    assert regions == [ogr_intersecting_region(bbox, REGIONS) for bbox in bboxes]
+    assert any(region is None for region in regions)
+    assert any(region is not None for region in regions)
+    if not antimeridian:
+        assert regions[-1] == REGIONS[0]
+
+
+def test_region_filter__when_bbox_crosses_antimeridian__then_not_treated_as_spanning_the_globe():
+    # ARRANGE
+    # crosses the antimeridian in the South Pacific. Unsplit, its ring spans nearly every longitude.
+    bbox = [{"lon": 179.0, "lat": -40.0}, {"lon": -179.0, "lat": -40.0}, {"lon": -179.0, "lat": -38.0},
+            {"lon": 179.0, "lat": -38.0}, {"lon": 179.0, "lat": -40.0}]
+
+    # ACT
+    regions = RegionFilter(REGIONS).intersecting_regions([bbox])
+
+    # ASSERT
+    assert regions == [None]
+
+
+def test_region_filter__when_no_bboxes__then_empty():
+    assert RegionFilter(REGIONS).intersecting_regions([]) == []
+
+
+@pytest.mark.benchmark
+def test_benchmark__region_filter_50k_granules():
+    # ARRANGE
+    rng = random.Random(0)
+    bboxes = [random_bbox(rng, antimeridian=rng.random() < 0.01) for _ in range(50_000)]
+
+    # ACT
+    start = time.perf_counter()
+    region_filter = RegionFilter(REGIONS)
+    build_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    regions = region_filter.intersecting_regions(bboxes)
+    filter_secs = time.perf_counter() - start
+
+    # the OGR path is too slow to run 50k times, so time a sample
+    sampled_bboxes = bboxes[:500]
+    start = time.perf_counter()
+    sampled_regions = [ogr_intersecting_region(bbox, REGIONS) for bbox in sampled_bboxes]
+    ogr_secs = (time.perf_counter() - start) * len(bboxes) / len(sampled_bboxes)
+
+    # ASSERT
+    logging.info(f"{len(bboxes):,} granules: STRtree build {build_secs:.3f}s + filter {filter_secs:.3f}s, "
+                 f"OGR (extrapolated) {ogr_secs:.1f}s")
+    assert regions[:len(sampled_bboxes)] == sampled_regions
+    assert build_secs + filter_secs < ogr_secs
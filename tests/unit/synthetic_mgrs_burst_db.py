@@ -0,0 +1,49 @@
+import random
+
+import geopandas as gpd
+from shapely.geometry import box
+
+
+def make_mgrs_burst_db_raw(num_orbits=12, sets_per_orbit=40, bursts_per_set=9, seed=0) -> gpd.GeoDataFrame:
+    """
+    Creates a synthetic MGRS tile collection database, shaped like the raw table read by `load_mgrs_burst_db_raw`.
+
+    Each relative orbit is covered by a run of MGRS sets, each made of `bursts_per_set` burst IDs across the 3 IW
+    swaths. Neighbouring sets share their boundary burst IDs, so most burst IDs map to 1 set and some map to 2.
+    Collection columns are encoded as strings, like the real database.
+    """
+    rng = random.Random(seed)
+    records = []
+    for orbit in range(1, num_orbits + 1):
+        for k in range(sets_per_orbit):
+            first_burst = orbit * 10_000 + k * (bursts_per_set - 1)
+            bursts = [
+                f"t{orbit:03d}_{first_burst + i:06d}_iw{swath}"
+                for i in range(bursts_per_set) for swath in (1, 2, 3)
+            ]
+            mgrs_tiles = sorted({f"{rng.randint(1, 60):02d}{rng.choice('CDEFGHJKLMNPQRSTUVWX')}"
+                                 f"{rng.choice('ABCDEFGH')}{rng.choice('ABCDEFGH')}" for _ in range(rng.randint(4, 12))})
+
+            zone = (orbit * 7 + k) % 60 + 1
+            xmin = rng.uniform(200_000, 600_000)
+            ymin = rng.uniform(500_000, 8_500_000)
+            lon = -180 + (zone - 1) * 6 + rng.uniform(0, 5)
+            lat = rng.uniform(5, 75)
+
+            records.append({
+                "mgrs_set_id": f"MS_{orbit}_{k}",
+                "relative_orbit_number": orbit,
+                "bursts": str(bursts),
+                "number_of_bursts": len(bursts),
+                "mgrs_tiles": str(mgrs_tiles),
+                "number_of_mgrs_tiles": len(mgrs_tiles),
+                "xmin": xmin,
+                "xmax": xmin + 200_000,
+                "ymin": ymin,
+                "ymax": ymin + 150_000,
+                "EPSG": 32600 + zone,
+                "land_ocean_flag": rng.choice(["land", "water/land", "water"]),
+                "geometry": box(lon, lat, lon + 1.5, lat + 1.5),
+            })
+
+    return gpd.GeoDataFrame(records, crs="EPSG:4326")
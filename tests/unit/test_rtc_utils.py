@@ -1,7 +1,14 @@
+import logging
+import random
 import re
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
 
 from rtc_utils import rtc_product_file_regex, determine_acquisition_cycle_for_rtc_product_file, \
-    determine_acquisition_cycle_for_rtc_granule, rtc_granule_regex
+    determine_acquisition_cycle_for_rtc_granule, rtc_granule_regex, determine_acquisition_cycle, \
+    determine_acquisition_cycles, parse_acquisition_ts, ACQUISITION_CYCLE_DURATION_SECS, MAX_BURST_IDENTIFICATION_NUMBER
 
 
 def test_determine_acquisition_cycle_for_rtc_product_file():
@@ -18,3 +25,117 @@ def test_determine_acquisition_cycle_for_rtc_granule():
     granule_id = "OPERA_L2_RTC-S1_T118-252624-IW1_20250512T193408Z_20250513T011557Z_S1A_30_v1.0"
     match = re.match(rtc_granule_regex, granule_id)
     assert 345 == determine_acquisition_cycle_for_rtc_granule(match_granule_id=match)
+
+
+def make_products(num_products, seed):
+    """Random (burst ID, acquisition timestamp, granule ID) of RTC products, including acquisitions exactly half way
+    between 2 cycles, where rounding ties to even."""
+    rng = random.Random(seed)
+    epochs = {"S1A": datetime(2014, 1, 1, tzinfo=timezone.utc), "S1B": datetime(2014, 1, 7, tzinfo=timezone.utc),
+              "S1C": datetime(2014, 1, 7, tzinfo=timezone.utc)}
+    products = []
+    for _ in range(num_products):
+        satellite = rng.choice(list(epochs))
+        if rng.random() < 0.1:
+            # burst 0 has no offset into the cycle, so this is an exact tie
+            burst_identification_number = 0
+            acquisition_dt = epochs[satellite] + timedelta(seconds=ACQUISITION_CYCLE_DURATION_SECS * (rng.randint(0, 500) + 0.5))
+        else:
+            burst_identification_number = rng.randint(0, MAX_BURST_IDENTIFICATION_NUMBER)
+            acquisition_dt = epochs[satellite] + timedelta(seconds=rng.randint(int(ACQUISITION_CYCLE_DURATION_SECS), 16 * 365 * 86400))
+        burst_id = f"T{rng.randint(1, 175):03d}-{burst_identification_number:06d}-IW{rng.randint(1, 3)}"
+        acquisition_dts = acquisition_dt.strftime("%Y%m%dT%H%M%SZ")
+        granule_id = f"OPERA_L2_RTC-S1_{burst_id}_{acquisition_dts}_20250101T000000Z_{satellite}_30_v1.0"
+        products.append((burst_id, acquisition_dts, granule_id))
+    return products
+
+
+def determine_acquisition_cycles_from_products(products):
+    return determine_acquisition_cycles(
+        burst_ids=[burst_id for burst_id, _, _ in products],
+        acquisition_ts=parse_acquisition_ts(acquisition_dts for _, acquisition_dts, _ in products),
+        satellites=[granule_id.split("_")[6] for _, _, granule_id in products]
+    ).tolist()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_determine_acquisition_cycles__parity_with_scalar(seed):
+    products = make_products(2_000, seed)
+
+    acquisition_cycles = determine_acquisition_cycles_from_products(products)
+
+    assert acquisition_cycles == [determine_acquisition_cycle(*product) for product in products]
+
+
+def test_determine_acquisition_cycles__rounds_ties_to_even():
+    products = [
+        ("T001-000000-IW1", "20140107T000000Z", "OPERA_L2_RTC-S1_T001-000000-IW1_20140107T000000Z_20250101T000000Z_S1A_30_v1.0"),
+        ("T001-000000-IW1", "20140125T000000Z", "OPERA_L2_RTC-S1_T001-000000-IW1_20140125T000000Z_20250101T000000Z_S1A_30_v1.0"),
+    ]
+
+    assert determine_acquisition_cycles_from_products(products) == [determine_acquisition_cycle(*product) for product in products] == [0, 2]
+
+
+def test_determine_acquisition_cycles__empty():
+    assert determine_acquisition_cycles_from_products([]) == []
+
+
+@pytest.mark.parametrize("satellite, error", [("S1D", ValueError), ("S1X", KeyError)])
+def test_determine_acquisition_cycles__raises_for_unknown_epoch_like_scalar(satellite, error):
+    products = make_products(3, seed=0) + [("T001-000001-IW1", "20250101T000000Z", f"OPERA_L2_RTC-S1_T001-000001-IW1_20250101T000000Z_20250101T000000Z_{satellite}_30_v1.0")]
+
+    with pytest.raises(error):
+        determine_acquisition_cycle(*products[-1])
+    with pytest.raises(error):
+        determine_acquisition_cycles_from_products(products)
+
+
+def test_determine_acquisition_cycles__asserts_non_negative_like_scalar():
+    products = make_products(3, seed=0) + [("T001-375000-IW1", "20140101T000000Z", "OPERA_L2_RTC-S1_T001-375000-IW1_20140101T000000Z_20250101T000000Z_S1A_30_v1.0")]
+
+    with pytest.raises(AssertionError, match="Acquisition cycle is negative: acquisition_cycle=-1"):
+        determine_acquisition_cycle(*products[-1])
+    with pytest.raises(AssertionError, match="Acquisition cycle is negative: acquisition_cycle=-1"):
+        determine_acquisition_cycles_from_products(products)
+
+
+@pytest.mark.parametrize("acquisition_dts", ["20210705T183117.123Z", "2021-07-05T18:31:17Z", "20210705T183117"])
+def test_parse_acquisition_ts__when_malformed__then_raises(acquisition_dts):
+    with pytest.raises(ValueError):
+        parse_acquisition_ts(["20210705T183117Z", acquisition_dts])
+
+
+@pytest.mark.parametrize("burst_id", ["T074-1572860-IW3", "T74-157286-IW3"])
+def test_determine_acquisition_cycles__when_burst_id_not_15_characters__then_same_as_scalar(burst_id):
+    product = (burst_id, "2025-05-12T19:34:08Z", "OPERA_L2_RTC-S1_T074-157286-IW3_20250512T193408Z_20250513T011557Z_S1A_30_v1.0")
+    assert determine_acquisition_cycles([product[0]], parse_acquisition_ts(["20250512T193408Z"]), ["S1A"]).tolist() == \
+           [determine_acquisition_cycle(*product)]
+
+
+@pytest.mark.parametrize("burst_id", ["T074_157286_IW3", "T074-15728a-IW3"])
+def test_determine_acquisition_cycles__when_burst_id_malformed__then_raises(burst_id):
+    with pytest.raises(ValueError):
+        determine_acquisition_cycles([burst_id], parse_acquisition_ts(["20250512T193408Z"]), ["S1A"])
+
+
+@pytest.mark.benchmark
+def test_benchmark__determine_acquisition_cycles_1m_rows():
+    products = make_products(1_000_000, seed=0)
+    burst_ids = [burst_id for burst_id, _, _ in products]
+    acquisition_dts = [acquisition_dts for _, acquisition_dts, _ in products]
+    satellites = [granule_id.split("_")[6] for _, _, granule_id in products]
+
+    start = time.perf_counter()
+    acquisition_cycles = determine_acquisition_cycles(burst_ids, parse_acquisition_ts(acquisition_dts), satellites).tolist()
+    vectorized_secs = time.perf_counter() - start
+
+    # the scalar function is too slow to run 1M times, so time a sample
+    sampled_products = products[:20_000]
+    start = time.perf_counter()
+    expected = [determine_acquisition_cycle(*product) for product in sampled_products]
+    scalar_secs = (time.perf_counter() - start) * len(products) / len(sampled_products)
+
+    logging.info(f"{len(products):,} products: vectorized {vectorized_secs:.2f}s, scalar (extrapolated) {scalar_secs:.1f}s")
+    assert acquisition_cycles[:len(sampled_products)] == expected
+    # NOTE: parsing the timestamps against their exact format dominates the vectorized time
+    assert vectorized_secs < scalar_secs
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+import pytest
+
+from tests.unit.fake_cmr_server import make_umm_granules
+from tools.ops.cmr_audit.cmr_client import (async_cmr_posts,
+                                            async_cmr_posts_windowed,
+                                            async_cmr_posts_windowed_iter,
+                                            params_to_request_body,
+                                            split_params_by_range)
+
+START = datetime(2024, 1, 1, 0, 0, 0)
+END = datetime(2024, 1, 1, 1, 0, 0)
+PARAMS = {
+    "sort_key": "-start_date",
+    "provider": "ASF",
+    "ShortName[]": ["SENTINEL-1A_SLC"],
+    "temporal": "2024-01-01T00:00:00Z,2024-01-01T01:00:00Z"
+}
+
+
+def native_ids(response_jsons):
+    return [item["meta"]["native-id"] for response_json in response_jsons for item in response_json["items"]]
+
+
+def test_split_params_by_range__when_temporal__then_contiguous_newest_first():
+    # ACT
+    paramss = split_params_by_range(PARAMS, num_windows=4)
+
+    # ASSERT
+    assert [params["temporal"] for params in paramss] == [
+        "2024-01-01T00:45:00Z,2024-01-01T01:00:00Z",
+        "2024-01-01T00:30:00Z,2024-01-01T00:45:00Z",
+        "2024-01-01T00:15:00Z,2024-01-01T00:30:00Z",
+        "2024-01-01T00:00:00Z,2024-01-01T00:15:00Z",
+    ]
+    assert all(params["provider"] == "ASF" for params in paramss)
+
+
+def test_split_params_by_range__when_revision_date_mode__then_revision_date_split():
+    # ARRANGE
+    params = {
+        "revision_date": "2024-01-01T00:00:00Z,2024-01-01T01:00:00Z",
+        "temporal": "2023-01-01T00:00:00Z"
+    }
+
+    # ACT
+    paramss = split_params_by_range(params, num_windows=2)
+
+    # ASSERT
+    assert [params["revision_date"] for params in paramss] == [
+        "2024-01-01T00:30:00Z,2024-01-01T01:00:00Z",
+        "2024-01-01T00:00:00Z,2024-01-01T00:30:00Z",
+    ]
+    assert all(params["temporal"] == "2023-01-01T00:00:00Z" for params in paramss)
+
+
+def test_split_params_by_range__when_no_range__then_unchanged():
+    # ARRANGE
+    params = {"native-id[]": ["foo"]}
+
+    # ACT
+    paramss = split_params_by_range(params, num_windows=4)
+
+    # ASSERT
+    assert paramss == [params]
+
+
+def test_async_cmr_post__when_more_than_one_page__then_all_pages_read(fake_cmr_server):
+    # ARRANGE
+    server = fake_cmr_server(make_umm_granules(5_000, START, END))
+
+    # ACT
+    response_jsons = asyncio.run(async_cmr_posts(server.url, [params_to_request_body(PARAMS)]))
+
+    # ASSERT
+    assert len(native_ids(response_jsons)) == 5_000
+    assert server.request_count == 3
+
+
+def test_async_cmr_posts_windowed__when_small_result__then_single_request(fake_cmr_server):
+    # ARRANGE
+    server = fake_cmr_server(make_umm_granules(100, START, END))
+
+    # ACT
+    response_jsons = asyncio.run(async_cmr_posts_windowed(server.url, [PARAMS]))
+
+    # ASSERT
+    assert len(native_ids(response_jsons)) == 100
+    assert server.request_count == 1
+
+
+def test_async_cmr_posts_windowed__then_complete_and_deduplicated(fake_cmr_server):
+    # ARRANGE
+    # 1 granule every 0.2s, so many granules fall exactly on sub-window boundaries
+    items = make_umm_granules(18_000, START, END)
+    server = fake_cmr_server(items)
+
+    # ACT
+    response_jsons = asyncio.run(async_cmr_posts_windowed(server.url, [PARAMS]))
+
+    # ASSERT
+    ids = native_ids(response_jsons)
+    assert len(ids) == len(set(ids))
+    assert set(ids) == {item["meta"]["native-id"] for item in items}
+
+
+@pytest.mark.benchmark
+def test_async_cmr_posts_windowed__then_faster_than_serial(fake_cmr_server):
+    # ARRANGE
+    items = make_umm_granules(10_000, START, END)
+    server = fake_cmr_server(items, latency=0.3)
+
+    # ACT
+    start = time.perf_counter()
+    serial_response_jsons = asyncio.run(async_cmr_posts(server.url, [params_to_request_body(PARAMS)]))
+    serial_duration = time.perf_counter() - start
+    serial_request_count = server.request_count
+
+    server.request_count = 0
+    start = time.perf_counter()
+    windowed_response_jsons = asyncio.run(async_cmr_posts_windowed(server.url, [PARAMS]))
+    windowed_duration = time.perf_counter() - start
+
+    # ASSERT
+    logging.info(f"serial: {serial_duration=:.2f}s {serial_request_count=}")
+    logging.info(f"windowed: {windowed_duration=:.2f}s {server.request_count=}")
+
+    assert sorted(native_ids(serial_response_jsons)) == sorted(native_ids(windowed_response_jsons))
+    assert windowed_duration < serial_duration
+
+
+def test_async_cmr_posts_windowed_iter__then_pages_yielded_as_received_and_deduplicated(fake_cmr_server):
+    # ARRANGE
+    items = make_umm_granules(18_000, START, END)
+    server = fake_cmr_server(items, latency=0.05)
+
+    async def consume():
+        request_counts_per_page = []
+        response_jsons = []
+        async for response_json in async_cmr_posts_windowed_iter(server.url, [PARAMS], max_buffered_pages=1):
+            request_counts_per_page.append(server.request_count)
+            response_jsons.append(response_json)
+        return request_counts_per_page, response_jsons
+
+    # ACT
+    request_counts_per_page, response_jsons = asyncio.run(consume())
+
+    # ASSERT
+    ids = native_ids(response_jsons)
+    assert len(ids) == len(set(ids))
+    assert set(ids) == {item["meta"]["native-id"] for item in items}
+    assert request_counts_per_page[0] < server.request_count  # first page yielded before all pages were fetched
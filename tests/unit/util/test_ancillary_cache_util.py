@@ -0,0 +1,155 @@
+import concurrent.futures
+import contextlib
+import gzip
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+from tools import stage_ionosphere_file, stage_orbit_file
+from util.ancillary_cache_util import ANCILLARY_CACHE_DIR_ENV, AncillaryFileCache
+
+NUM_JOBS = 20
+NUM_DAYS = 4
+FIRST_DAY = datetime(2024, 1, 1)
+
+
+def job_safe_filename(job_number):
+    """The SLC of a simulated download job. Jobs are spread evenly over NUM_DAYS days, a few minutes apart."""
+    start = FIRST_DAY + timedelta(days=job_number % NUM_DAYS, hours=1, minutes=job_number)
+    stop = start + timedelta(seconds=27)
+    return f"S1A_IW_SLC__1SDV_{start:%Y%m%dT%H%M%S}_{stop:%Y%m%dT%H%M%S}_043462_05308F_86F3.zip"
+
+
+def orbit_file_name(day):
+    valid_start = FIRST_DAY + timedelta(days=day - 1, hours=22, minutes=59, seconds=42)
+    valid_stop = valid_start + timedelta(hours=26)
+    return f"S1A_OPER_AUX_POEORB_OPOD_{valid_start + timedelta(days=20):%Y%m%dT%H%M%S}_V{valid_start:%Y%m%dT%H%M%S}_{valid_stop:%Y%m%dT%H%M%S}.EOF"
+
+
+class FakeOrbitFileService:
+    """Serves a POEORB file per day from the local HTTP file server, counting the queries made"""
+
+    def __init__(self, fake_http_server):
+        self.queries = Counter()
+        for day in range(NUM_DAYS):
+            fake_http_server.add_file(f"/odata/download({day})/$value", f"orbit {day}".encode())
+
+    def query_orbit_file_service(self, endpoint_url, query):
+        # the query covers the start of the day of its SLC
+        day = int(query.split("ContentDate/End gt '")[1][8:10]) - FIRST_DAY.day
+        self.queries[day] += 1
+        return [{"Id": day, "Name": orbit_file_name(day)}]
+
+
+@pytest.fixture
+def ancillary_servers(fake_http_server, monkeypatch):
+    """Serves an Ionosphere archive per day and an Orbit file per day from the local HTTP file server"""
+    for day in range(NUM_DAYS):
+        year, doy = stage_ionosphere_file.start_date_to_julian_day(f"{FIRST_DAY + timedelta(days=day):%Y%m%d}")
+        archive_name = stage_ionosphere_file.get_new_archive_name("FIN", "JPL", doy, year)
+        fake_http_server.add_file(f"/ionex/{year}/{doy}/{archive_name}", gzip.compress(f"ionosphere {day}".encode()))
+
+    orbit_file_service = FakeOrbitFileService(fake_http_server)
+    monkeypatch.setattr(stage_orbit_file, "query_orbit_file_service", orbit_file_service.query_orbit_file_service)
+    monkeypatch.setattr(stage_orbit_file, "DataspaceSession",
+                        lambda username, password: contextlib.nullcontext(type("Session", (), {"token": "token"})))
+
+    return fake_http_server, orbit_file_service
+
+
+def run_download_job(job_number, fake_http_server, working_dir):
+    """Stages the Ionosphere and Orbit files of a simulated SLC download job, returning their contents"""
+    output_directory = working_dir / f"job_{job_number}"
+    output_directory.mkdir()
+
+    ionosphere_filepath = stage_ionosphere_file.main(stage_ionosphere_file.get_parser().parse_args([
+        "--type=FIN", "--provider=JPL", f"--output-directory={output_directory}", "--username=user",
+        "--password=pass", f"--download-endpoint={fake_http_server.url}/ionex", job_safe_filename(job_number)
+    ]))
+    stage_orbit_file.main(stage_orbit_file.get_parser().parse_args([
+        "--orbit-type=POEORB", f"--output-directory={output_directory}", "--username=user", "--password=pass",
+        f"--download-endpoint={fake_http_server.url}/odata/download", job_safe_filename(job_number)
+    ]))
+
+    orbit_filepath, = [path for path in output_directory.iterdir() if path.suffix == ".EOF"]
+    with open(ionosphere_filepath) as ionosphere_file, open(orbit_filepath) as orbit_file:
+        return ionosphere_file.read(), orbit_filepath.name, orbit_file.read()
+
+
+def run_download_jobs(fake_http_server, working_dir):
+    working_dir.mkdir()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        return list(executor.map(lambda job_number: run_download_job(job_number, fake_http_server, working_dir),
+                                 range(NUM_JOBS)))
+
+
+def test_download_jobs__when_cached__then_each_ancillary_file_fetched_once(ancillary_servers, tmp_path, monkeypatch):
+    # ARRANGE
+    fake_http_server, orbit_file_service = ancillary_servers
+
+    uncached_results = run_download_jobs(fake_http_server, tmp_path / "uncached")
+    uncached_requests = sum(fake_http_server.requests.values()) + sum(orbit_file_service.queries.values())
+    fake_http_server.requests.clear()
+    orbit_file_service.queries.clear()
+
+    monkeypatch.setenv(ANCILLARY_CACHE_DIR_ENV, str(tmp_path / "cache"))
+
+    # ACT
+    cached_results = run_download_jobs(fake_http_server, tmp_path / "cached")
+    cached_requests = sum(fake_http_server.requests.values()) + sum(orbit_file_service.queries.values())
+
+    # ASSERT
+    assert cached_results == uncached_results
+    assert [result[0] for result in cached_results] == [f"ionosphere {i % NUM_DAYS}" for i in range(NUM_JOBS)]
+    assert [result[1:] for result in cached_results] == [(orbit_file_name(i % NUM_DAYS), f"orbit {i % NUM_DAYS}")
+                                                        for i in range(NUM_JOBS)]
+
+    # Per day, one existence check and one download of the Ionosphere archive (after a 404 for the legacy name),
+    # and one query and one download of the Orbit file
+    assert uncached_requests == NUM_JOBS * 5
+    assert cached_requests == NUM_DAYS * 5
+    assert set(orbit_file_service.queries.values()) == {1}
+    assert all(count in (1, 2) for count in fake_http_server.requests.values())
+
+
+def cached_blobs(cache_dir):
+    return [filename for _, _, filenames in os.walk(cache_dir / "blobs") for filename in filenames]
+
+
+def test_put__when_over_max_bytes__then_least_recently_used_evicted(tmp_path):
+    # ARRANGE
+    cache = AncillaryFileCache(str(tmp_path / "cache"), max_bytes=30)
+    output_directory = tmp_path / "out"
+    output_directory.mkdir()
+
+    for name in ("a", "b", "c"):
+        (tmp_path / name).write_bytes(name.encode() * 10)
+        cache.put(name, str(tmp_path / name))
+
+    # ACT
+    cache.get("a", str(output_directory))
+    (tmp_path / "d").write_bytes(b"d" * 10)
+    cache.put("d", str(tmp_path / "d"))
+
+    # ASSERT
+    assert cache.get("b", str(output_directory)) is None
+    for name in ("a", "c", "d"):
+        assert open(cache.get(name, str(output_directory)), "rb").read() == name.encode() * 10
+    assert len(cached_blobs(tmp_path / "cache")) == 3
+
+
+def test_put__when_same_content__then_stored_once(tmp_path):
+    # ARRANGE
+    cache = AncillaryFileCache(str(tmp_path / "cache"))
+    (tmp_path / "jprg0010.24i").write_bytes(b"same")
+    (tmp_path / "JPL0OPSRAP_20240010000_01D_02H_GIM.INX").write_bytes(b"same")
+
+    # ACT
+    cache.put("jprg0010.24i.Z", str(tmp_path / "jprg0010.24i"))
+    cache.put("JPL0OPSRAP_20240010000_01D_02H_GIM.INX.gz", str(tmp_path / "JPL0OPSRAP_20240010000_01D_02H_GIM.INX"))
+
+    # ASSERT
+    assert len(cached_blobs(tmp_path / "cache")) == 1
+    assert cache.get("jprg0010.24i.Z", str(tmp_path)).endswith("jprg0010.24i")
@@ -0,0 +1,114 @@
+import concurrent.futures
+import logging
+import time
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from util import aws_util
+from util.aws_util import S3ClientPool, concurrent_s3_client_try_upload_file, get_s3_client
+
+BUCKET = "test-bucket"
+
+
+@pytest.fixture
+def s3_bucket(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-west-2")
+    monkeypatch.setattr(aws_util, "s3_client_pool", S3ClientPool())
+
+    with mock_aws():
+        get_s3_client().create_bucket(Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": "us-west-2"})
+        yield BUCKET
+
+
+def test_get_client__when_same_key__then_client_is_reused():
+    # ARRANGE
+    pool = S3ClientPool()
+
+    # ACT
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+        clients = list(executor.map(lambda _: pool.get_client(region_name="us-west-2"), range(64)))
+
+    # ASSERT
+    assert len({id(client) for client in clients}) == 1
+
+
+def test_get_client__when_different_credentials_region_or_endpoint__then_clients_differ():
+    # ARRANGE
+    pool = S3ClientPool()
+
+    # ACT
+    clients = [
+        pool.get_client(region_name="us-west-2"),
+        pool.get_client(region_name="us-east-1"),
+        pool.get_client(region_name="us-west-2", endpoint_url="http://localhost:4566"),
+        pool.get_client("key-1", "secret-1", "token-1", region_name="us-west-2"),
+        pool.get_client("key-2", "secret-2", "token-2", region_name="us-west-2"),
+    ]
+
+    # ASSERT
+    assert len({id(client) for client in clients}) == len(clients)
+    assert clients[3].meta.config.max_pool_connections == aws_util.S3_MAX_POOL_CONNECTIONS
+
+
+def test_get_client__when_ttl_expires__then_client_is_recreated():
+    # ARRANGE
+    pool = S3ClientPool(ttl=0.05)
+    client = pool.get_client("key", "secret", "token", region_name="us-west-2")
+
+    # ACT
+    time.sleep(0.1)
+
+    # ASSERT
+    assert pool.get_client("key", "secret", "token", region_name="us-west-2") is not client
+
+
+def test_concurrent_s3_client_try_upload_file(s3_bucket, tmp_path):
+    # ARRANGE
+    files = []
+    for i in range(20):
+        (tmp_path / f"file_{i}.txt").write_text(str(i))
+        files.append(tmp_path / f"file_{i}.txt")
+
+    # ACT
+    s3paths = concurrent_s3_client_try_upload_file(bucket=s3_bucket, key_prefix="prefix", files=files)
+
+    # ASSERT
+    assert sorted(s3paths) == sorted(f"s3://{s3_bucket}/prefix/file_{i}.txt" for i in range(20))
+    assert len(aws_util.s3_client_pool._clients) == 1
+
+
+@pytest.mark.benchmark
+def test_benchmark__pooled_vs_per_object_s3_clients(s3_bucket, tmp_path):
+    """
+    Compares per-object latency of 1,000 small objects when creating an S3 client per object (as before) versus
+    using the pooled client. Client creation dominates, so the per-object client case is sampled to keep the test short.
+    """
+    # ARRANGE
+    num_objects = 1000
+    files = []
+    for i in range(num_objects):
+        (tmp_path / f"file_{i}.txt").write_text(str(i))
+        files.append(tmp_path / f"file_{i}.txt")
+    concurrent_s3_client_try_upload_file(bucket=s3_bucket, key_prefix="prefix", files=files)
+    keys = [f"prefix/{f.name}" for f in files]
+
+    # ACT
+    sampled_keys = keys[::20]
+    start = time.perf_counter()
+    for key in sampled_keys:
+        boto3.session.Session().client("s3").head_object(Bucket=s3_bucket, Key=key)
+    unpooled_secs_per_object = (time.perf_counter() - start) / len(sampled_keys)
+
+    start = time.perf_counter()
+    for key in keys:
+        get_s3_client().head_object(Bucket=s3_bucket, Key=key)
+    pooled_secs_per_object = (time.perf_counter() - start) / len(keys)
+
+    # ASSERT
+    logging.info(f"per-object client: {1000 * unpooled_secs_per_object:.2f} ms/object, "
+                 f"pooled client: {1000 * pooled_secs_per_object:.2f} ms/object")
+    assert pooled_secs_per_object < unpooled_secs_per_object / 2
@@ -0,0 +1,135 @@
+import hashlib
+import logging
+import os
+import shutil
+import time
+
+import pytest
+
+from util.checksum_util import copy_with_checksum, create_checksum_files, create_dataset_checksums
+
+
+def calculate_checksum_reference(file_name, hash_algo):
+    """Checksum as calculated by hysds.utils.calculate_checksum_from_localized_file, as previously used"""
+    hash_tool = hashlib.new(hash_algo)
+    with open(file_name, "rb") as f:
+        for chunk in iter(lambda: f.read(4096), b""):
+            hash_tool.update(chunk)
+    return hash_tool.hexdigest()
+
+
+def checksum_files(dataset_dir):
+    return sorted(
+        os.path.relpath(os.path.join(dir_name, fname), dataset_dir)
+        for dir_name, _, fnames in os.walk(dataset_dir)
+        for fname in fnames
+        if fname.endswith((".md5", ".sha256"))
+    )
+
+
+@pytest.fixture
+def dataset_dir(tmp_path):
+    dataset_dir = tmp_path / "dataset"
+    (dataset_dir / "sub").mkdir(parents=True)
+    for name, size in [("a.tif", 3 * 1024 * 1024 + 7), ("b.h5", 1), ("c.png", 0), ("sub/d.tif", 4096), ("sub/e.xml", 100)]:
+        (dataset_dir / name).write_bytes(os.urandom(size))
+    return dataset_dir
+
+
+@pytest.mark.parametrize("algo", ["md5", "sha256"])
+def test_create_dataset_checksums__output_identical_to_reference(dataset_dir, algo):
+    # ACT
+    create_dataset_checksums(str(dataset_dir), algo)
+
+    # ASSERT
+    assert checksum_files(dataset_dir) == sorted(f"{name}.{algo}" for name in ["a.tif", "b.h5", "c.png", "sub/d.tif", "sub/e.xml"])
+    for checksum_file in checksum_files(dataset_dir):
+        file = str(dataset_dir / checksum_file).removesuffix(f".{algo}")
+        assert (dataset_dir / checksum_file).read_bytes() == calculate_checksum_reference(file, algo).encode()
+
+
+@pytest.mark.parametrize("globs,regex,expected", [
+    (["*.tif"], [], ["a.tif.md5", "sub/d.tif.md5"]),
+    ([], [r"^[bc]\."], ["b.h5.md5", "c.png.md5"]),
+    (["*.xml"], [r"a\.", r"e\."], ["a.tif.md5", "sub/e.xml.md5"]),
+])
+def test_create_dataset_checksums__when_filtered(dataset_dir, globs, regex, expected):
+    # ACT
+    create_dataset_checksums(str(dataset_dir), "md5", globs=globs, regex=regex)
+
+    # ASSERT
+    assert checksum_files(dataset_dir) == expected
+
+
+def test_create_dataset_checksums__when_file(dataset_dir):
+    # ACT
+    create_dataset_checksums(str(dataset_dir / "a.tif"), "md5")
+
+    # ASSERT
+    assert checksum_files(dataset_dir) == ["a.tif.md5"]
+
+
+def test_copy_with_checksum(dataset_dir, tmp_path):
+    # ARRANGE
+    target_dir = tmp_path / "target"
+    target_dir.mkdir()
+
+    # ACT
+    target = copy_with_checksum(str(dataset_dir / "a.tif"), str(target_dir), "sha256")
+
+    # ASSERT
+    assert target == str(target_dir / "a.tif")
+    assert (target_dir / "a.tif").read_bytes() == (dataset_dir / "a.tif").read_bytes()
+    assert (target_dir / "a.tif.sha256").read_text() == calculate_checksum_reference(target, "sha256")
+
+
+@pytest.mark.benchmark
+def test_benchmark__checksum_product_directory(tmp_path):
+    # ARRANGE
+    product_dir = tmp_path / "product"
+    product_dir.mkdir()
+    block = os.urandom(1024 * 1024)
+    file_sizes = [8, 4, 4, 2, 2, 1]  # MiB, the files of a DISP-S1 product scaled down 256 times
+    for i, size in enumerate(file_sizes):
+        with open(product_dir / f"file_{i}.nc", "wb") as f:
+            for _ in range(size):
+                f.write(block)
+            f.write(block[:i])
+
+    # ACT
+    start = time.perf_counter()
+    reference_checksums = {}
+    for dir_name, _, fnames in os.walk(product_dir):
+        for fname in fnames:
+            file = os.path.join(dir_name, fname)
+            reference_checksums[f"{file}.md5"] = calculate_checksum_reference(file, "md5")
+    reference_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    create_dataset_checksums(str(product_dir), "md5")
+    engine_secs = time.perf_counter() - start
+
+    copy_dir = tmp_path / "copy"
+    copy_dir.mkdir()
+    start = time.perf_counter()
+    for i in range(len(file_sizes)):
+        shutil.copy(product_dir / f"file_{i}.nc", copy_dir)
+    create_checksum_files([(str(copy_dir / f"file_{i}.nc"), "md5") for i in range(len(file_sizes))])
+    copy_then_checksum_secs = time.perf_counter() - start
+
+    fused_dir = tmp_path / "fused"
+    fused_dir.mkdir()
+    start = time.perf_counter()
+    for i in range(len(file_sizes)):
+        copy_with_checksum(str(product_dir / f"file_{i}.nc"), str(fused_dir), "md5")
+    fused_secs = time.perf_counter() - start
+
+    # ASSERT
+    logging.info(f"{sum(file_sizes)} MiB, {os.cpu_count()} CPUs: reference {reference_secs:.3f}s, "
+                 f"engine {engine_secs:.3f}s, copy then checksum {copy_then_checksum_secs:.3f}s, "
+                 f"fused copy and checksum {fused_secs:.3f}s")
+    for checksum_file, checksum in reference_checksums.items():
+        with open(checksum_file, "rb") as f:
+            assert f.read() == checksum.encode()
+        assert (fused_dir / os.path.basename(checksum_file)).read_text() == checksum
+    assert engine_secs < reference_secs
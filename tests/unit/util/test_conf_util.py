@@ -0,0 +1,127 @@
+import copy
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+
+import pytest
+
+import util
+from data_subscriber.cslc_utils import parse_cslc_file_name
+from util.conf_util import ReadOnlyDict, SettingsConf, YamlConf, invalidate_conf_cache
+from util.datasets_json_util import DatasetsJson
+
+CSLC_NATIVE_ID = "OPERA_L2_CSLC-S1_T042-088905-IW1_20231009T140757Z_20231010T204936Z_S1A_VV_v1.0"
+
+
+@pytest.fixture
+def yaml_file(tmp_path):
+    yaml_file = tmp_path / "settings.yaml"
+    yaml_file.write_text("A: 1\nB:\n  C: [x, y]\n")
+    yield yaml_file
+    invalidate_conf_cache()
+
+
+def test_yaml_conf__when_loaded_again__then_cached(yaml_file):
+    # ACT
+    cfg = YamlConf(str(yaml_file)).cfg
+
+    # ASSERT
+    assert YamlConf(str(yaml_file)).cfg is cfg
+    assert cfg == {"A": 1, "B": {"C": ("x", "y")}}
+
+
+def test_yaml_conf__when_file_modified__then_reloaded(yaml_file):
+    # ARRANGE
+    cfg = YamlConf(str(yaml_file)).cfg
+
+    # ACT
+    yaml_file.write_text("A: 2\n")
+    stat = os.stat(yaml_file)
+    os.utime(yaml_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    # ASSERT
+    assert YamlConf(str(yaml_file)).cfg == {"A": 2}
+    assert cfg["A"] == 1
+
+
+def test_yaml_conf__when_invalidated__then_reloaded(yaml_file):
+    # ARRANGE
+    cfg = YamlConf(str(yaml_file)).cfg
+
+    # ACT
+    invalidate_conf_cache(str(yaml_file))
+
+    # ASSERT
+    assert YamlConf(str(yaml_file)).cfg is not cfg
+    assert YamlConf(str(yaml_file)).cfg == cfg
+
+
+def test_yaml_conf__when_modified__then_error(yaml_file):
+    # ARRANGE
+    cfg = YamlConf(str(yaml_file)).cfg
+
+    # ACT / ASSERT
+    with pytest.raises(TypeError):
+        cfg["A"] = 2
+    with pytest.raises(TypeError):
+        cfg["B"].update({"D": 1})
+    with pytest.raises(AttributeError):
+        cfg["B"]["C"].append("z")
+
+    cfg_copy = copy.deepcopy(cfg)
+    cfg_copy["B"]["D"] = 1
+    assert type(cfg_copy) is dict and type(cfg_copy["B"]) is dict
+    assert json.loads(json.dumps(cfg)) == {"A": 1, "B": {"C": ["x", "y"]}}
+    assert YamlConf(str(yaml_file)).cfg == {"A": 1, "B": {"C": ("x", "y")}}
+
+
+def test_settings_conf__regexes_are_compiled():
+    # ACT
+    cfg = SettingsConf().cfg
+
+    # ASSERT
+    assert isinstance(cfg, ReadOnlyDict)
+    assert isinstance(cfg["PRODUCT_TYPES"]["L2_CSLC_S1"]["Pattern"], re.Pattern)
+
+
+def test_datasets_json__match_patterns_are_compiled():
+    # ACT
+    datasets_json = DatasetsJson()
+
+    # ASSERT
+    assert DatasetsJson().get("L2_CSLC_S1") is datasets_json.get("L2_CSLC_S1")
+    assert datasets_json.get_match_pattern("L2_CSLC_S1").pattern == datasets_json.get("L2_CSLC_S1")["match_pattern"]
+    assert parse_cslc_file_name(CSLC_NATIVE_ID) == ("T042-088905-IW1", "20231009T140757Z")
+
+
+@pytest.mark.benchmark
+def test_benchmark__parse_100k_cslc_file_names():
+    # ARRANGE
+    native_ids = [CSLC_NATIVE_ID.replace("088905", f"{i:06d}") for i in range(100_000)]
+    datasets_json_file = Path(util.__file__).parent.parent / "conf" / "sds" / "files" / "datasets.json"
+
+    def parse_cslc_file_name_uncached(native_id):
+        """datasets.json is re-read for each file name"""
+        with open(datasets_json_file) as f:
+            datasets = {dataset["type"]: dataset for dataset in json.load(f)["datasets"]}
+        match_product_id = re.match(datasets["L2_CSLC_S1"]["match_pattern"], native_id)
+        return match_product_id.group("burst_id"), match_product_id.group("acquisition_ts")
+
+    # ACT
+    start = time.perf_counter()
+    results = [parse_cslc_file_name(native_id) for native_id in native_ids]
+    cached_secs = time.perf_counter() - start
+
+    # re-reading datasets.json is too slow to run 100k times, so time a sample
+    sampled_native_ids = native_ids[:2000]
+    start = time.perf_counter()
+    sampled_results = [parse_cslc_file_name_uncached(native_id) for native_id in sampled_native_ids]
+    uncached_secs = (time.perf_counter() - start) * len(native_ids) / len(sampled_native_ids)
+
+    # ASSERT
+    logging.info(f"{len(native_ids):,} CSLC file names: cached {cached_secs:.2f}s, uncached (extrapolated) {uncached_secs:.1f}s")
+    assert results[:len(sampled_native_ids)] == sampled_results
+    assert cached_secs < uncached_secs / 5
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import tracemalloc
+
+import pytest
+import requests
+
+from util.download_util import DOWNLOAD_CHUNK_SIZE, IncompleteDownloadException, stream_download
+
+MiB = 1024 * 1024
+
+
+def test_stream_download(fake_http_server, tmp_path):
+    # ARRANGE
+    content = os.urandom(3 * MiB + 123)
+    url = fake_http_server.add_file("/granule.zip", content)
+
+    # ACT
+    result = stream_download(url, tmp_path / "granule.zip")
+    checksummed_result = stream_download(url, tmp_path / "checksummed_granule.zip", checksum_algo="md5")
+
+    # ASSERT
+    assert result.path == (tmp_path / "granule.zip").resolve()
+    assert result.path.read_bytes() == content
+    assert result.size == len(content)
+    assert result.checksum is None
+    assert checksummed_result.checksum == hashlib.md5(content).hexdigest()
+    assert not (tmp_path / "granule.zip.part").exists()
+    assert fake_http_server.requests["/granule.zip"] == 2
+
+
+def test_stream_download__when_connection_drops__then_resumes_with_range_requests(fake_http_server, tmp_path):
+    # ARRANGE
+    content = os.urandom(5 * MiB)
+    url = fake_http_server.add_file("/granule.zip", content, drop_after=[MiB + 7, 2 * MiB])
+
+    # ACT
+    result = stream_download(url, tmp_path / "granule.zip", checksum_algo="sha256", session=requests.Session())
+
+    # ASSERT
+    assert result.path.read_bytes() == content
+    assert result.checksum == hashlib.sha256(content).hexdigest()
+    assert fake_http_server.requests["/granule.zip"] == 3
+    assert fake_http_server.range_requests["/granule.zip"] == 2
+
+
+
+@pytest.mark.parametrize("range_offset", [-1000, 1000])
+def test_stream_download__when_content_range_does_not_match_part_file__then_restarts(fake_http_server, tmp_path,
+                                                                                     range_offset):
+    # ARRANGE
+    content = os.urandom(3 * MiB)
+    url = fake_http_server.add_file("/granule.zip", content, drop_after=[MiB], range_offset=range_offset)
+
+    # ACT
+    result = stream_download(url, tmp_path / "granule.zip", checksum_algo="md5")
+
+    # ASSERT
+    assert result.path.read_bytes() == content
+    assert result.checksum == hashlib.md5(content).hexdigest()
+    assert fake_http_server.requests["/granule.zip"] == 3  # dropped, shifted range discarded, whole file
+    assert fake_http_server.range_requests["/granule.zip"] == 1
+
+
+def test_stream_download__when_range_ignored__then_restarts_from_whole_file(fake_http_server, tmp_path):
+    # ARRANGE
+    content = os.urandom(3 * MiB)
+    url = fake_http_server.add_file("/granule.zip", content, drop_after=[MiB], ignore_range=True)
+
+    # ACT
+    result = stream_download(url, tmp_path / "granule.zip", checksum_algo="md5")
+
+    # ASSERT
+    assert result.path.read_bytes() == content
+    assert result.checksum == hashlib.md5(content).hexdigest()
+    assert fake_http_server.requests["/granule.zip"] == 2
+    assert fake_http_server.range_requests["/granule.zip"] == 1
+
+def test_stream_download__when_connection_keeps_dropping__then_raises(fake_http_server, tmp_path):
+    # ARRANGE
+    url = fake_http_server.add_file("/granule.zip", os.urandom(MiB), drop_after=[100] * 10)
+
+    # ACT
+    with pytest.raises(IncompleteDownloadException):
+        stream_download(url, tmp_path / "granule.zip", max_resumes=3)
+
+    # ASSERT
+    assert fake_http_server.requests["/granule.zip"] == 4
+    assert not (tmp_path / "granule.zip").exists()
+    assert not (tmp_path / "granule.zip.part").exists()
+
+
+def test_stream_download__when_http_error__then_raises(fake_http_server, tmp_path):
+    # ACT
+    with pytest.raises(requests.HTTPError):
+        stream_download(fake_http_server.url + "/missing.zip", tmp_path / "missing.zip")
+
+    # ASSERT
+    assert not (tmp_path / "missing.zip").exists()
+    assert not (tmp_path / "missing.zip.part").exists()
+
+
+def test_stream_download__peak_memory_is_independent_of_file_size(fake_http_server, tmp_path):
+    # ARRANGE
+    small_url = fake_http_server.add_file("/small.zip", os.urandom(8 * MiB), drop_after=[3 * MiB])
+    large_url = fake_http_server.add_file("/large.zip", os.urandom(64 * MiB), drop_after=[40 * MiB])
+
+    def download_peak_memory(url, target_path):
+        tracemalloc.start()
+        try:
+            stream_download(url, target_path)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    # ACT
+    small_peak = download_peak_memory(small_url, tmp_path / "small.zip")
+    large_peak = download_peak_memory(large_url, tmp_path / "large.zip")
+
+    # ASSERT
+    assert (tmp_path / "large.zip").stat().st_size == 64 * MiB
+    assert large_peak < 4 * DOWNLOAD_CHUNK_SIZE
+    assert large_peak < 2 * small_peak
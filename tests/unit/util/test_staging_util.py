@@ -0,0 +1,162 @@
+import hashlib
+import logging
+import os
+import time
+
+import numpy as np
+import pytest
+from shapely.geometry import box
+
+gdal = pytest.importorskip("osgeo.gdal")
+
+from util.geo_util import check_dateline
+from util.staging_util import gdal_staging_config_options, get_vrt_digest, stage_sub_regions
+from util.tile_cache_util import TileCache
+
+SIMULATED_S3_LATENCY_SECS = 0.2
+"""Added to each translation of the local mosaic, to stand in for the latency of reading from /vsis3/"""
+
+
+@pytest.fixture(scope="module")
+def mosaic_vrt(tmp_path_factory):
+    """A global EPSG:4326 mosaic of 8 x 4 GTiff tiles of 45 x 45 degrees, at 0.1 degree resolution"""
+    mosaic_dir = tmp_path_factory.mktemp("mosaic")
+    rng = np.random.default_rng(0)
+    tile_paths = []
+    for i, west in enumerate(range(-180, 180, 45)):
+        for j, north in enumerate(range(90, -90, -45)):
+            tile_path = str(mosaic_dir / f"tile_{i}_{j}.tif")
+            ds = gdal.GetDriverByName("GTiff").Create(tile_path, 450, 450, 1, gdal.GDT_Int16)
+            ds.SetGeoTransform((west, 0.1, 0, north, 0, -0.1))
+            ds.SetProjection('GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563]],'
+                             'PRIMEM["Greenwich",0],UNIT["degree",0.0174532925199433],AUTHORITY["EPSG","4326"]]')
+            ds.GetRasterBand(1).WriteArray(rng.integers(-100, 4000, (450, 450), dtype=np.int16))
+            ds = None
+            tile_paths.append(tile_path)
+
+    vrt_path = str(mosaic_dir / "mosaic.vrt")
+    gdal.BuildVRT(vrt_path, tile_paths)
+    return vrt_path
+
+
+def translate_with_latency(vrt_filename, output_path, x_min, x_max, y_min, y_max):
+    time.sleep(SIMULATED_S3_LATENCY_SECS)
+    ds = gdal.Open(vrt_filename, gdal.GA_ReadOnly)
+    gdal.Translate(output_path, ds, format='GTiff', projWin=[x_min, y_max, x_max, y_min])
+
+
+def read_array(path):
+    return gdal.Open(path).ReadAsArray()
+
+
+def test_stage_sub_regions__uses_thread_local_gdal_config(tmp_path):
+    # ARRANGE
+    config_options = {}
+
+    def translate(vrt_filename, output_path, x_min, x_max, y_min, y_max):
+        config_options[output_path] = {key: gdal.GetConfigOption(key) for key in gdal_staging_config_options(4)}
+        with open(output_path, "w") as f:
+            f.write(f"{vrt_filename} {x_min} {x_max} {y_min} {y_max}")
+
+    polys = [box(i, 0, i + 1, 1) for i in range(6)]
+
+    # ACT
+    output_paths = stage_sub_regions(translate, ["a.vrt"] * len(polys), polys, str(tmp_path / "map"))
+
+    # ASSERT
+    assert output_paths == [str(tmp_path / f"map_{i}.tif") for i in range(6)]
+    assert all(options == gdal_staging_config_options(4) for options in config_options.values())
+    assert gdal.GetConfigOption("GDAL_HTTP_MULTIPLEX") is None
+    with open(output_paths[5]) as f:
+        assert f.read() == "a.vrt 5.0 6.0 0.0 1.0"
+
+
+def test_stage_sub_regions__when_translate_fails__then_error(tmp_path):
+    # ARRANGE
+    def translate(vrt_filename, output_path, x_min, x_max, y_min, y_max):
+        if x_min == 1:
+            raise RuntimeError("translate failed")
+        open(output_path, "w").close()
+
+    # ACT / ASSERT
+    with pytest.raises(RuntimeError, match="translate failed"):
+        stage_sub_regions(translate, ["a.vrt"] * 2, [box(0, 0, 1, 1), box(1, 0, 2, 1)], str(tmp_path / "map"))
+
+
+def test_gdal_staging_config_options__then_cpus_divided_between_workers(monkeypatch):
+    # ARRANGE
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+
+    # ACT / ASSERT
+    assert gdal_staging_config_options(1)["GDAL_NUM_THREADS"] == "8"
+    assert gdal_staging_config_options(4)["GDAL_NUM_THREADS"] == "2"
+    assert gdal_staging_config_options(16)["GDAL_NUM_THREADS"] == "1"
+
+
+def test_stage_sub_regions__when_vrt_updated_in_place__then_tile_cache_missed(tmp_path):
+    # ARRANGE
+    vrt_path = tmp_path / "map.vrt"
+    vrt_path.write_text("<VRTDataset>v1</VRTDataset>")
+    tile_cache = TileCache(str(tmp_path / "cache"))
+
+    def translate(vrt_filename, output_path, x_min, x_max, y_min, y_max):
+        with open(vrt_filename) as vrt_file, open(output_path, "w") as f:
+            f.write(vrt_file.read())
+
+    def stage(subdir):
+        (tmp_path / subdir).mkdir()
+        output_path, = stage_sub_regions(translate, [str(vrt_path)], [box(0, 0, 1, 1)], str(tmp_path / subdir / "map"),
+                                         tile_cache=tile_cache)
+        with open(output_path) as f:
+            return f.read()
+
+    # ACT
+    first = stage("first")
+    cached = stage("cached")
+    vrt_path.write_text("<VRTDataset>v2</VRTDataset>")
+    updated = stage("updated")
+
+    # ASSERT
+    assert get_vrt_digest(str(vrt_path)) == hashlib.sha256(b"<VRTDataset>v2</VRTDataset>").hexdigest()
+    assert (first, cached, updated) == ("<VRTDataset>v1</VRTDataset>",) * 2 + ("<VRTDataset>v2</VRTDataset>",)
+    assert (tile_cache.hits, tile_cache.misses) == (1, 2)
+
+
+@pytest.mark.benchmark
+def test_benchmark__stage_antimeridian_sub_regions_from_local_mosaic(mosaic_vrt, tmp_path):
+    # ARRANGE
+    # 12 bounding boxes, half of which cross the antimeridian and are split in 2
+    bboxes = [box(170 + i, -30 + 5 * i, 190 + i, -20 + 5 * i) for i in range(6)] \
+             + [box(-120 + 10 * i, 30, -110 + 10 * i, 40) for i in range(6)]
+    requests = [check_dateline(bbox) for bbox in bboxes]
+    tile_cache = TileCache(str(tmp_path / "cache"))
+
+    def stage_all(max_workers, tile_cache=None, subdir="out"):
+        (tmp_path / subdir).mkdir(exist_ok=True)
+        start = time.perf_counter()
+        output_paths = [
+            stage_sub_regions(translate_with_latency, [mosaic_vrt] * len(polys), polys,
+                              str(tmp_path / subdir / f"map{k}"), tile_cache=tile_cache, max_workers=max_workers)
+            for k, polys in enumerate(requests)
+        ]
+        return output_paths, time.perf_counter() - start
+
+    # ACT
+    sequential_paths, sequential_secs = stage_all(max_workers=1, subdir="sequential")
+    concurrent_paths, concurrent_secs = stage_all(max_workers=4, tile_cache=tile_cache, subdir="concurrent")
+    cold_hit_rate = tile_cache.hit_rate
+    cached_paths, cached_secs = stage_all(max_workers=4, tile_cache=tile_cache, subdir="cached")
+
+    # ASSERT
+    logging.info(f"{len(bboxes)} bounding boxes: sequential {sequential_secs:.2f}s, concurrent {concurrent_secs:.2f}s, "
+                 f"cached {cached_secs:.2f}s (cache hit rate {tile_cache.hit_rate:.0%})")
+    assert sum(len(polys) for polys in requests) == 18
+    for sequential, concurrent, cached in zip(sequential_paths, concurrent_paths, cached_paths):
+        for sequential_path, concurrent_path, cached_path in zip(sequential, concurrent, cached):
+            np.testing.assert_array_equal(read_array(concurrent_path), read_array(sequential_path))
+            np.testing.assert_array_equal(read_array(cached_path), read_array(sequential_path))
+
+    assert cold_hit_rate == 0
+    assert tile_cache.hits == 18
+    assert concurrent_secs < sequential_secs * 0.75
+    assert cached_secs < concurrent_secs / 2
@@ -0,0 +1,78 @@
+import os
+import threading
+
+from util.tile_cache_util import TileCache
+
+
+def cached_tiles(cache_dir):
+    return sorted(filename for _, _, filenames in os.walk(cache_dir) for filename in filenames)
+
+
+def test_tile_cache__concurrent_puts_of_same_key(tmp_path):
+    # ARRANGE
+    tile_cache = TileCache(str(tmp_path / "cache"))
+    (tmp_path / "tile.tif").write_bytes(b"x" * 1024 * 1024)
+
+    # ACT
+    threads = [threading.Thread(target=tile_cache.put, args=("digest", (0, 0, 1, 1), str(tmp_path / "tile.tif")))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # ASSERT
+    assert tile_cache.get("digest", (0, 0, 1, 1), str(tmp_path / "out.tif"))
+    assert (tmp_path / "out.tif").read_bytes() == b"x" * 1024 * 1024
+    assert not tile_cache.get("digest", (0, 0, 1, 2), str(tmp_path / "out.tif"))
+    assert tile_cache.hit_rate == 0.5
+    assert len(cached_tiles(tmp_path / "cache")) == 1
+
+
+def test_tile_cache__when_vrt_digest_differs__then_missed(tmp_path):
+    # ARRANGE
+    tile_cache = TileCache(str(tmp_path / "cache"))
+    (tmp_path / "tile.tif").write_bytes(b"v1")
+    tile_cache.put("digest of v1", (0, 0, 1, 1), str(tmp_path / "tile.tif"))
+
+    # ACT / ASSERT
+    assert not tile_cache.get("digest of v2", (0, 0, 1, 1), str(tmp_path / "out.tif"))
+    assert tile_cache.get("digest of v1", (0, 0, 1, 1), str(tmp_path / "out.tif"))
+
+
+def test_tile_cache__when_over_max_bytes__then_least_recently_used_evicted(tmp_path):
+    # ARRANGE
+    tile_cache = TileCache(str(tmp_path / "cache"), max_bytes=30)
+
+    for i, name in enumerate("abc"):
+        (tmp_path / name).write_bytes(name.encode() * 10)
+        tile_cache.put(name, (0, 0, 1, 1), str(tmp_path / name))
+        os.utime(tile_cache._path(tile_cache.key(name, (0, 0, 1, 1))), (i, i))
+
+    # ACT
+    assert tile_cache.get("a", (0, 0, 1, 1), str(tmp_path / "out.tif"))
+    (tmp_path / "d").write_bytes(b"d" * 10)
+    tile_cache.put("d", (0, 0, 1, 1), str(tmp_path / "d"))
+
+    # ASSERT
+    assert not tile_cache.get("b", (0, 0, 1, 1), str(tmp_path / "out.tif"))
+    for name in "acd":
+        assert tile_cache.get(name, (0, 0, 1, 1), str(tmp_path / "out.tif"))
+        assert (tmp_path / "out.tif").read_bytes() == name.encode() * 10
+    assert len(cached_tiles(tmp_path / "cache")) == 3
+
+
+def test_tile_cache__when_tile_larger_than_max_bytes__then_kept_until_next_put(tmp_path):
+    # ARRANGE
+    tile_cache = TileCache(str(tmp_path / "cache"), max_bytes=10)
+    (tmp_path / "tile.tif").write_bytes(b"x" * 20)
+
+    # ACT
+    tile_cache.put("a", (0, 0, 1, 1), str(tmp_path / "tile.tif"))
+    a_cached = tile_cache.get("a", (0, 0, 1, 1), str(tmp_path / "out.tif"))
+    tile_cache.put("b", (0, 0, 1, 1), str(tmp_path / "tile.tif"))
+
+    # ASSERT
+    assert a_cached
+    assert not tile_cache.get("a", (0, 0, 1, 1), str(tmp_path / "out.tif"))
+    assert tile_cache.get("b", (0, 0, 1, 1), str(tmp_path / "out.tif"))
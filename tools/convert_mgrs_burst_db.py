@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Converts the MGRS Tile Collection Database (SQLite) to the columnar Parquet file loaded by the DSWx-S1 query and
+evaluator jobs, in place of the SQLite database. Place the output next to the SQLite database
+(see MGRS_TILE_COLLECTION_DB_FILEPATH), keeping its filename, which names the version of the database it was
+converted from by the size and modification time of the database file. Preserve the modification time when copying
+the database (e.g. `cp -p`), or convert it in place.
+"""
+import argparse
+import logging
+from pathlib import Path
+
+from data_subscriber.rtc.mgrs_bursts_collection_db_client import (convert_mgrs_burst_db_to_parquet,
+                                                                  get_mgrs_burst_db_parquet_filename,
+                                                                  get_mgrs_burst_db_source_id)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--db-file", required=True, help="The MGRS Tile Collection Database SQLite file")
+parser.add_argument("--output", help="The output Parquet file. Defaults to the versioned Parquet filename, next to the database file")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    output = args.output or str(Path(args.db_file).with_name(
+        get_mgrs_burst_db_parquet_filename(args.db_file, get_mgrs_burst_db_source_id(args.db_file))))
+    convert_mgrs_burst_db_to_parquet(args.db_file, output)
+    logger.info(f"Wrote {output}")
@@ -11,7 +11,7 @@ import requests
 from datetime import datetime, timedelta
 from data_subscriber.url import determine_acquisition_cycle
 from data_subscriber.cslc_utils import parse_r2_product_file_name
-from data_subscriber.dist_s1_utils import parse_local_burst_db_pickle, localize_dist_burst_db, trigger_from_cmr_survey_csv
+from data_subscriber.dist_s1_utils import parse_local_burst_db_cache, localize_dist_burst_db, trigger_from_cmr_survey_csv
 
 burst_geometry_file_url = "https://github.com/opera-adt/burst_db/releases/download/v0.9.0/burst-id-geometries-simple-0.9.0.geojson.zip"
 burst_geometry_file = "burst-id-geometries-simple-0.9.0.geojson.zip"
@@ -52,9 +52,9 @@ server_parser.add_argument("--tile-to-trigger", help="Only trigger a specific ti
 args = parser.parse_args()
 
 if args.db_file:
-    # First see if a pickle file exists
-    pickle_file_name = args.db_file + ".pickle"
-    dist_products, bursts_to_products, product_to_bursts, all_tile_ids = parse_local_burst_db_pickle(args.db_file, pickle_file_name)
+    # First see if a cache file exists
+    cache_file_name = args.db_file + ".npz"
+    dist_products, bursts_to_products, product_to_bursts, all_tile_ids = parse_local_burst_db_cache(args.db_file, cache_file_name)
 else:
     dist_products, bursts_to_products, product_to_bursts, all_tile_ids = localize_dist_burst_db()
 
@@ -9,11 +9,26 @@ from typing import Optional, Iterable
 
 import aiohttp
 import backoff
+import dateutil.parser
 import requests
 from requests.exceptions import HTTPError
 
 from opera_commons.logger import get_logger
 
+CMR_PAGE_SIZE = 2000
+"""The number of granules requested per CMR search page. CMR's default is 10 and the max is 2000."""
+
+CMR_MAX_CONCURRENT_REQUESTS = 8
+"""The maximum number of CMR requests in flight at once when searching sub-windows concurrently."""
+
+CMR_MAX_HITS_PER_WINDOW = 2 * CMR_PAGE_SIZE
+"""Searches with more hits than this are split into smaller temporal sub-windows that are fetched concurrently."""
+
+CMR_WINDOW_PAGE_FILL = 0.8
+"""The fraction of a search page each sub-window is sized to fill, leaving headroom for unevenly distributed granules."""
+
+CMR_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
 
 async def async_cmr_posts(url, request_bodies: list):
     """Given a list of request bodies, performs CMR queries asynchronously, returning the response JSONs."""
@@ -28,25 +43,29 @@ async def async_cmr_posts(url, request_bodies: list):
     return list(itertools.chain.from_iterable(responses))
 
 
-async def async_cmr_post(url, data: str, session: aiohttp.ClientSession, sem: Optional[asyncio.Semaphore]):
-    """Issues a request asynchronously. If a semaphore is provided, it will use it as a context manager."""
+async def async_cmr_post(url, data: str, session: aiohttp.ClientSession, sem: Optional[asyncio.Semaphore],
+                         max_pages: Optional[int] = None):
+    """
+    Issues a request asynchronously. If a semaphore is provided, it will use it as a context manager.
+
+    Results are scrolled through using CMR-Search-After until exhausted, or until `max_pages` pages have been read,
+    if provided.
+    """
     logger = get_logger()
 
     sem = sem if sem is not None else contextlib.nullcontext()
 
     async with sem:
-        page_size = 2000  # default is 10, max is 2000
+        page_size = CMR_PAGE_SIZE
         data += f"&page_size={page_size}"
 
         logger.debug(f"async_cmr_post({url=}..., {len(data)=:,}, {data[-250:]=}")
-        max_pages = 1  # cap the number of pages (requests) to scroll through results.
+        max_pages_limit = max_pages if max_pages is not None else math.inf
         # after first response, update with the smallest of the forced max and the number of hits
+        max_pages = 1
 
         current_page = 1
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded',
-            'Client-Id': f'nasa.jpl.opera.sds.pcm.data_subscriber.{os.environ["USER"]}'
-        }
+        headers = cmr_request_headers()
 
         logger.info("Issuing request. This may take a while depending on search page size and number of pages/results.")
 
@@ -58,8 +77,8 @@ async def async_cmr_post(url, data: str, session: aiohttp.ClientSession, sem: Op
 
             if current_page == 1:
                 logger.debug(f'CMR number of granules (cmr-query): {response_json["hits"]=:,}')
-                # max_pages = math.ceil(response_json["hits"]/page_size)
-                logger.debug("Updating max pages to %d", max_pages)
+                max_pages = min(max_pages_limit, max(1, math.ceil(response_json["hits"] / page_size)))
+                logger.debug("Updating max pages to %s", max_pages)
 
             logger.debug(f'CMR query (cmr-query-page {current_page} of {ceil(response_json["hits"]/page_size)}): '
                          f'{len(response_json["items"])=:,}')
@@ -75,7 +94,7 @@ async def async_cmr_post(url, data: str, session: aiohttp.ClientSession, sem: Op
                 break
 
             current_page += 1
-            if not current_page <= max_pages:
+            if not current_page <= max_pages and max_pages < math.ceil(response_json["hits"] / page_size):
                 logger.warning(
                     "Reached max pages limit (%d). Not all search results exhausted. "
                     "Adjust limit or time ranges to process all hits, then re-run this script.",
@@ -85,6 +104,172 @@ async def async_cmr_post(url, data: str, session: aiohttp.ClientSession, sem: Op
         return response_jsons
 
 
+async def async_cmr_posts_windowed(url, paramss: Iterable[dict], max_concurrency=CMR_MAX_CONCURRENT_REQUESTS,
+                                   max_hits_per_window=CMR_MAX_HITS_PER_WINDOW):
+    """
+    Given a list of request params, performs CMR queries concurrently, returning the deduplicated response JSONs.
+
+    Searches with more than `max_hits_per_window` hits have their temporal (or revision date) range split into
+    sub-windows sized by the number of hits reported by CMR. The sub-windows are fetched concurrently over a single
+    connection-pooled session, bounded by `max_concurrency`, and scrolled through using CMR-Search-After.
+    """
+    connector = aiohttp.TCPConnector(limit=max_concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        sem = asyncio.Semaphore(max_concurrency)
+
+        tasks = []
+        for params in paramss:
+            tasks.append(_async_cmr_post_window(url, params, session, sem, max_hits_per_window))
+        responses = await asyncio.gather(*tasks)
+
+    return dedupe_response_jsons(itertools.chain.from_iterable(responses))
+
+
+async def async_cmr_posts_windowed_iter(url, paramss: Iterable[dict], max_concurrency=CMR_MAX_CONCURRENT_REQUESTS,
+                                        max_hits_per_window=CMR_MAX_HITS_PER_WINDOW, max_buffered_pages=4):
+    """
+    Async generator variant of async_cmr_posts_windowed(). Yields each deduplicated response JSON as soon as its page
+    is received, instead of once all pages have been read, so that callers can start processing the first page while
+    later pages are still being fetched.
+
+    Pages are yielded in the order they are received. At most `max_buffered_pages` pages are buffered for a slow
+    consumer before fetching of further pages is paused.
+    """
+    pages = asyncio.Queue(maxsize=max_buffered_pages)
+    done = object()
+
+    connector = aiohttp.TCPConnector(limit=max_concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        sem = asyncio.Semaphore(max_concurrency)
+
+        async def fetch_all():
+            try:
+                await asyncio.gather(*[
+                    _async_cmr_post_window(url, params, session, sem, max_hits_per_window, on_page=pages.put)
+                    for params in paramss
+                ])
+            finally:
+                await pages.put(done)
+
+        fetch_task = asyncio.create_task(fetch_all())
+        try:
+            seen = set()
+            while (response_json := await pages.get()) is not done:
+                yield dedupe_response_jsons([response_json], seen=seen)[0]
+            await fetch_task  # re-raises any error of the fetch
+        finally:
+            fetch_task.cancel()
+            await asyncio.gather(fetch_task, return_exceptions=True)
+
+
+async def _async_cmr_post_window(url, params: dict, session: aiohttp.ClientSession, sem: asyncio.Semaphore,
+                                 max_hits_per_window: int, on_page=None) -> list[dict]:
+    """
+    Reads all pages of the given search, splitting it into concurrently fetched sub-windows if it has too many hits.
+    If provided, the `on_page` coroutine function is awaited with each response JSON as soon as it is received.
+    """
+    logger = get_logger()
+
+    data = params_to_request_body(params) + f"&page_size={CMR_PAGE_SIZE}"
+    headers = cmr_request_headers()
+
+    response_json, hits, cmr_search_after = await _async_cmr_post_page(url, data, session, sem, headers)
+    if len(response_json["items"]) >= hits or not cmr_search_after:
+        if on_page:
+            await on_page(response_json)
+        return [response_json]
+
+    if hits > max_hits_per_window:
+        sub_paramss = split_params_by_range(params, num_windows=math.ceil(hits / (CMR_PAGE_SIZE * CMR_WINDOW_PAGE_FILL)))
+        if len(sub_paramss) > 1:
+            logger.debug("Splitting search of %d hits into %d sub-windows", hits, len(sub_paramss))
+            tasks = [_async_cmr_post_window(url, sub_params, session, sem, max_hits_per_window, on_page=on_page)
+                     for sub_params in sub_paramss]
+            return list(itertools.chain.from_iterable(await asyncio.gather(*tasks)))
+
+    if on_page:
+        await on_page(response_json)
+
+    response_jsons = [response_json]
+    num_items = len(response_json["items"])
+    while cmr_search_after and num_items < hits:
+        headers["CMR-Search-After"] = cmr_search_after
+        response_json, _, cmr_search_after = await _async_cmr_post_page(url, data, session, sem, headers)
+        response_jsons.append(response_json)
+        num_items += len(response_json["items"])
+        if on_page:
+            await on_page(response_json)
+
+        if len(response_json["items"]) < CMR_PAGE_SIZE:
+            break
+
+    return response_jsons
+
+
+async def _async_cmr_post_page(url, data: str, session: aiohttp.ClientSession, sem: asyncio.Semaphore, headers):
+    """Issues a single search page request, returning the response JSON, the total number of hits and the CMR-Search-After value."""
+    async with sem:
+        async with await fetch_post_url(session, url, data, headers) as response:
+            response_json = await response.json()
+            hits = int(response.headers.get("CMR-Hits", response_json["hits"]))
+            return response_json, hits, response.headers.get("CMR-Search-After")
+
+
+def split_params_by_range(params: dict, num_windows: int) -> list[dict]:
+    """
+    Splits the "temporal" (or "revision_date") range of the given CMR request params into `num_windows` contiguous
+    sub-windows, ordered newest first to match the "-start_date" sort key. Boundaries are shared between neighbouring
+    windows, so results must be deduplicated. Returns the params as-is if they have no range to split.
+    """
+    for key in ("temporal", "revision_date"):
+        value = params.get(key)
+        if not isinstance(value, str) or value.count(",") != 1:
+            continue
+        try:
+            start, end = (dateutil.parser.isoparse(dt) for dt in value.split(","))
+        except ValueError:
+            continue
+        break
+    else:
+        return [params]
+
+    num_windows = min(num_windows, int((end - start).total_seconds()))
+    if num_windows <= 1:
+        return [params]
+
+    step = (end - start) / num_windows
+    bounds = [start + step * i for i in range(num_windows)] + [end]
+    return [
+        {**params, key: f"{window_start.strftime(CMR_TIME_FORMAT)},{window_end.strftime(CMR_TIME_FORMAT)}"}
+        for window_start, window_end in reversed(list(zip(bounds, bounds[1:])))
+    ]
+
+
+def dedupe_response_jsons(response_jsons: Iterable[dict], seen: Optional[set] = None) -> list[dict]:
+    """
+    Removes granule revisions that appear in more than one response JSON, such as those on sub-window boundaries.
+    A `seen` set may be provided to deduplicate across calls.
+    """
+    seen = seen if seen is not None else set()
+    deduped_response_jsons = []
+    for response_json in response_jsons:
+        items = []
+        for item in response_json["items"]:
+            key = (item["meta"].get("concept-id", item["meta"].get("native-id")), item["meta"].get("revision-id"))
+            if key not in seen:
+                seen.add(key)
+                items.append(item)
+        deduped_response_jsons.append({**response_json, "items": items})
+    return deduped_response_jsons
+
+
+def cmr_request_headers() -> dict:
+    return {
+        'Content-Type': 'application/x-www-form-urlencoded',
+        'Client-Id': f'nasa.jpl.opera.sds.pcm.data_subscriber.{os.environ["USER"]}'
+    }
+
+
 def giveup_cmr_requests(e):
     """giveup function for use with @backoff decorator when issuing CMR queries to retry on intermittent 504 errors."""
     if isinstance(e, aiohttp.ClientResponseError):
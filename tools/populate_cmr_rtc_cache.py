@@ -14,7 +14,7 @@ from opera_commons.logger import get_logger
 import sys
 import os
 from rtc_utils import rtc_granule_regex, determine_acquisition_cycle
-from data_subscriber.dist_s1_utils import parse_local_burst_db_pickle, localize_dist_burst_db
+from data_subscriber.dist_s1_utils import parse_local_burst_db_cache, localize_dist_burst_db
 import re
 from data_subscriber.rtc_for_dist.dist_dependency import CMR_RTC_CACHE_INDEX
 
@@ -161,14 +161,14 @@ def main():
     )
     parser.add_argument("csv_file", help="Path to the CMR survey CSV file (e.g., cmr_survey.csv.raw.csv)")
     parser.add_argument("--verbose", "-v", action="store_true", help="Enable verbose logging")
-    parser.add_argument("--db-file", help="Path to the DIST-S1 burst database pickle file")
+    parser.add_argument("--db-file", help="Path to the DIST-S1 burst database parquet file")
     
     args = parser.parse_args()
 
     if args.db_file:
-        # First see if a pickle file exists
-        pickle_file_name = args.db_file + ".pickle"
-        dist_products, bursts_to_products, product_to_bursts, all_tile_ids = parse_local_burst_db_pickle(args.db_file, pickle_file_name)
+        # First see if a cache file exists
+        cache_file_name = args.db_file + ".npz"
+        dist_products, bursts_to_products, product_to_bursts, all_tile_ids = parse_local_burst_db_cache(args.db_file, cache_file_name)
     else:
         dist_products, bursts_to_products, product_to_bursts, all_tile_ids = localize_dist_burst_db()
     
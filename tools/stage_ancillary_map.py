@@ -14,6 +14,8 @@ from opera_commons.logger import LogLevels
 from util.geo_util import (check_dateline,
                            polygon_from_bounding_box)
 from util.pge_util import check_aws_connection
+from util.staging_util import stage_sub_regions
+from util.tile_cache_util import get_tile_cache
 
 # Enable exceptions
 gdal.UseExceptions()
@@ -56,6 +58,56 @@ def get_parser():
 
 
 @backoff.on_exception(backoff.expo, Exception, max_time=600, max_value=32)
+def translate_map(vrt_filename, output_path, x_min, x_max, y_min, y_max):
+    """
+    Translate a map from S3 to a region matching the provided boundaries.
+
+    Parameters
+    ----------
+    vrt_filename: str
+        Path to the input VRT file
+    output_path: str
+        Path to the translated output GTiff file
+    x_min: float
+        Minimum longitude bound of the sub-window
+    x_max: float
+        Maximum longitude bound of the sub-window
+    y_min: float
+        Minimum latitude bound of the sub-window
+    y_max: float
+        Maximum latitude bound of the sub-window
+
+    """
+    logger.info(
+        f"Translating map for projection window "
+        f"{str([x_min, y_max, x_max, y_min])} to {output_path}"
+    )
+
+    ds = gdal.Open(vrt_filename, gdal.GA_ReadOnly)
+
+    gdal.Translate(
+        output_path, ds, format='GTiff', projWin=[x_min, y_max, x_max, y_min]
+    )
+
+    # stage_ancillary_map.py takes a bbox as an input. The longitude coordinates
+    # of this bbox are unwrapped i.e., range in [0, 360] deg. If the
+    # bbox crosses the anti-meridian, the script divides it in two
+    # bboxes neighboring the anti-meridian. Here, x_min and x_max
+    # represent the min and max longitude coordinates of one of these
+    # bboxes. We Add 360 deg if the min longitude of the downloaded DEM
+    # tile is < 180 deg i.e., there is a dateline crossing.
+    # This ensures that the mosaicked DEM VRT will span a min
+    # range of longitudes rather than the full [-180, 180] deg
+    sr = osr.SpatialReference(ds.GetProjection())
+    epsg_str = sr.GetAttrValue("AUTHORITY", 1)
+
+    if x_min <= -180.0 and epsg_str == '4326':
+        ds = gdal.Open(output_path, gdal.GA_Update)
+        geotransform = list(ds.GetGeoTransform())
+        geotransform[0] += 360.0
+        ds.SetGeoTransform(tuple(geotransform))
+
+
 def download_map(polys, map_bucket, map_vrt_key, outfile):
     """
     Download a map subregion corresponding to the provided polygon(s)
@@ -74,45 +126,11 @@ def download_map(polys, map_bucket, map_vrt_key, outfile):
         Path to where the output map VRT (and corresponding tifs) will be staged.
 
     """
-    # Download the map for each provided Polygon
+    # Download the map for each provided Polygon concurrently
     file_prefix = os.path.splitext(outfile)[0]
-    region_list = []
-
-    for idx, poly in enumerate(polys):
-        vrt_filename = f'/vsis3/{map_bucket}/{map_vrt_key}'
-        output_path = f'{file_prefix}_{idx}.tif'
-        region_list.append(output_path)
-
-        x_min, y_min, x_max, y_max = poly.bounds
-
-        logger.info(
-            f"Translating map for projection window "
-            f"{str([x_min, y_max, x_max, y_min])} to {output_path}"
-        )
-
-        ds = gdal.Open(vrt_filename, gdal.GA_ReadOnly)
-
-        gdal.Translate(
-            output_path, ds, format='GTiff', projWin=[x_min, y_max, x_max, y_min]
-        )
-
-        # stage_ancillary_map.py takes a bbox as an input. The longitude coordinates
-        # of this bbox are unwrapped i.e., range in [0, 360] deg. If the
-        # bbox crosses the anti-meridian, the script divides it in two
-        # bboxes neighboring the anti-meridian. Here, x_min and x_max
-        # represent the min and max longitude coordinates of one of these
-        # bboxes. We Add 360 deg if the min longitude of the downloaded DEM
-        # tile is < 180 deg i.e., there is a dateline crossing.
-        # This ensures that the mosaicked DEM VRT will span a min
-        # range of longitudes rather than the full [-180, 180] deg
-        sr = osr.SpatialReference(ds.GetProjection())
-        epsg_str = sr.GetAttrValue("AUTHORITY", 1)
-
-        if x_min <= -180.0 and epsg_str == '4326':
-            ds = gdal.Open(output_path, gdal.GA_Update)
-            geotransform = list(ds.GetGeoTransform())
-            geotransform[0] += 360.0
-            ds.SetGeoTransform(tuple(geotransform))
+    vrt_filename = f'/vsis3/{map_bucket}/{map_vrt_key}'
+    region_list = stage_sub_regions(translate_map, [vrt_filename] * len(polys), polys, file_prefix,
+                                    tile_cache=get_tile_cache())
 
     # Build VRT with downloaded sub-regions
     gdal.BuildVRT(outfile, region_list)
@@ -16,6 +16,8 @@ from util.geo_util import (check_dateline,
                            polygon_from_bounding_box,
                            polygon_from_mgrs_tile)
 from util.pge_util import check_aws_connection
+from util.staging_util import stage_sub_regions
+from util.tile_cache_util import get_tile_cache
 
 # Enable exceptions
 gdal.UseExceptions()
@@ -213,16 +215,10 @@ def download_dem(polys, epsgs, dem_location, outfile):
     # set epsg to 4326 for each element in the list
     epsgs = [4326] * len(epsgs)
 
-    # Download DEM for each polygon/epsg
+    # Download DEM for each polygon/epsg concurrently
     file_prefix = os.path.splitext(outfile)[0]
-    dem_list = []
-
-    for idx, (epsg, poly) in enumerate(zip(epsgs, polys)):
-        vrt_filename = f'/vsis3/{dem_location}/EPSG{epsg}/EPSG{epsg}.vrt'
-        output_path = f'{file_prefix}_{idx}.tif'
-        dem_list.append(output_path)
-        x_min, y_min, x_max, y_max = poly.bounds
-        translate_dem(vrt_filename, output_path, x_min, x_max, y_min, y_max)
+    vrt_filenames = [f'/vsis3/{dem_location}/EPSG{epsg}/EPSG{epsg}.vrt' for epsg in epsgs]
+    dem_list = stage_sub_regions(translate_dem, vrt_filenames, polys, file_prefix, tile_cache=get_tile_cache())
 
     # Build vrt with downloaded DEMs
     gdal.BuildVRT(outfile, dem_list)
@@ -11,6 +11,7 @@ to the start date of an input SLC SAFE archive.
 """
 
 import argparse
+import contextlib
 import datetime
 import netrc
 import os
@@ -22,6 +23,7 @@ from os.path import abspath, join
 import requests
 from opera_commons.logger import LogLevels
 from opera_commons.logger import logger
+from util.ancillary_cache_util import get_ancillary_file_cache
 from util.edl_util import DEFAULT_EDL_ENDPOINT, SessionWithHeaderRedirection
 
 DEFAULT_DOWNLOAD_ENDPOINT = "https://cddis.nasa.gov/archive/gnss/products/ionex"
@@ -437,6 +439,40 @@ def main(args):
     # There are two file-naming conventions we need to account for.
     names_to_check = (legacy_archive_name, new_archive_name)
 
+    # Serve the file from the worker-local cache if a previous job already staged it. While a job fetches the file,
+    # others for the same day wait for it, then find it in the cache.
+    cache = get_ancillary_file_cache()
+
+    with (cache.lock(f"ionosphere/{year}/{doy}/{args.provider}/{args.type}") if cache else contextlib.nullcontext()):
+        if cache:
+            cached_path_or_url = _get_cached_ionosphere_file(cache, names_to_check, args)
+            if cached_path_or_url:
+                return cached_path_or_url
+
+        return _stage_ionosphere_file(args, year, doy, names_to_check, cache)
+
+
+def _get_cached_ionosphere_file(cache, names_to_check, args):
+    """Returns the cached Ionosphere file path (or URL, if only the URL is requested) of the first cached archive name"""
+    for archive_name in names_to_check:
+        if args.url_only:
+            metadata = cache.get_metadata(archive_name)
+            if metadata:
+                logger.info('URL-only requested')
+                logger.info(metadata["url"])
+                print(metadata["url"])
+                return metadata["url"]
+        else:
+            cached_path = cache.get(archive_name, args.output_directory)
+            if cached_path:
+                logger.info('Ionosphere Correction file staging complete')
+                return cached_path
+
+    return None
+
+
+def _stage_ionosphere_file(args, year, doy, names_to_check, cache):
+    """Finds, downloads and uncompresses the first available of the Ionosphere archive names, caching the result"""
     # Check for the first available of the available naming conventions
     for archive_name in names_to_check:
         request_url = join(args.download_endpoint, year, doy, archive_name)
@@ -481,6 +517,9 @@ def main(args):
     # Remove the compressed version
     os.unlink(output_ionosphere_archive_path)
 
+    if cache:
+        cache.put(archive_name, output_ionosphere_file_path, url=request_url)
+
     logger.info('Ionosphere Correction file staging complete')
 
     return output_ionosphere_file_path
@@ -11,6 +11,7 @@ range covered by an input SLC SAFE archive.
 """
 
 import argparse
+import contextlib
 import os
 import re
 from datetime import datetime, timedelta
@@ -21,6 +22,7 @@ import requests
 
 from opera_commons.logger import LogLevels
 from opera_commons.logger import logger
+from util.ancillary_cache_util import get_ancillary_file_cache
 from util.backoff_util import fatal_code, backoff_logger
 from util.dataspace_util import (DEFAULT_QUERY_ENDPOINT,
                                  DEFAULT_AUTH_ENDPOINT,
@@ -60,6 +62,14 @@ Temporal margin to apply to the stop time of a frame to make sure that the
 ascending node crossing is included when choosing the orbit file
 """
 
+ORBIT_REGEX = re.compile(
+    r'(?P<mission_id>S1A|S1B|S1C)_(?P<file_class>OPER)_(?P<category>AUX)_'
+    r'(?P<semantic_desc>POEORB|RESORB)_(?P<site>OPOD)_'
+    r'(?P<creation_ts>\d{8}T\d{6})_V(?P<valid_start_ts>\d{8}T\d{6})_'
+    r'(?P<valid_stop_ts>\d{8}T\d{6})[.](?P<format>EOF)$'
+)
+"""Regular expression for Orbit file names, capturing their validity time range"""
+
 
 def get_parser():
     """Returns the command line parser for stage_orbit_file.py"""
@@ -342,14 +352,6 @@ def select_orbit_file(query_results, req_start_time, req_stop_time):
         orbit file.
 
     """
-    orbit_regex_pattern = (
-        r'(?P<mission_id>S1A|S1B|S1C)_(?P<file_class>OPER)_(?P<category>AUX)_'
-        r'(?P<semantic_desc>POEORB|RESORB)_(?P<site>OPOD)_'
-        r'(?P<creation_ts>\d{8}T\d{6})_V(?P<valid_start_ts>\d{8}T\d{6})_'
-        r'(?P<valid_stop_ts>\d{8}T\d{6})[.](?P<format>EOF)$'
-    )
-    orbit_regex = re.compile(orbit_regex_pattern)
-
     # Parse each result from the query, and look for a suitable orbit file
     # candidate among the results
     for query_result in query_results:
@@ -368,7 +370,7 @@ def select_orbit_file(query_results, req_start_time, req_stop_time):
             continue
 
         # Parse the validity time range from the orbit file name
-        match = orbit_regex.match(orbit_file_name)
+        match = ORBIT_REGEX.match(orbit_file_name)
 
         if not match:
             logger.warning(
@@ -491,6 +493,30 @@ def main(args):
     search_start_time = args.sensing_start_range or safe_start_time
     search_stop_time = args.sensing_stop_range or safe_stop_time
 
+    # Serve the file from the worker-local cache if a previous job already staged an orbit file of the type whose
+    # validity time range envelops the query time range. While a job fetches an orbit file, others wait for it, then
+    # find it in the cache.
+    cache = get_ancillary_file_cache() if not args.url_only else None
+
+    def envelops_search_time_range(key, metadata):
+        # YYYYmmddTHHMMSS timestamps compare in chronological order
+        return (metadata.get("mission_id") == mission_id
+                and metadata.get("orbit_type") == args.orbit_type
+                and metadata["valid_start_ts"] < search_start_time
+                and metadata["valid_stop_ts"] > search_stop_time)
+
+    with (cache.lock(f"orbit/{mission_id}/{args.orbit_type}") if cache else contextlib.nullcontext()):
+        if cache:
+            cached_path = cache.find(envelops_search_time_range, args.output_directory)
+            if cached_path:
+                logger.info(f"Orbit file staged to {cached_path}")
+                return
+
+        _stage_orbit_file(args, mission_id, search_start_time, search_stop_time, cache)
+
+
+def _stage_orbit_file(args, mission_id, search_start_time, search_stop_time, cache):
+    """Queries for, selects and downloads the Orbit file for the search time range, caching the result"""
     # Construct the query based on the time range parsed from the input file
     query = construct_orbit_file_query(
         mission_id, args.orbit_type, search_start_time, search_stop_time
@@ -532,6 +558,11 @@ def main(args):
 
             logger.info(f"Orbit file downloaded to {output_orbit_file_path}")
 
+        if cache:
+            match = ORBIT_REGEX.match(orbit_file_name)
+            cache.put(orbit_file_name, output_orbit_file_path, mission_id=mission_id, orbit_type=args.orbit_type,
+                      valid_start_ts=match.group("valid_start_ts"), valid_stop_ts=match.group("valid_stop_ts"))
+
 
 if __name__ == '__main__':
     parser = get_parser()
@@ -14,6 +14,8 @@ from opera_commons.logger import LogLevels
 from util.geo_util import (check_dateline,
                            polygon_from_mgrs_tile)
 from util.pge_util import check_aws_connection
+from util.staging_util import stage_sub_regions
+from util.tile_cache_util import get_tile_cache
 
 # Enable exceptions
 gdal.UseExceptions()
@@ -190,20 +192,14 @@ def download_worldcover(polys, worldcover_bucket, worldcover_ver,
 
     """
 
-    # Download Worldcover map for each polygon/epsg
+    # Download Worldcover map for each polygon/epsg concurrently
     file_prefix = os.path.splitext(outfile)[0]
-    wc_list = []
-
-    for idx, poly in enumerate(polys):
-        vrt_filename = (
-            f'/vsis3/{worldcover_bucket}/{worldcover_ver}/{worldcover_year}/'
-            f'ESA_WorldCover_10m_{worldcover_year}_{worldcover_ver}_Map_AWS.vrt'
-        )
-
-        output_path = f'{file_prefix}_{idx}.tif'
-        wc_list.append(output_path)
-        x_min, y_min, x_max, y_max = poly.bounds
-        translate_worldcover(vrt_filename, output_path, x_min, x_max, y_min, y_max)
+    vrt_filename = (
+        f'/vsis3/{worldcover_bucket}/{worldcover_ver}/{worldcover_year}/'
+        f'ESA_WorldCover_10m_{worldcover_year}_{worldcover_ver}_Map_AWS.vrt'
+    )
+    wc_list = stage_sub_regions(translate_worldcover, [vrt_filename] * len(polys), polys, file_prefix,
+                                tile_cache=get_tile_cache())
 
     # Build vrt with downloaded maps
     gdal.BuildVRT(outfile, wc_list)
@@ -0,0 +1,207 @@
+"""
+=======================
+ancillary_cache_util.py
+=======================
+
+Contains the worker-local cache of the ancillary files (Ionosphere and Orbit
+files) staged by stage_ionosphere_file.py and stage_orbit_file.py, shared by
+the SLC/CSLC download jobs running on a worker.
+
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Callable, Optional
+
+from opera_commons.logger import logger
+
+ANCILLARY_CACHE_DIR_ENV = "OPERA_ANCILLARY_CACHE_DIR"
+"""Environment variable enabling the local ancillary file cache, set to the cache directory"""
+
+ANCILLARY_CACHE_MAX_BYTES_ENV = "OPERA_ANCILLARY_CACHE_MAX_BYTES"
+"""Environment variable overriding the size cap of the local ancillary file cache"""
+
+DEFAULT_ANCILLARY_CACHE_MAX_BYTES = 2 * 1024 ** 3
+"""Default size cap of the local ancillary file cache. Least recently used files are evicted beyond it."""
+
+
+class AncillaryFileCache:
+    """
+    Local, content-addressed cache of staged ancillary files, shared by the
+    processes of a worker.
+
+    Files are stored once per content digest under blobs/, and looked up
+    through an index file mapping each key (e.g. the Ionosphere archive name,
+    or the Orbit file name) to its digest, file name and metadata (e.g. the
+    Orbit validity window). Access to the index is serialized across processes
+    with fcntl file locks, and least recently used entries are evicted once
+    the cached files exceed max_bytes.
+    """
+
+    INDEX_FILENAME = "index.json"
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_ANCILLARY_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+
+        os.makedirs(os.path.join(self.cache_dir, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(self.cache_dir, "locks"), exist_ok=True)
+
+    @contextlib.contextmanager
+    def lock(self, name: str):
+        """
+        Holds an exclusive lock on the given name, across the processes and
+        threads of the worker. Download jobs hold the lock of a file while
+        fetching it, so that concurrent jobs fetch each file once.
+        """
+        lock_path = os.path.join(self.cache_dir, "locks", f"{hashlib.sha256(name.encode()).hexdigest()}.lock")
+
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, "blobs", digest[:2], digest)
+
+    def _read_index(self) -> dict:
+        try:
+            with open(os.path.join(self.cache_dir, self.INDEX_FILENAME)) as index_file:
+                return json.load(index_file)
+        except FileNotFoundError:
+            return {}
+
+    def _write_index(self, index: dict):
+        # Write to a temporary file first so the index is never seen partially written
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILENAME)
+        tmp_path = f"{index_path}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, "w") as index_file:
+            json.dump(index, index_file)
+        os.replace(tmp_path, index_path)
+
+    def _count(self, hit: bool):
+        with self._counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str, output_directory: str) -> Optional[str]:
+        """
+        Copies the cached file of the key to output_directory, returning its
+        path. Returns None if the key is not cached.
+        """
+        return self.find(lambda entry_key, metadata: entry_key == key, output_directory)
+
+    def get_metadata(self, key: str) -> Optional[dict]:
+        """Returns the metadata the key was cached with, without staging its file. Returns None if it is not cached."""
+        with self.lock(self.INDEX_FILENAME):
+            entry = self._read_index().get(key)
+
+        self._count(hit=entry is not None)
+        return entry["metadata"] if entry is not None else None
+
+    def find(self, predicate: Callable[[str, dict], bool], output_directory: str) -> Optional[str]:
+        """
+        Copies the first cached file whose key and metadata satisfy the
+        predicate to output_directory, returning its path. Returns None if
+        no cached file does.
+        """
+        with self.lock(self.INDEX_FILENAME):
+            index = self._read_index()
+
+            for key, entry in index.items():
+                if predicate(key, entry["metadata"]) and os.path.exists(self._blob_path(entry["digest"])):
+                    break
+            else:
+                self._count(hit=False)
+                return None
+
+            output_path = os.path.join(output_directory, entry["filename"])
+            shutil.copyfile(self._blob_path(entry["digest"]), output_path)
+
+            entry["last_used"] = time.time()
+            self._write_index(index)
+
+        logger.info(f"Staged {output_path} from ancillary file cache entry {key}")
+        self._count(hit=True)
+        return output_path
+
+    def put(self, key: str, filepath: str, **metadata):
+        """
+        Adds the file at filepath to the cache under the given key, along with
+        any metadata to be matched by find().
+        """
+        sha256 = hashlib.sha256()
+        with open(filepath, "rb") as file:
+            for block in iter(lambda: file.read(1024 * 1024), b""):
+                sha256.update(block)
+        digest = sha256.hexdigest()
+
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+
+            # Copy to a temporary file first so concurrent readers never see a partial file
+            tmp_path = f"{blob_path}.{os.getpid()}.{threading.get_ident()}"
+            shutil.copyfile(filepath, tmp_path)
+            os.replace(tmp_path, blob_path)
+
+        with self.lock(self.INDEX_FILENAME):
+            index = self._read_index()
+            index[key] = {
+                "digest": digest,
+                "filename": os.path.basename(filepath),
+                "size": os.path.getsize(blob_path),
+                "last_used": time.time(),
+                "metadata": metadata
+            }
+            self._evict(index, keep=key)
+            self._write_index(index)
+
+        logger.info(f"Added {filepath} to ancillary file cache as {key}")
+
+    def _evict(self, index: dict, keep: str):
+        """Removes the least recently used entries of the index, other than keep, until the cache fits max_bytes"""
+        digest_to_size = {entry["digest"]: entry["size"] for entry in index.values()}
+        total_size = sum(digest_to_size.values())
+
+        for key in sorted(index, key=lambda key: index[key]["last_used"]):
+            if total_size <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+
+            digest = index.pop(key)["digest"]
+            if all(entry["digest"] != digest for entry in index.values()):
+                total_size -= digest_to_size[digest]
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self._blob_path(digest))
+
+            logger.info(f"Evicted {key} from ancillary file cache")
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def get_ancillary_file_cache() -> Optional[AncillaryFileCache]:
+    """Returns the ancillary file cache configured by the OPERA_ANCILLARY_CACHE_DIR environment variable, if set"""
+    cache_dir = os.environ.get(ANCILLARY_CACHE_DIR_ENV)
+    if not cache_dir:
+        return None
+
+    max_bytes = int(os.environ.get(ANCILLARY_CACHE_MAX_BYTES_ENV, DEFAULT_ANCILLARY_CACHE_MAX_BYTES))
+    return AncillaryFileCache(cache_dir, max_bytes=max_bytes)
@@ -5,16 +5,84 @@ import contextlib
 import os
 import threading
 from pathlib import Path
-from typing import Collection
+from typing import Collection, Optional
 
 import backoff
 import boto3
 from boto3.exceptions import Boto3Error
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from cachetools import TTLCache
 from mypy_boto3_s3 import S3Client
 
 from opera_commons.logger import logger
 from util.backoff_util import giveup_s3_client_upload_file
 
+AWS_CREDENTIALS_TTL_SECS = 3300
+"""How long temporary AWS credentials (e.g. DAAC S3 credentials) are used before being refreshed. Note: validity period is 60 minutes"""
+
+S3_MAX_POOL_CONNECTIONS = 32
+"""The size of each S3 client's connection pool. Should be at least the number of threads sharing a client."""
+
+
+class S3ClientPool:
+    """
+    Thread-safe cache of S3 clients, keyed by (credentials, region, endpoint).
+
+    boto3 clients are thread-safe and expensive to create, so a single client (and its connection pool) is shared by
+    all threads using the same credentials. Clients expire after `AWS_CREDENTIALS_TTL_SECS`, in step with the
+    credentials they were created with, so clients for refreshed credentials replace them.
+    """
+
+    def __init__(self, max_pool_connections=S3_MAX_POOL_CONNECTIONS, transfer_config: Optional[TransferConfig] = None,
+                 ttl=AWS_CREDENTIALS_TTL_SECS, maxsize=64):
+        self.max_pool_connections = max_pool_connections
+        self.transfer_config = transfer_config if transfer_config is not None else TransferConfig()
+        self._clients = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get_client(self, aws_access_key_id=None, aws_secret_access_key=None, aws_session_token=None,
+                   region_name=None, endpoint_url=None) -> S3Client:
+        """Returns the pooled S3 client for the given credentials, region and endpoint, creating it if needed."""
+        key = (aws_access_key_id, aws_secret_access_key, aws_session_token, region_name, endpoint_url)
+        with self._lock:
+            s3_client = self._clients.get(key)
+            if s3_client is None:
+                logger.debug(f"Creating S3 client for {region_name=}, {endpoint_url=}")
+                s3_client = boto3.session.Session(
+                    aws_access_key_id=aws_access_key_id,
+                    aws_secret_access_key=aws_secret_access_key,
+                    aws_session_token=aws_session_token,
+                    region_name=region_name
+                ).client("s3", endpoint_url=endpoint_url, config=Config(max_pool_connections=self.max_pool_connections))
+                self._clients[key] = s3_client
+            return s3_client
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+
+s3_client_pool = S3ClientPool()
+"""The process-wide S3 client pool."""
+
+
+def get_s3_client(aws_creds: Optional[dict] = None, region_name=None, endpoint_url=None) -> S3Client:
+    """
+    Returns a pooled S3 client. See `S3ClientPool`.
+
+    :param aws_creds: temporary credentials, as returned by the DAAC S3 credentials endpoints. If not provided, the
+    default credential chain is used.
+    """
+    aws_creds = aws_creds or {}
+    return s3_client_pool.get_client(
+        aws_access_key_id=aws_creds.get("accessKeyId"),
+        aws_secret_access_key=aws_creds.get("secretAccessKey"),
+        aws_session_token=aws_creds.get("sessionToken"),
+        region_name=region_name,
+        endpoint_url=endpoint_url
+    )
+
 
 def concurrent_s3_client_try_upload_file(bucket: str, key_prefix: str, files: Collection[Path]):
     """Upload s3 files concurrently, returning their s3 paths if all succeed."""
@@ -42,15 +110,15 @@ def concurrent_s3_client_try_upload_file(bucket: str, key_prefix: str, files: Co
 def try_s3_client_try_upload_file(s3_client: S3Client = None, sem: threading.Semaphore = None, **kwargs):
     """
     Attempt to perform an s3 upload, retrying upon failure, returning back the S3 path.
-    A default session-based S3 client is created on clients' behalf to facilitate parallelization of requests.
+    The pooled default S3 client is used if one isn't provided.
     """
     sem = sem if sem is not None else contextlib.nullcontext()
     with sem:
         if s3_client is None:
-            s3_client = boto3.session.Session().client("s3")
+            s3_client = get_s3_client()
         s3path = f's3://{kwargs["Bucket"]}/{kwargs["Key"]}'
 
         logger.info(f'Uploading to {s3path}')
-        s3_client.upload_file(**kwargs)
+        s3_client.upload_file(**{"Config": s3_client_pool.transfer_config, **kwargs})
         logger.info(f'Uploaded to {s3path}')
         return s3path
\ No newline at end of file
@@ -1,106 +1,135 @@
-import re
-import os
+import concurrent.futures
 import fnmatch
 import hashlib
-from hysds.utils import calculate_checksum_from_localized_file
+import os
+import re
+import shutil
+
+CHECKSUM_BLOCK_SIZE = 1024 * 1024
+"""The number of bytes read and hashed at a time."""
 
+CHECKSUM_MAX_WORKERS = min(8, os.cpu_count() or 1)
+"""The number of files hashed concurrently. hashlib releases the GIL while hashing, so threads hash in parallel."""
 
-def create_dataset_checksums(dataset_dir, algo, globs=[], regex=[]):
+
+def create_dataset_checksums(dataset_dir, algo, globs=[], regex=[], max_workers=CHECKSUM_MAX_WORKERS):
     """
      Create checksum files for files in a directory using calculated using the specified algorithm.
 
      This function creates the checksum files for the files in the directory using the specified algorithm.
      The files that are subjected to checksum are filtered using the specified globs or regular expressions.
+     The directory is walked once, and the files are hashed concurrently.
 
      @param dataset_dir (string) - The directory containing the files
      @param algo (string) - The algorithm used to calculate the checksum
      @param globs (list) - A list of glob for filtering files
      @param regex (list) - A list of regular expression for filtering files
+     @param max_workers (int) - The number of files hashed concurrently
 
      @return Checksum files with the original file name with the checksum algorithm name as extension
 
      """
-    is_file = os.path.isfile(dataset_dir)
-    glob_only = False
-    regex_only = False
-    both = False
-    no_filter = False
-
-    if not globs and not regex:
-        no_filter = True
-    if not globs and regex:
-        regex_only = True
-    if globs and not regex:
-        glob_only = True
-    if globs and regex:
-        both = True
-
-    if is_file:
-        cfile = os.path.join(dataset_dir + "." + algo)
-        f = open(cfile, "w+")
-        f.write(calculate_checksum_from_localized_file(dataset_dir, algo))
-        f.close()
-    else:
-        if no_filter:
-            for dirName, subdirList, fileList in os.walk(dataset_dir):
-                for fname in fileList:
-                    cfile = os.path.join(dirName, fname + "." + algo)
-                    f = open(cfile, "w+")
-                    f.write(
-                        calculate_checksum_from_localized_file(
-                            os.path.join(dirName, fname), algo
-                        )
-                    )
-                    f.close()
-        if glob_only:
-            for dirName, subdirList, fileList in os.walk(dataset_dir):
-                for fname in fileList:
-                    for g in globs:
-                        if fnmatch.fnmatch(fname, g):
-                            cfile = os.path.join(dirName, fname + "." + algo)
-                            f = open(cfile, "w+")
-                            f.write(
-                                calculate_checksum_from_localized_file(
-                                    os.path.join(dirName, fname), algo
-                                )
-                            )
-                            f.close()
-        if regex_only:
-            for dirName, subdirList, fileList in os.walk(dataset_dir):
-                for fname in fileList:
-                    for r in regex:
-                        if re.match(r, fname):
-                            cfile = os.path.join(dirName, fname + "." + algo)
-                            f = open(cfile, "w+")
-                            f.write(
-                                calculate_checksum_from_localized_file(
-                                    os.path.join(dirName, fname), algo
-                                )
-                            )
-                            f.close()
-        if both:
-            for dirName, subdirList, fileList in os.walk(dataset_dir):
-                for fname in fileList:
-                    for g in globs:
-                        if fnmatch.fnmatch(fname, g):
-                            cfile = os.path.join(dirName, fname + "." + algo)
-                            f = open(cfile, "w+")
-                            f.write(
-                                calculate_checksum_from_localized_file(
-                                    os.path.join(dirName, fname), algo
-                                )
-                            )
-                            f.close()
-                    for r in regex:
-                        if re.match(r, fname):
-                            cfile = os.path.join(dirName, fname + "." + algo)
-                            f = open(cfile, "w+")
-                            f.write(
-                                calculate_checksum_from_localized_file(
-                                    os.path.join(dirName, fname), algo
-                                )
-                            )
-                            f.close()
+    if os.path.isfile(dataset_dir):
+        create_checksum_files([(dataset_dir, algo)])
+        return
+
+    patterns = [re.compile(r) for r in regex]
+
+    def is_selected(fname):
+        if not globs and not regex:
+            return True
+        return (any(fnmatch.fnmatch(fname, g) for g in globs)
+                or any(pattern.match(fname) for pattern in patterns))
+
+    # list all files before creating any checksum file, so checksum files are never themselves checksummed
+    files = [
+        os.path.join(dirName, fname)
+        for dirName, subdirList, fileList in os.walk(dataset_dir)
+        for fname in fileList
+        if is_selected(fname)
+    ]
+    create_checksum_files([(file, algo) for file in files], max_workers=max_workers)
+
+
+def create_checksum_files(files_and_algos, max_workers=CHECKSUM_MAX_WORKERS):
+    """
+    Create a checksum file, named after the original file with the checksum algorithm name as extension, for each of the
+    given (file path, checksum algorithm) pairs. Files are hashed concurrently.
+
+    @param files_and_algos (list) - (file path, checksum algorithm) pairs
+    @param max_workers (int) - The number of files hashed concurrently
+    """
+    if len(files_and_algos) <= 1 or max_workers <= 1:
+        for file, algo in files_and_algos:
+            write_checksum_file(file, algo)
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for _ in executor.map(lambda file_and_algo: write_checksum_file(*file_and_algo), files_and_algos):
+            pass
+
+
+def write_checksum_file(file, algo, checksum=None):
+    """
+    Write the checksum of the file to a file named after the original file, with the checksum algorithm name as extension.
+
+    @param file (string) - The file path
+    @param algo (string) - The algorithm used to calculate the checksum
+    @param checksum (string) - The checksum of the file, if already calculated
+
+    @return The checksum
+    """
+    if checksum is None:
+        checksum = calculate_file_checksum(file, algo)
+    with open(file + "." + algo, "w+") as f:
+        f.write(checksum)
+    return checksum
+
+
+def calculate_file_checksum(file, algo, block_size=CHECKSUM_BLOCK_SIZE):
+    """
+    Calculate the checksum of a file, reading it in fixed-size blocks.
+
+    @param file (string) - The file path
+    @param algo (string) - The algorithm used to calculate the checksum
+    @param block_size (int) - The number of bytes read and hashed at a time
+
+    @return The hex digest of the file
+    """
+    hasher = hashlib.new(algo)
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    with open(file, "rb", buffering=0) as f:
+        while num_bytes := f.readinto(buffer):
+            hasher.update(view[:num_bytes])
+    return hasher.hexdigest()
+
+
+def copy_with_checksum(source, target, algo, block_size=CHECKSUM_BLOCK_SIZE):
+    """
+    Copy a file (as `shutil.copy` does) and create the checksum file of the copy, reading the source file only once.
+
+    @param source (string) - The source file path
+    @param target (string) - The target file or directory path
+    @param algo (string) - The algorithm used to calculate the checksum
+    @param block_size (int) - The number of bytes read, written and hashed at a time
+
+    @return The target file path
+    """
+    if os.path.isdir(target):
+        target = os.path.join(target, os.path.basename(source))
+
+    hasher = hashlib.new(algo)
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    with open(source, "rb", buffering=0) as src, open(target, "wb") as dst:
+        while num_bytes := src.readinto(buffer):
+            hasher.update(view[:num_bytes])
+            dst.write(view[:num_bytes])
+    shutil.copymode(source, target)
+
+    write_checksum_file(target, algo, checksum=hasher.hexdigest())
+    return target
 
 
 def get_file_checksum(file_content, checksum_type):
@@ -5,8 +5,9 @@ import json
 import logging
 import os
 import re
+import threading
 from builtins import object
-from typing import Optional
+from typing import Any, Callable, Optional
 
 import yaml
 
@@ -28,6 +29,84 @@ yaml.SafeLoader.add_constructor(
 )
 
 
+class ReadOnlyDict(dict):
+    """
+    A dict that cannot be modified in place. Used for configuration shared across the process.
+    Copies (`dict(d)`, `copy.copy`, `copy.deepcopy`) are plain, modifiable dicts.
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError(f"{type(self).__name__} is read-only. Modify a copy instead.")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+def freeze(obj):
+    """Recursively converts dicts to `ReadOnlyDict`s and lists to tuples."""
+    if isinstance(obj, dict):
+        return ReadOnlyDict((k, freeze(v)) for k, v in obj.items())
+    if isinstance(obj, list):
+        return tuple(freeze(v) for v in obj)
+    return obj
+
+
+_conf_cache: dict[tuple[str, Callable], tuple[tuple[int, int], Any]] = {}
+_conf_cache_lock = threading.Lock()
+
+
+def load_conf_cached(file: str, loader: Callable[[str], Any]):
+    """
+    Returns `loader(file)`, cached for the life of the process. The file is re-loaded when its modification time or
+    size changes, or after `invalidate_conf_cache` is called. Loaders should return read-only values (see `freeze`),
+    as the same value is returned to every caller.
+
+    :param file: filepath to the configuration file.
+    :param loader: function that loads the configuration file.
+    """
+    file = os.path.abspath(file)
+    stat = os.stat(file)
+    file_stamp = (stat.st_mtime_ns, stat.st_size)
+    key = (file, loader)
+
+    with _conf_cache_lock:
+        cached = _conf_cache.get(key)
+    if cached is not None and cached[0] == file_stamp:
+        return cached[1]
+
+    conf = loader(file)
+    with _conf_cache_lock:
+        _conf_cache[key] = (file_stamp, conf)
+    return conf
+
+
+def invalidate_conf_cache(file: Optional[str] = None):
+    """
+    Discards cached configuration, forcing it to be re-loaded on next access.
+
+    :param file: filepath to the configuration file to discard. Defaults to discarding all cached configuration.
+    """
+    with _conf_cache_lock:
+        if file is None:
+            _conf_cache.clear()
+            return
+        file = os.path.abspath(file)
+        for key in [key for key in _conf_cache if key[0] == file]:
+            del _conf_cache[key]
+
+
+def _load_yaml(file: str):
+    logger.debug("Loading YAML file: {}".format(file))
+    with open(file) as f:
+        return freeze(yaml.safe_load(f))
+
+
 class YamlConfEncoder(json.JSONEncoder):
     """Custom encoder for YamlConf."""
 
@@ -47,15 +126,12 @@ class YamlConf(object):
     """YAML configuration class."""
 
     def __init__(self, file: str):
-        """Construct YamlConf instance.
+        """Construct YamlConf instance. The parsed YAML is cached per process and read-only.
 
         :param file: filepath to the YAML file.
         """
-        logger.debug("Loading YAML file: {}".format(file))
-
         self._file = file
-        with open(self._file) as f:
-            self._cfg = yaml.safe_load(f)
+        self._cfg = load_conf_cached(self._file, _load_yaml)
 
     @property
     def file(self):
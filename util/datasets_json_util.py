@@ -1,12 +1,16 @@
+import json
+import os
+import re
 from pathlib import PurePath
 from typing import Optional
+
+from util.conf_util import ReadOnlyDict, freeze, load_conf_cached
 from util.os_util import norm_path
-import os
-import json
 
 
 class DatasetsJson:
-    """Parses conf/sds/files/datasets.json and makes access easier"""
+    """Parses conf/sds/files/datasets.json and makes access easier.
+    The parsed file is cached per process and read-only (see `util.conf_util.load_conf_cached`)."""
 
     def __init__(self, file: Optional[str] = None):
         """Constructor. Parses datasets.json
@@ -19,15 +23,28 @@ class DatasetsJson:
                 os.path.join(os.path.dirname(__file__), "..", "conf", "sds", "files", "datasets.json")
             )
 
-        # Open up the datasets.json file and create a dictionary of datasets keyed by dataset type
-        with open(file) as f:
-            datasets = json.load(f)["datasets"]
-            self._datasets_json = {dataset["type"]: dataset for dataset in datasets}
+        self._datasets_json, self._match_patterns = load_conf_cached(file, _load_datasets_json)
 
     def get(self, key):
         '''Returns the dataset with the given key. Key is the dataset type.'''
         return self._datasets_json[key]
 
+    def get_match_pattern(self, key) -> re.Pattern:
+        '''Returns the compiled "match_pattern" regex of the dataset with the given key. Key is the dataset type.'''
+        return self._match_patterns[key]
+
+
+def _load_datasets_json(file: str):
+    """Returns a dictionary of datasets keyed by dataset type, and a dictionary of their compiled match patterns"""
+    with open(file) as f:
+        datasets = json.load(f)["datasets"]
+
+    datasets_json = freeze({dataset["type"]: dataset for dataset in datasets})
+    match_patterns = ReadOnlyDict(
+        (dataset["type"], re.compile(dataset["match_pattern"])) for dataset in datasets if "match_pattern" in dataset
+    )
+    return datasets_json, match_patterns
+
 # TODO: Refactor so that all the functions below are methods of DatasetsJson
 
 def find_publish_location_s3(datasets_json, dataset_type):
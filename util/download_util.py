@@ -0,0 +1,143 @@
+"""Utilities for streaming file downloads over HTTP(S)"""
+
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import requests
+from requests.exceptions import ChunkedEncodingError, ConnectionError, ReadTimeout
+
+from opera_commons.logger import logger
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+"""The number of bytes read from the response and written to disk at a time."""
+
+DOWNLOAD_MAX_RESUMES = 5
+"""The number of times a download is resumed after a dropped connection before giving up."""
+
+DOWNLOAD_TIMEOUT_SECS = (30, 300)
+"""The (connect, read) timeouts of each download request."""
+
+PART_FILE_SUFFIX = ".part"
+
+_CONTENT_RANGE_RE = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+
+
+class IncompleteDownloadException(Exception):
+    pass
+
+
+class DownloadResult(NamedTuple):
+    path: Path
+    size: int
+    checksum: Optional[str]
+
+
+def stream_download(url, target_path: Path, session: Optional[requests.Session] = None, headers: Optional[dict] = None,
+                    checksum_algo: Optional[str] = None, expected_size: Optional[int] = None,
+                    chunk_size=DOWNLOAD_CHUNK_SIZE, max_resumes=DOWNLOAD_MAX_RESUMES) -> DownloadResult:
+    """
+    Downloads the given URL to `target_path` without holding the response body in memory.
+
+    The response is streamed in chunks to a sibling `.part` file. If the connection drops mid-stream, the download is
+    resumed from the last written byte using an HTTP Range request, up to `max_resumes` times. If `checksum_algo` is
+    given, the checksum is computed incrementally while streaming, so the file is never re-read. The `.part` file is renamed to `target_path` only once
+    the expected size (`expected_size` if given, else the size reported by the server) has been written.
+
+    :param url: the URL to download
+    :param target_path: the final file path
+    :param session: the session used to issue requests. Defaults to the `requests` module.
+    :param headers: additional request headers, such as authorization headers
+    :param checksum_algo: the hashlib algorithm of the returned checksum. Defaults to None, skipping checksumming.
+    :param expected_size: the expected file size, in bytes
+    :return: the path, size and checksum of the downloaded file
+    """
+    session = session if session is not None else requests
+    target_path = Path(target_path)
+    part_path = target_path.with_name(target_path.name + PART_FILE_SUFFIX)
+
+    hasher = hashlib.new(checksum_algo) if checksum_algo else None
+    total_size = expected_size
+    num_bytes = 0
+    resumes = 0
+
+    with open(part_path, "wb") as part_file:
+        while True:
+            request_headers = dict(headers or {})
+            if num_bytes:
+                request_headers["Range"] = f"bytes={num_bytes}-"
+
+            try:
+                with session.get(url, headers=request_headers, stream=True, timeout=DOWNLOAD_TIMEOUT_SECS) as r:
+                    r.raise_for_status()
+
+                    if num_bytes:
+                        range_start = _get_range_start(r)
+                        if range_start != part_file.tell():
+                            # A plain 200 is the whole file. Any other offset cannot be appended to the .part file.
+                            logger.warning("Server returned %s from byte %s instead of %d for %s. Restarting download.",
+                                           r.status_code, range_start, part_file.tell(), url)
+                            part_file.seek(0)
+                            part_file.truncate()
+                            hasher = hashlib.new(checksum_algo) if checksum_algo else None
+                            num_bytes = 0
+                            if range_start != 0:
+                                continue
+                    if total_size is None:
+                        total_size = _get_total_size(r)
+
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        part_file.write(chunk)
+                        if hasher:
+                            hasher.update(chunk)
+                        num_bytes += len(chunk)
+            except (ChunkedEncodingError, ConnectionError, ReadTimeout) as e:
+                # NOTE: requests raises ChunkedEncodingError when the connection drops mid-stream, regardless of encoding
+                logger.warning("Download of %s interrupted after %d bytes: %s", url, num_bytes, e)
+            except Exception:
+                part_file.close()
+                part_path.unlink(missing_ok=True)
+                raise
+            else:
+                if total_size is None or num_bytes >= total_size:
+                    break
+                logger.warning("Download of %s ended early after %d of %d bytes", url, num_bytes, total_size)
+
+            resumes += 1
+            if resumes > max_resumes:
+                part_file.close()
+                part_path.unlink(missing_ok=True)
+                raise IncompleteDownloadException(f"Failed to download {url} after {max_resumes} resumes")
+            logger.info("Resuming download of %s from byte %d (attempt %d of %d)", url, num_bytes, resumes, max_resumes)
+
+    if total_size is not None and num_bytes != total_size:
+        part_path.unlink(missing_ok=True)
+        raise IncompleteDownloadException(f"Downloaded {num_bytes} bytes of {url}, expected {total_size}")
+
+    os.replace(part_path, target_path)
+    return DownloadResult(target_path.resolve(), num_bytes, hasher.hexdigest() if hasher else None)
+
+
+def _get_range_start(r: requests.Response) -> Optional[int]:
+    """Returns the offset of the first byte of the response body in the file being downloaded, if known."""
+    if r.status_code == 200:
+        return 0
+    if r.status_code == 206:
+        match = _CONTENT_RANGE_RE.match(r.headers.get("Content-Range", ""))
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def _get_total_size(r: requests.Response) -> Optional[int]:
+    """Returns the full size of the file being downloaded, as reported by the server, if known."""
+    if r.status_code == 206:
+        match = _CONTENT_RANGE_RE.match(r.headers.get("Content-Range", ""))
+        if match and match.group(3) != "*":
+            return int(match.group(3))
+        return None
+    if "Content-Length" in r.headers and not r.headers.get("Content-Encoding"):
+        return int(r.headers["Content-Length"])
+    return None
@@ -0,0 +1,164 @@
+"""
+===============
+staging_util.py
+===============
+
+Contains utility functions for staging sub-regions of global maps (DEM,
+Worldcover, HAND, etc.) with GDAL, shared by the stage_*.py tools.
+
+"""
+
+import concurrent.futures
+import contextlib
+import hashlib
+import os
+from typing import Callable, Dict, List, Optional
+
+from osgeo import gdal
+
+from opera_commons.logger import logger
+from util.tile_cache_util import TileCache
+
+GDAL_STAGING_CONFIG_OPTIONS = {
+    # Multiplex the range requests of a translation over a single HTTP/2 connection
+    "GDAL_HTTP_MULTIPLEX": "YES",
+    "GDAL_HTTP_VERSION": "2",
+    "GDAL_HTTP_MERGE_CONSECUTIVE_RANGES": "YES",
+    # Cache the blocks read from the remote VRT sources, which neighboring reads share
+    "VSI_CACHE": "TRUE",
+    "VSI_CACHE_SIZE": str(64 * 1024 * 1024),
+    # Don't list the remote VRT directory when opening sources
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+}
+"""GDAL configuration options applied to each staging thread, along with its share of GDAL_NUM_THREADS"""
+
+STAGING_MAX_WORKERS = 4
+"""Maximum number of sub-regions translated concurrently"""
+
+
+def gdal_staging_config_options(num_workers: int) -> Dict[str, str]:
+    """
+    Returns the GDAL configuration options of each of num_workers concurrent
+    staging threads, which share the CPUs of the worker between them.
+
+    Parameters
+    ----------
+    num_workers : int
+        Number of sub-regions translated concurrently.
+
+    """
+    num_threads = max(1, (os.cpu_count() or 1) // max(1, num_workers))
+    return {**GDAL_STAGING_CONFIG_OPTIONS, "GDAL_NUM_THREADS": str(num_threads)}
+
+
+def get_vrt_digest(vrt_filename: str) -> str:
+    """
+    Returns the SHA-256 digest of the content of the VRT, which may be a
+    /vsis3/ path. Used to key the tile cache on the VRT's current version.
+
+    Parameters
+    ----------
+    vrt_filename : str
+        Path to the VRT.
+
+    """
+    sha256 = hashlib.sha256()
+
+    with gdal_thread_config(GDAL_STAGING_CONFIG_OPTIONS):
+        vrt_file = gdal.VSIFOpenL(vrt_filename, "rb")
+        if vrt_file is None:
+            raise RuntimeError(f"Failed to open {vrt_filename}")
+
+        try:
+            while block := gdal.VSIFReadL(1, 1024 * 1024, vrt_file):
+                sha256.update(block)
+        finally:
+            gdal.VSIFCloseL(vrt_file)
+
+    return sha256.hexdigest()
+
+
+@contextlib.contextmanager
+def gdal_thread_config(options: Dict[str, str]):
+    """
+    Sets the provided GDAL configuration options for the current thread only,
+    restoring the previous values on exit.
+
+    Parameters
+    ----------
+    options : dict
+        GDAL configuration option names to values.
+
+    """
+    previous_options = {key: gdal.GetThreadLocalConfigOption(key, None) for key in options}
+
+    for key, value in options.items():
+        gdal.SetThreadLocalConfigOption(key, value)
+
+    try:
+        yield
+    finally:
+        for key, value in previous_options.items():
+            gdal.SetThreadLocalConfigOption(key, value)
+
+
+def stage_sub_regions(translate: Callable, vrt_filenames: List[str], polys, file_prefix: str,
+                      tile_cache: Optional[TileCache] = None,
+                      max_workers: int = STAGING_MAX_WORKERS) -> List[str]:
+    """
+    Stages the sub-region of each polygon concurrently, one GTiff file per polygon.
+
+    Parameters
+    ----------
+    translate : callable
+        Function translating a sub-region of a VRT to a GTiff file, with the
+        signature translate(vrt_filename, output_path, x_min, x_max, y_min, y_max).
+    vrt_filenames : list of str
+        Path to the VRT to translate from, for each polygon.
+    polys : list of shapely.geometry.Polygon
+        List of polygons comprising the sub-regions to stage.
+    file_prefix : str
+        Prefix of the output GTiff files, which are named {file_prefix}_{index}.tif
+    tile_cache : TileCache, optional
+        Cache to serve the sub-regions from, and to add newly staged sub-regions to.
+    max_workers : int, optional
+        Maximum number of sub-regions translated concurrently. The CPUs of the
+        worker are divided between them through GDAL_NUM_THREADS.
+
+    Returns
+    -------
+    output_paths : list of str
+        Paths to the staged GTiff files, in the order of the provided polygons.
+
+    """
+    num_workers = 1 if len(polys) <= 1 or max_workers <= 1 else min(max_workers, len(polys))
+    config_options = gdal_staging_config_options(num_workers)
+
+    # The VRTs are keyed by content, as they may be updated in place
+    vrt_digests = {}
+    if tile_cache is not None:
+        vrt_digests = {vrt_filename: get_vrt_digest(vrt_filename) for vrt_filename in set(vrt_filenames)}
+
+    def stage_sub_region(idx, vrt_filename, poly):
+        output_path = f'{file_prefix}_{idx}.tif'
+        bounds = poly.bounds
+
+        if tile_cache is not None and tile_cache.get(vrt_digests[vrt_filename], bounds, output_path):
+            logger.info(f"Staged {output_path} from tile cache")
+            return output_path
+
+        x_min, y_min, x_max, y_max = bounds
+        with gdal_thread_config(config_options):
+            translate(vrt_filename, output_path, x_min, x_max, y_min, y_max)
+
+        if tile_cache is not None:
+            tile_cache.put(vrt_digests[vrt_filename], bounds, output_path)
+
+        return output_path
+
+    if num_workers == 1:
+        return [stage_sub_region(idx, vrt_filename, poly)
+                for idx, (vrt_filename, poly) in enumerate(zip(vrt_filenames, polys))]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+        return list(executor.map(stage_sub_region, range(len(polys)), vrt_filenames, polys))
@@ -0,0 +1,124 @@
+"""
+==================
+tile_cache_util.py
+==================
+
+Contains the worker-local cache of the sub-regions of global maps (DEM,
+Worldcover, HAND, etc.) staged by the stage_*.py tools.
+
+"""
+
+import contextlib
+import hashlib
+import os
+import shutil
+import threading
+from typing import Optional
+
+from opera_commons.logger import logger
+
+TILE_CACHE_DIR_ENV = "OPERA_STAGING_TILE_CACHE_DIR"
+"""Environment variable enabling the local tile cache, set to the cache directory"""
+
+TILE_CACHE_MAX_BYTES_ENV = "OPERA_STAGING_TILE_CACHE_MAX_BYTES"
+"""Environment variable overriding the size cap of the local tile cache"""
+
+DEFAULT_TILE_CACHE_MAX_BYTES = 10 * 1024 ** 3
+"""Default size cap of the local tile cache. Least recently used tiles are evicted beyond it."""
+
+
+class TileCache:
+    """
+    Local cache of staged sub-regions, shared by the processes of a worker.
+    Entries are keyed by the digest of the source VRT's content and the
+    requested bounds, so a VRT updated in place is never served from tiles
+    staged from its previous version. The modification time of each tile
+    records its last use, and least recently used tiles are evicted once the
+    cached tiles exceed max_bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_TILE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(vrt_digest: str, bounds) -> str:
+        """
+        Returns the cache key of the sub-region of the VRT with the provided
+        content digest and (x_min, y_min, x_max, y_max) bounds
+        """
+        bounds_str = ",".join(f"{bound:.9f}" for bound in bounds)
+        return hashlib.sha256(f"{vrt_digest}|{bounds_str}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.tif")
+
+    def get(self, vrt_digest: str, bounds, output_path: str) -> bool:
+        """Copies the cached sub-region to output_path. Returns False if the sub-region is not cached."""
+        cache_path = self._path(self.key(vrt_digest, bounds))
+        try:
+            shutil.copyfile(cache_path, output_path)
+            os.utime(cache_path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def put(self, vrt_digest: str, bounds, output_path: str):
+        """Adds the staged sub-region at output_path to the cache"""
+        cache_path = self._path(self.key(vrt_digest, bounds))
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+        # Copy to a temporary file first so concurrent readers never see a partial tile
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}"
+        shutil.copyfile(output_path, tmp_path)
+        os.replace(tmp_path, cache_path)
+
+        self._evict(keep=cache_path)
+
+    def _evict(self, keep: str):
+        """Removes the least recently used tiles, other than keep, until the cache fits max_bytes"""
+        tiles = []
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if not filename.endswith(".tif"):
+                    continue  # temporary file of a concurrent put
+                path = os.path.join(dirpath, filename)
+                with contextlib.suppress(FileNotFoundError):
+                    stat = os.stat(path)
+                    tiles.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in tiles)
+        for _, size, path in sorted(tiles):
+            if total_size <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+
+            # Another process may have evicted the tile already
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+                logger.info(f"Evicted {path} from tile cache")
+            total_size -= size
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def get_tile_cache() -> Optional[TileCache]:
+    """Returns the tile cache configured by the OPERA_STAGING_TILE_CACHE_DIR environment variable, if set"""
+    cache_dir = os.environ.get(TILE_CACHE_DIR_ENV)
+    if not cache_dir:
+        return None
+
+    max_bytes = int(os.environ.get(TILE_CACHE_MAX_BYTES_ENV, DEFAULT_TILE_CACHE_MAX_BYTES))
+    return TileCache(cache_dir, max_bytes=max_bytes)